@@ -706,6 +706,19 @@ def ldata():
     else:
         translate = settings.get_L10n_translate_gis_location()
 
+    # Pre-rendered response?
+    cache = s3base.S3LocationCache
+    l0 = cache.l0(location_id)
+    if l0:
+        key = "ldata-%s-%s-%s" % (location_id,
+                                  output_level or "",
+                                  language if translate else "",
+                                  )
+        version = cache.version("hierarchy", l0)
+        output = cache.get(l0, version, key)
+        if output is not None:
+            return output
+
     table = s3db.gis_location
     query = (table.deleted == False) & \
             (table.end_date == None) & \
@@ -822,7 +835,11 @@ def ldata():
                                             "f": f,
                                             }
 
-    return json.dumps(location_dict, separators=SEPARATORS)
+    output = json.dumps(location_dict, separators=SEPARATORS)
+    if l0:
+        cache.store(l0, version, key, output)
+
+    return output
 
 # -----------------------------------------------------------------------------
 def hdata():
@@ -845,6 +862,17 @@ def hdata():
 
     response.headers["Content-Type"] = "application/json"
 
+    # Pre-rendered response?
+    cache = s3base.S3LocationCache
+    try:
+        l0 = int(location_id)
+    except ValueError:
+        raise HTTP(400)
+    version = cache.version("hierarchy", l0)
+    output = cache.get(l0, version, "hdata")
+    if output is not None:
+        return output
+
     # @ToDo: Translate options using gis_hierarchy_name?
     #translate = settings.get_L10n_translate_gis_location()
     #if translate:
@@ -868,7 +896,10 @@ def hdata():
             if row[l]:
                 hdict[int(l[1:])] = row[l]
 
-    return json.dumps(hdict, separators=SEPARATORS)
+    output = json.dumps(hdict, separators=SEPARATORS)
+    cache.store(l0, version, "hdata", output)
+
+    return output
 
 # -----------------------------------------------------------------------------
 def s3_gis_location_parents(r, **attr):
@@ -226,6 +226,7 @@ def s3_rest_controller(prefix=None, resourcename=None, **attr):
     set_handler("report", s3base.S3Report, transform=True) # For GeoJSON
     set_handler("search_ac", s3base.search_ac)
     set_handler("summary", s3base.S3Summary)
+    set_handler("tiles", s3base.S3VectorTiles)
     set_handler("timeplot", s3base.S3TimePlot)
     set_handler("xform", s3base.S3XForms)
 
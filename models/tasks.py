@@ -27,8 +27,9 @@ def s3db_task(function, user_id=None, **kwargs):
         # Authenticate
         auth.s3_impersonate(user_id)
     # Run the Task & return the result
-    result = s3db[function](**kwargs)
-    db.commit()
+    with s3base.S3DeferredUpdates():
+        result = s3db[function](**kwargs)
+    s3db.commit()
     return result
 
 # -----------------------------------------------------------------------------
@@ -44,8 +45,9 @@ def settings_task(taskname, user_id=None, **kwargs):
     task = settings.get_task(taskname)
     if task:
         # Run the Task & return the result
-        result = task(**kwargs)
-        db.commit()
+        with s3base.S3DeferredUpdates():
+            result = task(**kwargs)
+        s3db.commit()
         return result
 
 # -----------------------------------------------------------------------------
@@ -83,10 +85,28 @@ def maintenance(period = "daily"):
     if maintenance is not None:
         if period == "daily":
             result = maintenance.Daily()()
-        db.commit()
+        s3db.commit()
 
     return result
 
+# -----------------------------------------------------------------------------
+def s3_text_search_rebuild(tablename, fields=None, user_id=None):
+    """
+        Set up and build the text search index for a table
+            - scheduled when the index is first needed (see S3TextSearch)
+
+        @param tablename: the table name
+        @param fields: the names of the fields to index
+        @param user_id: calling request's auth.user.id or None
+    """
+    if user_id:
+        # Authenticate
+        auth.s3_impersonate(user_id)
+    # Run the Task & return the result
+    result = s3base.S3TextSearch.rebuild(tablename, fields=fields)
+    s3db.commit()
+    return result
+
 # -----------------------------------------------------------------------------
 # GIS: always-enabled
 # -----------------------------------------------------------------------------
@@ -107,7 +127,39 @@ def gis_download_kml(record_id, filename, session_id_name, session_id,
         auth.s3_impersonate(user_id)
     # Run the Task & return the result
     result = gis.download_kml(record_id, filename, session_id_name, session_id)
-    db.commit()
+    s3db.commit()
+    return result
+
+# -----------------------------------------------------------------------------
+def gis_gazetteer_rebuild(user_id=None):
+    """
+        Build the name index of the offline gazetteer
+            - scheduled when the index is first needed (see S3Gazetteer)
+
+        @param user_id: calling request's auth.user.id or None
+    """
+    if user_id:
+        # Authenticate
+        auth.s3_impersonate(user_id)
+    # Run the Task & return the result
+    result = s3base.S3Gazetteer.rebuild()
+    s3db.commit()
+    return result
+
+# -----------------------------------------------------------------------------
+def gis_spatial_index_setup(user_id=None):
+    """
+        Set up the spatial index for bounding box queries
+            - scheduled when the index is first needed (see S3SpatialIndex)
+
+        @param user_id: calling request's auth.user.id or None
+    """
+    if user_id:
+        # Authenticate
+        auth.s3_impersonate(user_id)
+    # Run the Task & return the result
+    result = s3base.S3SpatialIndex.setup()
+    s3db.commit()
     return result
 
 # -----------------------------------------------------------------------------
@@ -125,9 +177,29 @@ def gis_update_location_tree(feature, user_id=None):
     # Run the Task & return the result
     feature = json.loads(feature)
     path = gis.update_location_tree(feature)
-    db.commit()
+    s3db.commit()
+    if feature.get("level"):
+        # Paths & bounds of the Lx have changed
+        s3base.S3LocationCache.invalidate_hierarchy(feature["id"])
     return path
 
+# -----------------------------------------------------------------------------
+def gis_update_simplified_geometries(location_id, user_id=None):
+    """
+        Update the precomputed simplified geometries of a location
+            - will normally be done Asynchronously if there is a worker alive
+
+        @param location_id: the gis_location record ID
+        @param user_id: calling request's auth.user.id or None
+    """
+    if user_id:
+        # Authenticate
+        auth.s3_impersonate(user_id)
+    # Run the Task & return the result
+    result = gis.update_simplified_geometries([location_id])
+    s3db.commit()
+    return result
+
 # -----------------------------------------------------------------------------
 # Org: always-enabled
 # -----------------------------------------------------------------------------
@@ -142,15 +214,19 @@ def org_site_check(site_id, user_id=None):
     customise = settings.get_org_site_check()
     if customise:
         customise(site_id)
-        db.commit()
+        s3db.commit()
 
 # -----------------------------------------------------------------------------
 tasks = {"dummy": dummy,
          "s3db_task": s3db_task,
          "settings_task": settings_task,
          "maintenance": maintenance,
+         "s3_text_search_rebuild": s3_text_search_rebuild,
          "gis_download_kml": gis_download_kml,
+         "gis_gazetteer_rebuild": gis_gazetteer_rebuild,
+         "gis_spatial_index_setup": gis_spatial_index_setup,
          "gis_update_location_tree": gis_update_location_tree,
+         "gis_update_simplified_geometries": gis_update_simplified_geometries,
          "org_site_check": org_site_check,
          }
 
@@ -240,7 +316,7 @@ if has_module("doc"):
         # After Indexing, set the value for has_been_indexed to True in the database
         db(table.id == id).update(has_been_indexed = True)
 
-        db.commit()
+        s3db.commit()
 
     tasks["document_create_index"] = document_create_index
 
@@ -262,7 +338,7 @@ if has_module("doc"):
         # After removing the index, set has_been_indexed value to False in the database
         db(table.id == id).update(has_been_indexed = False)
 
-        db.commit()
+        s3db.commit()
 
     tasks["document_delete_index"] = document_delete_index
 
@@ -284,7 +360,7 @@ if has_module("msg"):
 
         # Run the Task & return the result
         result = msg.process_outbox(contact_method)
-        db.commit()
+        s3db.commit()
         return result
 
     tasks["msg_process_outbox"] = msg_process_outbox
@@ -305,7 +381,7 @@ if has_module("msg"):
 
         # Run the Task & return the result
         result = msg.twitter_search(search_id)
-        db.commit()
+        s3db.commit()
         return result
 
     tasks["msg_twitter_search"] = msg_twitter_search
@@ -325,7 +401,7 @@ if has_module("msg"):
 
         # Run the Task & return the result
         result = msg.process_keygraph(search_id)
-        db.commit()
+        s3db.commit()
         return result
 
     tasks["msg_process_keygraph"] = msg_process_keygraph
@@ -340,7 +416,7 @@ if has_module("msg"):
 
         # Run the Task & return the result
         result = msg.poll(tablename, channel_id)
-        db.commit()
+        s3db.commit()
         return result
 
     tasks["msg_poll"] = msg_poll
@@ -355,7 +431,7 @@ if has_module("msg"):
 
         # Run the Task & return the result
         result = msg.parse(channel_id, function_name)
-        db.commit()
+        s3db.commit()
         return result
 
     tasks["msg_parse"] = msg_parse
@@ -382,7 +458,7 @@ if has_module("msg"):
             auth.s3_impersonate(user_id)
 
         result = s3base.S3Notifications().check_subscriptions()
-        db.commit()
+        s3db.commit()
         return result
 
     tasks["notify_check_subscriptions"] = notify_check_subscriptions
@@ -416,7 +492,7 @@ if has_module("req"):
 
         # Run the Task & return the result
         result = s3db.req_add_from_template(req_id)
-        db.commit()
+        s3db.commit()
         return result
 
     tasks["req_add_from_template"] = req_add_from_template
@@ -440,7 +516,7 @@ if has_module("setup"):
 
         # Run the Task & return the result
         result = s3db.setup_run_playbook(playbook, instance_id, tags, hosts)
-        db.commit()
+        s3db.commit()
         return result
 
     tasks["setup_run_playbook"] = setup_run_playbook
@@ -454,7 +530,7 @@ if has_module("setup"):
             auth.s3_impersonate(user_id)
         # Run the Task & return the result
         result = s3db.setup_monitor_run_task(task_id)
-        db.commit()
+        s3db.commit()
         return result
 
     tasks["setup_monitor_run_task"] = setup_monitor_run_task
@@ -468,7 +544,7 @@ if has_module("setup"):
             auth.s3_impersonate(user_id)
         # Run the Task & return the result
         result = s3db.setup_monitor_check_email_reply(run_id)
-        db.commit()
+        s3db.commit()
         return result
 
     tasks["setup_monitor_check_email_reply"] = setup_monitor_check_email_reply
@@ -494,7 +570,7 @@ if has_module("stats"):
 
         # Run the Task & return the result
         result = s3db.stats_demographic_update_aggregates(records)
-        db.commit()
+        s3db.commit()
         return result
 
     tasks["stats_demographic_update_aggregates"] = stats_demographic_update_aggregates
@@ -529,7 +605,7 @@ if has_module("stats"):
                                                                   start_date,
                                                                   end_date,
                                                                   )
-        db.commit()
+        s3db.commit()
         return result
 
     tasks["stats_demographic_update_location_aggregate"] = stats_demographic_update_location_aggregate
@@ -557,7 +633,7 @@ if has_module("stats"):
 
             # Run the Task & return the result
             result = s3db.disease_stats_update_aggregates(records, all)
-            db.commit()
+            s3db.commit()
             return result
 
         tasks["disease_stats_update_aggregates"] = disease_stats_update_aggregates
@@ -589,7 +665,7 @@ if has_module("stats"):
                                                                    parameter_id,
                                                                    dates,
                                                                    )
-            db.commit()
+            s3db.commit()
             return result
 
         tasks["disease_stats_update_location_aggregates"] = disease_stats_update_location_aggregates
@@ -613,7 +689,7 @@ if has_module("stats"):
 
             # Run the Task & return the result
             result = s3db.vulnerability_update_aggregates(records)
-            db.commit()
+            s3db.commit()
             return result
 
         tasks["vulnerability_update_aggregates"] = vulnerability_update_aggregates
@@ -648,7 +724,7 @@ if has_module("stats"):
                                                                   start_date,
                                                                   end_date,
                                                                   )
-            db.commit()
+            s3db.commit()
             return result
 
         tasks["vulnerability_update_location_aggregate"] = vulnerability_update_location_aggregate
@@ -681,14 +757,14 @@ if has_module("sync"):
                                remote=False,
                                result=sync.log.ERROR,
                                message=message)
-                db.commit()
+                s3db.commit()
                 return sync.log.ERROR
             sync.set_status(running=True, manual=manual)
             try:
                 sync.synchronize(repository)
             finally:
                 sync.set_status(running=False, manual=False)
-        db.commit()
+        s3db.commit()
         return s3base.S3SyncLog.SUCCESS
 
     tasks["sync_synchronize"] = sync_synchronize
@@ -253,7 +253,7 @@ if len(pop_list) > 0:
         db.supply_catalog.insert(name = settings.get_supply_catalog_default())
 
     # Ensure DB population committed when running through shell
-    db.commit()
+    s3db.commit()
 
     duration("Database Tables Created.", start)
 
@@ -407,6 +407,13 @@ if len(pop_list) > 0:
     field = "last_name"
     db.executesql("CREATE INDEX %s__idx on %s(%s);" % (field, tablename, field))
 
+    # Affiliation closure
+    db.executesql("CREATE INDEX pr_affiliation_closure_ancestor__idx on pr_affiliation_closure(ancestor_pe, role_type);")
+    db.executesql("CREATE INDEX pr_affiliation_closure_descendant__idx on pr_affiliation_closure(descendant_pe, role_type);")
+
+    # Realm sets
+    db.executesql("CREATE INDEX s3_realm_set_key__idx on s3_realm_set(set_key);")
+
     # GIS
     # Add extra index on search field
     # Should work for our 3 supported databases: sqlite, MySQL & PostgreSQL
@@ -66,6 +66,18 @@ from .s3task import *
 # Hierarchy Handling
 from .s3hierarchy import *
 
+# Text Search Index
+from .s3textsearch import *
+
+# Spatial Index
+from .s3spatialindex import *
+
+# Offline Gazetteer
+from .s3gazetteer import *
+
+# Location Option Cache
+from .s3locationcache import *
+
 # Core Framework ==============================================================
 
 # Model Extensions
@@ -125,6 +137,7 @@ from .s3track import *
 
 # GIS Mapping
 from .s3gis import *
+from .s3vectortiles import *
 
 # Messaging
 from .s3msg import *
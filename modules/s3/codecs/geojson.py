@@ -0,0 +1,590 @@
+# -*- coding: utf-8 -*-
+
+"""
+    S3 GeoJSON codec
+
+    @copyright: 2020 (c) Sahana Software Foundation
+    @license: MIT
+
+    Permission is hereby granted, free of charge, to any person
+    obtaining a copy of this software and associated documentation
+    files (the "Software"), to deal in the Software without
+    restriction, including without limitation the rights to use,
+    copy, modify, merge, publish, distribute, sublicense, and/or sell
+    copies of the Software, and to permit persons to whom the
+    Software is furnished to do so, subject to the following
+    conditions:
+
+    The above copyright notice and this permission notice shall be
+    included in all copies or substantial portions of the Software.
+
+    THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+    EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES
+    OF MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+    NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT
+    HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY,
+    WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+    FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR
+    OTHER DEALINGS IN THE SOFTWARE.
+"""
+
+__all__ = ("S3GeoJSON",)
+
+import json
+import os
+
+from gluon import current
+
+from s3compat import basestring
+from ..s3codec import S3Codec
+from ..s3gis import CLUSTER_DISTANCE, CLUSTER_THRESHOLD
+
+SEPARATORS = (",", ":")
+
+# =============================================================================
+class S3GeoJSON(S3Codec):
+    """
+        Native GeoJSON encoder for feature layers, producing the same
+        output as the default GeoJSON stylesheet (geojson/export.xsl)
+        without building and transforming an S3XML element tree
+    """
+
+    # Tables with special templates in the stylesheet
+    SPECIAL = ("gis_cache",
+               "gis_feature_query",
+               "gis_location",
+               "gis_theme_data",
+               )
+
+    # -------------------------------------------------------------------------
+    def __init__(self):
+        """
+            Constructor
+        """
+
+        pass
+
+    # -------------------------------------------------------------------------
+    @classmethod
+    def accepts(cls, resource, stylesheet):
+        """
+            Check whether this encoder can replace the XSLT transformation
+            of a resource export
+
+            @param resource: the S3Resource
+            @param stylesheet: the XSLT stylesheet (pathname or stream)
+
+            @return: True|False
+        """
+
+        if current.auth.permission.format != "geojson":
+            return False
+
+        # Only the default stylesheet (custom stylesheets may differ)
+        if not isinstance(stylesheet, basestring):
+            return False
+        default = os.path.join(current.request.folder,
+                               "static", "formats", "geojson", "export.xsl")
+        if os.path.normpath(stylesheet) != os.path.normpath(default):
+            return False
+
+        tablename = resource.tablename
+        if tablename in cls.SPECIAL or \
+           tablename.startswith("gis_layer_shapefile"):
+            return False
+
+        return True
+
+    # -------------------------------------------------------------------------
+    def encode(self, resource, **attr):
+        """
+            Export a resource as GeoJSON
+
+            @param resource: the S3Resource
+            @param attr: dictionary of parameters:
+                 * start:          index of the first record to export
+                 * limit:          maximum number of records to export
+                 * fields:         fields to load (default: all)
+                 * skip:           fields to skip when loading
+                 * location_data:  dictionary of location data which has
+                                   been looked-up in bulk
+                 * map_data:       dictionary of options which can be read
+                                   by the map
+                 * cluster:        dictionary of options for server-side
+                                   clustering, see cluster_options()
+
+            @return: the GeoJSON as string
+        """
+
+        table = resource.table
+
+        # Filter for MCI >= 0 (setting)
+        if current.xml.filter_mci and "mci" in table.fields:
+            resource.add_filter(table.mci >= 0)
+
+        # Server-side clustering (not with slicing)
+        start = attr.get("start")
+        if start is None and attr.get("limit") is None:
+            options = self.cluster_options(attr.get("cluster"))
+            if options:
+                output = self.encode_clusters(resource, options, **attr)
+                if output is not None:
+                    return output
+
+        # Load the master records
+        resource.load(fields = attr.get("fields"),
+                      skip = attr.get("skip"),
+                      start = start,
+                      limit = attr.get("limit"),
+                      virtual = False,
+                      cacheable = True,
+                      )
+
+        # Total number of results
+        results = resource.count()
+
+        # Get location data for records (if not passed-in from caller)
+        location_data = attr.get("location_data")
+        if not location_data:
+            location_data = current.gis.get_location_data(resource,
+                                                           count = results,
+                                                           ) or {}
+
+        # Skip empty resources
+        if results <= 0 or start and start >= results:
+            return "{}"
+
+        rows = resource._rows
+        features = self.encode_features(resource, location_data)
+
+        if len(rows) == 1 and len(features) <= 1:
+            # A single Feature not a Collection
+            return features[0] if features else "{}"
+
+        return self.collection(features, attr.get("map_data"))
+
+    # -------------------------------------------------------------------------
+    def encode_features(self, resource, location_data):
+        """
+            Encode the features for the loaded records of a resource
+
+            @param resource: the S3Resource
+            @param location_data: dictionary of location data from
+                                  gis.get_location_data()
+
+            @return: list of features (as JSON strings)
+        """
+
+        tablename = resource.tablename
+        pkey = resource.table._id.name
+
+        features = []
+        append = features.append
+        for row in resource._rows:
+            for feature in self.features(tablename,
+                                         row[pkey],
+                                         location_data,
+                                         ):
+                append(json.dumps(feature, separators=SEPARATORS))
+
+        return features
+
+    # -------------------------------------------------------------------------
+    @staticmethod
+    def collection(features, map_data=None):
+        """
+            Encode a FeatureCollection
+
+            @param features: the features (as JSON strings)
+            @param map_data: dictionary of options which can be read by the map
+
+            @return: the FeatureCollection as JSON string
+        """
+
+        output = ['{"type":"FeatureCollection"']
+        if map_data:
+            output.append(',"s3":%s' % json.dumps(map_data, separators=SEPARATORS))
+        output.append(',"features":[%s]}' % ",".join(features))
+
+        return "".join(output)
+
+    # -------------------------------------------------------------------------
+    @staticmethod
+    def cluster_options(cluster):
+        """
+            Validate the clustering options (as passed from the request):
+                - zoom: the zoom level of the map (required)
+                - distance: the grid cell size in pixels
+                - threshold: the minimum number of features in a cell
+                             to form a cluster
+                - markers: include the markers of the clusters
+
+            @param cluster: the options as dict
+
+            @return: tuple (zoom, distance, threshold, markers), or None
+                     if no (or no valid) clustering was requested
+        """
+
+        if not cluster:
+            return None
+
+        try:
+            zoom = int(cluster["zoom"])
+            distance = float(cluster.get("distance") or CLUSTER_DISTANCE)
+            threshold = int(cluster.get("threshold") or CLUSTER_THRESHOLD)
+        except (KeyError, TypeError, ValueError):
+            return None
+        if not 0 <= zoom <= 30 or distance <= 0:
+            return None
+
+        return zoom, distance, max(threshold, 2), bool(cluster.get("markers"))
+
+    # -------------------------------------------------------------------------
+    def encode_clusters(self, resource, options, **attr):
+        """
+            Encode a resource as FeatureCollection of clusters for dense
+            grid cells, and of features for records in sparse cells
+
+            @param resource: the S3Resource
+            @param options: tuple (zoom, distance, threshold, markers),
+                            see cluster_options()
+            @param attr: the parameters for encode()
+
+            @return: the GeoJSON as string, or None if the resource
+                     cannot be clustered
+        """
+
+        zoom, distance, threshold, markers = options
+
+        clusters = self.clusters(resource, zoom, distance, threshold)
+        if clusters is None:
+            return None
+        clusters, record_ids = clusters
+
+        features = []
+
+        # Clusters with a representative marker
+        if markers:
+            markers = self.cluster_markers(resource,
+                                           [cluster["id"] for cluster in clusters],
+                                           )
+        append = features.append
+        for cluster in clusters:
+            properties = {"count": cluster["count"],
+                          "bbox": cluster["bbox"],
+                          }
+            marker = markers.get(cluster["id"]) if markers else None
+            if marker:
+                properties.update(self.marker_properties(marker))
+            feature = {"type": "Feature",
+                       "geometry": {"type": "Point",
+                                    "coordinates": cluster["coordinates"],
+                                    },
+                       "properties": properties,
+                       }
+            append(json.dumps(feature, separators=SEPARATORS))
+
+        # Individual features in sparse cells
+        if record_ids:
+            sparse = current.s3db.resource(resource.tablename, id=record_ids)
+            sparse.load(fields = attr.get("fields"),
+                        skip = attr.get("skip"),
+                        virtual = False,
+                        cacheable = True,
+                        )
+            location_data = current.gis.get_location_data(sparse,
+                                                          count = len(record_ids),
+                                                          ) or {}
+            features.extend(self.encode_features(sparse, location_data))
+
+        return self.collection(features, attr.get("map_data"))
+
+    # -------------------------------------------------------------------------
+    @staticmethod
+    def clusters(resource, zoom, distance, threshold):
+        """
+            Aggregate the locations of the records in a resource into
+            grid cells (in the database)
+
+            @param resource: the S3Resource
+            @param zoom: the zoom level of the map
+            @param distance: the grid cell size in pixels
+            @param threshold: the minimum number of records in a cell
+                              to form a cluster
+
+            @return: tuple (clusters, record_ids), with clusters as list
+                     of dicts {id, count, coordinates, bbox} and the IDs
+                     of the records in sparse cells; or None if the
+                     resource has no location reference
+        """
+
+        db = current.db
+        s3db = current.s3db
+
+        table = resource.table
+        gtable = s3db.gis_location
+
+        if "location_id" in table.fields:
+            join = (table.location_id == gtable.id)
+        elif "site_id" in table.fields:
+            stable = s3db.org_site
+            join = (table.site_id == stable.site_id) & \
+                   (stable.location_id == gtable.id)
+        else:
+            return None
+
+        # Records matching the resource filter
+        vfilter = resource.get_filter()
+        rfilter = resource.rfilter
+        if vfilter is not None or rfilter.get_extra_filters():
+            # Virtual or extra filters => must extract the record IDs
+            rows = resource.select([table._id.name],
+                                   limit = None,
+                                   as_rows = True,
+                                   )
+            subquery = table._id.belongs([row[table._id] for row in rows])
+        else:
+            ijoin, ljoin = rfilter.count_joins(distinct=True)
+            subquery = table._id.belongs(db(rfilter.get_query())._select(table._id,
+                                                                          join = ijoin,
+                                                                          left = ljoin,
+                                                                          distinct = True,
+                                                                          ))
+
+        query = subquery & join & \
+                (gtable.lat != None) & \
+                (gtable.lon != None)
+        points = db(query)._select(table._id, gtable.lat, gtable.lon).rstrip(";")
+
+        # Grid cell of a point (lon/lat + offset is never negative,
+        # so truncation is the same as floor)
+        if db._dbname == "sqlite":
+            floor = "CAST(%s AS INTEGER)"
+        else:
+            floor = "FLOOR(%s)"
+        size = distance * 360.0 / (256 * 2 ** zoom)
+        cell = lambda p: "%s,%s" % (floor % ("(%s.lon+180.0)/%r" % (p, size)),
+                                    floor % ("(%s.lat+90.0)/%r" % (p, size)),
+                                    )
+
+        executesql = db.executesql
+
+        # Dense cells => clusters
+        sql = "SELECT COUNT(*),MIN(p.id),AVG(p.lon),AVG(p.lat)," \
+              "MIN(p.lon),MIN(p.lat),MAX(p.lon),MAX(p.lat) " \
+              "FROM (%(points)s) p GROUP BY %(cell)s " \
+              "HAVING COUNT(*)>=%(threshold)d;" % {"points": points,
+                                                   "cell": cell("p"),
+                                                   "threshold": threshold,
+                                                   }
+        clusters = []
+        for row in executesql(sql):
+            count, record_id = row[:2]
+            lon, lat, lon_min, lat_min, lon_max, lat_max = [float(v) for v in row[2:]]
+            clusters.append({"id": record_id,
+                             "count": count,
+                             "coordinates": [round(lon, 4), round(lat, 4)],
+                             "bbox": [lon_min, lat_min, lon_max, lat_max],
+                             })
+
+        # Records in sparse cells
+        cx, cy = cell("p").split(",")
+        qx, qy = cell("q").split(",")
+        sql = "SELECT p.id FROM (%(points)s) p," \
+              "(SELECT %(qx)s AS cx,%(qy)s AS cy FROM (%(points)s) q " \
+              "GROUP BY %(qx)s,%(qy)s HAVING COUNT(*)<%(threshold)d) c " \
+              "WHERE %(cx)s=c.cx AND %(cy)s=c.cy;" % {"points": points,
+                                                      "qx": qx,
+                                                      "qy": qy,
+                                                      "cx": cx,
+                                                      "cy": cy,
+                                                      "threshold": threshold,
+                                                      }
+        record_ids = [row[0] for row in executesql(sql)]
+
+        return clusters, record_ids
+
+    # -------------------------------------------------------------------------
+    @staticmethod
+    def cluster_markers(resource, record_ids):
+        """
+            Get the markers for the representative records of clusters,
+            same as the per-feature markers in gis.get_location_data()
+
+            @param resource: the S3Resource
+            @param record_ids: the record IDs
+
+            @return: dict {record_id: marker}
+        """
+
+        if not record_ids:
+            return {}
+
+        tablename = resource.tablename
+        marker_fn = current.s3db.get_config(tablename, "marker_fn")
+        if marker_fn:
+            table = resource.table
+            rows = current.db(table._id.belongs(record_ids)).select(table.ALL)
+            pkey = table._id.name
+            return dict((row[pkey], marker_fn(row)) for row in rows)
+        else:
+            # Default marker for all
+            c, f = tablename.split("_", 1)
+            marker = current.gis.get_marker(c, f)
+            return dict((record_id, marker) for record_id in record_ids)
+
+    # -------------------------------------------------------------------------
+    @classmethod
+    def features(cls, tablename, record_id, location_data):
+        """
+            Get the GeoJSON features for a record
+
+            @param tablename: the tablename
+            @param record_id: the record ID
+            @param location_data: dictionary of location data from
+                                  gis.get_location_data()
+
+            @return: list of features (as JSON-serializable dicts)
+        """
+
+        geojsons = location_data.get("geojsons", {})
+        latlons = location_data.get("latlons", {})
+        attributes = location_data.get("attributes", {})
+        markers = location_data.get("markers", {})
+        styles = location_data.get("styles", {})
+
+        attrs = None
+        if tablename in attributes:
+            attrs = attributes[tablename].get(record_id)
+
+        style = None
+        if tablename in styles:
+            style = styles[tablename].get(record_id)
+
+        features = []
+
+        if tablename in geojsons:
+            geometries = geojsons[tablename].get(record_id)
+            if not geometries:
+                return features
+
+            marker = None
+            if tablename in markers:
+                _markers = markers[tablename]
+                if _markers:
+                    if _markers.get("image", None):
+                        # Single Marker here
+                        marker = _markers
+                    else:
+                        # We have a separate Marker per-Feature
+                        marker = _markers.get(record_id)
+
+            properties = cls.properties(record_id, attrs, marker, style)
+            for geometry in geometries:
+                features.append({"type": "Feature",
+                                 "geometry": json.loads(geometry),
+                                 "properties": properties,
+                                 })
+
+        elif tablename in latlons:
+            latlon = latlons[tablename].get(record_id)
+            if latlon:
+                lat, lon = latlon[0], latlon[1]
+                if lat is not None and lon is not None:
+                    # Point features have no per-feature Marker
+                    # (same as in the stylesheet)
+                    properties = cls.properties(record_id, attrs, None, style)
+                    geometry = {"type": "Point",
+                                "coordinates": ["%.4f" % lon, "%.4f" % lat],
+                                }
+                    features.append({"type": "Feature",
+                                     "geometry": geometry,
+                                     "properties": properties,
+                                     })
+        else:
+            # Error
+            raise RuntimeError("Bulk lookup of GeoJSON or Lat/Lon data failed for %s" % tablename)
+
+        return features
+
+    # -------------------------------------------------------------------------
+    @classmethod
+    def properties(cls, record_id, attrs=None, marker=None, style=None):
+        """
+            Get the properties of a feature
+
+            @param record_id: the record ID
+            @param attrs: the attributes of the record {name: value}
+            @param marker: the marker for the record
+            @param style: the style for the record (JSON string)
+
+            @return: the properties (as JSON-serializable dict)
+        """
+
+        properties = {}
+
+        if marker:
+            properties.update(cls.marker_properties(marker))
+
+        # id is used for url_format
+        if current.xml.show_ids:
+            properties["id"] = record_id
+        else:
+            # Stylesheet has no record ID without show_ids
+            properties["id"] = {}
+
+        if style:
+            properties["style"] = json.loads(style)
+
+        if attrs:
+            attribute = cls.attribute
+            for key, value in attrs.items():
+                properties[key] = attribute(value)
+
+        return properties
+
+    # -------------------------------------------------------------------------
+    @staticmethod
+    def marker_properties(marker):
+        """
+            Get the properties of a feature for its marker
+
+            @param marker: the marker
+
+            @return: dict {marker_url, marker_height, marker_width}
+        """
+
+        # Assume being used within the Sahana Mapping client
+        # so use local URLs to keep filesize down
+        download_url = "/%s/static/img/markers" % current.request.application
+
+        return {"marker_url": "%s/%s" % (download_url, marker["image"]),
+                "marker_height": str(marker["height"]),
+                "marker_width": str(marker["width"]),
+                }
+
+    # -------------------------------------------------------------------------
+    @staticmethod
+    def attribute(value):
+        """
+            Encode an attribute value: text as string, numbers as numbers,
+            anything else as its JSON representation (as string)
+
+            @param value: the attribute value
+        """
+
+        if isinstance(value, basestring):
+            return value
+
+        text = json.dumps(value)
+        try:
+            number = float(text)
+        except ValueError:
+            return text
+        try:
+            integer = int(number)
+        except (ValueError, OverflowError):
+            return number
+        return integer if integer == number else number
+
+# END =========================================================================
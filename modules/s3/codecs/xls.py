@@ -91,19 +91,29 @@ class S3XLS(S3Codec):
         # setting = {field_selector: [LevelLabel, LevelLabel, ...]}
         expand_hierarchy = resource.get_config("xls_expand_hierarchy")
 
-        data = resource.select(list_fields,
-                               left = left,
-                               limit = None,
-                               count = True,
-                               getids = True,
-                               orderby = orderby,
-                               represent = True,
-                               show_links = False,
-                               raw_data = True if expand_hierarchy else False,
-                               )
-
+        if expand_hierarchy:
+            # Hierarchy expansion requires all rows at once
+            data = resource.select(list_fields,
+                                   left = left,
+                                   limit = None,
+                                   count = True,
+                                   getids = True,
+                                   orderby = orderby,
+                                   represent = True,
+                                   show_links = False,
+                                   raw_data = True,
+                                   )
+            rows = data.rows
+        else:
+            # Extract the rows chunk-wise while writing them
+            data = rows = resource.iterselect(list_fields,
+                                              left = left,
+                                              count = True,
+                                              orderby = orderby,
+                                              represent = True,
+                                              show_links = False,
+                                              )
         rfields = data.rfields
-        rows = data.rows
 
         types = []
         lfields = []
@@ -219,7 +229,8 @@ class S3XLS(S3Codec):
 
         # Verify columns in items
         request = current.request
-        if len(rows) > 0 and len(lfields) > len(rows[0]):
+        if isinstance(rows, (list, tuple)) and \
+           len(rows) > 0 and len(lfields) > len(rows[0]):
             msg = """modules/s3/codecs/xls: There is an error in the list items, a field doesn't exist
 requesting url %s
 Headers = %d, Data Items = %d
@@ -30,6 +30,7 @@
 """
 
 __all__ = ("AuthS3",
+           "S3DeferredUpdates",
            "S3Permission",
            "S3Audit",
            #"S3EntityRoleManager",
@@ -38,8 +39,10 @@ __all__ = ("AuthS3",
            )
 
 import datetime
+import hashlib
 import json
 #import re
+import threading
 import time
 
 from collections import OrderedDict
@@ -4132,6 +4135,7 @@ Please go to %(url)s to approve this user."""
             # Remove all permission rules for this role
             ptable = self.permission.table
             db(ptable.group_id == group_id).update(**data)
+            self.permission.clear_acl_store()
 
             # Remove the role
             deleted_uuid = "%s-deleted-%s" % (uuid4().hex[-12:], role.uuid[:40])
@@ -5041,6 +5045,45 @@ Please go to %(url)s to approve this user."""
                 (permission.table_name == table)
         return table.id.belongs(current.db(query)._select(permission.record_id))
 
+    # -------------------------------------------------------------------------
+    def s3_permitted_record_ids(self, method, table, record_ids, c=None, f=None):
+        """
+            Returns the subset of record_ids which the currently logged-in
+            user is permitted to access with method (bulk alternative to
+            s3_has_permission with record_id, e.g. for the records on
+            a list page)
+
+            @param method: the access method as string, one of:
+                           "create", "read", "update" or "delete"
+            @param table: the table or table name
+            @param record_ids: the record IDs
+            @param c: the controller name (overrides current.request)
+            @param f: the function name (overrides current.request)
+
+            @return: set of record IDs (as integers)
+        """
+
+        if not hasattr(table, "_tablename"):
+            table = current.s3db[table]
+
+        policy = current.deployment_settings.get_security_policy()
+        if policy in (3, 4, 5, 6, 7, 8) and not self.override:
+            return self.permission.permitted_record_ids(method,
+                                                        table,
+                                                        record_ids,
+                                                        c = c,
+                                                        f = f,
+                                                        )
+
+        # Other policies: one query with the accessible query
+        record_ids = S3Permission.record_ids(record_ids)
+        if not record_ids:
+            return set()
+        query = self.s3_accessible_query(method, table, c=c, f=f) & \
+                table._id.belongs(record_ids)
+        rows = current.db(query).select(table._id)
+        return set(row[table._id] for row in rows)
+
     # -------------------------------------------------------------------------
     # S3 Variants of web2py Authorization Methods
     # -------------------------------------------------------------------------
@@ -5209,7 +5252,7 @@ Please go to %(url)s to approve this user."""
             s3_set_record_owner and set_realm_entity)
 
             @param table: the table
-            @param record: the record or record ID
+            @param record: the record or record ID, or a list of record IDs
             @param update: True to update realm_entity in all realm-components
             @param fields: dict of {ownership_field:value}
         """
@@ -5234,8 +5277,12 @@ Please go to %(url)s to approve this user."""
 
         db = current.db
 
-        # Update record
-        q = (table._id == record_id)
+        # Update record(s)
+        if isinstance(record_id, (list, tuple, set)):
+            q = (table._id.belongs(record_id))
+            record = q
+        else:
+            q = (table._id == record_id)
         success = db(q).update(**data)
 
         if success and update and REALM in data:
@@ -5482,6 +5529,19 @@ Please go to %(url)s to approve this user."""
         else:
             query = None
 
+        # Deferred (bulk operation)?
+        if query is None:
+            deferred = S3DeferredUpdates.context()
+            if deferred:
+                record_ids = self.realm_record_ids(table, records)
+                if record_ids is not None and \
+                   deferred.add_realms(tablename,
+                                       record_ids,
+                                       entity = entity,
+                                       force_update = force_update,
+                                       ):
+                    return
+
         # Bulk update?
         if realm_entity != 0 and force_update and query is not None:
             data = {REALM:realm_entity}
@@ -5499,27 +5559,36 @@ Please go to %(url)s to approve this user."""
         if not records:
             return
 
-        # Update record by record
+        # Reload all records with missing fields in one query
+        pkey = table._id.name
+        reload_ids = []
+        for record in records:
+            if not isinstance(record, (Row, Storage)):
+                reload_ids.append(record)
+            elif pkey in record and \
+                 any(f not in record for f in fields_in_table):
+                reload_ids.append(record[pkey])
+        if reload_ids:
+            rows = db(table._id.belongs(reload_ids)).select(*fields_to_load)
+            loaded = dict((str(row[pkey]), row) for row in rows)
+        else:
+            loaded = {}
+
+        # Determine the realm entity for each record
         get_realm_entity = self.get_realm_entity
-        s3_update_record_owner = self.s3_update_record_owner
+        updates = OrderedDict()
         for record in records:
 
             if not isinstance(record, (Row, Storage)):
-                record_id = record
-                row = Storage()
+                row = loaded.get(str(record))
+            elif pkey not in record:
+                continue
+            elif any(f not in record for f in fields_in_table):
+                row = loaded.get(str(record[pkey]))
             else:
                 row = record
-                if table._id.name not in record:
-                    continue
-                record_id = row[table._id.name]
-            q = (table._id == record_id)
-
-            # Do we need to reload the record?
-            fields_missing = [f for f in fields_in_table if f not in row]
-            if fields_missing:
-                row = db(q).select(*fields_to_load, limitby = (0, 1)).first()
-                if not row:
-                    continue
+            if not row:
+                continue
 
             # Do we need to update the record at all?
             if row[REALM] and not force_update:
@@ -5527,12 +5596,54 @@ Please go to %(url)s to approve this user."""
 
             _realm_entity = get_realm_entity(table, row,
                                              entity=realm_entity)
+            if len(records) == 1:
+                # Single record
+                updates[_realm_entity] = row
+            elif _realm_entity in updates:
+                updates[_realm_entity].append(row[pkey])
+            else:
+                updates[_realm_entity] = [row[pkey]]
+
+        # Update all records with the same realm entity at once
+        s3_update_record_owner = self.s3_update_record_owner
+        for _realm_entity, rows in updates.items():
             data = {REALM:_realm_entity}
-            s3_update_record_owner(table, row,
+            s3_update_record_owner(table, rows,
                                    update=force_update, **data)
 
         return
 
+    # -------------------------------------------------------------------------
+    @staticmethod
+    def realm_record_ids(table, records):
+        """
+            Extract the record IDs from a records-parameter of
+            set_realm_entity
+
+            @param table: the Table
+            @param records: a single record or record ID, or a list
+                            of records or record IDs, or a Rows object
+
+            @return: list of record IDs, or None if the record IDs
+                     can not be determined
+        """
+
+        if not isinstance(records, (list, tuple, Rows)):
+            records = [records]
+
+        pkey = table._id.name
+        record_ids = []
+        for record in records:
+            if isinstance(record, (Row, Storage, dict)):
+                record_id = record.get(pkey)
+                if record_id is None:
+                    return None
+            else:
+                record_id = record
+            record_ids.append(record_id)
+
+        return record_ids
+
     # -------------------------------------------------------------------------
     @staticmethod
     def get_realm_entity(table, record, entity=0):
@@ -5822,11 +5933,182 @@ Please go to %(url)s to approve this user."""
         else:
             return (table.organisation_id == None)
 
+# =============================================================================
+class S3DeferredUpdates(object):
+    """
+        Context to defer affiliation and realm updates during bulk
+        operations (e.g. imports or scheduler tasks), and perform them
+        once and set-based at the end:
+
+            with S3DeferredUpdates():
+                job.commit()
+
+        Inside the context, pr_update_affiliations, the rebuild of OU
+        paths (pr_rebuild_path) and set_realm_entity only collect the
+        affected records/entities, which are then updated when leaving
+        the context (unless with an exception). Nested contexts are
+        merged into the outermost context.
+
+        @note: OU paths, affiliation closure and realm entities of the
+               affected records are not up-to-date before the end of
+               the context
+    """
+
+    def __init__(self):
+
+        self.active = False
+
+        # Which updates to defer (switched off one by one during commit)
+        self.defer_affiliations = True
+        self.defer_paths = True
+        self.defer_realms = True
+
+        self.affiliations = OrderedDict()
+        self.paths = set()
+        self.realms = OrderedDict()
+
+    # -------------------------------------------------------------------------
+    def __enter__(self):
+
+        s3 = current.response.s3
+        if s3.deferred_updates is None:
+            s3.deferred_updates = self
+            self.active = True
+        return self
+
+    # -------------------------------------------------------------------------
+    def __exit__(self, exc_type, exc_value, tb):
+
+        if self.active:
+            try:
+                if exc_type is None:
+                    self.commit()
+            finally:
+                current.response.s3.deferred_updates = None
+                self.active = False
+
+        return False
+
+    # -------------------------------------------------------------------------
+    @staticmethod
+    def context():
+        """
+            Get the currently active deferral context
+
+            @return: the S3DeferredUpdates instance, or None
+        """
+
+        response = current.response
+        return response.s3.deferred_updates if response else None
+
+    # -------------------------------------------------------------------------
+    def add_affiliations(self, tablename, record):
+        """
+            Defer the update of affiliations related to a record
+
+            @param tablename: the table name
+            @param record: the record (Row) or record ID
+
+            @return: True if deferred, False if the update shall be
+                     performed immediately
+        """
+
+        if not self.defer_affiliations:
+            return False
+
+        if isinstance(record, (Row, Storage, dict)):
+            record_id = record.get("id")
+        else:
+            record_id = record
+        if not record_id:
+            return False
+
+        if tablename not in self.affiliations:
+            self.affiliations[tablename] = OrderedDict()
+        self.affiliations[tablename][record_id] = record
+        return True
+
+    # -------------------------------------------------------------------------
+    def add_path(self, pe_id):
+        """
+            Defer the rebuild of OU paths (and affiliation closure)
+            for a person entity and its descendants
+
+            @param pe_id: the person entity ID
+
+            @return: True if deferred, False if the update shall be
+                     performed immediately
+        """
+
+        if not self.defer_paths or not pe_id:
+            return False
+
+        self.paths.add(pe_id)
+        return True
+
+    # -------------------------------------------------------------------------
+    def add_realms(self, tablename, record_ids, entity=0, force_update=False):
+        """
+            Defer the update of the realm entity for records
+
+            @param tablename: the table name
+            @param record_ids: list of record IDs
+            @param entity: the entity, see AuthS3.set_realm_entity
+            @param force_update: whether to overwrite existing realms
+
+            @return: True if deferred, False if the update shall be
+                     performed immediately
+        """
+
+        if not self.defer_realms:
+            return False
+
+        key = (tablename, entity, force_update)
+        if key not in self.realms:
+            self.realms[key] = OrderedDict()
+        for record_id in record_ids:
+            self.realms[key][record_id] = None
+        return True
+
+    # -------------------------------------------------------------------------
+    def commit(self):
+        """
+            Perform all deferred updates, in order of dependency
+        """
+
+        s3db = current.s3db
+
+        # Affiliations (can add more paths and realms)
+        self.defer_affiliations = False
+        affiliations, self.affiliations = self.affiliations, OrderedDict()
+        update_affiliations = s3db.pr_update_affiliations
+        for tablename, records in affiliations.items():
+            for record in records.values():
+                update_affiliations(tablename, record)
+
+        # OU paths and affiliation closure (set-based)
+        self.defer_paths = False
+        paths, self.paths = self.paths, set()
+        if paths:
+            s3db.pr_clear_paths(paths)
+
+        # Realm entities (grouped by realm)
+        self.defer_realms = False
+        realms, self.realms = self.realms, OrderedDict()
+        set_realm_entity = current.auth.set_realm_entity
+        for (tablename, entity, force_update), record_ids in realms.items():
+            set_realm_entity(tablename,
+                             list(record_ids.keys()),
+                             entity = entity,
+                             force_update = force_update,
+                             )
+
 # =============================================================================
 class S3Permission(object):
     """ S3 Class to handle permissions """
 
     TABLENAME = "s3_permission"
+    REALM_SET_TABLENAME = "s3_realm_set"
 
     CREATE = 0x0001     # Permission to create new records
     READ = 0x0002       # Permission to read records
@@ -5879,6 +6161,11 @@ class S3Permission(object):
                               reduce(lambda x, y: (x[0]&y[0], x[1]&y[1]),
                                      acl, (self.ALL, self.ALL))
 
+    # Process-wide store of compiled ACL sets (shared across requests)
+    acl_store = OrderedDict()
+    acl_store_lock = threading.Lock()
+    acl_store_version = None
+
     # -------------------------------------------------------------------------
     def __init__(self, auth, tablename=None):
         """
@@ -5943,6 +6230,8 @@ class S3Permission(object):
 
         # Clear cache
         self.clear_cache()
+        self._acl_version = None
+        self.realm_sets = {}
 
         # Pages which never require permission:
         # Make sure that any data access via these pages uses
@@ -5967,6 +6256,82 @@ class S3Permission(object):
         self.permission_cache = {}
         self.query_cache = {}
 
+    # -------------------------------------------------------------------------
+    @classmethod
+    def clear_acl_store(cls):
+        """ Clear the process-wide ACL store """
+
+        with cls.acl_store_lock:
+            cls.acl_store.clear()
+            cls.acl_store_version = None
+
+    # -------------------------------------------------------------------------
+    def acl_version(self):
+        """
+            Get the current version of the permissions table, i.e. the
+            number of ACLs and the time of the latest change, looked up
+            once per request; clears the ACL store if the permissions
+            have been changed (e.g. by another worker process)
+
+            @return: the version (tuple)
+        """
+
+        version = self._acl_version
+        if version is None:
+
+            table = self.table
+            count = table.id.count()
+            latest = table.modified_on.max()
+            row = current.db(table.id > 0).select(count,
+                                                  latest,
+                                                  ).first()
+            version = self._acl_version = (row[count], row[latest])
+
+            cls = self.__class__
+            with cls.acl_store_lock:
+                if cls.acl_store_version != version:
+                    cls.acl_store.clear()
+                    cls.acl_store_version = version
+
+        return version
+
+    # -------------------------------------------------------------------------
+    def acl_lookup(self, key, lookup):
+        """
+            Look up a compiled ACL set in the process-wide ACL store, or
+            compile and store it if not found
+
+            @param key: the key (tuple)
+            @param lookup: function to compile the ACL set if not found,
+                           the result must not be modified by the caller
+
+            @return: the ACL set
+        """
+
+        size = current.deployment_settings.get_security_acl_cache_size()
+        if not size:
+            return lookup()
+
+        self.acl_version()
+
+        cls = self.__class__
+        store = cls.acl_store
+        with cls.acl_store_lock:
+            value = store.pop(key, None)
+            if value is not None:
+                # Re-insert as most recently used
+                store[key] = value
+                return value
+
+        value = lookup()
+
+        with cls.acl_store_lock:
+            store[key] = value
+            while len(store) > size:
+                store.popitem(last=False)
+
+        return value
+
     # -------------------------------------------------------------------------
     def check_settings(self):
         """
@@ -6022,6 +6387,16 @@ class S3Permission(object):
                             *S3MetaFields.sync_meta_fields())
             self.table = db[self.tablename]
 
+            # Stored realm sets (see realm_set)
+            if self.REALM_SET_TABLENAME not in db:
+                db.define_table(self.REALM_SET_TABLENAME,
+                                Field("set_key", length=40, notnull=True),
+                                Field("pe_id", "integer", notnull=True),
+                                Field("modified_on", "datetime"),
+                                migrate=migrate,
+                                fake_migrate=fake_migrate,
+                                )
+
     # -------------------------------------------------------------------------
     # ACL Management
     # -------------------------------------------------------------------------
@@ -6064,6 +6439,8 @@ class S3Permission(object):
         if "restricted_tables" in s3:
             del s3["restricted_tables"]
         self.clear_cache()
+        self.clear_acl_store()
+        self._acl_version = None
 
         if c is None and f is None and t is None:
             return None
@@ -6415,8 +6792,7 @@ class S3Permission(object):
         return query
 
     # -------------------------------------------------------------------------
-    @staticmethod
-    def realm_query(table, entities):
+    def realm_query(self, table, entities):
         """
             Returns a query to select the records owned by one of the entities.
 
@@ -6424,6 +6800,10 @@ class S3Permission(object):
             @param entities: list of entities
             @return: a web2py Query instance, or None if no query can be
                       constructed
+
+            @note: for large numbers of entities (e.g. with deep org
+                   hierarchies), the entities are stored as realm set
+                   and selected with a sub-select instead of an IN-list
         """
 
         OENT = "realm_entity"
@@ -6435,10 +6815,92 @@ class S3Permission(object):
             if len(entities) == 1:
                 query = (table[OENT] == entities[0]) | public
             else:
-                query = (table[OENT].belongs(entities)) | public
+                subselect = None
+                settings = current.deployment_settings
+                threshold = settings.get_security_realm_set_threshold()
+                if threshold and len(entities) > threshold:
+                    subselect = self.realm_set(entities)
+                if subselect:
+                    query = (table[OENT].belongs(subselect)) | public
+                else:
+                    query = (table[OENT].belongs(entities)) | public
 
         return query
 
+    # -------------------------------------------------------------------------
+    def realm_set(self, entities):
+        """
+            Stores a set of realm entities in the realm set table (unless
+            it is stored already), so that it can be selected with a
+            sub-select rather than a long IN-list which the query planner
+            can't handle efficiently
+
+            @param entities: the realm entities (list of pe_ids)
+            @return: the sub-select (SQL string), or None if the realm
+                     set table is not available
+
+            @note: realm sets are identified by a hash of their members,
+                   and thus shared between all users with the same realms
+        """
+
+        db = current.db
+
+        tablename = self.REALM_SET_TABLENAME
+        if tablename not in db:
+            return None
+        table = db[tablename]
+
+        try:
+            pe_ids = sorted(set(int(pe_id) for pe_id in entities))
+        except (ValueError, TypeError):
+            return None
+        key = ",".join(str(pe_id) for pe_id in pe_ids)
+        set_key = hashlib.sha1(key.encode("utf-8")).hexdigest()
+
+        realm_sets = self.realm_sets
+        subselect = realm_sets.get(set_key)
+        if subselect is None:
+
+            now = current.request.utcnow
+            query = (table.set_key == set_key)
+
+            row = db(query).select(table.modified_on,
+                                   limitby = (0, 1),
+                                   ).first()
+            if not row:
+                table.bulk_insert([{"set_key": set_key,
+                                    "pe_id": pe_id,
+                                    "modified_on": now,
+                                    } for pe_id in pe_ids])
+            elif not row.modified_on or \
+                 row.modified_on < now - datetime.timedelta(hours=1):
+                # Mark as recently used (prevents removal by cleanup)
+                db(query).update(modified_on=now)
+
+            subselect = realm_sets[set_key] = db(query)._select(table.pe_id)
+
+        return subselect
+
+    # -------------------------------------------------------------------------
+    def cleanup_realm_sets(self, expiry=1):
+        """
+            Removes realm sets which have not been used for some time,
+            to be run as part of the daily maintenance
+
+            @param expiry: the expiry time in days (must be well
+                           above one hour)
+        """
+
+        db = current.db
+
+        tablename = self.REALM_SET_TABLENAME
+        if tablename not in db:
+            return
+
+        table = db[tablename]
+        expired = current.request.utcnow - datetime.timedelta(days=expiry)
+        db((table.modified_on < expired) | (table.modified_on == None)).delete()
+
     # -------------------------------------------------------------------------
     def permitted_realms(self, tablename, method="read"):
         """
@@ -6801,6 +7263,63 @@ class S3Permission(object):
 
         return permitted
 
+    # -------------------------------------------------------------------------
+    def permitted_record_ids(self, method, table, record_ids, c=None, f=None):
+        """
+            Returns the subset of record_ids which are accessible for
+            method, with a single query rather than one has_permission
+            check per record
+
+            @param method: the method as string or a list of methods (AND)
+            @param table: the database table or table name
+            @param record_ids: the record IDs
+            @param c: controller name (falls back to current request)
+            @param f: function name (falls back to current request)
+
+            @return: set of record IDs (as integers)
+        """
+
+        # Get the table
+        if not hasattr(table, "_tablename"):
+            tablename = table
+            error = AttributeError("undefined table %s" % tablename)
+            table = current.s3db.table(tablename,
+                                       db_only = True,
+                                       default = error,
+                                       )
+
+        record_ids = self.record_ids(record_ids)
+        if not record_ids:
+            return set()
+
+        query = self.accessible_query(method, table, c=c, f=f)
+        if query is None:
+            return set()
+        query &= table._id.belongs(record_ids)
+
+        rows = current.db(query).select(table._id)
+        return set(row[table._id] for row in rows)
+
+    # -------------------------------------------------------------------------
+    @staticmethod
+    def record_ids(values):
+        """
+            Helper to convert record IDs into a list of unique integers,
+            skipping invalid IDs
+
+            @param values: the record IDs (list of integers or strings)
+
+            @return: list of integers
+        """
+
+        record_ids = set()
+        for value in values:
+            try:
+                record_ids.add(int(value))
+            except (ValueError, TypeError):
+                continue
+        return list(record_ids)
+
     # -------------------------------------------------------------------------
     def accessible_query(self, method, table, c=None, f=None, deny=True):
         """
@@ -7184,15 +7703,24 @@ class S3Permission(object):
         # Retrieve the ACLs
         if q is not None:
             query &= q
-            rows = db(query).select(table.group_id,
-                                    table.controller,
-                                    table.function,
-                                    table.tablename,
-                                    table.unrestricted,
-                                    table.entity,
-                                    table.uacl,
-                                    table.oacl,
-                                    cacheable=True)
+            def lookup():
+                rows = db(query).select(table.group_id,
+                                        table.controller,
+                                        table.function,
+                                        table.tablename,
+                                        table.unrestricted,
+                                        table.entity,
+                                        table.uacl,
+                                        table.oacl,
+                                        cacheable=True)
+                return [Storage(row.as_dict()) for row in rows]
+            key = ("acls",
+                   tuple(sorted(roles)),
+                   c if page_restricted else None,
+                   f if page_restricted and self.use_facls else None,
+                   t if t and self.use_tacls else None,
+                   )
+            rows = self.acl_lookup(key, lookup)
         else:
             rows = []
 
@@ -7447,13 +7975,17 @@ class S3Permission(object):
 
         if not "restricted_tables" in s3:
             table = self.table
-            query = (table.deleted != True) & \
-                    (table.controller == None) & \
-                    (table.function == None)
-            rows = current.db(query).select(table.tablename,
-                                            groupby = table.tablename
-                                            )
-            s3.restricted_tables = [row.tablename for row in rows]
+            def lookup():
+                query = (table.deleted != True) & \
+                        (table.controller == None) & \
+                        (table.function == None)
+                rows = current.db(query).select(table.tablename,
+                                                groupby = table.tablename
+                                                )
+                return set(row.tablename for row in rows)
+            s3.restricted_tables = self.acl_lookup(("restricted_tables",),
+                                                   lookup,
+                                                   )
 
         return str(t) in s3.restricted_tables
 
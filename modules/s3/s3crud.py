@@ -48,6 +48,7 @@ from gluon import current, redirect, HTTP, URL, \
 from gluon.contenttype import contenttype
 from gluon.languages import lazyT
 from gluon.storage import Storage
+from gluon.streamer import DEFAULT_CHUNK_SIZE
 from gluon.tools import callback
 
 from s3compat import basestring, long
@@ -781,7 +782,10 @@ class S3CRUD(S3Method):
 
         elif representation == "csv":
             exporter = S3Exporter().csv
-            output = exporter(resource)
+            output = exporter(resource, as_stream=True)
+            return response.stream(output,
+                                   chunk_size = DEFAULT_CHUNK_SIZE,
+                                   )
 
         #elif representation == "map":
         #    exporter = S3Map()
@@ -1340,7 +1344,10 @@ class S3CRUD(S3Method):
         elif representation == "csv":
 
             exporter = S3Exporter().csv
-            return exporter(resource)
+            output = exporter(resource, as_stream=True)
+            return current.response.stream(output,
+                                           chunk_size = DEFAULT_CHUNK_SIZE,
+                                           )
 
         elif representation == "json":
 
@@ -1520,6 +1527,7 @@ class S3CRUD(S3Method):
                                                left = left,
                                                orderby = orderby,
                                                distinct = distinct,
+                                               list_id = list_id,
                                                )
             displayrows = totalrows
 
@@ -1566,8 +1574,19 @@ class S3CRUD(S3Method):
             # Apply datatable filters
             searchq, orderby, left = resource.datatable_filter(list_fields,
                                                                get_vars)
+
+            # Count strategy
+            if get_vars.get("count") == "exact":
+                # Client requests the exact number of records
+                return self._datatable_count(resource, searchq, left, list_id)
+            count = get_config("count_strategy",
+                               current.deployment_settings \
+                                      .get_ui_datatables_count_strategy())
+            approximate = False
+
             if searchq is not None:
-                totalrows = resource.count()
+                totalrows = resource.count(strategy=count)
+                approximate = resource.rfilter.approximate
                 resource.add_filter(searchq)
             else:
                 totalrows = None
@@ -1584,7 +1603,11 @@ class S3CRUD(S3Method):
                                                      left = left,
                                                      orderby = orderby,
                                                      distinct = distinct,
+                                                     list_id = list_id,
+                                                     count = count,
                                                      )
+                if approximate:
+                    dt.approximate = True
             else:
                 dt, displayrows = None, 0
             if totalrows is None:
@@ -1612,6 +1635,39 @@ class S3CRUD(S3Method):
 
         return output
 
+    # -------------------------------------------------------------------------
+    @staticmethod
+    def _datatable_count(resource, searchq, left, list_id):
+        """
+            Count the records in a data table exactly, Ajax method to
+            replace estimated numbers after the table has been rendered
+
+            @param resource: the S3Resource
+            @param searchq: the datatable search query
+            @param left: the left joins for the search query
+            @param list_id: the datatable ID
+
+            @return: JSON {"recordsTotal": number,
+                           "recordsFiltered": number,
+                           "dataTable_id": list_id}
+        """
+
+        totalrows = displayrows = resource.count(distinct=True,
+                                                 strategy="cached",
+                                                 )
+        if searchq is not None:
+            resource.add_filter(searchq)
+            displayrows = resource.count(left = left,
+                                         distinct = True,
+                                         strategy = "cached",
+                                         )
+
+        current.response.headers["Content-Type"] = "application/json"
+        return json.dumps({"recordsTotal": totalrows,
+                           "recordsFiltered": displayrows,
+                           "dataTable_id": list_id,
+                           }, separators=SEPARATORS)
+
     # -------------------------------------------------------------------------
     def _datalist(self, r, **attr):
         """
@@ -2604,6 +2660,37 @@ class S3CRUD(S3Method):
         else:
             s3.actions.append(link)
 
+    # -------------------------------------------------------------------------
+    @staticmethod
+    def permitted_restrict(method, table):
+        """
+            Get the record IDs for the "restrict" fallback of an action
+            button with permit=method, i.e. for data tables which do not
+            report the permitted record IDs per page
+
+            @param method: the method
+            @param table: the table
+
+            @return: list of record IDs (as strings), or None if the data
+                     table of this request reports the permitted record IDs
+                     for method (see S3Resource.permitted_actions)
+        """
+
+        reported = current.response.s3.permitted_actions
+        if reported and method in reported.get(table._tablename, ()):
+            return None
+
+        query = current.auth.s3_accessible_query(method, table)
+        rows = current.db(query).select(table._id)
+
+        restrict = []
+        rappend = restrict.append
+        for row in rows:
+            row_id = row.get("id", None)
+            if row_id:
+                rappend(str(row_id))
+        return restrict
+
     # -------------------------------------------------------------------------
     @classmethod
     def action_buttons(cls,
@@ -2718,20 +2805,15 @@ class S3CRUD(S3Method):
                     delete_url = iframe_safe(URL(args = args + ["delete"],
                                                  vars = get_vars))
             if ownership_required("delete", table):
-                # Check which records can be deleted
-                query = auth.s3_accessible_query("delete", table)
-                rows = current.db(query).select(table._id)
-                restrict = []
-                rappend = restrict.append
-                for row in rows:
-                    row_id = row.get("id", None)
-                    if row_id:
-                        rappend(str(row_id))
+                # Render only for records which can be deleted
+                attr = dict(target, permit="delete")
+                restrict = s3crud.permitted_restrict("delete", table)
+                if restrict is not None:
+                    attr["restrict"] = restrict
                 s3crud.action_button(labels.DELETE, delete_url,
                                      _class="delete-btn",
                                      icon=icon,
-                                     restrict=restrict,
-                                     **target
+                                     **attr
                                      )
             else:
                 s3crud.action_button(labels.DELETE, delete_url,
@@ -82,6 +82,13 @@ class S3DataTable(object):
         self.rfields = rfields
         self.empty = empty
 
+        # Whether the number of records is an estimate
+        self.approximate = False
+
+        # Permitted record IDs per method, for action buttons which
+        # depend on record ownership, {method: [record ID]}
+        self.permitted = None
+
         colnames = []
         heading = {}
 
@@ -260,6 +267,9 @@ class S3DataTable(object):
         else:
             cache = None
 
+        if self.permitted:
+            attr["dt_permitted"] = self.permitted
+
         html = self.htmlConfig(table,
                                id,
                                self.orderby,
@@ -286,6 +296,7 @@ class S3DataTable(object):
                    '''i18n.previous="%s"''' % T("Previous"),
                    '''i18n.emptyTable="%s"''' % T("No records found"), #T("No data available in table"),
                    '''i18n.info="%s"''' % T("Showing _START_ to _END_ of _TOTAL_ entries"),
+                   '''i18n.infoApprox="%s"''' % T("Showing _START_ to _END_ of about _TOTAL_ entries"),
                    '''i18n.infoEmpty="%s"''' % T("Showing 0 to 0 of 0 entries"),
                    '''i18n.infoFiltered="%s"''' % T("(filtered from _MAX_ total entries)"),
                    '''i18n.infoThousands="%s"''' % current.deployment_settings.get_L10n_thousands_separator(),
@@ -604,18 +615,23 @@ class S3DataTable(object):
                                  _class="action-btn read")
 
         # Delete button
-        # @todo: does not apply selective action (renders DELETE for
-        #        all items even if the user is only permitted to delete
-        #        some of them) => should implement "restrict", see
-        #        S3CRUD.action_buttons
         deletable = get_config(tablename, "deletable", True)
-        if deletable and \
-           has_permission("delete", table) and \
-           not ownership_required("delete", table):
+        if deletable and has_permission("delete", table):
             delete_url = URL(c=c, f=f, args=args + ["delete"])
-            S3CRUD.action_button(labels.DELETE, delete_url,
-                                 icon = "delete",
-                                 _class="delete-btn")
+            if ownership_required("delete", table):
+                # Render only for records which can be deleted
+                attr = {"permit": "delete"}
+                restrict = S3CRUD.permitted_restrict("delete", table)
+                if restrict is not None:
+                    attr["restrict"] = restrict
+                S3CRUD.action_button(labels.DELETE, delete_url,
+                                     icon = "delete",
+                                     _class="delete-btn",
+                                     **attr)
+            else:
+                S3CRUD.action_button(labels.DELETE, delete_url,
+                                     icon = "delete",
+                                     _class="delete-btn")
 
         # Append custom actions
         if custom_actions:
@@ -666,6 +682,9 @@ class S3DataTable(object):
                    dt_group_space: Insert a space between the group heading and the next group
                    dt_bulk_selected: A list of selected items
                    dt_row_actions: list of actions (each is a dict)
+                   dt_permitted: permitted record IDs per method, for row
+                                 actions with a "permit" method, e.g.
+                                 {"delete": ["1", "4"]}
                    dt_styles: dictionary of styles to be applied to a list of ids
                               for example:
                               {"warning" : [1,3,6,7,9],
@@ -746,6 +765,9 @@ class S3DataTable(object):
             config.rowActions = rowActions
         else:
             config.rowActions = []
+        permitted = attr_get("dt_permitted")
+        if permitted:
+            config.permitted = permitted
         bulkActions = attr_get("dt_bulk_actions", None)
         if bulkActions and not isinstance(bulkActions, list):
             bulkActions = [bulkActions]
@@ -978,6 +1000,10 @@ class S3DataTable(object):
         structure["data"] = aadata
         structure["recordsTotal"] = totalrows
         structure["recordsFiltered"] = displayrows
+        if self.approximate:
+            structure["recordsApprox"] = True
+        if self.permitted:
+            structure["permitted"] = self.permitted
         structure["draw"] = draw
         if stringify:
             from gluon.serializers import json as jsons
@@ -186,6 +186,7 @@ class S3Delete(object):
         delete_super = current.s3db.delete_super
 
         num_deleted = 0
+        deleted_ids = []
         for row in deletable:
 
             record_id = row[pkey]
@@ -236,6 +237,7 @@ class S3Delete(object):
                     db.commit()
 
                 num_deleted += 1
+                deleted_ids.append(record_id)
 
             elif not cascade:
                 # Master process failure
@@ -253,6 +255,10 @@ class S3Delete(object):
                 # - will be rolled back by master process
                 break
 
+        if num_deleted:
+            # Update indexes, invalidate caches
+            current.s3db.invalidate_caches(tablename, deleted_ids, deleted=True)
+
         self.set_resource_error()
         return num_deleted
 
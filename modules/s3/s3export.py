@@ -33,9 +33,13 @@
 
 __all__ = ("S3Exporter",)
 
+import tempfile
+
 from gluon import current
 
+from s3compat import StringIO
 from .s3codec import S3Codec
+from .s3utils import s3_str
 
 # =============================================================================
 class S3Exporter(object):
@@ -44,11 +48,13 @@ class S3Exporter(object):
     """
 
     # -------------------------------------------------------------------------
-    def csv(self, resource):
+    def csv(self, resource, as_stream=False):
         """
             Export resource as CSV
 
             @param resource: the resource to export
+            @param as_stream: return the CSV as file-like object (to be
+                              streamed by the caller) rather than as string
 
             @note: export does not include components!
 
@@ -65,8 +71,25 @@ class S3Exporter(object):
             response.headers["Content-Type"] = contenttype(".csv")
             response.headers["Content-disposition"] = "attachment; filename=%s" % filename
 
-        rows = resource.select(None, as_rows=True)
-        return str(rows)
+        # Write the rows chunk-wise into a temporary file
+        output = tempfile.TemporaryFile()
+        colnames = True
+        for rows in resource.iterselect(None, as_rows=True).chunks():
+            chunk = StringIO()
+            rows.export_to_csv_file(chunk, write_colnames=colnames)
+            colnames = False
+            chunk = chunk.getvalue()
+            if not isinstance(chunk, bytes):
+                chunk = chunk.encode("utf-8")
+            output.write(chunk)
+        output.seek(0)
+
+        if as_stream:
+            return output
+
+        contents = output.read()
+        output.close()
+        return s3_str(contents)
 
     # -------------------------------------------------------------------------
     def json(self, resource,
@@ -127,25 +150,41 @@ class S3Exporter(object):
                 if tooltip not in fields:
                     fields.append(tooltip)
 
-        # Get the data
-        _rows = resource.select(fields,
-                                start=start,
-                                limit=limit,
-                                orderby=orderby,
-                                represent=represent).rows
-
         # Simplify to plain fieldnames for fields in this table
         tn = "%s." % resource.tablename
-        rows = []
-        rappend = rows.append
-        for _row in _rows:
+        def simplify(_row):
             row = {}
             for f in _row:
                 v = _row[f]
                 if tn in f:
                     f = f.split(tn, 1)[1]
                 row[f] = v
-            rappend(row)
+            return row
+
+        from gluon.serializers import json as jsons
+
+        if not tooltip and start is None and limit is None:
+            # Unlimited export => encode the data chunk-wise
+            data = resource.iterselect(fields,
+                                       orderby = orderby,
+                                       represent = represent,
+                                       )
+            output = []
+            for rows in data.chunks():
+                output.append(jsons([simplify(row) for row in rows])[1:-1])
+
+            response = current.response
+            if response:
+                response.headers["Content-Type"] = "application/json"
+            return "[%s]" % ",".join(chunk for chunk in output if chunk)
+
+        # Get the data
+        _rows = resource.select(fields,
+                                start=start,
+                                limit=limit,
+                                orderby=orderby,
+                                represent=represent).rows
+        rows = [simplify(_row) for _row in _rows]
 
         if tooltip:
             if tooltip_function:
@@ -210,7 +249,6 @@ class S3Exporter(object):
         if response:
             response.headers["Content-Type"] = "application/json"
 
-        from gluon.serializers import json as jsons
         return jsons(rows)
 
     # -------------------------------------------------------------------------
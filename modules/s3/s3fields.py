@@ -31,6 +31,9 @@
 
 import datetime
 import sys
+import threading
+import time
+from collections import OrderedDict
 from itertools import chain
 from uuid import uuid4
 
@@ -315,6 +318,8 @@ class S3Represent(object):
         self.slabels = None
         self.htemplate = None
 
+        self.csignature = None
+
         # Attributes to simulate being a function for sqlhtml's count_expected_args()
         # Make sure we indicate only 1 position argument
         if PY2:
@@ -673,6 +678,9 @@ class S3Represent(object):
         else:
             self.htemplate = "%s > %s"
 
+        # Shared cache signature
+        self.csignature = S3RepresentCache.signature(self)
+
         self.setup = True
 
     # -------------------------------------------------------------------------
@@ -739,8 +747,22 @@ class S3Represent(object):
         except AttributeError:
             return items
 
-        # Use the given rows to lookup the values
+        # Use the shared cache
         pop = lookup.pop
+        csignature = self.csignature
+        if csignature and not h:
+            cached = S3RepresentCache.get(table._tablename,
+                                          list(lookup.keys()),
+                                          csignature,
+                                          )
+            for k, v in cached.items():
+                theset[k] = v
+                if pop(k, None):
+                    items[keys.get(k, k)] = v
+            if not lookup:
+                return items
+
+        # Use the given rows to lookup the values
         represent_row = self.represent_row
         represent_path = self._represent_path
         if rows and not self.custom_lookup:
@@ -788,6 +810,11 @@ class S3Represent(object):
                 for k, row in rows.items():
                     lookup.pop(k, None)
                     items[keys.get(k, k)] = theset[k] = represent_row(row)
+                if csignature:
+                    S3RepresentCache.store(table._tablename,
+                                           csignature,
+                                           {k: theset[k] for k in rows},
+                                           )
 
         # Anything left gets set to default
         if lookup:
@@ -829,6 +856,258 @@ class S3Represent(object):
         theset[value] = result
         return result
 
+# =============================================================================
+class S3RepresentCache(object):
+    """
+        Process-wide LRU cache for S3Represent lookups, shared across
+        requests; used for lookup tables listed in the represent_cache
+        deployment setting
+
+        Entries are stored per referenced record, and keyed by the
+        signature of the S3Represent instance (class, lookup table,
+        fields, labels...) and the language, so that they can be
+        invalidated when the record is updated or deleted.
+
+        @note: representations which depend on other records than the
+               referenced record (e.g. from joins in custom lookup_rows)
+               can become outdated for up to settings.base.represent_cache_ttl
+               when those other records change; the same applies to changes
+               made by other worker processes
+    """
+
+    lock = threading.Lock()
+
+    entries = OrderedDict()
+
+    hits = 0
+    misses = 0
+
+    # Instance attributes not relevant for the representation
+    TRANSIENT = ("table",
+                 "setup",
+                 "theset",
+                 "queries",
+                 "lazy",
+                 "lazy_show_link",
+                 "rows",
+                 "clabels",
+                 "slabels",
+                 "htemplate",
+                 "custom_lookup",
+                 "csignature",
+                 "linkto",
+                 "show_link",
+                 "func_code",
+                 "func_defaults",
+                 "__code__",
+                 "__defaults__",
+                 )
+
+    # -------------------------------------------------------------------------
+    @staticmethod
+    def enabled(tablename):
+        """
+            Check whether the shared cache is enabled for a lookup table
+
+            @param tablename: the lookup table name
+        """
+
+        setting = current.deployment_settings.get_base_represent_cache()
+        if not setting:
+            return False
+        elif setting is True:
+            return True
+        else:
+            return tablename in setting
+
+    # -------------------------------------------------------------------------
+    @classmethod
+    def signature(cls, represent):
+        """
+            Get the cache signature of an S3Represent instance
+
+            @param represent: the S3Represent instance
+
+            @return: the signature (string), or None if the instance
+                     can not use the shared cache
+        """
+
+        table = represent.table
+        if table is None or represent.hierarchy or \
+           represent.key != table._id.name or \
+           not cls.enabled(table._tablename):
+            return None
+
+        # Links which use the referenced row need the row from the lookup
+        if represent.show_link and \
+           getattr(type(represent).link, "__func__", type(represent).link) is not \
+           getattr(S3Represent.link, "__func__", S3Represent.link):
+            return None
+
+        def serialize(value):
+            if value is None or isinstance(value, (bool, int, float)):
+                return repr(value)
+            elif isinstance(value, (basestring, lazyT)):
+                return repr(s3_unicode(value))
+            elif isinstance(value, (list, tuple)):
+                items = [serialize(item) for item in value]
+                if None in items:
+                    return None
+                return "[%s]" % ",".join(items)
+            elif callable(value):
+                if getattr(value, "__self__", None) is not None or \
+                   getattr(value, "__closure__", None) or \
+                   getattr(value, "func_closure", None):
+                    # Bound method or closure => depends on state
+                    # which its source location doesn't identify
+                    return None
+                code = getattr(value, "__code__", None) or \
+                       getattr(value, "func_code", None)
+                if code is not None:
+                    # Function (including lambda) => its source location
+                    return "%s:%s" % (code.co_filename, code.co_firstlineno)
+            return None
+
+        cls_ = type(represent)
+        items = ["%s.%s" % (cls_.__module__, cls_.__name__)]
+
+        transient = cls.TRANSIENT
+        attributes = represent.__dict__
+        for name in sorted(attributes):
+            if name in transient:
+                continue
+            value = serialize(attributes[name])
+            if value is None and attributes[name] is not None:
+                # Can not serialize this attribute
+                return None
+            items.append("%s=%s" % (name, value))
+
+        return "|".join(items)
+
+    # -------------------------------------------------------------------------
+    @classmethod
+    def get(cls, tablename, values, signature):
+        """
+            Look up cached representations
+
+            @param tablename: the lookup table name
+            @param values: the key values
+            @param signature: the signature of the S3Represent instance
+
+            @return: dict {value: representation} for all cached values
+        """
+
+        ttl = current.deployment_settings.get_base_represent_cache_ttl()
+        expired = time.time() - ttl if ttl else None
+
+        key = (current.T.accepted_language, signature)
+
+        found = {}
+        entries = cls.entries
+        with cls.lock:
+            for value in values:
+                ekey = (tablename, value)
+                entry = entries.get(ekey)
+                if entry is None:
+                    cls.misses += 1
+                    continue
+                item = entry.get(key)
+                if item is None or expired and item[0] < expired:
+                    cls.misses += 1
+                    continue
+                # Re-insert as most recently used
+                del entries[ekey]
+                entries[ekey] = entry
+                found[value] = item[1]
+                cls.hits += 1
+
+        return found
+
+    # -------------------------------------------------------------------------
+    @classmethod
+    def store(cls, tablename, signature, representations):
+        """
+            Store representations in the cache
+
+            @param tablename: the lookup table name
+            @param signature: the signature of the S3Represent instance
+            @param representations: dict {value: representation}
+        """
+
+        size = current.deployment_settings.get_base_represent_cache_size()
+        if not size:
+            return
+
+        key = (current.T.accepted_language, signature)
+        now = time.time()
+
+        entries = cls.entries
+        with cls.lock:
+            for value, representation in representations.items():
+                if isinstance(representation, lazyT):
+                    representation = s3_str(representation)
+                elif not isinstance(representation, basestring):
+                    # Only cache strings
+                    continue
+                ekey = (tablename, value)
+                entry = entries.pop(ekey, None)
+                if entry is None:
+                    entry = {}
+                entry[key] = (now, representation)
+                entries[ekey] = entry
+            while len(entries) > size:
+                entries.popitem(last=False)
+
+    # -------------------------------------------------------------------------
+    @classmethod
+    def invalidate(cls, tablename, record_ids):
+        """
+            Remove the cached representations of records
+
+            @param tablename: the table name
+            @param record_ids: record ID or list of record IDs
+        """
+
+        entries = cls.entries
+        if not entries:
+            return
+
+        if not isinstance(record_ids, (list, tuple, set)):
+            record_ids = [record_ids]
+
+        with cls.lock:
+            for record_id in record_ids:
+                entries.pop((tablename, record_id), None)
+                if isinstance(record_id, basestring):
+                    try:
+                        entries.pop((tablename, int(record_id)), None)
+                    except ValueError:
+                        pass
+
+    # -------------------------------------------------------------------------
+    @classmethod
+    def clear(cls):
+        """ Remove all entries from the cache """
+
+        with cls.lock:
+            cls.entries.clear()
+            cls.hits = cls.misses = 0
+
+    # -------------------------------------------------------------------------
+    @classmethod
+    def stats(cls):
+        """
+            Get cache statistics
+
+            @return: dict with number of entries, hits and misses
+        """
+
+        with cls.lock:
+            return {"entries": len(cls.entries),
+                    "hits": cls.hits,
+                    "misses": cls.misses,
+                    }
+
 # =============================================================================
 class S3RepresentLazy(object):
     """
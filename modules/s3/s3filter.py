@@ -63,6 +63,7 @@ from gluon.tools import callback
 from s3compat import INTEGER_TYPES, PY2, basestring, long, unicodeT
 from s3dal import Field
 from .s3datetime import s3_decode_iso_datetime, S3DateTime
+from .s3locationcache import S3LocationCache
 from .s3query import FS, S3ResourceField, S3ResourceQuery, S3URLQuery
 from .s3rest import S3Method
 from .s3timeplot import S3TimeSeries
@@ -1473,6 +1474,8 @@ class S3LocationFilter(S3FilterWidget):
         @keyword resource: alternative resource to look up options
         @keyword lookup: field in the alternative resource to look up
         @keyword options: fixed set of options (list of gis_location IDs)
+        @keyword facets: use precomputed options if the resource is
+                         unfiltered (default: gis.location_filter_facets)
 
         ** Multiselect-dropdowns:
 
@@ -1845,6 +1848,51 @@ class S3LocationFilter(S3FilterWidget):
 
         return rows
 
+    # -------------------------------------------------------------------------
+    @staticmethod
+    def _unfiltered(resource, rfield):
+        """
+            Check whether the options for a location reference in a
+            resource can be looked up from the precomputed location
+            facet, i.e. the field is in the master table, and the
+            resource is neither filtered nor access-restricted
+
+            @param resource: the resource
+            @param rfield: the S3ResourceField for the location reference
+
+            @returns: True|False
+        """
+
+        if resource.parent or rfield.tname != resource.tablename:
+            return False
+
+        # Facets never include deleted records
+        if resource.include_deleted:
+            return False
+
+        rfilter = resource.rfilter
+        if rfilter is None:
+            rfilter = resource.build_query()
+        if rfilter.restricted or \
+           rfilter.queries or rfilter.filters or rfilter.get_extra_filters():
+            return False
+
+        # Resource must not be access-restricted (neither by ACLs nor by
+        # record approval, which also applies with auth.override)
+        accessible_query = resource.accessible_query
+        if accessible_query is None:
+            return True
+        method = []
+        if resource._approved:
+            method.append("read")
+        if resource._unapproved:
+            method.append("review")
+        table = resource.table
+        query = accessible_query(method, table)
+
+        # Unrestricted access means all records (same as in S3Permission)
+        return query is not None and str(query) == str(table._id > 0)
+
     # -------------------------------------------------------------------------
     def _options(self, resource, inject_hierarchy=True, values=None):
 
@@ -1900,6 +1948,7 @@ class S3LocationFilter(S3FilterWidget):
             selector = self.field
 
         filters_added = False
+        facet = False
 
         options = opts.get("options")
         if options:
@@ -1925,13 +1974,22 @@ class S3LocationFilter(S3FilterWidget):
             # Always joined (gis_location foreign key in resource)
             joined = True
 
-            # Reduce multi-table joins by excluding empty FKs
-            resource.add_filter(FS(selector) != None)
+            # Use the precomputed options?
+            facet = opts.get("facets")
+            if facet is None:
+                facet = current.deployment_settings \
+                               .get_gis_location_filter_facets()
+            if facet:
+                facet = self._unfiltered(resource, rfield)
 
-            # Filter out old Locations
-            # @ToDo: Allow override
-            resource.add_filter(FS("%s$end_date" % selector) == None)
-            filters_added = True
+            if not facet:
+                # Reduce multi-table joins by excluding empty FKs
+                resource.add_filter(FS(selector) != None)
+
+                # Filter out old Locations
+                # @ToDo: Allow override
+                resource.add_filter(FS("%s$end_date" % selector) == None)
+                filters_added = True
 
         else:
             # Neither fixed options nor resource to look them up
@@ -1944,7 +2002,10 @@ class S3LocationFilter(S3FilterWidget):
                                      .get_gis_location_filter_bigtable_lookups()
 
         # Find the options
-        if ancestor_lookup:
+        if facet:
+            rows = S3LocationCache.lx_ancestors(rfield.tname, rfield.fname)
+            joined = False
+        elif ancestor_lookup:
             rows = self.get_lx_ancestors(levels,
                                          resource,
                                          selector = selector,
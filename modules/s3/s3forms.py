@@ -745,6 +745,9 @@ class S3SQLDefaultForm(S3SQLForm):
                 # This is getting swallowed
                 raise
 
+            # Update indexes, invalidate caches
+            s3db.invalidate_caches(tablename, form_vars.id)
+
         else:
             success = False
 
@@ -1559,6 +1562,9 @@ class S3SQLCustomForm(S3SQLForm):
                 # This is getting swallowed
                 raise
 
+            # Update indexes, invalidate caches
+            s3db.invalidate_caches(tablename, accept_id)
+
         if alias is None:
             # Return master_form_vars
             return accept_id, form.vars
@@ -0,0 +1,702 @@
+# -*- coding: utf-8 -*-
+
+""" S3 Offline Gazetteer
+
+    @copyright: 2020 (c) Sahana Software Foundation
+    @license: MIT
+
+    @requires: U{B{I{gluon}} <http://web2py.com>}
+
+    Permission is hereby granted, free of charge, to any person
+    obtaining a copy of this software and associated documentation
+    files (the "Software"), to deal in the Software without
+    restriction, including without limitation the rights to use,
+    copy, modify, merge, publish, distribute, sublicense, and/or sell
+    copies of the Software, and to permit persons to whom the
+    Software is furnished to do so, subject to the following
+    conditions:
+
+    The above copyright notice and this permission notice shall be
+    included in all copies or substantial portions of the Software.
+
+    THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+    EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES
+    OF MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+    NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT
+    HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY,
+    WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+    FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR
+    OTHER DEALINGS IN THE SOFTWARE.
+"""
+
+__all__ = ("S3Gazetteer",
+           )
+
+import os
+import re
+import sys
+import time
+import unicodedata
+
+from gluon import current
+
+from s3compat import basestring
+from .s3spatialindex import S3SpatialIndex
+from .s3utils import s3_unicode
+
+TABLENAME = "gis_gazetteer"
+
+# Length of the name prefix used as lookup key for fuzzy matching
+PREFIX_LENGTH = 3
+
+# Minimum trigram similarity for fuzzy matches
+SIMILARITY = 0.5
+
+# Maximum number of candidates per prefix for fuzzy matching
+MAX_CANDIDATES = 1000
+
+# Timeout for the index build task (seconds)
+BUILD_TIMEOUT = 7200
+
+# Result cache (per process, versioned across processes)
+CACHE_SIZE = 10000
+CACHE_TTL = 3600 # seconds
+
+# =============================================================================
+class S3Gazetteer(object):
+    """
+        Offline gazetteer for geocoding without external services:
+
+            - forward geocoding of addresses by matching their parts
+              against the (normalized) names of locations, with exact
+              matches looked up by name and fuzzy matches looked up by
+              name prefix and ranked by trigram similarity
+            - reverse geocoding of coordinates to the Lx locations
+              containing them, pre-filtered by the spatial index (if
+              available) or the bounds columns of gis_location
+
+        The name index (gis_gazetteer) contains the names, local names
+        and alternate names of all locations; it is maintained by the
+        onaccept of the location (name) tables and by import_geonames.
+
+        The index is built by a scheduler task (see rebuild), which is
+        scheduled when the index is first needed - until then, geocoding
+        returns "Gazetteer not available". The index can also be built
+        (or rebuilt, e.g. after importing locations with the DAL) from
+        the CLI:
+
+            python web2py.py -S eden -M -R applications/eden/static/scripts/tools/gis_gazetteer_rebuild.py
+
+        Geocoding results are cached per process (for up to CACHE_TTL);
+        the caches of all processes are discarded when the index has
+        been updated (see clear_cache).
+
+        Activation:
+
+            settings.gis.geocode_service = "gazetteer"
+    """
+
+    # Index known to be populated (per process)
+    _ready = False
+
+    # Index build scheduled (per process)
+    _scheduled = False
+
+    # Result cache {key: (timestamp, result)}, and its version
+    _cache = {}
+    _version = None
+
+    # -------------------------------------------------------------------------
+    @classmethod
+    def enabled(cls):
+        """
+            Check whether the gazetteer is the configured geocoder
+
+            @return: True|False
+        """
+
+        return current.deployment_settings.get_gis_geocode_service() == "gazetteer"
+
+    # -------------------------------------------------------------------------
+    @classmethod
+    def table(cls):
+        """
+            Get the name index table
+
+            @return: the Table
+        """
+
+        return current.s3db.table(TABLENAME)
+
+    # -------------------------------------------------------------------------
+    @classmethod
+    def setup(cls):
+        """
+            Set up the indexes for the name index table, called by rebuild
+            (i.e. in the index build task rather than in interactive requests)
+        """
+
+        db = current.db
+        for fieldname in ("name", "prefix", "location_id"):
+            try:
+                db.executesql("CREATE INDEX IF NOT EXISTS "
+                              "%(t)s_%(f)s_idx ON %(t)s (%(f)s);" %
+                              {"t": TABLENAME, "f": fieldname})
+            except Exception:
+                current.log.error("Gazetteer index setup failed",
+                                  sys.exc_info()[1])
+                break
+
+    # -------------------------------------------------------------------------
+    # Name normalization and similarity
+    # -------------------------------------------------------------------------
+    @staticmethod
+    def normalize(name):
+        """
+            Normalize a name for matching: lower-case, without diacritics
+            and punctuation, single spaces
+
+            @param name: the name
+            @return: the normalized name (unicode)
+        """
+
+        if not name:
+            return ""
+
+        name = unicodedata.normalize("NFKD", s3_unicode(name).lower())
+        name = "".join(c for c in name if not unicodedata.combining(c))
+        name = re.sub(r"[\W_]+", " ", name, flags=re.UNICODE)
+
+        return name.strip()
+
+    # -------------------------------------------------------------------------
+    @staticmethod
+    def trigrams(name):
+        """
+            Get the trigrams of a normalized name (with each word padded
+            like pg_trgm does)
+
+            @param name: the normalized name
+            @return: set of trigrams
+        """
+
+        trigrams = set()
+        for word in name.split():
+            word = "  %s " % word
+            trigrams.update(word[i:i+3] for i in range(len(word) - 2))
+        return trigrams
+
+    # -------------------------------------------------------------------------
+    @classmethod
+    def similarity(cls, a, b):
+        """
+            Trigram similarity of two normalized names
+
+            @param a: the first name
+            @param b: the second name
+            @return: the similarity (0.0..1.0)
+        """
+
+        ta = cls.trigrams(a)
+        tb = cls.trigrams(b)
+        if not ta or not tb:
+            return 0.0
+        return float(len(ta & tb)) / len(ta | tb)
+
+    # -------------------------------------------------------------------------
+    # Index maintenance
+    # -------------------------------------------------------------------------
+    @classmethod
+    def update(cls, location_ids, chunksize=1000):
+        """
+            Update the name index for locations
+
+            @param location_ids: location ID or list of location IDs
+            @param chunksize: number of locations to process at a time
+        """
+
+        if not cls.enabled():
+            return
+
+        if not isinstance(location_ids, (list, tuple, set)):
+            location_ids = [location_ids]
+        location_ids = [location_id for location_id in location_ids if location_id]
+        if not location_ids:
+            return
+
+        db = current.db
+        table = cls.table()
+        for i in range(0, len(location_ids), chunksize):
+            chunk = location_ids[i:i+chunksize]
+            db(table.location_id.belongs(chunk)).delete()
+            cls._insert(chunk)
+
+        cls.clear_cache()
+
+    # -------------------------------------------------------------------------
+    @classmethod
+    def rebuild(cls, chunksize=1000):
+        """
+            Rebuild the name index for all locations - to be run in a
+            scheduler task or from the CLI, not in interactive requests
+
+            @param chunksize: number of locations to process at a time
+        """
+
+        db = current.db
+        gtable = current.s3db.gis_location
+
+        cls.setup()
+
+        table = cls.table()
+        db(table.id > 0).delete()
+
+        query = (gtable.deleted == False)
+        last_id = 0
+        while True:
+            rows = db(query & (gtable.id > last_id)).select(gtable.id,
+                                                            orderby = gtable.id,
+                                                            limitby = (0, chunksize),
+                                                            )
+            if not rows:
+                break
+            location_ids = [row.id for row in rows]
+            cls._insert(location_ids)
+            last_id = location_ids[-1]
+
+        # Mark the index build as completed
+        table.insert(location_id=None, name=None, prefix=None)
+
+        cls._ready = True
+        cls.clear_cache()
+
+    # -------------------------------------------------------------------------
+    @classmethod
+    def _insert(cls, location_ids):
+        """
+            Insert the index entries for locations
+
+            @param location_ids: list of location IDs
+        """
+
+        db = current.db
+        s3db = current.s3db
+
+        gtable = s3db.gis_location
+        query = (gtable.id.belongs(location_ids)) & \
+                (gtable.deleted == False)
+        rows = db(query).select(gtable.id,
+                                gtable.name,
+                                )
+        names = dict((row.id, {row.name}) for row in rows)
+        if not names:
+            return
+
+        # Local names and alternate names
+        for tablename, fieldname in (("gis_location_name", "name_l10n"),
+                                     ("gis_location_name_alt", "name_alt"),
+                                     ):
+            ntable = s3db.table(tablename)
+            if not ntable:
+                continue
+            query = (ntable.location_id.belongs(list(names.keys()))) & \
+                    (ntable.deleted == False)
+            for row in db(query).select(ntable.location_id, ntable[fieldname]):
+                names[row.location_id].add(row[fieldname])
+
+        normalize = cls.normalize
+        entries = []
+        for location_id, location_names in names.items():
+            seen = set()
+            for name in location_names:
+                name = normalize(name)
+                if not name or name in seen:
+                    continue
+                seen.add(name)
+                entries.append({"location_id": location_id,
+                                "name": name[:255],
+                                "prefix": name[:PREFIX_LENGTH],
+                                })
+        if entries:
+            cls.table().bulk_insert(entries)
+
+    # -------------------------------------------------------------------------
+    @classmethod
+    def available(cls):
+        """
+            Check whether the name index can be used, schedules the index
+            build if necessary
+
+            @return: True|False
+        """
+
+        if not cls.enabled():
+            return False
+
+        if not cls._ready:
+            # Look up the marker for the completed index build
+            table = cls.table()
+            row = current.db(table.location_id == None).select(table.id,
+                                                               limitby = (0, 1),
+                                                               ).first()
+            if row:
+                cls._ready = True
+            elif not cls._scheduled:
+                # The scheduler skips duplicates of a queued build task
+                current.s3task.schedule_task("gis_gazetteer_rebuild",
+                                             timeout = BUILD_TIMEOUT,
+                                             )
+                cls._scheduled = True
+
+        return cls._ready
+
+    # -------------------------------------------------------------------------
+    # Result cache
+    # -------------------------------------------------------------------------
+    @classmethod
+    def _cached(cls, key):
+        """
+            Look up a result in the cache
+
+            @param key: the cache key
+            @return: the result, or None if not cached
+        """
+
+        entry = cls._cache.get(key)
+        if entry:
+            timestamp, result = entry
+            if time.time() - timestamp < CACHE_TTL:
+                return result
+            del cls._cache[key]
+        return None
+
+    # -------------------------------------------------------------------------
+    @classmethod
+    def _store(cls, key, result):
+        """
+            Store a result in the cache
+
+            @param key: the cache key
+            @param result: the result
+        """
+
+        cache = cls._cache
+        if len(cache) >= CACHE_SIZE:
+            cache.clear()
+        cache[key] = (time.time(), result)
+
+    # -------------------------------------------------------------------------
+    @classmethod
+    def clear_cache(cls):
+        """
+            Clear the result cache (e.g. after updating the index); the
+            caches of other processes are discarded after commit (see
+            _check_cache), so that they can not re-cache results read
+            before the commit
+        """
+
+        cls._cache = {}
+        current.s3db.after_commit(cls._bump)
+
+    # -------------------------------------------------------------------------
+    @staticmethod
+    def _version_path():
+        """
+            Get the path of the file holding the result cache version,
+            which is shared between processes
+        """
+
+        return os.path.join(current.request.folder, "cache", "gazetteer", "VERSION")
+
+    # -------------------------------------------------------------------------
+    @classmethod
+    def version(cls):
+        """
+            Get the current version of the result cache
+
+            @return: the version number
+        """
+
+        try:
+            with open(cls._version_path(), "r") as f:
+                version = int(f.read().strip() or 0)
+        except (IOError, OSError, ValueError):
+            version = 0
+        return version
+
+    # -------------------------------------------------------------------------
+    @classmethod
+    def _bump(cls):
+        """
+            Bump the result cache version, to be called after commit
+            (see clear_cache)
+        """
+
+        path = cls._version_path()
+        version = cls.version() + 1
+        try:
+            folder = os.path.dirname(path)
+            if not os.path.isdir(folder):
+                os.makedirs(folder)
+            with open(path, "w") as f:
+                f.write(str(version))
+        except (IOError, OSError):
+            current.log.error("Could not invalidate gazetteer cache")
+
+    # -------------------------------------------------------------------------
+    @classmethod
+    def _check_cache(cls):
+        """
+            Discard the result cache if its version has been bumped (i.e.
+            the index has been updated by another process)
+        """
+
+        version = cls.version()
+        if version != cls._version:
+            cls._cache = {}
+            cls._version = version
+
+    # -------------------------------------------------------------------------
+    # Forward geocoding
+    # -------------------------------------------------------------------------
+    @classmethod
+    def geocode(cls, address, postcode=None, Lx_ids=None):
+        """
+            Geocode an address, same API as GIS.geocode
+
+            @param address: the address
+            @param postcode: the postcode
+            @param Lx_ids: list of ancestor IDs
+
+            @return: dict {lat, lon, location_id}, or an error message
+        """
+
+        return cls.geocode_batch([(address, postcode, Lx_ids)])[0]
+
+    # -------------------------------------------------------------------------
+    @classmethod
+    def geocode_batch(cls, addresses):
+        """
+            Geocode a batch of addresses, looking up all names in bulk
+
+            @param addresses: list of tuples (address, postcode, Lx_ids)
+
+            @return: list of results (in the same order as addresses),
+                     each a dict {lat, lon, location_id} or an error message
+        """
+
+        if not cls.available():
+            return ["Gazetteer not available"] * len(addresses)
+
+        cls._check_cache()
+
+        normalize = cls.normalize
+
+        results = [None] * len(addresses)
+
+        # Parse the addresses, look up the cache
+        pending = []
+        for index, (address, postcode, Lx_ids) in enumerate(addresses):
+            if isinstance(address, basestring):
+                parts = [normalize(part) for part in address.split(",")]
+            else:
+                parts = []
+            parts = [part for part in parts if part]
+            Lx_ids = tuple(sorted(set(int(i) for i in Lx_ids))) if Lx_ids else ()
+            key = ("geocode", tuple(parts), Lx_ids)
+            result = cls._cached(key)
+            if result is not None:
+                results[index] = result
+            elif not parts:
+                results[index] = "No results found"
+            else:
+                pending.append((index, key, parts, Lx_ids))
+
+        if not pending:
+            return results
+
+        # Look up the candidates for all names
+        names = set()
+        for item in pending:
+            names.update(item[2])
+        candidates = cls._candidates(names)
+
+        for index, key, parts, Lx_ids in pending:
+            result = cls._match(parts, Lx_ids, candidates)
+            cls._store(key, result)
+            results[index] = result
+
+        return results
+
+    # -------------------------------------------------------------------------
+    @classmethod
+    def _candidates(cls, names):
+        """
+            Look up the candidate locations for normalized names
+
+            @param names: set of normalized names
+
+            @return: dict {name: [(similarity, location), ...]}, with
+                     location as Row (id, parent, path, lat, lon)
+        """
+
+        db = current.db
+        gtable = current.s3db.gis_location
+        table = cls.table()
+
+        fields = (table.name,
+                  gtable.id,
+                  gtable.parent,
+                  gtable.path,
+                  gtable.lat,
+                  gtable.lon,
+                  )
+        join = (table.location_id == gtable.id) & \
+               (gtable.deleted == False) & \
+               (gtable.lat != None) & \
+               (gtable.lon != None)
+
+        candidates = dict((name, []) for name in names)
+
+        # Exact matches
+        rows = db(join & table.name.belongs(names)).select(*fields)
+        for row in rows:
+            candidates[row[table.name]].append((1.0, row.gis_location))
+
+        # Fuzzy matches (by prefix) for names without exact match
+        similarity = cls.similarity
+        unmatched = [name for name in names if not candidates[name]]
+        prefixes = {}
+        for name in unmatched:
+            prefix = name[:PREFIX_LENGTH]
+            if prefix in prefixes:
+                prefixes[prefix].append(name)
+            else:
+                prefixes[prefix] = [name]
+        for prefix, group in prefixes.items():
+            # Rank the candidates by the difference in name length (a
+            # proxy for the trigram similarity) and then by record ID,
+            # so that the candidates within the limit are deterministic
+            # and the most similar ones
+            length = sum(len(name) for name in group) // len(group)
+            orderby = "ABS(LENGTH(%s)-%d),%s" % (table.name, length, table.id)
+            rows = db(join & (table.prefix == prefix)).select(orderby = orderby,
+                                                              limitby = (0, MAX_CANDIDATES),
+                                                              *fields)
+            for row in rows:
+                for name in group:
+                    score = similarity(name, row[table.name])
+                    if score >= SIMILARITY:
+                        candidates[name].append((score, row.gis_location))
+
+        return candidates
+
+    # -------------------------------------------------------------------------
+    @staticmethod
+    def _match(parts, Lx_ids, candidates):
+        """
+            Find the best match for the parts of an address
+
+            @param parts: the normalized parts of the address
+            @param Lx_ids: tuple of ancestor IDs
+            @param candidates: the candidates, see _candidates()
+
+            @return: dict {lat, lon, location_id}, or an error message
+        """
+
+        ancestors = set(Lx_ids)
+        ancestor = False
+
+        def within(location):
+            if not ancestors:
+                return True
+            if location.path:
+                path = set(int(i) for i in location.path.split("/") if i)
+                path.discard(location.id)
+                return ancestors.issubset(path)
+            # No path yet (e.g. during prepop): check the parent only
+            return location.parent in ancestors
+
+        # Most specific part first
+        for part in parts:
+            matches = {}
+            for score, location in candidates.get(part, ()):
+                if location.id in ancestors:
+                    # Match for the Lx itself
+                    ancestor = True
+                    continue
+                if not within(location):
+                    continue
+                if score > matches.get(location.id, (0.0,))[0]:
+                    matches[location.id] = (score, location)
+            if not matches:
+                continue
+
+            best = max(score for score, location in matches.values())
+            best = [location for score, location in matches.values() if score == best]
+            if len(best) > 1:
+                return "Multiple results found"
+            location = best[0]
+            return {"lat": location.lat,
+                    "lon": location.lon,
+                    "location_id": location.id,
+                    }
+
+        if ancestor:
+            return "We can only geocode to the Lx"
+        return "No results found"
+
+    # -------------------------------------------------------------------------
+    # Reverse geocoding
+    # -------------------------------------------------------------------------
+    @classmethod
+    def geocode_r(cls, lat, lon):
+        """
+            Reverse geocode coordinates to the Lx locations containing them
+
+            @param lat: the latitude (float)
+            @param lon: the longitude (float)
+
+            @return: dict {level: location_id}
+        """
+
+        cls._check_cache()
+
+        key = ("geocode_r", round(lat, 5), round(lon, 5))
+        results = cls._cached(key)
+        if results is not None:
+            return results
+
+        table = current.s3db.gis_location
+        query = (table.level != None) & \
+                (table.deleted != True)
+
+        # Filter to the BBOX initially
+        bbox = S3SpatialIndex.query(lon, lat, lon, lat)
+        if bbox is not None:
+            query &= bbox
+        else:
+            query &= (table.lat_min < lat) & \
+                     (table.lat_max > lat) & \
+                     (table.lon_min < lon) & \
+                     (table.lon_max > lon)
+        rows = current.db(query).select(table.id,
+                                        table.level,
+                                        table.wkt,
+                                        )
+
+        from shapely.geometry import point
+        from shapely.wkt import loads as wkt_loads
+        test = point.Point(lon, lat)
+        results = {}
+        for row in rows:
+            if not row.wkt:
+                continue
+            shape = wkt_loads(row.wkt)
+            if test.intersects(shape):
+                results[row.level] = row.id
+
+        cls._store(key, results)
+        return results
+
+# END =========================================================================
@@ -69,7 +69,10 @@ from s3compat import Cookie, HTTPError, StringIO, URLError, basestring, urllib_q
 from s3dal import Rows
 from .s3datetime import s3_format_datetime, s3_parse_datetime
 from .s3fields import s3_all_meta_field_names
+from .s3gazetteer import S3Gazetteer
+from .s3locationcache import S3LocationCache
 from .s3rest import S3Method
+from .s3spatialindex import S3SpatialIndex
 from .s3track import S3Trackable
 from .s3utils import s3_include_ext, s3_include_underscore, s3_str
 
@@ -493,16 +496,20 @@ class GIS(object):
             @param geocoder: which geocoder service to use
         """
 
+        settings = current.deployment_settings
+        if geocoder is None:
+            geocoder = settings.get_gis_geocode_service()
+
+        if geocoder == "gazetteer":
+            # Offline Gazetteer
+            return S3Gazetteer.geocode(address, postcode, Lx_ids)
+
         try:
             from geopy import geocoders
         except ImportError:
             current.log.error("S3GIS unresolved dependency: geopy required for Geocoder support")
             return "S3GIS unresolved dependency: geopy required for Geocoder support"
 
-        settings = current.deployment_settings
-        if geocoder is None:
-            geocoder = settings.get_gis_geocode_service()
-
         if geocoder == "nominatim":
             g = geocoders.Nominatim(user_agent = "Sahana Eden")
             geocode_ = lambda names, g=g, **kwargs: g.geocode(names, **kwargs)
@@ -739,6 +746,9 @@ class GIS(object):
                     results = {}
                     for row in rows:
                         results[row.level] = row.id
+                elif current.deployment_settings.get_gis_geocode_service() == "gazetteer":
+                    # Offline Gazetteer (indexed & cached)
+                    results = S3Gazetteer.geocode_r(lat, lon)
                 else:
                     # Oh dear, this is going to be slow :/
                     # Filter to the BBOX initially
@@ -1932,6 +1942,16 @@ class GIS(object):
             query &= (table.deleted == False)
         # @ToDo: Check AAA (do this as a resource filter?)
 
+        # Pre-select the features by bounds if a spatial index is available
+        if lon_min is None:
+            bounds = polygon.bounds
+        else:
+            bounds = (lon_min, lat_min, lon_max, lat_max)
+        bbox_query = S3SpatialIndex.query(*bounds)
+        if bbox_query is not None:
+            # Include locations without bounds (not in the spatial index)
+            query &= (bbox_query | (locations.lat_min == None))
+
         features = db(query).select(locations.wkt,
                                     locations.lat,
                                     locations.lon,
@@ -2276,11 +2296,20 @@ class GIS(object):
                       query,
                       join = True,
                       geojson = True,
+                      tolerance = None,
                       ):
         """
             Returns the locations for an XML export
             - used by GIS.get_location_data() and S3PivotTable.geojson()
 
+            @param table: the Table
+            @param query: the query for the records, joined with gis_location
+                          if join=True
+            @param join: whether the query is joined with gis_location
+            @param geojson: return the locations as GeoJSON rather than WKT
+            @param tolerance: the tolerance for the simplification of
+                              polygons (defaults to settings.gis.simplify_tolerance)
+
             @ToDo: Support multiple locations for a single resource
                    (e.g. a Project working in multiple Communities)
         """
@@ -2289,7 +2318,8 @@ class GIS(object):
         tablename = table._tablename
         gtable = current.s3db.gis_location
         settings = current.deployment_settings
-        tolerance = settings.get_gis_simplify_tolerance()
+        if tolerance is None:
+            tolerance = settings.get_gis_simplify_tolerance()
 
         output = {}
 
@@ -2332,67 +2362,70 @@ class GIS(object):
                         output[key].append(row.wkt)
                     else:
                         output[key] = [row.wkt]
+        elif geojson:
+            # Use the precomputed simplified polygons to reduce download size
+            if join:
+                rows = db(query).select(table.id,
+                                        gtable.id)
+                geojsons = GIS.get_simplified_geojson([row["gis_location.id"] for row in rows],
+                                                      tolerance = tolerance,
+                                                      )
+                for row in rows:
+                    g = geojsons.get(row["gis_location.id"])
+                    if g:
+                        key = row[tablename].id
+                        if key in output:
+                            output[key].append(g)
+                        else:
+                            output[key] = [g]
+            else:
+                # gis_location: always single
+                rows = db(query).select(table.id)
+                output = GIS.get_simplified_geojson([row.id for row in rows],
+                                                    tolerance = tolerance,
+                                                    )
         else:
             rows = db(query).select(table.id,
                                     gtable.wkt)
             simplify = GIS.simplify
-            if geojson:
-                # Simplify the polygon to reduce download size
-                if join:
+            if join:
+                if tolerance:
+                    # Simplify the polygon to reduce download size
+                    # & also to work around the recursion limit in libxslt
+                    # http://blog.gmane.org/gmane.comp.python.lxml.devel/day=20120309
                     for row in rows:
-                        g = simplify(row["gis_location"].wkt,
-                                     tolerance=tolerance,
-                                     output="geojson")
-                        if g:
+                        wkt = simplify(row["gis_location"].wkt,
+                                       tolerance = tolerance,
+                                       )
+                        if wkt:
                             key = row[tablename].id
                             if key in output:
-                                output[key].append(g)
+                                output[key].append(wkt)
                             else:
-                                output[key] = [g]
+                                output[key] = [wkt]
                 else:
-                    # gis_location: always single
                     for row in rows:
-                        g = simplify(row.wkt,
-                                     tolerance=tolerance,
-                                     output="geojson")
-                        if g:
-                            output[row.id] = g
-
+                        wkt = row["gis_location"].wkt
+                        if wkt:
+                            key = row[tablename].id
+                            if key in output:
+                                output[key].append(wkt)
+                            else:
+                                output[key] = [wkt]
             else:
-                if join:
-                    if tolerance:
-                        # Simplify the polygon to reduce download size
-                        # & also to work around the recursion limit in libxslt
-                        # http://blog.gmane.org/gmane.comp.python.lxml.devel/day=20120309
-                        for row in rows:
-                            wkt = simplify(row["gis_location"].wkt)
-                            if wkt:
-                                key = row[tablename].id
-                                if key in output:
-                                    output[key].append(wkt)
-                                else:
-                                    output[key] = [wkt]
-                    else:
-                        for row in rows:
-                            wkt = row["gis_location"].wkt
-                            if wkt:
-                                key = row[tablename].id
-                                if key in output:
-                                    output[key].append(wkt)
-                                else:
-                                    output[key] = [wkt]
+                # gis_location: always single
+                if tolerance:
+                    for row in rows:
+                        wkt = simplify(row.wkt,
+                                       tolerance = tolerance,
+                                       )
+                        if wkt:
+                            output[row.id] = wkt
                 else:
-                    # gis_location: always single
-                    if tolerance:
-                        for row in rows:
-                            wkt = simplify(row.wkt)
-                            if wkt:
-                                output[row.id] = wkt
-                    else:
-                        for row in rows:
-                            wkt = row.wkt
-                            if wkt:
-                                output[row.id] = wkt
+                    for row in rows:
+                        wkt = row.wkt
+                        if wkt:
+                            output[row.id] = wkt
 
         return output
 
@@ -2748,7 +2781,9 @@ class GIS(object):
                     return None
 
             if geojson and not points:
-                geojsons[tablename] = GIS.get_locations(table, query, join, geojson)
+                geojsons[tablename] = GIS.get_locations(table, query, join, geojson,
+                                                        tolerance = GIS.get_tolerance(),
+                                                        )
             # @ToDo: Support Polygons in KML, GPX & GeoRSS
             #else:
             #    wkts[tablename] = GIS.get_locations(table, query, join, geojson)
@@ -2793,6 +2828,44 @@ class GIS(object):
                 "styles": styles,
                 }
 
+    # -------------------------------------------------------------------------
+    @staticmethod
+    def get_tolerance():
+        """
+            Get the tolerance for the simplification of polygons in a
+            GeoJSON export from the request, either as URL variable
+            "tolerance", or from the map zoom level (URL variable "zoom",
+            ~one pixel at that zoom level)
+
+            @return: the tolerance, or None for the default
+                     (settings.gis.simplify_tolerance)
+        """
+
+        get_vars = current.request.get_vars
+
+        tolerance = get_vars.get("tolerance")
+        if tolerance:
+            try:
+                tolerance = float(tolerance)
+            except (TypeError, ValueError):
+                tolerance = None
+            else:
+                if tolerance < 0:
+                    tolerance = None
+        else:
+            zoom = get_vars.get("zoom")
+            try:
+                zoom = int(zoom) if zoom else None
+            except (TypeError, ValueError):
+                zoom = None
+            if zoom is not None and 0 <= zoom <= 22:
+                # Degrees per pixel
+                tolerance = 360.0 / (256 * 2 ** zoom)
+            else:
+                tolerance = None
+
+        return tolerance
+
     # -------------------------------------------------------------------------
     @staticmethod
     def get_marker(controller=None,
@@ -3137,9 +3210,9 @@ page.render('%(filename)s', {format: 'jpeg', quality: '100'});''' % \
         #        geojsons[row["gis_theme_data.id"]] = row.geojson
         #else:
         rows = current.db(query).select(table.id,
+                                        gtable.id,
                                         gtable.level,
-                                        gtable.wkt)
-        simplify = GIS.simplify
+                                        )
         tolerance = {"L0": 0.01,
                      "L1": 0.005,
                      "L2": 0.00125,
@@ -3147,12 +3220,22 @@ page.render('%(filename)s', {format: 'jpeg', quality: '100'});''' % \
                      "L4": 0.0003125,
                      "L5": 0.00015625,
                      }
+
+        # Group the locations by level
+        levels = {}
         for row in rows:
             grow = row.gis_location
-            # Simplify the polygon to reduce download size
-            geojson = simplify(grow.wkt,
-                               tolerance=tolerance[grow.level],
-                               output="geojson")
+            levels.setdefault(grow.level, []).append(grow.id)
+
+        # Look up the simplified polygons to reduce download size
+        simplified = {}
+        get_simplified_geojson = GIS.get_simplified_geojson
+        for level, location_ids in levels.items():
+            simplified.update(get_simplified_geojson(location_ids,
+                                                     tolerance = tolerance.get(level),
+                                                     ))
+        for row in rows:
+            geojson = simplified.get(row["gis_location.id"])
             if geojson:
                 geojsons[row["gis_theme_data.id"]] = geojson
 
@@ -3678,6 +3761,10 @@ page.render('%(filename)s', {format: 'jpeg', quality: '100'});''' % \
             if "L2" in levels:
                 self.import_gadm1(ogr, "L2", countries=countries)
 
+            # Invalidate cached location options (all L0s, as the
+            # imported locations are only known by country code)
+            current.s3db.after_commit(S3LocationCache.invalidate_hierarchy)
+
             current.log.debug("All done!")
 
         elif source == "gadmv1":
@@ -3694,6 +3781,10 @@ page.render('%(filename)s', {format: 'jpeg', quality: '100'});''' % \
             if "L2" in levels:
                 self.import_gadm2(ogr, "L2", countries=countries)
 
+            # Invalidate cached location options (all L0s, as the
+            # imported locations are only known by country code)
+            current.s3db.after_commit(S3LocationCache.invalidate_hierarchy)
+
             current.log.debug("All done!")
 
         else:
@@ -4419,6 +4510,12 @@ page.render('%(filename)s', {format: 'jpeg', quality: '100'});''' % \
         table = s3db.gis_location
         ttable = s3db.gis_location_tag
 
+        # Import alternate names into the Offline Gazetteer?
+        gazetteer = S3Gazetteer.enabled()
+        if gazetteer:
+            atable = s3db.gis_location_name_alt
+            new_ids = []
+
         url = "http://download.geonames.org/export/dump/" + country + ".zip"
 
         cachepath = os.path.join(request.folder, "cache")
@@ -4586,9 +4683,35 @@ page.render('%(filename)s', {format: 'jpeg', quality: '100'});''' % \
                 ttable.insert(location_id=new_id,
                               tag="geonames",
                               value=geonameid)
+                if gazetteer:
+                    alt_names = set(alternatenames.split(","))
+                    alt_names.add(asciiname)
+                    alt_names.discard(name)
+                    alt_names.discard("")
+                    for alt_name in alt_names:
+                        atable.insert(location_id = new_id,
+                                      name_alt = alt_name,
+                                      )
+                    new_ids.append(new_id)
             else:
                 continue
 
+        if gazetteer:
+            # Index the new locations
+            S3Gazetteer.update(new_ids)
+
+        # Invalidate cached location options for the country
+        l0 = db((table.level == "L0") & \
+                (table.deleted == False) & \
+                (ttable.location_id == table.id) & \
+                (ttable.tag == "ISO2") & \
+                (ttable.value == country)).select(table.id,
+                                                  limitby = (0, 1),
+                                                  ).first()
+        current.s3db.after_commit(S3LocationCache.invalidate_hierarchy,
+                                  l0.id if l0 else None,
+                                  )
+
         current.log.debug("All done!")
         return
 
@@ -4758,30 +4881,8 @@ page.render('%(filename)s', {format: 'jpeg', quality: '100'});''' % \
 
 
         if not feature:
-            # We are updating all locations.
-            all_locations = True
-            # Do in chunks to save memory and also do in correct order
-            all_fields = (table.id, table.name, table.gis_feature_type,
-                          table.L0, table.L1, table.L2, table.L3, table.L4,
-                          table.lat, table.lon, table.wkt, table.inherited,
-                          # Handle Countries which start with Bounds set, yet are Points
-                          table.lat_min, table.lon_min, table.lat_max, table.lon_max,
-                          table.path, table.parent)
-            for level in ("L0", "L1", "L2", "L3", "L4", "L5", None):
-                query = (table.level == level) & (table.deleted == False)
-                try:
-                    features = db(query).select(*all_fields)
-                except MemoryError:
-                    current.log.error("S3GIS: Unable to update Location Tree for level %s: MemoryError" % level)
-                else:
-                    for feature in features:
-                        feature["level"] = level
-                        wkt = feature["wkt"]
-                        if wkt and not wkt.startswith("POI"):
-                            # Polygons aren't inherited
-                            feature["inherited"] = False
-                        update_location_tree(feature)  # all_locations is False here
-            # All Done!
+            # We are updating all locations => bulk update
+            GIS.rebuild_location_tree()
             return
 
 
@@ -5791,6 +5892,219 @@ page.render('%(filename)s', {format: 'jpeg', quality: '100'});''' % \
 
         return _path
 
+    # -------------------------------------------------------------------------
+    @staticmethod
+    def rebuild_location_tree(L0=None, chunksize=1000):
+        """
+            Bulk update of the materialized paths, Lx names and inherited
+            Lat/Lon of all locations, alternative to update_location_tree
+            for one feature at a time:
+
+            - processes the tree level by level (L0 to L5, then specific
+              locations), with the resolved ancestors kept in memory, so
+              that every location is read only once
+            - writes only locations with changes, and groups identical
+              changes (e.g. siblings inheriting the Lat/Lon from their
+              parent) into one update
+
+            @param L0: the L0 location ID(s) to restrict the update to
+                       (e.g. to process independent countries in parallel
+                       processes)
+            @param chunksize: the number of locations to process at a time
+
+            @return: the number of updated locations
+
+            @note: centroid, bounds and WKT are only re-calculated for
+                   locations with inherited Lat/Lon or without WKT
+        """
+
+        db = current.db
+        table = current.s3db.gis_location
+
+        wkt_centroid = GIS.wkt_centroid
+        spatialdb = current.deployment_settings.get_gis_spatialdb()
+
+        LEVELS = ("L0", "L1", "L2", "L3", "L4", "L5")
+        GEOMETRY = ("lat", "lon", "wkt", "gis_feature_type",
+                    "lat_min", "lat_max", "lon_min", "lon_max",
+                    )
+
+        fields = [table.id,
+                  table.name,
+                  table.level,
+                  table.parent,
+                  table.path,
+                  table.inherited,
+                  ] + [table[fn] for fn in GEOMETRY] \
+                    + [table[level] for level in LEVELS]
+
+        if L0 is not None and not isinstance(L0, (list, tuple, set)):
+            L0 = [L0]
+
+        # The resolved hierarchy locations
+        # {location_id: (path, (L0, L1, L2, L3, L4, L5), lat, lon)}
+        ancestors = {}
+
+        def select(level):
+            """
+                Select the locations of a level, in chunks
+
+                @param level: the level
+                @return: generator of lists of Rows
+            """
+
+            base = (table.level == level) & (table.deleted == False)
+            if L0 is None:
+                queries = [base]
+            elif level == "L0":
+                queries = [base & (table.id.belongs(L0))]
+            else:
+                # Children of the locations resolved so far
+                parent_ids = sorted(ancestors.keys())
+                queries = [base & (table.parent.belongs(parent_ids[i:i+chunksize]))
+                           for i in range(0, len(parent_ids), chunksize)]
+
+            for query in queries:
+                last_id = 0
+                while True:
+                    rows = db(query & (table.id > last_id)).select(
+                                                orderby = table.id,
+                                                limitby = (0, chunksize),
+                                                *fields)
+                    if not rows:
+                        break
+                    yield rows
+                    last_id = rows.last().id
+
+        def resolve(row, level):
+            """
+                Determine path, Lx names and inherited Lat/Lon for a location
+
+                @param row: the location Row
+                @param level: the level of the location
+
+                @return: dict of changed fields, or None if the location
+                         cannot be resolved
+            """
+
+            location_id = row.id
+            parent = row.parent
+
+            if level == "L0" or not parent:
+                path = str(location_id)
+                names = [None] * 6
+                parent_lat = parent_lon = None
+            else:
+                ancestor = ancestors.get(parent)
+                if ancestor is None:
+                    current.log.error("Parent of Location ID %s is not a valid hierarchy location: %s" %
+                                      (location_id, parent))
+                    return None
+                parent_path, names, parent_lat, parent_lon = ancestor
+                path = "%s/%s" % (parent_path, location_id)
+                names = list(names)
+            if level:
+                index = LEVELS.index(level)
+                names[index] = row.name
+                for i in range(index + 1, 6):
+                    names[i] = None
+
+            inherited = row.inherited
+            lat, lon, wkt = row.lat, row.lon, row.wkt
+            if wkt and not wkt.startswith("POI"):
+                # Polygons aren't inherited
+                inherited = False
+
+            data = {"path": path,
+                    "lat": lat,
+                    "lon": lon,
+                    }
+            for i, name in enumerate(names):
+                data[LEVELS[i]] = name
+
+            if level == "L0":
+                inherited = False
+                geometry = not wkt or lat is None
+            elif inherited or lat is None or lon is None:
+                inherited = True
+                data["lat"] = parent_lat
+                data["lon"] = parent_lon
+                geometry = True
+            else:
+                geometry = not wkt
+            data["inherited"] = inherited
+
+            if geometry:
+                # Calculate centroid, bounds and WKT
+                form_vars = Storage(data)
+                if inherited:
+                    # Point from inherited Lat/Lon
+                    form_vars.gis_feature_type = "1"
+                else:
+                    for fn in GEOMETRY[2:]:
+                        form_vars[fn] = row[fn]
+                    if not wkt:
+                        form_vars.gis_feature_type = "1"
+                form = Storage(vars = form_vars,
+                               errors = Storage(),
+                               )
+                wkt_centroid(form)
+                if form.errors:
+                    current.log.error("S3GIS: %s" % form.errors)
+                else:
+                    for fn in GEOMETRY:
+                        if fn in form_vars:
+                            data[fn] = form_vars[fn]
+                    if data.get("gis_feature_type"):
+                        data["gis_feature_type"] = int(data["gis_feature_type"])
+
+            if level:
+                ancestors[location_id] = (path,
+                                          tuple(names),
+                                          data["lat"],
+                                          data["lon"],
+                                          )
+
+            changed = dict((fn, value) for fn, value in data.items()
+                                       if row[fn] != value)
+            if spatialdb and "wkt" in changed:
+                changed["the_geom"] = changed["wkt"]
+            return changed
+
+        updated = 0
+        for level in LEVELS + (None,):
+            for rows in select(level):
+                batches = {}
+                for row in rows:
+                    changed = resolve(row, level)
+                    if not changed:
+                        continue
+                    if "path" in changed:
+                        # Paths are different for every location
+                        db(table.id == row.id).update(**changed)
+                    else:
+                        key = tuple(sorted(changed.items()))
+                        batches.setdefault(key, []).append(row.id)
+                    updated += 1
+
+                for key, location_ids in batches.items():
+                    db(table.id.belongs(location_ids)).update(**dict(key))
+
+        if updated:
+            # Invalidate cached vector tiles
+            from .s3vectortiles import S3TileCache
+            S3TileCache.invalidate(table)
+
+            # Paths and bounds of Lx locations have changed
+            after_commit = current.s3db.after_commit
+            if L0 is None:
+                after_commit(S3LocationCache.invalidate_hierarchy)
+            else:
+                for l0 in L0:
+                    after_commit(S3LocationCache.invalidate_hierarchy, l0)
+
+        return updated
+
     # -------------------------------------------------------------------------
     @staticmethod
     def wkt_centroid(form):
@@ -5954,13 +6268,27 @@ page.render('%(filename)s', {format: 'jpeg', quality: '100'});''' % \
     def query_features_by_bbox(lon_min, lat_min, lon_max, lat_max):
         """
             Returns a query of all Locations inside the given bounding box
+
+            @note: with the spatial index (S3SpatialIndex), results at the
+                   edges of the bounding box are approximate
         """
 
         table = current.s3db.gis_location
-        query = (table.lat_min <= lat_max) & \
-                (table.lat_max >= lat_min) & \
-                (table.lon_min <= lon_max) & \
-                (table.lon_max >= lon_min)
+
+        # Use the spatial index if available
+        query = S3SpatialIndex.query(lon_min, lat_min, lon_max, lat_max)
+        if query is None:
+            query = (table.lat_min <= lat_max) & \
+                    (table.lat_max >= lat_min) & \
+                    (table.lon_min <= lon_max) & \
+                    (table.lon_max >= lon_min)
+
+        # Include points without bounds (not in the spatial index)
+        query |= (table.lat_min == None) & \
+                 (table.lat >= lat_min) & \
+                 (table.lat <= lat_max) & \
+                 (table.lon >= lon_min) & \
+                 (table.lon <= lon_max)
         return query
 
     # -------------------------------------------------------------------------
@@ -6187,6 +6515,155 @@ page.render('%(filename)s', {format: 'jpeg', quality: '100'});''' % \
 
         return output
 
+    # -------------------------------------------------------------------------
+    @staticmethod
+    def simplified_tolerance(tolerance):
+        """
+            Find the precomputed simplified geometries to use for a
+            requested tolerance, i.e. the coarsest which are at least
+            as detailed as requested
+
+            @param tolerance: the requested tolerance
+
+            @return: the tolerance of the precomputed geometries,
+                     or None if there are none suitable
+        """
+
+        if not tolerance:
+            return None
+
+        tolerances = current.deployment_settings.get_gis_simplify_tolerances()
+        suitable = [t for t in tolerances if t <= tolerance * 1.000001]
+
+        return max(suitable) if suitable else None
+
+    # -------------------------------------------------------------------------
+    @staticmethod
+    def get_simplified_geojson(location_ids, tolerance=None, precision=None):
+        """
+            Get the simplified geometries of locations as GeoJSON, using
+            the precomputed geometries where available (for points, or
+            for locations not yet processed, the WKT is simplified now)
+
+            @param location_ids: the gis_location record IDs
+            @param tolerance: the requested tolerance (defaults to
+                              settings.gis.simplify_tolerance)
+            @param precision: the number of decimal places (if the
+                              geometry has to be simplified now)
+
+            @return: dict {location_id: geojson}
+        """
+
+        db = current.db
+        s3db = current.s3db
+
+        if tolerance is None:
+            tolerance = current.deployment_settings.get_gis_simplify_tolerance()
+
+        location_ids = set(location_ids)
+        location_ids.discard(None)
+
+        output = {}
+
+        precomputed = GIS.simplified_tolerance(tolerance)
+        if precomputed is not None and location_ids:
+            stable = s3db.gis_location_simplified
+            query = (stable.location_id.belongs(location_ids)) & \
+                    (stable.tolerance == precomputed)
+            rows = db(query).select(stable.location_id,
+                                    stable.geojson,
+                                    )
+            for row in rows:
+                output[row.location_id] = row.geojson
+
+        missing = location_ids.difference(output)
+        if missing:
+            gtable = s3db.gis_location
+            rows = db(gtable.id.belongs(missing)).select(gtable.id,
+                                                         gtable.wkt,
+                                                         )
+            simplify = GIS.simplify
+            for row in rows:
+                if not row.wkt:
+                    continue
+                geojson = simplify(row.wkt,
+                                   tolerance = tolerance,
+                                   output = "geojson",
+                                   precision = precision,
+                                   )
+                if geojson:
+                    output[row.id] = geojson
+
+        return output
+
+    # -------------------------------------------------------------------------
+    @staticmethod
+    def update_simplified_geometries(location_ids=None, chunksize=100):
+        """
+            Precompute the simplified geometries of (non-point) locations
+            at the tolerances configured in settings.gis.simplify_tolerances
+
+            - called onaccept of gis_location (async where possible)
+            - can be run in bulk for existing data, see
+              static/scripts/tools/gis_update_simplified_geometries.py
+
+            @param location_ids: the gis_location record IDs, None to
+                                 update all locations
+            @param chunksize: the number of locations to process at a time
+
+            @return: the number of locations with simplified geometries
+        """
+
+        db = current.db
+        s3db = current.s3db
+
+        gtable = s3db.gis_location
+        stable = s3db.gis_location_simplified
+
+        tolerances = current.deployment_settings.get_gis_simplify_tolerances()
+        simplify = GIS.simplify
+
+        query = (gtable.deleted == False)
+        if location_ids is not None:
+            query &= (gtable.id.belongs(location_ids))
+
+        updated = 0
+        last_id = 0
+        while True:
+            rows = db(query & (gtable.id > last_id)).select(gtable.id,
+                                                            gtable.wkt,
+                                                            limitby = (0, chunksize),
+                                                            orderby = gtable.id,
+                                                            )
+            if not rows:
+                break
+            last_id = rows.last().id
+
+            # Remove the outdated geometries
+            db(stable.location_id.belongs([row.id for row in rows])).delete()
+
+            items = []
+            for row in rows:
+                wkt = row.wkt
+                if not wkt or wkt[:5] == "POINT":
+                    # Points need no simplification
+                    continue
+                for tolerance in tolerances:
+                    geojson = simplify(wkt,
+                                       tolerance = tolerance,
+                                       output = "geojson",
+                                       )
+                    if geojson:
+                        items.append({"location_id": row.id,
+                                      "tolerance": tolerance,
+                                      "geojson": geojson,
+                                      })
+                updated += 1
+            if items:
+                stable.bulk_insert(items)
+
+        return updated
+
     # -------------------------------------------------------------------------
     def show_map(self,
                  id = "default_map",
@@ -428,6 +428,169 @@ class S3HierarchyCRUD(S3Method):
         # Reponse headers and file name are set in codec
         return result
 
+# =============================================================================
+class S3HierarchyIndex(object):
+    """
+        Compact representation of a hierarchy as parallel arrays in
+        pre-order (depth-first) sequence, so that all descendants of
+        the node at position i are at the positions i+1...right[i]
+        (nested-set intervals)
+    """
+
+    def __init__(self, ids, parents, categories, right):
+        """
+            Constructor
+
+            @param ids: the node IDs, in pre-order
+            @param parents: the position of the parent node for
+                            each node (-1 for root nodes)
+            @param categories: the category of each node
+            @param right: the position of the last descendant of each
+                          node (=the position of the node if it is a
+                          leaf node)
+        """
+
+        self.ids = ids
+        self.parents = parents
+        self.categories = categories
+        self.right = right
+
+        # Node ID => position
+        self.pos = dict((node_id, i) for i, node_id in enumerate(ids))
+
+        # Level of each node (0 for root nodes)
+        levels = []
+        append = levels.append
+        for p in parents:
+            append(levels[p] + 1 if p >= 0 else 0)
+        self.levels = levels
+
+    # -------------------------------------------------------------------------
+    @classmethod
+    def from_nodes(cls, theset):
+        """
+            Build the index from a nodes dict
+
+            @param theset: the nodes dict {node_id: {"p": parent_id,
+                                                     "c": category,
+                                                     "s": set(child_ids)}}
+
+            @return: the S3HierarchyIndex
+        """
+
+        ids = []
+        parents = []
+        categories = []
+        right = []
+
+        visited = set()
+
+        def visit(node_id, parent):
+            # Iterative depth-first traversal (avoids recursion limits
+            # with deep hierarchies)
+            stack = [(node_id, parent, None)]
+            while stack:
+                node_id, parent, i = stack.pop()
+                if i is not None:
+                    # All descendants processed
+                    right[i] = len(ids) - 1
+                    continue
+                if node_id in visited:
+                    continue
+                visited.add(node_id)
+                node = theset[node_id]
+                i = len(ids)
+                ids.append(node_id)
+                parents.append(parent)
+                categories.append(node["c"])
+                right.append(i)
+                stack.append((node_id, parent, i))
+                children = [c for c in node["s"] if c in theset]
+                for child_id in sorted(children, reverse=True):
+                    stack.append((child_id, i, None))
+
+        for node_id in sorted(theset):
+            if not theset[node_id]["p"]:
+                visit(node_id, -1)
+
+        # Nodes in parent loops (invalid, but must not get lost)
+        for node_id in sorted(theset):
+            if node_id not in visited:
+                visit(node_id, -1)
+
+        return cls(ids, parents, categories, right)
+
+    # -------------------------------------------------------------------------
+    @classmethod
+    def from_dict(cls, data):
+        """
+            Restore the index from its serialized form
+
+            @param data: the serialized index (as returned from as_dict)
+
+            @return: the S3HierarchyIndex
+        """
+
+        return cls([long(node_id) for node_id in data["ids"]],
+                   data["parents"],
+                   data["categories"],
+                   data["right"],
+                   )
+
+    # -------------------------------------------------------------------------
+    def as_dict(self):
+        """ Serialize this index (JSON-serializable dict of arrays) """
+
+        return {"ids": self.ids,
+                "parents": self.parents,
+                "categories": self.categories,
+                "right": self.right,
+                }
+
+    # -------------------------------------------------------------------------
+    def nodes(self):
+        """
+            Convert this index into a nodes dict
+
+            @return: the nodes dict {node_id: {"p": parent_id,
+                                               "c": category,
+                                               "s": set(child_ids)}}
+        """
+
+        ids = self.ids
+        categories = self.categories
+
+        theset = {}
+        for i, parent in enumerate(self.parents):
+            node_id = ids[i]
+            if parent >= 0:
+                parent_id = ids[parent]
+                theset[parent_id]["s"].add(node_id)
+            else:
+                parent_id = None
+            theset[node_id] = {"p": parent_id, "c": categories[i], "s": set()}
+        return theset
+
+    # -------------------------------------------------------------------------
+    def children(self, i):
+        """
+            Get the positions of the child nodes of a node
+
+            @param i: the position of the node
+
+            @return: list of positions
+        """
+
+        right = self.right
+        children = []
+        last = right[i]
+        j = i + 1
+        while j <= last:
+            children.append(j)
+            j = right[j] + 1
+        return children
+
+
 # =============================================================================
 class S3Hierarchy(object):
     """ Class representing an object hierarchy """
@@ -460,9 +623,9 @@ class S3Hierarchy(object):
         self.filter = filter
         self.leafonly = leafonly
 
-        self.__theset = None
-        self.__flags = None
+        self.__hierarchy = None
 
+        self.__subset_pos = None
         self.__nodes = None
         self.__roots = None
 
@@ -484,22 +647,45 @@ class S3Hierarchy(object):
                              "c": <category>,
                              "s": set(child nodes)
                 }}
+
+            @note: this is generated from the index on demand, lookups
+                   should use the index instead where possible
         """
 
-        if self.__theset is None:
-            self.__connect()
+        hierarchy = self.__hierarchy
+        if hierarchy is None:
+            hierarchy = self.__connect()
+        if self.__status("dirty"):
+            self.read()
+        if hierarchy["nodes"] is None:
+            index = hierarchy["index"]
+            hierarchy["nodes"] = index.nodes() if index else {}
+        return hierarchy["nodes"]
+
+    # -------------------------------------------------------------------------
+    @property
+    def index(self):
+        """ The hierarchy as S3HierarchyIndex """
+
+        hierarchy = self.__hierarchy
+        if hierarchy is None:
+            hierarchy = self.__connect()
         if self.__status("dirty"):
             self.read()
-        return self.__theset
+        if hierarchy["index"] is None:
+            theset = self.theset
+            hierarchy["index"] = S3HierarchyIndex.from_nodes(theset)
+        return hierarchy["index"]
 
     # -------------------------------------------------------------------------
     @property
     def flags(self):
         """ Dict of status flags """
 
-        if self.__flags is None:
-            theset = self.theset
-        return self.__flags
+        hierarchy = self.__hierarchy
+        if hierarchy is None:
+            hierarchy = self.__connect()
+        return hierarchy["flags"]
 
     # -------------------------------------------------------------------------
     @property
@@ -517,19 +703,42 @@ class S3Hierarchy(object):
     # -------------------------------------------------------------------------
     @property
     def nodes(self):
-        """ The nodes in the subset """
+        """ The nodes in the subset (as nodes dict, see theset) """
 
-        theset = self.theset
+        index = self.index
         if self.__nodes is None:
-            self.__subset()
+            subset = self.subset
+            ids = index.ids
+            categories = index.categories
+
+            nodes = {}
+            for i in subset:
+                node = {"c": categories[i],
+                        "s": set(ids[j] for j in index.children(i)
+                                        if j in subset),
+                        }
+                parent = index.parents[i]
+                node["p"] = ids[parent] if parent >= 0 else None
+                nodes[ids[i]] = node
+            self.__nodes = nodes
         return self.__nodes
 
+    # -------------------------------------------------------------------------
+    @property
+    def subset(self):
+        """ The index positions of the nodes in the subset """
+
+        if self.__subset_pos is None:
+            self.__subset()
+        return self.__subset_pos
+
     # -------------------------------------------------------------------------
     @property
     def roots(self):
         """ The IDs of the root nodes in the subset """
 
-        nodes = self.nodes
+        if self.__roots is None:
+            self.__subset()
         return self.__roots
 
     # -------------------------------------------------------------------------
@@ -590,27 +799,66 @@ class S3Hierarchy(object):
         return self.__ckey
 
     # -------------------------------------------------------------------------
-    def __connect(self):
-        """ Connect this instance to the hierarchy """
+    def __connect(self, load=True):
+        """
+            Connect this instance to the hierarchy
+
+            @param load: try loading the hierarchy from s3_hierarchy
+                         if not yet connected
+
+            @return: the hierarchy dict {"nodes": nodes dict or None,
+                                         "index": S3HierarchyIndex or None,
+                                         "flags": status flags}
+        """
 
         tablename = self.tablename
         if tablename :
             hierarchies = current.model["hierarchies"]
             if tablename in hierarchies:
                 hierarchy = hierarchies[tablename]
-                self.__theset = hierarchy["nodes"]
-                self.__flags = hierarchy["flags"]
+                self.__hierarchy = hierarchy
             else:
-                self.__theset = dict()
-                self.__flags = dict()
-                self.load()
-                hierarchy = {"nodes": self.__theset,
-                             "flags": self.__flags}
+                hierarchy = {"nodes": None,
+                             "index": None,
+                             "flags": dict(),
+                             }
+                self.__hierarchy = hierarchy
+                if load:
+                    self.load()
                 hierarchies[tablename] = hierarchy
         else:
-            self.__theset = dict()
-            self.__flags = dict()
-        return
+            hierarchy = {"nodes": dict(),
+                         "index": None,
+                         "flags": dict(),
+                         }
+            self.__hierarchy = hierarchy
+        return hierarchy
+
+    # -------------------------------------------------------------------------
+    def __mutable(self):
+        """
+            Get the nodes dict for modification, invalidates the index
+
+            @return: the nodes dict
+        """
+
+        hierarchy = self.__hierarchy
+        if hierarchy is None:
+            hierarchy = self.__connect()
+
+        theset = hierarchy["nodes"]
+        if theset is None:
+            index = hierarchy["index"]
+            theset = index.nodes() if index else {}
+            hierarchy["nodes"] = theset
+        hierarchy["index"] = None
+
+        # Subset positions refer to the index
+        self.__subset_pos = None
+        self.__nodes = None
+        self.__roots = None
+
+        return theset
 
     # -------------------------------------------------------------------------
     def __status(self, flag=None, default=None, **attr):
@@ -652,19 +900,14 @@ class S3Hierarchy(object):
         query = (htable.tablename == tablename)
         row = current.db(query).select(htable.dirty,
                                        htable.hierarchy,
+                                       htable.version,
                                        limitby=(0, 1)).first()
-        if row and not row.dirty:
-            data = row.hierarchy
-            theset = self.__theset
-            theset.clear()
-            for node_id, item in data["nodes"].items():
-                theset[long(node_id)] = {"p": item["p"],
-                                         "c": item["c"],
-                                         "s": set(item["s"]) \
-                                              if item["s"] else set()}
+        if row and not row.dirty and row.hierarchy:
+            self.__restore(row.hierarchy)
             self.__status(dirty=False,
                           dbupdate=None,
-                          dbstatus=True)
+                          dbstatus=True,
+                          version=row.version or 0)
             return
         else:
             self.__status(dirty=True,
@@ -672,6 +915,34 @@ class S3Hierarchy(object):
                           dbstatus=False if row else None)
         return
 
+    # -------------------------------------------------------------------------
+    def __restore(self, data):
+        """
+            Restore the hierarchy from its stored form
+
+            @param data: the stored hierarchy (s3_hierarchy.hierarchy)
+        """
+
+        hierarchy = self.__hierarchy
+        if "ids" in data:
+            # Index arrays
+            hierarchy["index"] = S3HierarchyIndex.from_dict(data)
+            hierarchy["nodes"] = None
+        else:
+            # Legacy format (nodes dict)
+            theset = {}
+            for node_id, item in data["nodes"].items():
+                theset[long(node_id)] = {"p": item["p"],
+                                         "c": item["c"],
+                                         "s": set(item["s"]) \
+                                              if item["s"] else set()}
+            hierarchy["index"] = None
+            hierarchy["nodes"] = theset
+
+        self.__subset_pos = None
+        self.__nodes = None
+        self.__roots = None
+
     # -------------------------------------------------------------------------
     def save(self):
         """ Save this hierarchy in s3_hierarchy """
@@ -680,39 +951,49 @@ class S3Hierarchy(object):
             return
         tablename = self.tablename
 
-        theset = self.theset
+        index = self.index
         if not self.__status("dbupdate"):
             return
 
-        # Serialize the theset
-        nodes_dict = {}
-        for node_id, node in theset.items():
-            nodes_dict[node_id] = {"p": node["p"],
-                                   "c": node["c"],
-                                   "s": list(node["s"]) \
-                                        if node["s"] else []}
-
         # Generate record
         data = {"tablename": tablename,
                 "dirty": False,
-                "hierarchy": {"nodes": nodes_dict}
+                "hierarchy": index.as_dict(),
                 }
 
         # Get current entry
+        db = current.db
         htable = current.s3db.s3_hierarchy
         query = (htable.tablename == tablename)
-        row = current.db(query).select(htable.id,
-                                       limitby=(0, 1)).first()
+        row = db(query).select(htable.id,
+                               htable.version,
+                               limitby=(0, 1)).first()
 
         if row:
-            # Update record
-            row.update_record(**data)
+            # Update record, unless it has been changed since we read
+            # the hierarchy (=our copy is stale)
+            version = row.version or 0
+            if version == self.__status("version", 0):
+                query = (htable.id == row.id) & \
+                        (htable.version == row.version)
+                data["version"] = version = version + 1
+                if not db(query).update(**data):
+                    version = None
+            else:
+                version = None
+            if version is None:
+                self.__status(dbupdate=None)
+                return
         else:
             # Create new record
+            data["version"] = version = 1
             htable.insert(**data)
 
         # Update status
-        self.__status(dirty=False, dbupdate=None, dbstatus=True)
+        self.__status(dirty=False,
+                      dbupdate=None,
+                      dbstatus=True,
+                      version=version)
         return
 
     # -------------------------------------------------------------------------
@@ -739,8 +1020,10 @@ class S3Hierarchy(object):
             flags = hierarchy["flags"]
         else:
             flags = {}
-            hierarchies[tablename] = {"nodes": dict(),
-                                      "flags": flags}
+            hierarchies[tablename] = {"nodes": None,
+                                      "index": None,
+                                      "flags": flags,
+                                      }
         flags["dirty"] = True
 
         dbstatus = flags.get("dbstatus", True)
@@ -749,11 +1032,12 @@ class S3Hierarchy(object):
             query = (htable.tablename == tablename)
             row = current.db(query).select(htable.id,
                                            htable.dirty,
+                                           htable.version,
                                            limitby=(0, 1)).first()
             if not row:
-                htable.insert(tablename=tablename, dirty=True)
+                htable.insert(tablename=tablename, dirty=True, version=1)
             elif not row.dirty:
-                row.update_record(dirty=True)
+                row.update_record(dirty=True, version=(row.version or 0) + 1)
             flags["dbstatus"] = False
         return
 
@@ -776,13 +1060,25 @@ class S3Hierarchy(object):
         if ckey is not None:
             fields.append(table[ckey])
 
+        db = current.db
+
+        # Version of the stored hierarchy before reading the table
+        htable = s3db.s3_hierarchy
+        query = (htable.tablename == tablename)
+        row = db(query).select(htable.version, limitby=(0, 1)).first()
+        version = (row.version or 0) if row else 0
+
         if "deleted" in table:
             query = (table.deleted != True)
         else:
             query = (table.id > 0)
-        rows = current.db(query).select(left = self.left, *fields)
+        rows = db(query).select(left = self.left, *fields)
 
-        self.__theset.clear()
+        hierarchy = self.__hierarchy
+        if hierarchy is None:
+            hierarchy = self.__connect()
+        hierarchy["nodes"] = {}
+        hierarchy["index"] = None
 
         add = self.add
         cfield = table[ckey]
@@ -796,12 +1092,20 @@ class S3Hierarchy(object):
             add(n, parent_id=p, category=c)
 
         # Update status: memory is clean, db needs update
-        self.__status(dirty=False, dbupdate=True)
+        self.__status(dirty=False, dbupdate=True, version=version)
 
         # Remove subset
+        self.__subset_pos = None
         self.__roots = None
         self.__nodes = None
 
+        # Store the hierarchy, so that subsequent requests need not
+        # rebuild it (except link table hierarchies, since link table
+        # updates are not tracked by update_nodes)
+        if self.link is None and \
+           current.deployment_settings.get_base_hierarchy_store():
+            self.save()
+
         return
 
     # -------------------------------------------------------------------------
@@ -1010,6 +1314,8 @@ class S3Hierarchy(object):
                 if result is None:
                     if not cascade:
                         current.db.rollback()
+                        # Re-read the hierarchy after rollback
+                        self.__status(dirty=True)
                     return None
                 else:
                     total += result
@@ -1025,11 +1331,10 @@ class S3Hierarchy(object):
             else:
                 if not cascade:
                     current.db.rollback()
+                    # Re-read the hierarchy after rollback
+                    self.__status(dirty=True)
                 return None
 
-        if not cascade and total:
-            self.dirty(tablename)
-
         return total
 
     # -------------------------------------------------------------------------
@@ -1042,12 +1347,16 @@ class S3Hierarchy(object):
             @param category: the category
         """
 
-        theset = self.__theset
+        theset = self.__mutable()
 
         if node_id in theset:
             node = theset[node_id]
             if category is not None:
                 node["c"] = category
+            previous = node["p"]
+            if previous and previous != parent_id and previous in theset:
+                # Node has been moved
+                theset[previous]["s"].discard(node_id)
         elif node_id:
             node = {"s": set(), "c": category}
         else:
@@ -1072,7 +1381,7 @@ class S3Hierarchy(object):
             @param node_id: the node ID
         """
 
-        theset = self.__theset
+        theset = self.__mutable()
 
         if node_id in theset:
             node = theset[node_id]
@@ -1086,14 +1395,181 @@ class S3Hierarchy(object):
         del theset[node_id]
         return True
 
+    # -------------------------------------------------------------------------
+    @classmethod
+    def update_nodes(cls, tablename, record_ids):
+        """
+            Update the stored hierarchy after records in the hierarchical
+            table have been created or updated (onaccept hook)
+
+            @param tablename: the tablename
+            @param record_ids: the record ID(s)
+        """
+
+        s3db = current.s3db
+
+        if not tablename or not s3db.get_config(tablename, "hierarchy"):
+            return
+
+        if not isinstance(record_ids, (list, tuple, set)):
+            record_ids = [record_ids]
+        record_ids = [record_id for record_id in record_ids if record_id]
+        if not record_ids:
+            return
+
+        h = cls(tablename)
+        if not h.config or h.link is not None:
+            # Link table hierarchies are never stored (see apply)
+            return
+        table = s3db[tablename]
+
+        pkey = h.pkey
+        fkey = h.fkey
+        ckey = h.ckey
+
+        fields = [table._id, pkey, fkey]
+        if ckey:
+            cfield = table[ckey]
+            fields.append(cfield)
+        deleted = "deleted" in table.fields
+        if deleted:
+            fields.append(table.deleted)
+
+        query = table._id.belongs(record_ids)
+        rows = current.db(query).select(left = h.left, *fields)
+
+        add, remove = [], []
+        for row in rows:
+            node_id = row[pkey]
+            if deleted and row[table.deleted]:
+                remove.append(node_id)
+            else:
+                category = row[cfield] if ckey else None
+                add.append((node_id, row[fkey], category))
+
+        h.apply(add=add, remove=remove)
+
+    # -------------------------------------------------------------------------
+    @classmethod
+    def delete_nodes(cls, tablename, record_ids):
+        """
+            Update the stored hierarchy after records in the hierarchical
+            table have been deleted (ondelete hook)
+
+            @param tablename: the tablename
+            @param record_ids: the record ID(s)
+        """
+
+        s3db = current.s3db
+
+        if not tablename or not s3db.get_config(tablename, "hierarchy"):
+            return
+
+        if not isinstance(record_ids, (list, tuple, set)):
+            record_ids = [record_ids]
+        if not record_ids:
+            return
+
+        h = cls(tablename)
+        if not h.config or h.link is not None:
+            # Link table hierarchies are never stored (see apply)
+            return
+        table = s3db[tablename]
+
+        pkey = h.pkey
+        if pkey.name == table._id.name:
+            node_ids = record_ids
+        else:
+            # Look up the node IDs (only possible if records are
+            # archived rather than removed)
+            query = table._id.belongs(record_ids)
+            rows = current.db(query).select(pkey)
+            node_ids = [row[pkey] for row in rows]
+            if len(node_ids) != len(record_ids):
+                cls.dirty(tablename)
+                return
+
+        h.apply(remove=node_ids)
+
+    # -------------------------------------------------------------------------
+    def apply(self, add=None, remove=None):
+        """
+            Apply node changes to the stored hierarchy, rather than
+            marking it dirty (=which would require a full rebuild)
+
+            @param add: list of tuples (node_id, parent_id, category)
+                        for new or updated nodes
+            @param remove: list of node IDs to remove
+
+            @note: the stored hierarchy is locked for the update by
+                   incrementing its version counter first (the row lock
+                   is held until the end of the transaction), so that
+                   concurrent updates are applied in sequence; copies
+                   read before a change are never saved (see save)
+        """
+
+        if not self.config or self.link is not None:
+            return
+        tablename = self.tablename
+
+        db = current.db
+        htable = current.s3db.s3_hierarchy
+
+        query = (htable.tablename == tablename)
+        row = db(query).select(htable.id,
+                               htable.version,
+                               limitby = (0, 1),
+                               ).first()
+        if not row:
+            # Not stored yet (=will be built by the next reader)
+            return
+
+        # Lock the stored hierarchy
+        version = (row.version or 0) + 1
+        query = (htable.id == row.id)
+        db(query).update(version=version)
+        row = db(query).select(htable.id,
+                               htable.dirty,
+                               htable.hierarchy,
+                               limitby = (0, 1),
+                               ).first()
+
+        if self.__hierarchy is None:
+            self.__connect(load=False)
+
+        if row.dirty or not row.hierarchy:
+            # Needs a full rebuild anyway
+            self.__status(dirty=True, dbstatus=False)
+            return
+
+        # Apply the changes to the stored hierarchy
+        self.__restore(row.hierarchy)
+        self.__status(dirty=False,
+                      dbupdate=None,
+                      dbstatus=True,
+                      version=version)
+        if remove:
+            for node_id in remove:
+                self.remove(node_id)
+        if add:
+            for node_id, parent_id, category in add:
+                node = self.add(node_id, parent_id=parent_id)
+                node["c"] = category
+
+        db(query).update(hierarchy = self.index.as_dict(),
+                         dirty = False,
+                         )
+
     # -------------------------------------------------------------------------
     def __subset(self):
         """ Generate the subset of accessible nodes which match the filter """
 
-        theset = self.theset
+        index = self.index
+        pos = index.pos
+        parents = index.parents
+        right = index.right
 
-        roots = set()
-        subset = {}
+        subset = set()
 
         resource = current.s3db.resource(self.tablename,
                                          filter = self.filter)
@@ -1103,41 +1579,40 @@ class S3Hierarchy(object):
 
         if rows:
             key = str(pkey)
-            if self.leafonly:
-                # Select matching leaf nodes
-                ids = set()
-                for row in rows:
-                    node_id = row[key]
-                    if node_id in theset and not theset[node_id]["s"]:
-                        ids.add(node_id)
-            else:
-                # Select all matching nodes
-                ids = set(row[key] for row in rows)
-
-            # Resolve the paths
-            while ids:
-                node_id = ids.pop()
-                if node_id in subset:
+            leafonly = self.leafonly
+            for row in rows:
+                i = pos.get(row[key])
+                if i is None:
                     continue
-                node = theset.get(node_id)
-                if not node:
+                if leafonly and right[i] != i:
+                    # Not a leaf node
                     continue
-                parent_id = node["p"]
-                if parent_id and parent_id not in subset:
-                    ids.add(parent_id)
-                elif not parent_id:
-                    roots.add(node_id)
-                subset[node_id] = dict(node)
-
-            # Update the descendants
-            for node in subset.values():
-                node["s"] = set(node_id for node_id in node["s"]
-                                        if node_id in subset)
-
-        self.__roots = roots
-        self.__nodes = subset
+                # Resolve the path
+                while i >= 0 and i not in subset:
+                    subset.add(i)
+                    i = parents[i]
+
+        ids = index.ids
+        self.__roots = set(ids[i] for i in subset if parents[i] < 0)
+        self.__subset_pos = subset
+        self.__nodes = None
         return
 
+    # -------------------------------------------------------------------------
+    def __position(self, node_id):
+        """
+            Get the index position of a node in the subset
+
+            @param node_id: the node ID
+
+            @return: the position, or None if the node is not in the subset
+        """
+
+        i = self.index.pos.get(node_id)
+        if i is None or i not in self.subset:
+            return None
+        return i
+
     # -------------------------------------------------------------------------
     def category(self, node_id):
         """
@@ -1148,11 +1623,11 @@ class S3Hierarchy(object):
             @return: the node category
         """
 
-        node = self.nodes.get(node_id)
-        if not node:
+        i = self.__position(node_id)
+        if i is None:
             return None
         else:
-            return node["c"]
+            return self.index.categories[i]
 
     # -------------------------------------------------------------------------
     def parent(self, node_id, classify=False):
@@ -1166,24 +1641,19 @@ class S3Hierarchy(object):
             @return: the root node ID (or tuple (id, category), respectively)
         """
 
-        nodes = self.nodes
-
         default = (None, None) if classify else None
 
-        node = nodes.get(node_id)
-        if not node:
-            return default
-
-        parent_id = node["p"]
-        if not parent_id:
+        i = self.__position(node_id)
+        if i is None:
             return default
 
-        parent_node = nodes.get(parent_id)
-        if not parent_node:
+        index = self.index
+        p = index.parents[i]
+        if p < 0 or p not in self.subset:
             return default
 
-        parent_category = parent_node["c"]
-        return (parent_id, parent_category) if classify else parent_id
+        parent_id = index.ids[p]
+        return (parent_id, index.categories[p]) if classify else parent_id
 
     # -------------------------------------------------------------------------
     def children(self, node_id, category=DEFAULT, classify=False):
@@ -1198,26 +1668,23 @@ class S3Hierarchy(object):
             @return: the child nodes as Python set
         """
 
-        nodes = self.nodes
-        default = set()
+        children = set()
 
-        node = nodes.get(node_id)
-        if not node:
-            return default
+        i = self.__position(node_id)
+        if i is None:
+            return children
 
-        child_ids = node["s"]
-        if not child_ids:
-            return default
+        index = self.index
+        ids = index.ids
+        categories = index.categories
+        subset = self.subset
 
-        children = set()
-        for child_id in child_ids:
-            child_node = nodes.get(child_id)
-            if not child_node:
+        for j in index.children(i):
+            if j not in subset:
                 continue
-            child_category = child_node["c"]
-            child = (child_id, child_category) if classify else child_id
+            child_category = categories[j]
             if category is DEFAULT or category == child_category:
-                children.add(child)
+                children.add((ids[j], child_category) if classify else ids[j])
         return children
 
     # -------------------------------------------------------------------------
@@ -1233,19 +1700,23 @@ class S3Hierarchy(object):
             @return: the path as list, starting at the root node
         """
 
-        nodes = self.nodes
-
-        node = nodes.get(node_id)
-        if not node:
+        i = self.__position(node_id)
+        if i is None:
             return []
-        this = (node_id, node["c"]) if classify else node_id
-        if category is not DEFAULT and node["c"] == category:
-            return [this]
-        parent_id = node["p"]
-        if not parent_id:
-            return [this]
-        path = self.path(parent_id, category=category, classify=classify)
-        path.append(this)
+
+        index = self.index
+        ids = index.ids
+        parents = index.parents
+        categories = index.categories
+
+        path = []
+        while i >= 0:
+            c = categories[i]
+            path.append((ids[i], c) if classify else ids[i])
+            if category is not DEFAULT and c == category:
+                break
+            i = parents[i]
+        path.reverse()
         return path
 
     # -------------------------------------------------------------------------
@@ -1263,19 +1734,29 @@ class S3Hierarchy(object):
             @return: the root node ID (or tuple (id, category), respectively)
         """
 
-        nodes = self.nodes
         default = (None, None) if classify else None
 
-        node = nodes.get(node_id)
-        if not node:
+        i = self.__position(node_id)
+        if i is None:
             return default
-        this = (node_id, node["c"]) if classify else node_id
-        if category is not DEFAULT and node["c"] == category:
-            return this
-        parent_id = node["p"]
-        if not parent_id:
-            return this if category is DEFAULT else default
-        return self.root(parent_id, category=category, classify=classify)
+
+        index = self.index
+        parents = index.parents
+        categories = index.categories
+
+        while True:
+            c = categories[i]
+            if category is not DEFAULT and c == category:
+                break
+            p = parents[i]
+            if p < 0:
+                if category is not DEFAULT:
+                    return default
+                break
+            i = p
+
+        node_id = index.ids[i]
+        return (node_id, categories[i]) if classify else node_id
 
     # -------------------------------------------------------------------------
     def depth(self, node_id, level=0):
@@ -1285,20 +1766,21 @@ class S3Hierarchy(object):
             @param node_id: the start node (default to all root nodes)
         """
 
-        nodes = self.nodes
-        depth = self.depth
+        index = self.index
+        levels = index.levels
+        subset = self.subset
 
-        node = nodes.get(node_id)
-        if not node:
-            roots = self.roots
-            result = max(depth(root) for root in roots)
-        else:
-            children = node["s"]
-            if children:
-                result = max(depth(n, level=level+1) for n in children)
-            else:
-                result = level
-        return result
+        i = self.__position(node_id)
+        if i is None:
+            return max(levels[j] for j in subset)
+
+        # All descendants are within the nested-set interval of the node
+        base = levels[i]
+        result = 0
+        for j in xrange(i + 1, index.right[i] + 1):
+            if j in subset:
+                result = max(result, levels[j] - base)
+        return level + result
 
     # -------------------------------------------------------------------------
     def siblings(self,
@@ -1321,30 +1803,30 @@ class S3Hierarchy(object):
         """
 
         result = set()
-        nodes = self.nodes
 
-        node = nodes.get(node_id)
-        if not node:
+        i = self.__position(node_id)
+        if i is None:
             return result
 
-        parent_id = node["p"]
-        if not parent_id:
-            siblings = [(k, nodes[k]) for k in self.roots]
+        index = self.index
+        ids = index.ids
+        categories = index.categories
+        subset = self.subset
+
+        p = index.parents[i]
+        if p < 0:
+            pos = index.pos
+            siblings = [pos[k] for k in self.roots]
         else:
-            parent = nodes[parent_id]
-            if parent["s"]:
-                siblings = [(k, nodes[k]) for k in parent["s"]]
-            else:
-                siblings = []
+            siblings = [j for j in index.children(p) if j in subset]
 
         add = result.add
-        for sibling_id, sibling_node in siblings:
-            if not inclusive and sibling_id == node_id:
+        for j in siblings:
+            if not inclusive and j == i:
                 continue
-            if category is DEFAULT or category == sibling_node["c"]:
-                sibling = (sibling_id, sibling_node["c"]) \
-                          if classify else sibling_id
-                add(sibling)
+            c = categories[j]
+            if category is DEFAULT or category == c:
+                add((ids[j], c) if classify else ids[j])
         return result
 
     # -------------------------------------------------------------------------
@@ -1366,29 +1848,31 @@ class S3Hierarchy(object):
         """
 
         result = set()
-        findall = self.findall
-        if isinstance(node_id, (set, list, tuple)):
-            for n in node_id:
-                if n is None:
+        if not isinstance(node_id, (set, list, tuple)):
+            node_id = [node_id]
+
+        index = self.index
+        ids = index.ids
+        right = index.right
+        categories = index.categories
+        subset = self.subset
+
+        add = result.add
+        position = self.__position
+        for n in node_id:
+            if n is None:
+                continue
+            i = position(n)
+            if i is None:
+                continue
+            # All descendants are within the nested-set interval of the node
+            start = i if inclusive else i + 1
+            for j in xrange(start, right[i] + 1):
+                if j not in subset:
                     continue
-                result |= findall(n,
-                                  category=category,
-                                  classify=classify,
-                                  inclusive=inclusive)
-            return result
-        nodes = self.nodes
-        node = nodes.get(node_id)
-        if not node:
-            return result
-        if node["s"]:
-            result |= findall(node["s"],
-                              category=category,
-                              classify=classify,
-                              inclusive=True)
-        if inclusive:
-            this = (node_id, node["c"]) if classify else node_id
-            if category is DEFAULT or category == node["c"]:
-                result.add(this)
+                c = categories[j]
+                if category is DEFAULT or category == c:
+                    add((ids[j], c) if classify else ids[j])
         return result
 
     # -------------------------------------------------------------------------
@@ -57,6 +57,7 @@ from gluon.tools import callback, fetch
 
 from s3compat import basestring, pickle, urllib2, urlopen, BytesIO, StringIO, HTTPError, URLError
 from s3dal import Field
+from .s3aaa import S3DeferredUpdates
 from .s3datetime import s3_utc
 from .s3rest import S3Method, S3Request
 from .s3resource import S3Resource
@@ -2574,6 +2575,9 @@ class S3ImportItem(object):
             if modified_on_update is not None:
                 modified_on.update = modified_on_update
 
+            # Update indexes, invalidate caches
+            s3db.invalidate_caches(tablename, self.id)
+
         # Update referencing items
         if self.update and self.id:
             for u in self.update:
@@ -3639,43 +3643,45 @@ class S3ImportJob():
 
         self.log = log_items
         failed = False
-        for item_id in import_list:
-            item = items[item_id]
-            error = None
-
-            if item.accepted is not False:
-                logged = False
-                success = item.commit(ignore_errors=ignore_errors)
-            else:
-                # Field validation failed
-                logged = True
-                success = ignore_errors
-
-            if not success:
-                failed = True
-
-            error = item.error
-            if error:
-                current.log.error(error)
-                self.error = error
-                element = item.element
-                if element is not None:
-                    if not element.get(ATTRIBUTE.error, False):
-                        element.set(ATTRIBUTE.error, s3_unicode(self.error))
-                    if not logged:
-                        self.error_tree.append(deepcopy(element))
-
-            elif item.tablename == tablename:
-                count += 1
-                if mtime is None or item.mtime > mtime:
-                    mtime = item.mtime
-                if item.id:
-                    if item.method == METHOD.CREATE:
-                        cappend(item.id)
-                    elif item.method == METHOD.UPDATE:
-                        updated.append(item.id)
-                    elif item.method in (METHOD.MERGE, METHOD.DELETE):
-                        deleted.append(item.id)
+        # Affiliations and realms are updated once after all items
+        with S3DeferredUpdates():
+            for item_id in import_list:
+                item = items[item_id]
+                error = None
+
+                if item.accepted is not False:
+                    logged = False
+                    success = item.commit(ignore_errors=ignore_errors)
+                else:
+                    # Field validation failed
+                    logged = True
+                    success = ignore_errors
+
+                if not success:
+                    failed = True
+
+                error = item.error
+                if error:
+                    current.log.error(error)
+                    self.error = error
+                    element = item.element
+                    if element is not None:
+                        if not element.get(ATTRIBUTE.error, False):
+                            element.set(ATTRIBUTE.error, s3_unicode(self.error))
+                        if not logged:
+                            self.error_tree.append(deepcopy(element))
+
+                elif item.tablename == tablename:
+                    count += 1
+                    if mtime is None or item.mtime > mtime:
+                        mtime = item.mtime
+                    if item.id:
+                        if item.method == METHOD.CREATE:
+                            cappend(item.id)
+                        elif item.method == METHOD.UPDATE:
+                            updated.append(item.id)
+                        elif item.method in (METHOD.MERGE, METHOD.DELETE):
+                            deleted.append(item.id)
 
         if failed:
             return False
@@ -4440,15 +4446,17 @@ class S3BulkImporter(object):
             fun = task[1]
             filepath = task[2]
             extraArgs = task[3]
-            if filepath is None:
-                if extraArgs is None:
-                    error = s3[fun]()
+            # Update affiliations and realms once after the task
+            with S3DeferredUpdates():
+                if filepath is None:
+                    if extraArgs is None:
+                        error = s3[fun]()
+                    else:
+                        error = s3[fun](*extraArgs)
+                elif extraArgs is None:
+                    error = s3[fun](filepath)
                 else:
-                    error = s3[fun](*extraArgs)
-            elif extraArgs is None:
-                error = s3[fun](filepath)
-            else:
-                error = s3[fun](filepath, *extraArgs)
+                    error = s3[fun](filepath, *extraArgs)
             if error:
                 self.errorList.append(error)
             end = datetime.datetime.now()
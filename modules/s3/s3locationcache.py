@@ -0,0 +1,423 @@
+# -*- coding: utf-8 -*-
+
+""" S3 Location Option Cache
+
+    @copyright: 2020 (c) Sahana Software Foundation
+    @license: MIT
+
+    @requires: U{B{I{gluon}} <http://web2py.com>}
+
+    Permission is hereby granted, free of charge, to any person
+    obtaining a copy of this software and associated documentation
+    files (the "Software"), to deal in the Software without
+    restriction, including without limitation the rights to use,
+    copy, modify, merge, publish, distribute, sublicense, and/or sell
+    copies of the Software, and to permit persons to whom the
+    Software is furnished to do so, subject to the following
+    conditions:
+
+    The above copyright notice and this permission notice shall be
+    included in all copies or substantial portions of the Software.
+
+    THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+    EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES
+    OF MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+    NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT
+    HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY,
+    WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+    FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR
+    OTHER DEALINGS IN THE SOFTWARE.
+"""
+
+__all__ = ("S3LocationCache",
+           )
+
+import os
+import shutil
+import uuid
+
+from gluon import current
+
+from s3dal import Table, original_tablename
+
+TABLENAME = "gis_location_facet"
+
+# Name of the version for the location hierarchy
+HIERARCHY = "hierarchy"
+
+# All Lx levels
+LEVELS = ("L0", "L1", "L2", "L3", "L4", "L5")
+
+# =============================================================================
+class S3LocationCache(object):
+    """
+        Precomputed location options, shared between all worker processes:
+
+            - location facets (gis_location_facet): the Lx locations in
+              use by a location reference in a table, for the options of
+              S3LocationFilter (see lx_ancestors)
+            - the JSON responses of gis/ldata and gis/hdata for the
+              S3LocationSelector, stored per L0:
+
+              <folder>/cache/locations/hierarchy/<L0 ID>/<version>/<key>.json
+
+        Facets and JSON files are versioned like the tile cache:
+
+            <folder>/cache/locations/<tablename>/VERSION
+            <folder>/cache/locations/hierarchy/VERSION
+            <folder>/cache/locations/hierarchy/<L0 ID>/VERSION
+
+        The table version is bumped after records in the table have been
+        written or deleted (see invalidate), the hierarchy version and the
+        version of the L0 after Lx locations have changed (see
+        invalidate_hierarchy), and the version of the L0 after the names
+        of its locations have changed (see expire). Outdated facets are
+        refreshed with the next lookup, per table.
+
+        All versions must be bumped after commit (see S3Model.after_commit),
+        so that concurrent requests can not store data read before the
+        commit under the new version.
+    """
+
+    # -------------------------------------------------------------------------
+    @staticmethod
+    def path(*parts):
+        """
+            Get a path inside the location cache
+
+            @param parts: the path elements below the cache folder
+        """
+
+        return os.path.join(current.request.folder, "cache", "locations", *parts)
+
+    # -------------------------------------------------------------------------
+    @classmethod
+    def version(cls, *name):
+        """
+            Get the current version of the cached options for a table
+
+            @param name: the table name, or HIERARCHY (and the L0 ID)
+
+            @return: the version number
+        """
+
+        name = [str(part) for part in name]
+        try:
+            with open(cls.path(*(name + ["VERSION"])), "r") as f:
+                version = int(f.read().strip() or 0)
+        except (IOError, OSError, ValueError):
+            version = 0
+        return version
+
+    # -------------------------------------------------------------------------
+    @classmethod
+    def _bump(cls, *name):
+        """
+            Bump the version of the cached options for a table
+
+            @param name: the table name, or HIERARCHY (and the L0 ID)
+
+            @return: the new version number
+        """
+
+        name = [str(part) for part in name]
+        folder = cls.path(*name)
+        version = cls.version(*name) + 1
+        try:
+            if not os.path.isdir(folder):
+                os.makedirs(folder)
+            with open(os.path.join(folder, "VERSION"), "w") as f:
+                f.write(str(version))
+        except (IOError, OSError):
+            current.log.error("Could not invalidate location cache for %s" % "/".join(name))
+        return version
+
+    # -------------------------------------------------------------------------
+    @classmethod
+    def invalidate(cls, tablename):
+        """
+            Invalidate the location facets of a table, to be called after
+            records in the table have been written or deleted (see
+            S3Model.invalidate_caches)
+
+            @param tablename: the table name (or Table)
+        """
+
+        tablename = original_tablename(tablename) \
+                    if isinstance(tablename, Table) else str(tablename)
+
+        if os.path.isdir(cls.path(tablename)):
+            cls._bump(tablename)
+
+    # -------------------------------------------------------------------------
+    @classmethod
+    def invalidate_hierarchy(cls, location_id=None):
+        """
+            Invalidate all location facets, and the JSON files for the
+            L0 of a location, to be called after Lx locations have been
+            written or deleted
+
+            @param location_id: the Lx location ID (None for all L0s,
+                                e.g. after bulk imports)
+        """
+
+        cls._bump(HIERARCHY)
+
+        if location_id:
+            l0 = cls.l0(location_id)
+            if l0:
+                cls.expire(l0)
+        else:
+            cls.expire()
+
+    # -------------------------------------------------------------------------
+    # Location facets
+    # -------------------------------------------------------------------------
+    @classmethod
+    def lx_ancestors(cls, tablename, fieldname):
+        """
+            Look up the immediate Lx ancestors of all locations referenced
+            by a field, with the same result as S3LocationFilter.get_lx_ancestors
+            for all Lx levels
+
+            @param tablename: the table name
+            @param fieldname: the name of the location reference field
+
+            @return: gis_location Rows (id, L0-L5, path)
+        """
+
+        db = current.db
+        s3db = current.s3db
+
+        version = "%s:%s" % (cls.version(tablename), cls.version(HIERARCHY))
+
+        ftable = s3db.table(TABLENAME)
+        query = (ftable.tablename == tablename) & \
+                (ftable.fieldname == fieldname)
+        row = db(query).select(ftable.version,
+                               limitby = (0, 1),
+                               ).first()
+        if not row or row.version != version:
+            cls.refresh(tablename, fieldname, version)
+
+        gtable = s3db.gis_location
+        query &= (ftable.location_id == gtable.id) & \
+                 (gtable.deleted == False)
+        fields = [gtable.id] + [gtable[level] for level in LEVELS]
+        fields.append(gtable.path)
+
+        # Suppress instantiation of LazySets in rows (we don't need them)
+        rname = db._referee_name
+        db._referee_name = None
+
+        # Concurrent refreshes can produce duplicate facet entries
+        rows = db(query).select(groupby = gtable.id, *fields)
+
+        # Restore referee name
+        db._referee_name = rname
+
+        return rows
+
+    # -------------------------------------------------------------------------
+    @classmethod
+    def refresh(cls, tablename, fieldname, version=None):
+        """
+            Refresh the location facet for a field
+
+            @param tablename: the table name
+            @param fieldname: the name of the location reference field
+            @param version: the version to store the facet for
+        """
+
+        from .s3filter import S3LocationFilter
+
+        db = current.db
+        s3db = current.s3db
+
+        if version is None:
+            version = "%s:%s" % (cls.version(tablename), cls.version(HIERARCHY))
+
+        # Make sure writes to the table invalidate the facet
+        if not os.path.isdir(cls.path(tablename)):
+            cls._bump(tablename)
+            version = "%s:%s" % (cls.version(tablename), cls.version(HIERARCHY))
+
+        # Locations in use (same filters as S3LocationFilter)
+        table = s3db.table(tablename)
+        field = table[fieldname]
+        gtable = s3db.gis_location
+        query = (field == gtable.id) & \
+                (gtable.end_date == None)
+        if "deleted" in table.fields:
+            query &= (table.deleted == False)
+        rows = db(query).select(field, groupby=field)
+        location_ids = [row[field] for row in rows]
+
+        # Their immediate Lx ancestors
+        if location_ids:
+            rows = S3LocationFilter.get_lx_ancestors(LEVELS,
+                                                     None,
+                                                     location_ids = location_ids,
+                                                     )
+            lx_ids = set(row.id for row in rows)
+        else:
+            lx_ids = set()
+
+        # Replace the facet
+        ftable = s3db.table(TABLENAME)
+        db((ftable.tablename == tablename) & \
+           (ftable.fieldname == fieldname)).delete()
+        entries = [{"tablename": tablename,
+                    "fieldname": fieldname,
+                    "location_id": lx_id,
+                    "version": version,
+                    } for lx_id in lx_ids]
+        # Marker for the facet version (also if there are no locations)
+        entries.append({"tablename": tablename,
+                        "fieldname": fieldname,
+                        "location_id": None,
+                        "version": version,
+                        })
+        ftable.bulk_insert(entries)
+
+    # -------------------------------------------------------------------------
+    # JSON files for the location selector
+    # -------------------------------------------------------------------------
+    @staticmethod
+    def l0(location_id):
+        """
+            Get the L0 ancestor of a location
+
+            @param location_id: the location ID
+
+            @return: the L0 location ID, or None if not known
+        """
+
+        table = current.s3db.gis_location
+        row = current.db(table.id == location_id).select(table.level,
+                                                         table.parent,
+                                                         table.path,
+                                                         limitby = (0, 1),
+                                                         ).first()
+        if not row:
+            return None
+        if row.level == "L0":
+            return int(location_id)
+
+        path = row.path
+        if not path and row.parent:
+            # Path not yet built => use the parent's path
+            parent = current.db(table.id == row.parent).select(table.path,
+                                                               limitby = (0, 1),
+                                                               ).first()
+            path = parent.path if parent else None
+
+        if path:
+            l0 = path.split("/", 1)[0]
+            if l0.isdigit():
+                return int(l0)
+        return None
+
+    # -------------------------------------------------------------------------
+    @classmethod
+    def get(cls, l0, version, key):
+        """
+            Look up a cached JSON response
+
+            @param l0: the L0 location ID
+            @param version: the version of the L0 (see version)
+            @param key: the cache key
+
+            @return: the JSON (string), or None if not cached
+        """
+
+        path = cls.path(HIERARCHY, str(l0), str(version), "%s.json" % key)
+        try:
+            with open(path, "r") as f:
+                output = f.read()
+        except (IOError, OSError):
+            output = None
+        return output
+
+    # -------------------------------------------------------------------------
+    @classmethod
+    def store(cls, l0, version, key, output):
+        """
+            Store a JSON response in the cache
+
+            @param l0: the L0 location ID
+            @param version: the version of the L0 the response has
+                            been produced for (i.e. looked up before
+                            reading the data)
+            @param key: the cache key
+            @param output: the JSON (string)
+        """
+
+        folder = cls.path(HIERARCHY, str(l0), str(version))
+        path = os.path.join(folder, "%s.json" % key)
+
+        # Write to a temporary file first, so that concurrent
+        # requests never read an incomplete file
+        tmp = "%s.%s" % (path, uuid.uuid4().hex)
+        try:
+            if not os.path.isdir(folder):
+                os.makedirs(folder)
+            with open(tmp, "w") as f:
+                f.write(output)
+            os.rename(tmp, path)
+        except (IOError, OSError):
+            # Folder not writable
+            try:
+                os.remove(tmp)
+            except OSError:
+                pass
+
+    # -------------------------------------------------------------------------
+    @classmethod
+    def expire(cls, l0=None):
+        """
+            Expire the cached JSON responses for an L0, to be called
+            after commit (see S3Model.after_commit)
+
+            @param l0: the L0 location ID (None for all L0s)
+        """
+
+        if l0:
+            names = [str(l0)]
+        else:
+            try:
+                names = os.listdir(cls.path(HIERARCHY))
+            except OSError:
+                names = []
+
+        for name in names:
+            if not name.isdigit():
+                continue
+            version = cls._bump(HIERARCHY, name)
+
+            # Remove the outdated responses
+            folder = cls.path(HIERARCHY, name)
+            try:
+                subfolders = os.listdir(folder)
+            except OSError:
+                continue
+            for subfolder in subfolders:
+                if subfolder.isdigit() and int(subfolder) != version:
+                    shutil.rmtree(os.path.join(folder, subfolder),
+                                  ignore_errors = True,
+                                  )
+
+    # -------------------------------------------------------------------------
+    @classmethod
+    def clear(cls):
+        """
+            Remove all location facets and cached JSON responses
+        """
+
+        db = current.db
+        table = current.s3db.table(TABLENAME)
+        db(table.id > 0).delete()
+
+        shutil.rmtree(cls.path(), ignore_errors=True)
+
+# END =========================================================================
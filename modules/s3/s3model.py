@@ -31,6 +31,8 @@ __all__ = ("S3Model",
            #"S3DynamicModel",
            )
 
+import sys
+
 from collections import OrderedDict
 
 from gluon import current, IS_EMPTY_OR, IS_FLOAT_IN_RANGE, IS_INT_IN_RANGE, \
@@ -39,9 +41,13 @@ from gluon.storage import Storage
 from gluon.tools import callback
 
 from s3dal import Table, Field, original_tablename
+from .s3fields import S3RepresentCache
+from .s3locationcache import S3LocationCache
 from .s3navigation import S3ScriptItem
-from .s3resource import S3Resource
+from .s3resource import S3Resource, S3ResourceDataCache
+from .s3textsearch import S3TextSearch
 from .s3validators import IS_ONE_OF, IS_JSONS3
+from .s3vectortiles import S3TileCache
 from .s3widgets import s3_comments_widget, s3_richtext_widget
 
 DYNAMIC_PREFIX = "s3dt"
@@ -86,6 +92,7 @@ class S3Model(object):
                              "methods": {},
                              "cmethods": {},
                              "hierarchies": {},
+                             "selectors": {},
                              }
 
         response = current.response
@@ -482,6 +489,10 @@ class S3Model(object):
         if tn not in config:
             config[tn] = {}
         config[tn].update(attr)
+
+        if "context" in attr:
+            # Context expressions in selectors may change
+            cls.clear_selector_cache()
         return
 
     # -------------------------------------------------------------------------
@@ -523,6 +534,20 @@ class S3Model(object):
                 for k in keys:
                     table_config.pop(k, None)
 
+            if not keys or "context" in keys:
+                cls.clear_selector_cache()
+
+    # -------------------------------------------------------------------------
+    @staticmethod
+    def clear_selector_cache():
+        """
+            Invalidate the selector resolution cache (see S3FieldPath),
+            to be called whenever the component graph or the context
+            configuration of a table changes
+        """
+
+        current.model["selectors"] = {}
+
     # -------------------------------------------------------------------------
     @classmethod
     def add_custom_callback(cls, tablename, hook, cb, method=None):
@@ -631,6 +656,152 @@ class S3Model(object):
 
         return None
 
+    # -------------------------------------------------------------------------
+    @classmethod
+    def invalidate_caches(cls, tablename, record_ids, deleted=False):
+        """
+            Update the indexes and invalidate the caches of data derived
+            from a table, to be called once after records in the table
+            have been written (and their onaccept has run) or deleted
+
+            @param tablename: the table name (or Table)
+            @param record_ids: record ID or list of record IDs
+            @param deleted: the records have been deleted
+
+            @note: the text search index and the stored hierarchy are
+                   updated immediately (i.e. in the same transaction);
+                   caches are invalidated again after commit (see
+                   after_commit), so that other requests can not re-cache
+                   data read before the commit under the new versions
+        """
+
+        tablename = original_tablename(tablename) \
+                    if isinstance(tablename, Table) else str(tablename)
+
+        if not isinstance(record_ids, (list, tuple, set)):
+            record_ids = [record_ids]
+        record_ids = set(record_id for record_id in record_ids if record_id)
+
+        # Process-wide caches, so that this request doesn't
+        # see any outdated data before commit
+        S3ResourceDataCache.invalidate(tablename)
+        if record_ids:
+            S3RepresentCache.invalidate(tablename, record_ids)
+
+        # Indexes
+        from .s3hierarchy import S3Hierarchy
+        if deleted:
+            S3TextSearch.delete(tablename, list(record_ids))
+            S3Hierarchy.delete_nodes(tablename, list(record_ids))
+        else:
+            S3TextSearch.update(tablename, list(record_ids))
+            S3Hierarchy.update_nodes(tablename, list(record_ids))
+
+        # Caches shared between requests
+        s3 = current.response.s3
+        pending = s3.invalidate_caches
+        if pending is None:
+            pending = s3.invalidate_caches = {}
+            register = True
+        else:
+            register = False
+        if tablename in pending:
+            entry = pending[tablename]
+            entry[0] |= record_ids
+            entry[1] = entry[1] or deleted
+        else:
+            pending[tablename] = [record_ids, deleted]
+        if register:
+            cls.after_commit(cls._invalidate_caches)
+
+    # -------------------------------------------------------------------------
+    @staticmethod
+    def _invalidate_caches():
+        """
+            Invalidate the caches for all tables written in this request,
+            after commit (see invalidate_caches)
+        """
+
+        s3 = current.response.s3
+
+        pending = s3.invalidate_caches
+        s3.invalidate_caches = None
+        if not pending:
+            return
+
+        for tablename, (record_ids, deleted) in pending.items():
+            S3ResourceDataCache.invalidate(tablename)
+            if record_ids:
+                S3RepresentCache.invalidate(tablename, record_ids)
+            # References to deleted locations may have been removed,
+            # so can't limit the tile cache invalidation to them
+            S3TileCache.invalidate(tablename,
+                                   None if deleted else record_ids,
+                                   )
+            S3LocationCache.invalidate(tablename)
+
+    # -------------------------------------------------------------------------
+    @classmethod
+    def after_commit(cls, callback, *args):
+        """
+            Register a callback to be run after the transaction of the
+            current request has been committed, e.g. to invalidate caches
+            outside of the database; callbacks are dropped if the request
+            is rolled back
+
+            @param callback: the callback
+            @param args: positional arguments for the callback (must
+                         be hashable, identical callbacks are run once)
+
+            @note: outside of HTTP requests (scheduler tasks, scripts),
+                   the callbacks are run by S3Model.commit, so these must
+                   use s3db.commit() instead of db.commit()
+        """
+
+        response = current.response
+        pending = response.s3.after_commit
+        if pending is None:
+            pending = response.s3.after_commit = OrderedDict()
+            response.custom_commit = cls._commit
+        pending[(callback,) + args] = None
+
+    # -------------------------------------------------------------------------
+    @classmethod
+    def commit(cls):
+        """
+            Commit the current transaction, then run the after-commit
+            callbacks; to be used instead of db.commit() in scheduler
+            tasks and scripts (see after_commit)
+        """
+
+        cls._commit(current.db)
+
+    # -------------------------------------------------------------------------
+    @staticmethod
+    def _commit(adapter):
+        """
+            Commit the transaction, then run the after-commit callbacks;
+            used as response.custom_commit (see after_commit)
+
+            @param adapter: the DB adapter
+        """
+
+        adapter.commit()
+
+        s3 = current.response.s3
+
+        pending = s3.after_commit
+        s3.after_commit = None
+        if not pending:
+            return
+
+        for item in pending:
+            try:
+                item[0](*item[1:])
+            except Exception:
+                current.log.error("After-commit callback failed: %s" % item[0],
+                                  sys.exc_info()[1])
+
     # -------------------------------------------------------------------------
     @classmethod
     def onaccept(cls, table, record, method="create"):
@@ -656,6 +827,14 @@ class S3Model(object):
                                  )
             callback(onaccept, record, tablename=tablename)
 
+        if "vars" in record:
+            record_id = record["vars"].get("id")
+        else:
+            record_id = record.get("id")
+
+        # Update indexes, invalidate caches
+        cls.invalidate_caches(tablename, record_id)
+
     # -------------------------------------------------------------------------
     @classmethod
     def onvalidation(cls, table, record, method="create"):
@@ -697,6 +876,9 @@ class S3Model(object):
 
         master = master._tablename if type(master) is Table else master
 
+        # Component graph changes => invalidate resolved selectors
+        cls.clear_selector_cache()
+
         hooks = components.get(master)
         if hooks is None:
             hooks = {}
@@ -40,11 +40,13 @@ import datetime
 import re
 import sys
 
+from copy import copy
+
 from gluon import current, IS_EMPTY_OR, IS_IN_SET
 from gluon.storage import Storage
 
 from s3compat import basestring, long, reduce, urlparse
-from s3dal import Field, Row
+from s3dal import Field, Row, S3DAL
 from .s3fields import S3RepresentLazy
 from .s3utils import s3_get_foreign_key, s3_str, s3_unicode, S3TypeConverter
 
@@ -311,17 +313,69 @@ class S3FieldPath(object):
             If a context name can not be resolved, resolve() will
             still succeed - but the S3FieldPath returned will have
             colname=None and ftype="context" (=unresolvable context).
+
+            @note: resolved selectors are cached for the duration of
+                   the request, the cache is invalidated by S3Model
+                   whenever the table configuration or the component
+                   graph changes
         """
 
         if not selector:
             raise SyntaxError("Invalid selector: %s" % selector)
+
+        # Look up the resolution cache
+        cache = key = None
+        if not tail and resource is not None:
+            model = getattr(current, "model", None)
+            if model is not None:
+                cache = model.get("selectors")
+            if cache is not None:
+                key = cls._cache_key(resource, selector)
+                parser = cache.get(key)
+                if parser is not None:
+                    parser = copy(parser)
+                    parser.joins = dict(parser.joins)
+                    return parser
+
         tokens = re.split(r"(\.|\$)", selector)
         if tail:
             tokens.extend(tail)
         parser = cls(resource, None, tokens)
         parser.original = selector
+
+        if key is not None and (parser.field or parser.method):
+            # Cache the result (unless the cache has been invalidated
+            # in the meantime, e.g. by loading models on-demand)
+            if current.model.get("selectors") is cache:
+                cached = copy(parser)
+                cached.joins = dict(parser.joins)
+                cache[key] = cached
+
         return parser
 
+    # -------------------------------------------------------------------------
+    @staticmethod
+    def _cache_key(resource, selector):
+        """
+            Get the resolution cache key for a selector
+
+            @param resource: the S3Resource
+            @param selector: the selector
+
+            @return: the cache key (tuple)
+        """
+
+        parent = resource.parent
+        linked = resource.linked
+
+        return (resource.table._tablename,
+                resource.alias,
+                parent.table._tablename if parent else None,
+                linked.alias if linked else None,
+                frozenset(resource.components.exposed_aliases),
+                selector,
+                )
+
     # -------------------------------------------------------------------------
     def __init__(self, resource, table, tokens):
         """
@@ -1171,6 +1225,152 @@ class S3Joins(object):
         except RuntimeError:
             return list(joins_dict.values())
 
+    # -------------------------------------------------------------------------
+    @classmethod
+    def prune(cls, left, expressions, join=None, distinct=True):
+        """
+            Remove left joins which are not required for a query, i.e.
+            joins of tables which are neither referenced by any of the
+            expressions, nor by any other required join
+
+            @param left: the left joins (list, e.g. from as_list)
+            @param expressions: the expressions which will be evaluated
+                                against the joined set (query, orderby...)
+            @param join: the inner joins for the query
+            @param distinct: the query is only concerned with distinct
+                             master records (e.g. count distinct, or
+                             GROUPBY the primary key), so that joins which
+                             could multiply rows can be removed as well;
+                             otherwise only joins which can produce at
+                             most one row (=by primary key of the joined
+                             table) will be removed
+
+            @return: the list of required left joins (in original order)
+
+            @note: a left join can never reduce the number of master rows,
+                   so it is not required if it doesn't contribute any
+                   columns and doesn't change the number of rows
+        """
+
+        if not left:
+            return left
+
+        get_tables = current.db._adapter.tables
+
+        joins = dict((cls.joined_table(j), j) for j in left)
+
+        # Tables referenced by the expressions or inner joins
+        pending = set()
+        for expression in expressions:
+            pending |= cls.expression_tables(expression)
+        for j in join or []:
+            pending |= set(get_tables(j.second))
+
+        # Joins which could multiply rows
+        if not distinct:
+            for tname, j in joins.items():
+                if not cls.unique_join(j):
+                    pending.add(tname)
+
+        # Add all dependencies
+        required = set()
+        while pending:
+            tname = pending.pop()
+            if tname in required or tname not in joins:
+                continue
+            required.add(tname)
+            pending |= set(get_tables(joins[tname].second))
+
+        return [j for j in left if cls.joined_table(j) in required]
+
+    # -------------------------------------------------------------------------
+    @staticmethod
+    def joined_table(join):
+        """
+            Get the name of the table joined by a join
+
+            @param join: the join
+
+            @return: the table name (or alias)
+        """
+
+        try:
+            return join.first._tablename
+        except AttributeError:
+            return str(join.first)
+
+    # -------------------------------------------------------------------------
+    @classmethod
+    def expression_tables(cls, expression):
+        """
+            Get the names of all tables referenced by an expression
+
+            @param expression: a Query, Expression, Field, a string
+                               (e.g. an orderby), or a list of these
+
+            @return: set of table names
+        """
+
+        tables = set()
+
+        if expression is None:
+            pass
+        elif isinstance(expression, (list, tuple)):
+            for item in expression:
+                tables |= cls.expression_tables(item)
+        elif isinstance(expression, Field):
+            tables.add(expression.tablename)
+        else:
+            if not isinstance(expression, basestring):
+                try:
+                    tables |= set(current.db._adapter.tables(expression))
+                except (AttributeError, TypeError):
+                    expression = str(expression)
+                else:
+                    return tables
+            # SQL string (e.g. orderby) => find all "tablename." tokens
+            tables |= set(re.findall(r'([A-Za-z_][A-Za-z0-9_]*)"?\.', expression))
+
+        return tables
+
+    # -------------------------------------------------------------------------
+    @staticmethod
+    def unique_join(join):
+        """
+            Check whether a join can produce at most one row per master
+            row, i.e. whether the join condition includes the primary key
+            of the joined table (N:1 join)
+
+            @param join: the join
+
+            @return: True|False
+        """
+
+        table = join.first
+        try:
+            tname = table._tablename
+            pkey = table._id.name
+        except AttributeError:
+            return False
+
+        dal = S3DAL()
+        AND, EQ = dal.AND, dal.EQ
+
+        queries = [join.second]
+        while queries:
+            query = queries.pop()
+            op = getattr(query, "op", None)
+            if op == AND:
+                queries.extend((query.first, query.second))
+            elif op == EQ:
+                a, b = query.first, query.second
+                if isinstance(a, Field) and isinstance(b, Field):
+                    for f, o in ((a, b), (b, a)):
+                        if f.tablename == tname and f.name == pkey and \
+                           o.tablename != tname:
+                            return True
+        return False
+
     # -------------------------------------------------------------------------
     @classmethod
     def sort(cls, joins):
@@ -1595,7 +1795,7 @@ class S3ResourceQuery(object):
             if list_type:
                 q = (field.contains(list(nodeset)))
             elif len(nodeset) > 1:
-                q = (field.belongs(nodeset))
+                q = self._query_ranges(field, nodeset)
             else:
                 q = (field == tuple(nodeset)[0])
         else:
@@ -1614,6 +1814,51 @@ class S3ResourceQuery(object):
 
         return q
 
+    # -------------------------------------------------------------------------
+    @staticmethod
+    def _query_ranges(field, nodeset, minlength=8):
+        """
+            Construct a query for a set of node IDs, using range conditions
+            for runs of consecutive record IDs (nodes of a branch are often
+            created in sequence, so their record IDs tend to be consecutive)
+            rather than listing all IDs in a BELONGS
+
+            @param field: the Field
+            @param nodeset: the node IDs (set of integers)
+            @param minlength: the minimum number of consecutive IDs to
+                              use a range condition for
+
+            @return: the Query
+        """
+
+        node_ids = sorted(nodeset)
+
+        ranges, single = [], []
+        start = last = node_ids[0]
+        for node_id in node_ids[1:] + [None]:
+            if node_id is not None and node_id == last + 1:
+                last = node_id
+                continue
+            if last - start + 1 >= minlength:
+                ranges.append((start, last))
+            else:
+                single.extend(range(start, last + 1))
+            start = last = node_id
+
+        if not ranges:
+            return field.belongs(nodeset)
+
+        if len(single) > 1:
+            q = (field.belongs(set(single)))
+        elif single:
+            q = (field == single[0])
+        else:
+            q = None
+        for start, last in ranges:
+            subquery = (field >= start) & (field <= last)
+            q = subquery if q is None else q | subquery
+        return q
+
     # -------------------------------------------------------------------------
     @classmethod
     def _resolve_hierarchy(cls, l, r):
@@ -28,7 +28,8 @@
 
     @group Resource API: S3Resource,
     @group Filter API: S3ResourceFilter
-    @group Helper Classes: S3AxisFilter, S3ResourceData
+    @group Helper Classes: S3AxisFilter, S3ResourceData, S3ResourceDataIterator,
+                           S3ResourceDataCache
 """
 
 __all__ = ("S3AxisFilter",
@@ -36,9 +37,13 @@ __all__ = ("S3AxisFilter",
            "S3ResourceFilter",
            )
 
+import hashlib
 import json
 import sys
+import threading
+import time
 
+from collections import OrderedDict
 from itertools import chain
 
 try:
@@ -54,11 +59,13 @@ from gluon.storage import Storage
 from gluon.tools import callback
 
 from s3compat import StringIO, basestring, reduce, xrange
-from s3dal import Expression, Field, Row, Rows, Table, S3DAL, VirtualCommand
+from s3dal import Expression, Field, Row, Rows, Table, S3DAL, VirtualCommand, original_tablename
+from .s3codec import S3Codec
 from .s3data import S3DataTable, S3DataList
 from .s3datetime import s3_format_datetime
-from .s3fields import S3Represent, s3_all_meta_field_names
+from .s3fields import S3Represent, S3RepresentCache, s3_all_meta_field_names
 from .s3query import FS, S3ResourceField, S3ResourceQuery, S3Joins, S3URLQuery
+from .s3textsearch import S3TextSearch
 from .s3utils import s3_get_foreign_key, s3_get_last_record_id, s3_has_foreign_key, s3_remove_last_record_id, s3_str, s3_unicode
 from .s3validators import IS_ONE_OF
 from .s3xml import S3XMLFormat
@@ -235,6 +242,7 @@ class S3Resource(object):
 
         self._rows = None
         self._rowindex = None
+        self._masterindex = None
         self.rfields = None
         self.dfields = None
         self._ids = []
@@ -464,20 +472,31 @@ class S3Resource(object):
     # -------------------------------------------------------------------------
     # Data access (new API)
     # -------------------------------------------------------------------------
-    def count(self, left=None, distinct=False):
+    def count(self, left=None, distinct=False, strategy=None):
         """
             Get the total number of available records in this resource
 
             @param left: left outer joins, if required
             @param distinct: only count distinct rows
+            @param strategy: the count strategy, see S3ResourceFilter.count
+
+            @note: whether the number is an estimate is indicated by
+                   self.rfilter.approximate
         """
 
         if self.rfilter is None:
             self.build_query()
-        if self._length is None:
-            self._length = self.rfilter.count(left = left,
-                                              distinct = distinct)
-        return self._length
+
+        length = self._length
+        if length is None:
+            rfilter = self.rfilter
+            length = rfilter.count(left = left,
+                                   distinct = distinct,
+                                   strategy = strategy,
+                                   )
+            if not rfilter.approximate:
+                self._length = length
+        return length
 
     # -------------------------------------------------------------------------
     def select(self,
@@ -494,7 +513,8 @@ class S3Resource(object):
                as_rows = False,
                represent = False,
                show_links = True,
-               raw_data = False):
+               raw_data = False,
+               seek = None):
         """
             Extract data from this resource
 
@@ -511,7 +531,37 @@ class S3Resource(object):
             @param as_rows: return the rows (don't extract)
             @param represent: render field value representations
             @param raw_data: include raw data in the result
-        """
+            @param seek: use keyset pagination where possible, True to
+                         start a new page sequence, or the cursor returned
+                         for the previous page (S3ResourceData.cursor)
+        """
+
+        # Look up the result cache (if enabled for this table)
+        cache_key = None
+        if not as_rows and not groupby and self.get_config("data_cache"):
+            cache = S3ResourceDataCache
+            if fields is None:
+                fields = [f.name for f in self.readable_fields()]
+            rfields = self.resolve_selectors(fields, extra_fields=False)[0]
+            cache_key = cache.key(self,
+                                  rfields,
+                                  start = start,
+                                  limit = limit,
+                                  left = left,
+                                  orderby = orderby,
+                                  distinct = distinct,
+                                  virtual = virtual,
+                                  count = count,
+                                  getids = getids,
+                                  represent = represent,
+                                  show_links = show_links,
+                                  raw_data = raw_data,
+                                  seek = seek,
+                                  )
+            if cache_key:
+                data = cache.get(cache_key, self, rfields)
+                if data is not None:
+                    return data
 
         data = S3ResourceData(self,
                               fields,
@@ -527,12 +577,60 @@ class S3Resource(object):
                               as_rows = as_rows,
                               represent = represent,
                               show_links = show_links,
-                              raw_data = raw_data)
+                              raw_data = raw_data,
+                              seek = seek)
         if as_rows:
             return data.rows
         else:
+            if cache_key:
+                S3ResourceDataCache.store(cache_key, data)
             return data
 
+    # -------------------------------------------------------------------------
+    def iterselect(self,
+                   fields,
+                   chunksize = None,
+                   left = None,
+                   orderby = None,
+                   distinct = False,
+                   virtual = True,
+                   count = False,
+                   as_rows = False,
+                   represent = False,
+                   show_links = True,
+                   raw_data = False):
+        """
+            Extract data from this resource in chunks of limited size,
+            e.g. for exports of large numbers of records
+
+            @param fields: the fields to extract (selector strings)
+            @param chunksize: maximum number of records per chunk
+            @param left: additional left joins required for filters
+            @param orderby: orderby-expression for DAL
+            @param distinct: select distinct rows
+            @param virtual: include mandatory virtual fields
+            @param count: count the matching records in advance
+            @param as_rows: return the rows (don't extract)
+            @param represent: render field value representations
+            @param raw_data: include raw data in the result
+
+            @return: an S3ResourceDataIterator
+        """
+
+        return S3ResourceDataIterator(self,
+                                      fields,
+                                      chunksize = chunksize,
+                                      left = left,
+                                      orderby = orderby,
+                                      distinct = distinct,
+                                      virtual = virtual,
+                                      count = count,
+                                      as_rows = as_rows,
+                                      represent = represent,
+                                      show_links = show_links,
+                                      raw_data = raw_data,
+                                      )
+
     # -------------------------------------------------------------------------
     def insert(self, **fields):
         """
@@ -887,6 +985,8 @@ class S3Resource(object):
                   left = None,
                   orderby = None,
                   distinct = False,
+                  list_id = None,
+                  count = None,
                   ):
         """
             Generate a data table of this resource
@@ -897,9 +997,16 @@ class S3Resource(object):
             @param left: additional left joins for DB query
             @param orderby: orderby for DB query
             @param distinct: distinct-flag for DB query
+            @param list_id: the datatable ID (to track the pagination
+                            cursor for subsequent page requests)
+            @param count: the count strategy for numrows (defaults to
+                          the resource's "count_strategy" setting, see
+                          S3ResourceFilter.count)
 
             @return: tuple (S3DataTable, numrows), where numrows represents
                      the total number of rows in the table that match the query
+
+            @note: if numrows is an estimate, then dt.approximate is True
         """
 
         # Choose fields
@@ -920,6 +1027,16 @@ class S3Resource(object):
         id_repr = table_id.represent
         table_id.represent = None
 
+        # Keyset pagination
+        seek = self.get_cursor(list_id, start, orderby, left)
+
+        # Count strategy
+        if count is None:
+            count = self.get_config("count_strategy",
+                        current.deployment_settings.get_ui_datatables_count_strategy())
+        if not count or count == "exact":
+            count = True
+
         # Extract the data
         data = self.select(selectors,
                            start = start,
@@ -927,12 +1044,15 @@ class S3Resource(object):
                            orderby = orderby,
                            left = left,
                            distinct = distinct,
-                           count = True,
+                           count = count,
                            getids = False,
                            represent = True,
+                           seek = seek,
                            )
 
         rows = data.rows
+        if seek is not None:
+            self.set_cursor(list_id, start, orderby, left, data)
 
         # Restore ID representation
         table_id.represent = id_repr
@@ -952,9 +1072,58 @@ class S3Resource(object):
         # Generate the data table
         rfields = data.rfields
         dt = S3DataTable(rfields, rows, orderby=orderby, empty=empty)
+        dt.approximate = data.approximate
+
+        # Check record permissions for the action buttons on this page
+        permitted = self.permitted_actions(rows)
+        if permitted:
+            dt.permitted = permitted
+            # Tell action buttons that the permitted record IDs are
+            # reported per page (see S3CRUD.permitted_restrict)
+            s3 = current.response.s3
+            reported = s3.permitted_actions
+            if reported is None:
+                reported = s3.permitted_actions = {}
+            reported.setdefault(self.tablename, set()).update(permitted)
 
         return dt, data.numrows
 
+    # -------------------------------------------------------------------------
+    def permitted_actions(self, rows, methods=("delete",)):
+        """
+            Check record-level permissions for the records in a data table
+            page, for all methods which depend on record ownership, with one
+            query per method (rather than one per record and method)
+
+            - by default only for "delete", as the standard action buttons
+              only depend on record-level permissions for that method
+
+            @param rows: the extracted rows (S3ResourceData.rows)
+            @param methods: the methods to check
+
+            @return: dict {method: [record ID]}, with the record IDs as
+                     strings (as found in the data table), or None if
+                     no method depends on record ownership
+        """
+
+        auth = current.auth
+        permission = auth.permission
+
+        table = self.table
+        colname = str(table._id)
+
+        permitted = {}
+        record_ids = None
+        for method in methods:
+            if not permission.ownership_required(method, table):
+                continue
+            if record_ids is None:
+                record_ids = [row[colname] for row in rows]
+            ids = auth.s3_permitted_record_ids(method, table, record_ids)
+            permitted[method] = [str(record_id) for record_id in ids]
+
+        return permitted if permitted else None
+
     # -------------------------------------------------------------------------
     def datalist(self,
                  fields = None,
@@ -994,6 +1163,9 @@ class S3Resource(object):
             fields.insert(0, pkey)
             selectors.insert(0, pkey)
 
+        # Keyset pagination
+        seek = self.get_cursor(list_id, start, orderby, left)
+
         # Extract the data
         data = self.select(selectors,
                            start = start,
@@ -1005,7 +1177,10 @@ class S3Resource(object):
                            getids = False,
                            raw_data = True,
                            represent = True,
+                           seek = seek,
                            )
+        if seek is not None:
+            self.set_cursor(list_id, start, orderby, left, data)
 
         # Generate the data list
         numrows = data.numrows
@@ -1021,6 +1196,96 @@ class S3Resource(object):
 
         return dl, numrows
 
+    # -------------------------------------------------------------------------
+    def cursor_key(self, list_id, orderby, left):
+        """
+            Get a key for the pagination cursor of a list, which changes
+            whenever the list query or order changes
+
+            @param list_id: the list ID
+            @param orderby: the orderby expression
+            @param left: the left joins for the query
+
+            @return: the key (string)
+        """
+
+        if self.rfilter is None:
+            self.build_query()
+
+        expr = lambda e: ",".join(str(i) for i in e) \
+                         if isinstance(e, (list, tuple)) else str(e)
+
+        key = "%s|%s|%s|%s|%s" % (list_id,
+                                  self.tablename,
+                                  self.get_query(),
+                                  expr(orderby),
+                                  expr(left),
+                                  )
+        return hashlib.md5(s3_unicode(key).encode("utf-8")).hexdigest()
+
+    # -------------------------------------------------------------------------
+    def get_cursor(self, list_id, start, orderby, left=None):
+        """
+            Look up the keyset pagination cursor for a list page request,
+            so that sequential page requests can seek rather than skip
+            over all previous records (OFFSET)
+
+            @param list_id: the list ID
+            @param start: the index of the first record of the page
+            @param orderby: the orderby expression
+            @param left: the left joins for the query
+
+            @return: the seek-parameter for select, i.e. None if keyset
+                     pagination is not available, True to start a new
+                     page sequence, or the cursor of the previous page
+        """
+
+        if not list_id or \
+           not current.deployment_settings.get_base_keyset_pagination():
+            return None
+
+        session_s3 = current.session.s3
+        if session_s3 is None:
+            return None
+
+        cursors = session_s3.keyset_cursors
+        cursor = cursors.get(list_id) if cursors else None
+        if cursor and start and cursor[1] == start and \
+           cursor[0] == self.cursor_key(list_id, orderby, left):
+            return cursor[2]
+
+        return True
+
+    # -------------------------------------------------------------------------
+    def set_cursor(self, list_id, start, orderby, left, data):
+        """
+            Remember the cursor of a list page for the next page request
+
+            @param list_id: the list ID
+            @param start: the index of the first record of the page
+            @param orderby: the orderby expression
+            @param left: the left joins for the query
+            @param data: the S3ResourceData for the page
+        """
+
+        session_s3 = current.session.s3
+        if session_s3 is None:
+            return
+
+        cursors = session_s3.keyset_cursors
+        if cursors is None:
+            cursors = session_s3.keyset_cursors = {}
+
+        cursor = data.cursor
+        if cursor is None:
+            cursors.pop(list_id, None)
+        else:
+            position = (start if start else 0) + len(data.ids)
+            cursors[list_id] = (self.cursor_key(list_id, orderby, left),
+                                position,
+                                cursor,
+                                )
+
     # -------------------------------------------------------------------------
     def json(self,
              fields=None,
@@ -1161,6 +1426,11 @@ class S3Resource(object):
             start = 0
             limit = 1
 
+        # Components of loaded master records: filter by the master keys
+        # rather than joining the master query
+        if self.parent is not None and rfilter is not None:
+            rfilter.set_master_keys(self.master_keys())
+
         rows = self.select(fields,
                            start=start,
                            limit=limit,
@@ -1205,14 +1475,106 @@ class S3Resource(object):
 
         self._rows = None
         self._rowindex = None
+        self._masterindex = None
         self._length = None
         self._ids = None
         self._uids = None
         self.files = Storage()
 
+        # Restore the filter by master query (see load_components)
+        rfilter = self.rfilter
+        if rfilter is not None and rfilter.master_keys is not None:
+            rfilter.set_master_keys(None)
+
         for component in self.components.loaded.values():
             component.clear()
 
+    # -------------------------------------------------------------------------
+    def load_components(self, aliases=None, **attr):
+        """
+            Load the records of multiple components for all master records
+            currently stored in this instance, with one query per component
+            (filtered by the keys of all master records)
+
+            @param aliases: the component aliases, defaults to all exposed
+                            components
+            @param attr: keyword arguments for the component load()
+
+            @return: dict {alias: rows}
+        """
+
+        if self._rows is None:
+            self.load()
+
+        components = self.components
+        if aliases is None:
+            aliases = list(components.exposed.keys())
+
+        loaded = {}
+        for alias in aliases:
+            component = components.get(alias)
+            if component is not None:
+                loaded[alias] = component.load(**attr)
+        return loaded
+
+    # -------------------------------------------------------------------------
+    def master_keys(self):
+        """
+            Get the keys of the master records currently stored in the
+            parent resource of this component, to filter the component
+            records by
+
+            @return: list of keys, or None if the master records have
+                     not been loaded (or don't include the keys)
+        """
+
+        parent = self.parent
+        if parent is None or parent._rows is None:
+            return None
+
+        pkey = self.linked.pkey if self.linked is not None else self.pkey
+
+        keys = set()
+        for row in parent._rows:
+            if pkey not in row:
+                return None
+            keys.add(row[pkey])
+        return list(keys)
+
+    # -------------------------------------------------------------------------
+    def master_index(self):
+        """
+            Get an index of the records currently stored in this component
+            by the key of their master record, to look up the component
+            records for each master record
+
+            @return: dict {master key: [rows]}
+        """
+
+        index = self._masterindex
+        if index is not None:
+            return index
+
+        index = {}
+        rows = self._rows
+        if rows:
+            fkey = self.fkey
+            if self.link:
+                # Find the master keys for each record via the link table
+                lkey, rkey = self.lkey, self.rkey
+                masters = {}
+                for link in self.link:
+                    masters.setdefault(link[rkey], []).append(link[lkey])
+                for record in rows:
+                    for master_id in masters.get(record[fkey], ()):
+                        index.setdefault(master_id, []).append(record)
+            else:
+                for record in rows:
+                    index.setdefault(record[fkey], []).append(record)
+
+        self._masterindex = index
+        return index
+
     # -------------------------------------------------------------------------
     def records(self, fields=None):
         """
@@ -1318,17 +1680,12 @@ class S3Resource(object):
             return []
         pkey, fkey = c.pkey, c.fkey
         if pkey in master:
-            master_id = master[pkey]
-            if c.link:
-                lkey, rkey = c.lkey, c.rkey
-                lids = [r[rkey] for r in c.link if master_id == r[lkey]]
-                rows = [record for record in rows if record[fkey] in lids]
-            else:
-                try:
-                    rows = [record for record in rows if master_id == record[fkey]]
-                except AttributeError:
-                    # Most likely need to tweak static/formats/geoson/export.xsl
-                    raise AttributeError("Component %s records are missing fkey %s" % (component, fkey))
+            try:
+                index = c.master_index()
+            except AttributeError:
+                # Most likely need to tweak static/formats/geoson/export.xsl
+                raise AttributeError("Component %s records are missing fkey %s" % (component, fkey))
+            rows = list(index.get(master[pkey], ()))
         else:
             rows = []
         return rows
@@ -1484,6 +1841,7 @@ class S3Resource(object):
                    pretty_print=False,
                    location_data=None,
                    map_data=None,
+                   cluster=None,
                    target=None,
                    **args):
         """
@@ -1520,6 +1878,8 @@ class S3Resource(object):
             @param location_data: dictionary of location data which has been
                                   looked-up in bulk ready for xml.gis_encode()
             @param map_data: dictionary of options which can be read by the map
+            @param cluster: dictionary of options for server-side clustering
+                            (native GeoJSON encoder only, see S3GeoJSON)
             @param target: alias of component targetted (or None to target master resource)
             @param args: dict of arguments to pass to the XSLT stylesheet
         """
@@ -1534,6 +1894,30 @@ class S3Resource(object):
         if mcomponents is DEFAULT:
             mcomponents = []
 
+        # Native GeoJSON encoder for the default stylesheet
+        # - not with options it doesn't support (XSLT args, maxbounds,
+        #   field selection other than the stylesheet's)
+        if as_json and xmlformat is not None and \
+           not (as_tree or pretty_print or mdata or msince or filters or
+                target or maxbounds or args):
+            codec = S3Codec.get_codec("geojson")
+            # Base codec if the GeoJSON codec could not be imported
+            native = hasattr(codec, "accepts") and \
+                     codec.accepts(self, stylesheet)
+            if native:
+                include, exclude = xmlformat.get_fields(self.tablename)
+                native = fields is None or fields == include
+            if native:
+                return codec.encode(self,
+                                    start = start,
+                                    limit = limit,
+                                    fields = include,
+                                    skip = exclude,
+                                    location_data = location_data,
+                                    map_data = map_data,
+                                    cluster = cluster,
+                                    )
+
         # Export as element tree
         tree = self.export_tree(start = start,
                                 limit = limit,
@@ -3643,6 +4027,16 @@ class S3Resource(object):
                         # Otherwise, we search through the field itself
                         flist.append(field)
 
+            # Text fields covered by the text search index
+            tsfields = None
+            if words and flist:
+                tablename = self.tablename
+                if S3TextSearch.available(tablename):
+                    indexed = S3TextSearch.search_fields(tablename)
+                    tsfields = set(str(f) for f in flist
+                                          if f.tablename == tablename and
+                                             f.name in indexed)
+
             # Build search query
             # @todo: migrate this to S3ResourceQuery?
             opts = Storage()
@@ -3650,6 +4044,7 @@ class S3Resource(object):
             for w in words:
 
                 wqueries = []
+                indexed_fields = []
                 for field in flist:
                     ftype = str(field.type)
                     options = None
@@ -3675,13 +4070,23 @@ class S3Resource(object):
                                 except:
                                     options = []
                     if options is None and ftype in ("string", "text"):
-                        wqueries.append(field.lower().like("%%%s%%" % w))
+                        if tsfields and fname in tsfields:
+                            indexed_fields.append(field)
+                        else:
+                            wqueries.append(field.lower().like("%%%s%%" % w))
                     elif options is not None:
                         opts[fname] = options
                         vlist = [v for v, t in options
                                    if s3_unicode(t).lower().find(s3_unicode(w)) != -1]
                         if vlist:
                             wqueries.append(field.belongs(vlist))
+                if indexed_fields:
+                    wquery = S3TextSearch.query(self.table, w)
+                    if wquery is not None:
+                        wqueries.append(wquery)
+                    else:
+                        wqueries.extend(f.lower().like("%%%s%%" % w)
+                                        for f in indexed_fields)
                 if len(wqueries):
                     queries.append(reduce(lambda x, y: x | y \
                                                  if x is not None else y,
@@ -4596,6 +5001,15 @@ class S3ResourceFilter(object):
         self.multiple = True
         self.distinct = False
 
+        # Whether the master query is restricted to particular records
+        self.restricted = False
+
+        # Whether the last count was an estimate
+        self.approximate = False
+
+        # Keys of the master records (components only, see set_master_keys)
+        self.master_keys = None
+
         # Joins
         self.ijoins = {}
         self.ljoins = {}
@@ -4621,6 +5035,7 @@ class S3ResourceFilter(object):
 
         # ID query
         if id is not None:
+            self.restricted = True
             if not isinstance(id, (list, tuple)):
                 self.multiple = False
                 mquery = mquery & (table._id == id)
@@ -4630,6 +5045,7 @@ class S3ResourceFilter(object):
         # UID query
         UID = current.xml.UID
         if uid is not None and UID in table:
+            self.restricted = True
             if not isinstance(uid, (list, tuple)):
                 self.multiple = False
                 mquery = mquery & (table[UID] == uid)
@@ -4683,6 +5099,7 @@ class S3ResourceFilter(object):
                 pf = parent.build_query()
 
             # Extended master query
+            self.cquery = mquery
             self.mquery = mquery & pf.get_query()
 
             # Join the master
@@ -4886,7 +5303,7 @@ class S3ResourceFilter(object):
 
         # Cross-component left joins
         parent = resource.parent
-        if parent:
+        if parent and self.master_keys is None:
             pf = parent.rfilter
             if pf is None:
                 pf = parent.build_query()
@@ -4907,6 +5324,71 @@ class S3ResourceFilter(object):
         else:
             return joins
 
+    # -------------------------------------------------------------------------
+    def set_master_keys(self, keys):
+        """
+            Filter a component by the keys of its master records rather
+            than by the master query (which saves the join with the master
+            table and all its filter joins, e.g. when loading components
+            for master records which have already been loaded)
+
+            @param keys: the master keys (list), or None to restore the
+                         filter by master query
+        """
+
+        resource = self.resource
+        parent = resource.parent
+        if parent is None or keys == self.master_keys:
+            return
+
+        table = resource.table
+        DELETED = current.xml.DELETED
+
+        ijoins = self.ijoins
+        if self.master_keys is not None:
+            # Remove the previous link table join
+            linktable = resource.linktable
+            if linktable is not None and resource.linked is None:
+                ijoins.pop(linktable._tablename, None)
+
+        if keys is None:
+            # Restore the filter by master query
+            pf = parent.rfilter
+            if not pf:
+                pf = parent.build_query()
+            self.mquery = self.cquery & pf.get_query()
+            ijoins[parent._alias] = resource._join(reverse=True)
+
+        else:
+            linked = resource.linked
+            if linked is not None:
+                # Link table of a component
+                query = table[linked.lkey].belongs(keys)
+
+            elif resource.linktable is not None:
+                # Component linked via a link table
+                linktable = resource.linktable
+                query = linktable[resource.lkey].belongs(keys)
+                if DELETED in linktable:
+                    query &= (linktable[DELETED] != True)
+                rquery = (linktable[resource.rkey] == table[resource.fkey])
+                ijoins[linktable._tablename] = [linktable.on(rquery)]
+
+            else:
+                # Component with a direct foreign key
+                query = table[resource.fkey].belongs(keys)
+                if resource.filter is not None:
+                    query &= resource.filter
+
+            self.mquery = self.cquery & query
+            ijoins.pop(parent._alias, None)
+
+        self.master_keys = keys
+
+        # Rebuild the query
+        self.query = None
+        resource._length = None
+
     # -------------------------------------------------------------------------
     def get_fields(self):
         """ Get all field selectors in this filter """
@@ -5050,10 +5532,53 @@ class S3ResourceFilter(object):
         return subset
 
     # -------------------------------------------------------------------------
-    def count(self, left=None, distinct=False):
+    def count(self, left=None, distinct=False, strategy=None):
         """
             Get the total number of matching records
 
+            @param left: left outer joins
+            @param distinct: count only distinct rows
+            @param strategy: the count strategy
+                             - "exact" (default): count all matching records
+                             - "estimate": use the query planner's estimate
+                               (where available), unless that is below
+                               settings.base.count_estimate_threshold
+                             - "cached": exact count, cached for a short
+                               time (settings.base.count_cache_ttl)
+
+            @note: self.approximate indicates whether the returned
+                   number is an estimate
+        """
+
+        self.approximate = False
+
+        if self.resource is None:
+            return 0
+
+        settings = current.deployment_settings
+
+        if strategy == "estimate":
+            estimate = self.count_estimate(left=left)
+            if estimate is not None and \
+               estimate >= settings.get_base_count_estimate_threshold():
+                self.approximate = True
+                return estimate
+
+        elif strategy == "cached":
+            ttl = settings.get_base_count_cache_ttl()
+            if ttl:
+                return current.cache.ram(self.count_key(left, distinct),
+                                         lambda: self.count_exact(left, distinct),
+                                         time_expire = ttl,
+                                         )
+
+        return self.count_exact(left=left, distinct=distinct)
+
+    # -------------------------------------------------------------------------
+    def count_exact(self, left=None, distinct=False):
+        """
+            Count all matching records
+
             @param left: left outer joins
             @param distinct: count only distinct rows
         """
@@ -5068,18 +5593,11 @@ class S3ResourceFilter(object):
 
         vfltr = self.get_filter()
 
-        if vfltr is None and not distinct:
-
-            tablename = table._tablename
-
-            ijoins = S3Joins(tablename, self.get_joins(left=False))
-            ljoins = S3Joins(tablename, self.get_joins(left=True))
-            ljoins.add(left)
+        if vfltr is None:
 
-            join = ijoins.as_list(prefer=ljoins)
-            left = ljoins.as_list()
+            join, left = self.count_joins(left, distinct=distinct)
 
-            cnt = table._id.count()
+            cnt = table._id.count(distinct=distinct)
             row = current.db(self.query).select(cnt,
                                                 join=join,
                                                 left=left).first()
@@ -5096,6 +5614,95 @@ class S3ResourceFilter(object):
                                    count=True)
             return data["numrows"]
 
+    # -------------------------------------------------------------------------
+    def count_estimate(self, left=None):
+        """
+            Get the query planner's estimate for the number of matching
+            records, which is much cheaper than counting them for large
+            result sets, but can be considerably off
+
+            @param left: left outer joins
+
+            @return: the estimated number of records, or None if the
+                     database does not provide estimates or the filter
+                     can not be estimated (virtual filters)
+        """
+
+        db = current.db
+
+        if db._dbname != "postgres" or self.get_filter() is not None:
+            return None
+
+        resource = self.resource
+        join, left = self.count_joins(left)
+
+        sql = db(self.get_query())._select(resource._id,
+                                     join = join,
+                                     left = left,
+                                     )
+        try:
+            plan = db.executesql("EXPLAIN (FORMAT JSON) %s" % sql)[0][0]
+            if isinstance(plan, basestring):
+                plan = json.loads(plan)
+            estimate = int(plan[0]["Plan"]["Plan Rows"])
+        except Exception:
+            current.log.error("Could not estimate count for %s" % resource.tablename,
+                              sys.exc_info()[1])
+            return None
+
+        return estimate
+
+    # -------------------------------------------------------------------------
+    def count_joins(self, left=None, distinct=False):
+        """
+            Get the joins for a count query
+
+            @param left: additional left joins
+            @param distinct: count only distinct rows
+
+            @return: tuple (inner joins, left joins), without left joins
+                     which are not required for counting
+        """
+
+        tablename = self.resource.tablename
+
+        ijoins = S3Joins(tablename, self.get_joins(left=False))
+        ljoins = S3Joins(tablename, self.get_joins(left=True))
+        ljoins.add(left)
+
+        join = ijoins.as_list(prefer=ljoins)
+        left = S3Joins.prune(ljoins.as_list(), [self.get_query()],
+                             join = join,
+                             distinct = distinct,
+                             )
+        return join, left
+
+    # -------------------------------------------------------------------------
+    def count_key(self, left=None, distinct=False):
+        """
+            Get a cache key for the record count of this filter, which
+            includes the realms of the current user (i.e. users with the
+            same realms share the cached numbers)
+
+            @param left: left outer joins
+            @param distinct: count only distinct rows
+
+            @return: the cache key (string)
+        """
+
+        user = current.auth.user
+        realms = user.realms if user else None
+
+        if isinstance(left, (list, tuple)):
+            left = ",".join(str(j) for j in left)
+
+        key = "%r|%s|%s|%s" % (self,
+                               left,
+                               distinct,
+                               json.dumps(realms, sort_keys=True),
+                               )
+        return "count_%s" % hashlib.md5(s3_unicode(key).encode("utf-8")).hexdigest()
+
     # -------------------------------------------------------------------------
     # Utility Methods
     # -------------------------------------------------------------------------
@@ -5343,7 +5950,8 @@ class S3ResourceData(object):
                  as_rows=False,
                  represent=False,
                  show_links=True,
-                 raw_data=False):
+                 raw_data=False,
+                 seek=None):
         """
             Constructor, extracts (and represents) data from a resource
 
@@ -5356,11 +5964,17 @@ class S3ResourceData(object):
             @param groupby: fields to group by (overrides fields!)
             @param distinct: select distinct rows
             @param virtual: include mandatory virtual fields
-            @param count: include the total number of matching records
+            @param count: include the total number of matching records,
+                          True for an exact count, or the name of a count
+                          strategy (see S3ResourceFilter.count)
             @param getids: include the IDs of all matching records
             @param as_rows: return the rows (don't extract/represent)
             @param represent: render field value representations
             @param raw_data: include raw data in the result
+            @param seek: use keyset pagination (where possible), either
+                         True to start a new page sequence at start, or
+                         the cursor of the previous page (=the orderby
+                         values of its last record, see self.cursor)
 
             @note: as_rows / groupby prevent automatic splitting of
                    large multi-table joins, so use with care!
@@ -5458,6 +6072,12 @@ class S3ResourceData(object):
                                        aqueries = aqueries,
                                        )
 
+        # Left joins required to count/identify the matching records
+        # (without those only needed for ORDERBY or the master query)
+        count_ljoins = S3Joins.prune(filter_ljoins, [query],
+                                     join = filter_ijoins,
+                                     )
+
         # Virtual fields filter
         vfilter = resource.get_filter()
 
@@ -5467,6 +6087,16 @@ class S3ResourceData(object):
         # Is this a paginated request?
         pagination = limit is not None or start
 
+        # Whether numrows is an estimate
+        self.approximate = False
+
+        # Keyset pagination (seek method) possible?
+        self.cursor = None
+        keyset = None
+        if seek is not None and limit and \
+           not (groupby or getids or vfilter or efilter):
+            keyset = self.resolve_keyset(orderby)
+
         # Subselect?
         if ljoins or ijoins or \
            efilter or \
@@ -5496,18 +6126,58 @@ class S3ResourceData(object):
         # records, but not to extract all records, then we run a
         # separate query here to extract just this information:
         ids = page = totalrows = None
-        if fq:
+        if keyset:
+            # Extract the page IDs with a keyset query, so the effort
+            # is independent of the page position
+            if seek is True:
+                cursor = None
+            else:
+                cursor = seek
+                start = 0
+            # - keyset fields are all in the master table
+            page, self.cursor = self.keyset_query(query,
+                                                  keyset,
+                                                  cursor = cursor,
+                                                  join = filter_ijoins,
+                                                  left = count_ljoins,
+                                                  start = start,
+                                                  limit = limit,
+                                                  )
+            if count:
+                totalrows = self.count(count,
+                                       query,
+                                       join = filter_ijoins,
+                                       left = count_ljoins,
+                                       )
+            ids = page
+
+        elif fq and count_only and count is not True:
+            # Count with alternative strategy
+            totalrows = self.count(count,
+                                   query,
+                                   join = filter_ijoins,
+                                   left = count_ljoins,
+                                   )
+
+        elif fq:
             # Execute the filter query
             if bigtable and not vfilter:
                 limitby = resource.limitby(start=start, limit=limit)
             else:
                 limitby = None
+            if count_only:
+                fq_ljoins = count_ljoins
+            else:
+                fq_ljoins = S3Joins.prune(filter_ljoins, [query, orderby_aggr],
+                                          join = filter_ijoins,
+                                          )
             totalrows, ids = self.filter_query(query,
                                                join = filter_ijoins,
-                                               left = filter_ljoins,
+                                               left = fq_ljoins,
                                                getids = not count_only,
                                                orderby = orderby_aggr,
                                                limitby = limitby,
+                                               count = count if count else True,
                                                )
 
         # Simplify the master query if possible
@@ -5528,7 +6198,7 @@ class S3ResourceData(object):
                 if pagination and (efilter or vfilter):
                     master_ids = ids
                 else:
-                    if bigtable:
+                    if bigtable or keyset:
                         master_ids = page = ids
                     else:
                         limitby = resource.limitby(start=start, limit=limit)
@@ -5549,7 +6219,12 @@ class S3ResourceData(object):
                 else:
                     master_query = table._id.belongs(set(master_ids))
 
-                orderby = None
+                if keyset and as_rows:
+                    # Rows are returned as-is, so retain the keyset order
+                    orderby = [~field if descending else field
+                               for field, descending in keyset]
+                else:
+                    orderby = None
                 if not ljoins or ijoins:
                     # Without joins, there can only be one row per id,
                     # so we can limit the master query (faster)
@@ -5671,7 +6346,9 @@ class S3ResourceData(object):
             # Empty set => empty subset (no point to filter/count)
             page = []
             ids = []
-            totalrows = 0
+            if not keyset:
+                # Keyset pages are counted separately
+                totalrows = 0
 
         elif not groupby:
             if efilter or vfilter:
@@ -5789,6 +6466,10 @@ class S3ResourceData(object):
             field_data = self.field_data
             NONE = current.messages["NONE"]
 
+            if represent:
+                # Batch foreign key lookups across columns
+                self.prefetch_representations(dfields)
+
             render = self.render
             for dfield in dfields:
 
@@ -5981,6 +6662,196 @@ class S3ResourceData(object):
 
         return expr, aggr, fields, tables
 
+    # -------------------------------------------------------------------------
+    def resolve_keyset(self, orderby):
+        """
+            Determine the keyset for keyset pagination, i.e. the master
+            table fields in the ORDERBY which together identify the
+            position of a record in the ordered set
+
+            @param orderby: the orderby expression (resolved into Fields)
+
+            @return: list of tuples (Field, descending), or None if the
+                     orderby does not allow keyset pagination
+
+            @note: a deterministic order requires unique keys, so the
+                   primary key is appended if not in the orderby already
+            @note: all fields must be non-nullable columns in the master
+                   table (NULLs have no defined position in the order)
+        """
+
+        table = self.table
+        tablename = table._tablename
+        pkey = str(table._id)
+
+        INVERT = S3DAL().INVERT
+
+        keyset = []
+        has_id = False
+        for item in orderby or []:
+
+            if type(item) is Expression:
+                if item.op == INVERT and isinstance(item.first, Field):
+                    field, descending = item.first, True
+                else:
+                    # Aggregation or other expression
+                    return None
+            elif isinstance(item, Field):
+                field, descending = item, False
+            else:
+                return None
+
+            fname = str(field)
+            if fname.split(".", 1)[0] != tablename:
+                # Joined table (can be NULL or have multiple rows)
+                return None
+            if fname == pkey:
+                has_id = True
+            elif not field.notnull or \
+                 str(field.type)[:4] in ("list", "json", "uplo", "blob"):
+                return None
+            keyset.append((field, descending))
+
+            if has_id:
+                # Fields after the primary key are irrelevant
+                break
+
+        if not has_id:
+            keyset.append((table._id, False))
+
+        return keyset
+
+    # -------------------------------------------------------------------------
+    @staticmethod
+    def seek_query(keyset, cursor):
+        """
+            Construct a query for all records after the cursor position
+
+            @param keyset: the keyset, list of tuples (Field, descending)
+            @param cursor: the orderby values of the last record on the
+                           previous page
+
+            @return: the Query, i.e. the expanded form of the row value
+                     comparison (f1, f2, ...) > (v1, v2, ...)
+        """
+
+        query = None
+        for (field, descending), value in reversed(list(zip(keyset, cursor))):
+            if descending:
+                q = (field < value)
+            else:
+                q = (field > value)
+            if query is not None:
+                q |= (field == value) & query
+            query = q
+
+        return query
+
+    # -------------------------------------------------------------------------
+    def keyset_query(self,
+                     query,
+                     keyset,
+                     cursor=None,
+                     join=None,
+                     left=None,
+                     start=0,
+                     limit=None):
+        """
+            Extract the record IDs of a page using keyset pagination
+
+            @param query: the filter query
+            @param keyset: the keyset, list of tuples (Field, descending)
+            @param cursor: the cursor of the previous page (None to
+                           start at the first record)
+            @param join: the inner joins for the query
+            @param left: the left joins for the query
+            @param start: offset of the page (only relevant without cursor)
+            @param limit: the page length
+
+            @return: tuple (RecordIDs, Cursor), Cursor being the orderby
+                     values of the last record in the page (or None if
+                     the page is empty)
+        """
+
+        table = self.table
+
+        if cursor is not None:
+            if len(cursor) != len(keyset) or None in cursor:
+                # Cursor doesn't match the keyset => restart
+                cursor = None
+            else:
+                query &= self.seek_query(keyset, cursor)
+                start = 0
+        if not start:
+            start = 0
+
+        fields = [field for field, descending in keyset]
+        orderby = [~field if descending else field
+                   for field, descending in keyset]
+
+        # Temporarily deactivate virtual fields
+        vf = table.virtualfields
+        osetattr(table, "virtualfields", [])
+
+        # With joins, there could be more than one row per record
+        # - but one record has only one combination of keyset values
+        rows = current.db(query).select(distinct = bool(join or left),
+                                        join = join,
+                                        left = left,
+                                        orderby = orderby,
+                                        limitby = (start, start + limit),
+                                        cacheable = True,
+                                        *fields)
+
+        # Restore the virtual fields
+        osetattr(table, "virtualfields", vf)
+
+        pkey = str(table._id)
+        ids = [row[pkey] for row in rows]
+        if rows:
+            last = rows.last()
+            cursor = [last[str(field)] for field in fields]
+        else:
+            cursor = None
+
+        return ids, cursor
+
+    # -------------------------------------------------------------------------
+    def count(self, strategy, query, join=None, left=None):
+        """
+            Count the matching records
+
+            @param strategy: the count strategy (see S3ResourceFilter.count),
+                             or True for an exact count
+            @param query: the filter query
+            @param join: the inner joins for the query
+            @param left: the left joins for the query
+
+            @return: the number of matching records
+        """
+
+        rfilter = self.resource.rfilter
+
+        if strategy == "estimate":
+            estimate = rfilter.count_estimate(left=left)
+            threshold = current.deployment_settings \
+                               .get_base_count_estimate_threshold()
+            if estimate is not None and estimate >= threshold:
+                self.approximate = True
+                return estimate
+
+        elif strategy == "cached":
+            ttl = current.deployment_settings.get_base_count_cache_ttl()
+            if ttl:
+                key = rfilter.count_key(left, distinct=True)
+                count = lambda: self.filter_query(query,
+                                                  join = join,
+                                                  left = left,
+                                                  )[0]
+                return current.cache.ram(key, count, time_expire=ttl)
+
+        return self.filter_query(query, join=join, left=left)[0]
+
     # -------------------------------------------------------------------------
     def filter_query(self,
                      query,
@@ -5989,6 +6860,7 @@ class S3ResourceData(object):
                      getids=False,
                      limitby=None,
                      orderby=None,
+                     count=True,
                      ):
         """
             Execute a query to determine the number/record IDs of all
@@ -6001,6 +6873,8 @@ class S3ResourceData(object):
             @param limitby: tuple of indices (start, end) to extract only
                             a limited set of IDs
             @param orderby: ORDERBY expression for the query
+            @param count: the count strategy if the IDs are limited
+                          (see S3ResourceFilter.count), True for exact
 
             @return: tuple of (TotalNumberOfRecords, RecordIDs)
         """
@@ -6044,13 +6918,16 @@ class S3ResourceData(object):
             totalids = len(rows)
             if limit and totalids >= maxids or start != 0 and not totalids:
                 # Count all matching records
-                cnt = table._id.count(distinct=True)
-                row = db(query).select(cnt,
-                                       join = join,
-                                       left = left,
-                                       cacheable = True,
-                                       ).first()
-                totalrows = row[cnt]
+                if count is not True:
+                    totalrows = self.count(count, query, join=join, left=left)
+                else:
+                    cnt = table._id.count(distinct=True)
+                    row = db(query).select(cnt,
+                                           join = join,
+                                           left = left,
+                                           cacheable = True,
+                                           ).first()
+                    totalrows = row[cnt]
             else:
                 # We already know how many there are
                 totalrows = start + totalids
@@ -6384,6 +7261,105 @@ class S3ResourceData(object):
 
         return records
 
+    # -------------------------------------------------------------------------
+    def prefetch_representations(self, rfields):
+        """
+            Look up the foreign key representations for all columns
+            which refer to the same lookup table with a single query per
+            table, and pre-populate the S3Represent instances of these
+            columns (so that render() needs no further lookups)
+
+            @param rfields: the fields to render ([S3ResourceField])
+
+            @note: only applies to standard S3Represent lookups (no custom
+                   lookup_rows, options or hierarchy) of non-list fields,
+                   other renderers use their own lookups in render()
+        """
+
+        field_data = self.field_data
+
+        # Group the renderers by lookup table and key
+        groups = {}
+        for rfield in rfields:
+            renderer = rfield.represent
+            if not isinstance(renderer, S3Represent) or \
+               rfield.ftype[:4] == "list":
+                continue
+            renderer._setup()
+            table = renderer.table
+            if table is None or renderer.custom_lookup or \
+               renderer.hierarchy or renderer.options is not None:
+                continue
+            values = field_data[rfield.colname][0]
+            if not values:
+                continue
+            group = groups.setdefault((table._tablename, renderer.key), [])
+            group.append((renderer, values))
+
+        db = current.db
+        ogetattr = object.__getattribute__
+
+        for (tablename, keyname), group in groups.items():
+
+            if len(group) < 2:
+                # Single column => renderer does its own lookup
+                continue
+
+            # Collect the pending values per renderer
+            renderers = OrderedDict()
+            for renderer, values in group:
+                rid = id(renderer)
+                if rid in renderers:
+                    renderers[rid][1].update(values)
+                else:
+                    renderers[rid] = (renderer, set(values))
+
+            table = group[0][0].table
+            lookup = set()
+            fields = set()
+            for renderer, values in renderers.values():
+                theset = renderer.theset
+                pending = set(v for v in values
+                                if v is not None and v not in theset)
+                csignature = renderer.csignature
+                if pending and csignature:
+                    cached = S3RepresentCache.get(tablename,
+                                                  list(pending),
+                                                  csignature,
+                                                  )
+                    theset.update(cached)
+                    pending.difference_update(cached)
+                values.clear()
+                values.update(pending)
+                if pending:
+                    lookup |= pending
+                    fields.update(fn for fn in renderer.fields
+                                  if fn in table.fields)
+            if not lookup:
+                continue
+
+            key = ogetattr(table, keyname)
+            fields.discard(keyname)
+            query = key.belongs(lookup) if len(lookup) > 1 else \
+                    (key == list(lookup)[0])
+            rows = db(query).select(key, *[ogetattr(table, fn) for fn in fields])
+
+            # Feed the rows to the renderers
+            for renderer, pending in renderers.values():
+                if not pending:
+                    continue
+                subset = [row for row in rows if row[keyname] in pending]
+                if subset:
+                    renderer._lookup(list(pending), rows=subset)
+                    csignature = renderer.csignature
+                    if csignature:
+                        theset = renderer.theset
+                        S3RepresentCache.store(tablename,
+                                               csignature,
+                                               {row[keyname]: theset[row[keyname]]
+                                                for row in subset},
+                                               )
+
     # -------------------------------------------------------------------------
     def render(self,
                rfield,
@@ -6644,4 +7620,439 @@ class S3ResourceData(object):
             items = expr
         return items
 
+# =============================================================================
+class S3ResourceDataIterator(object):
+    """
+        Iterator over the data of a resource, extracting them chunk-wise
+        so that the memory required to process large numbers of records
+        (e.g. in exports) remains constant
+    """
+
+    def __init__(self,
+                 resource,
+                 fields,
+                 chunksize=None,
+                 left=None,
+                 orderby=None,
+                 distinct=False,
+                 virtual=True,
+                 count=False,
+                 as_rows=False,
+                 represent=False,
+                 show_links=True,
+                 raw_data=False):
+        """
+            Constructor
+
+            @param resource: the resource
+            @param fields: the fields to extract (selector strings)
+            @param chunksize: maximum number of records per chunk,
+                              defaults to settings.base.export_chunksize
+            @param left: additional left joins required for filters
+            @param orderby: orderby-expression for DAL
+            @param distinct: select distinct rows
+            @param virtual: include mandatory virtual fields
+            @param count: count the matching records in advance
+            @param as_rows: return the rows (don't extract/represent)
+            @param represent: render field value representations
+            @param show_links: render links in representations
+            @param raw_data: include raw data in the result
+        """
+
+        self.resource = resource
+
+        if fields is None:
+            fields = [f.name for f in resource.readable_fields()]
+        self.fields = fields
+
+        if not chunksize:
+            chunksize = current.deployment_settings.get_base_export_chunksize()
+        self.chunksize = chunksize
+
+        self.left = left
+        self.orderby = orderby
+        self.as_rows = as_rows
+
+        self.options = {"distinct": distinct,
+                        "virtual": virtual,
+                        "as_rows": as_rows,
+                        "represent": represent,
+                        "show_links": show_links,
+                        "raw_data": raw_data,
+                        }
+
+        # Resolve the fields in advance (e.g. for column headers)
+        self.rfields = resource.resolve_selectors(fields,
+                                                  extra_fields = False,
+                                                  )[0]
+        if count:
+            self.numrows = resource.count(left=left, distinct=True)
+        else:
+            self.numrows = None
+
+    # -------------------------------------------------------------------------
+    def __len__(self):
+        """
+            The total number of matching records
+        """
+
+        numrows = self.numrows
+        if numrows is None:
+            numrows = self.numrows = self.resource.count(left = self.left,
+                                                         distinct = True,
+                                                         )
+        return numrows
+
+    # -------------------------------------------------------------------------
+    def __iter__(self):
+        """
+            Iterate over all matching rows
+        """
+
+        for rows in self.chunks():
+            for row in rows:
+                yield row
+
+    # -------------------------------------------------------------------------
+    def chunks(self):
+        """
+            Extract the data chunk by chunk
+
+            @return: a generator yielding the rows of each chunk, either
+                     as list of dicts or (with as_rows) as Rows
+
+            @note: subsequent chunks are extracted with keyset pagination
+                   if the orderby allows it, otherwise all chunks are
+                   extracted by record IDs (or by offset if the record IDs
+                   can not all be retrieved)
+        """
+
+        resource = self.resource
+        chunksize = self.chunksize
+
+        # First chunk, trying keyset pagination
+        data = self.select(seek=True, limit=chunksize)
+
+        cursor = data.cursor
+        if cursor is not None:
+            # Keyset pagination applies
+            if data.rows:
+                yield data.rows
+            while cursor is not None and len(data.ids) >= chunksize:
+                data = self.select(seek=cursor, limit=chunksize)
+                if data.rows:
+                    yield data.rows
+                cursor = data.cursor
+            return
+
+        if len(data.rows) < chunksize:
+            # Everything in the first chunk
+            if data.rows:
+                yield data.rows
+            return
+
+        # Order by record ID as tie-breaker, so that the order of records
+        # with equal (or null) orderby values is the same in all queries
+        table_id = resource._id
+        orderby = self.orderby
+        if orderby:
+            orderby = list(S3ResourceData.resolve_expression(orderby))
+        else:
+            orderby = []
+        if str(table_id) not in [str(item).strip() for item in orderby]:
+            orderby.append(table_id)
+
+        # Retrieve the IDs of all matching records, in order
+        data = S3ResourceData(resource,
+                              [table_id.name],
+                              limit = 1,
+                              left = self.left,
+                              orderby = orderby,
+                              count = True,
+                              getids = True,
+                              virtual = False,
+                              )
+        ids = data.ids
+        if ids is not None and len(ids) == data.numrows:
+            # Extract all chunks (including the first) by record IDs
+            for index in xrange(0, len(ids), chunksize):
+                rows = self.select_ids(ids[index:index + chunksize])
+                if rows:
+                    yield rows
+        else:
+            # Extract all chunks by offset
+            start = 0
+            while True:
+                data = self.select(start=start, limit=chunksize, orderby=orderby)
+                if not data.rows:
+                    break
+                yield data.rows
+                start += chunksize
+
+    # -------------------------------------------------------------------------
+    def select(self, start=0, limit=None, seek=None, orderby=None):
+        """
+            Extract a chunk of data
+
+            @param start: index of the first record
+            @param limit: maximum number of records
+            @param seek: the keyset pagination cursor (see S3ResourceData)
+            @param orderby: orderby-expression to override self.orderby
+
+            @return: the S3ResourceData
+        """
+
+        return S3ResourceData(self.resource,
+                              self.fields,
+                              start = start,
+                              limit = limit,
+                              left = self.left,
+                              orderby = orderby or self.orderby,
+                              seek = seek,
+                              **self.options)
+
+    # -------------------------------------------------------------------------
+    def select_ids(self, ids):
+        """
+            Extract the data for a chunk of record IDs
+
+            @param ids: the record IDs, in order
+
+            @return: the rows, in the same order as the record IDs
+        """
+
+        resource = self.resource
+
+        # Restrict the resource query to the record IDs of the chunk,
+        # temporarily, so that the context of the resource (e.g. the
+        # master record of a component) is retained
+        query = resource.get_query()
+        rfilter = resource.rfilter
+        rfilter.query = query & resource._id.belongs(ids)
+        try:
+            data = S3ResourceData(resource, self.fields, **self.options)
+        finally:
+            rfilter.query = query
+
+        # Restore the order of the records
+        position = dict((record_id, index) for index, record_id in enumerate(ids))
+
+        rows = data.rows
+        if self.as_rows:
+            colname = str(resource._id)
+            rows = Rows(rows.db,
+                        rows.sort(lambda row: position.get(row[colname])),
+                        colnames = rows.colnames,
+                        compact = rows.compact,
+                        )
+        elif len(data.ids) == len(rows):
+            # Extracted rows are in the order of data.ids
+            rows = [row for record_id, row in
+                    sorted(zip(data.ids, rows),
+                           key = lambda item: position.get(item[0]),
+                           )]
+        return rows
+
+# =============================================================================
+class S3ResourceDataCache(object):
+    """
+        Process-wide LRU cache for S3ResourceData results, used for
+        tables configured with data_cache=True (e.g. for dashboards and
+        profile widgets which repeatedly extract the same data)
+
+        Cache keys include the versions of all tables involved in the
+        extraction, which are bumped whenever records in these tables
+        are written or deleted (see invalidate), so outdated entries
+        are never returned but just age out of the cache.
+
+        @note: table versions are process-local, so in deployments with
+               multiple worker processes, changes made by other processes
+               are only seen after settings.base.data_cache_ttl
+    """
+
+    lock = threading.Lock()
+
+    entries = OrderedDict()
+    versions = {}
+
+    hits = 0
+    misses = 0
+
+    # -------------------------------------------------------------------------
+    @classmethod
+    def key(cls, resource, rfields, **attr):
+        """
+            Construct the cache key for an extraction
+
+            @param resource: the S3Resource
+            @param rfields: the resolved fields to extract
+            @param attr: the parameters for S3ResourceData
+
+            @return: the cache key (string), or None if the extraction
+                     can not be cached
+        """
+
+        rfilter = resource.rfilter
+        if rfilter is None or rfilter.get_extra_filters():
+            # Extra filters are callables => can't serialize them
+            return None
+
+        # Tables involved in the extraction
+        tablenames = set([resource.tablename])
+        if resource.parent:
+            tablenames.add(resource.parent.tablename)
+        for left in (False, True):
+            tablenames |= set(rfilter.get_joins(left=left, as_list=False))
+        for rfield in rfields:
+            field = rfield.field
+            if field is None:
+                tablenames.add(rfield.tname)
+            else:
+                tablenames.add(original_tablename(field.table))
+                # Referenced table (for representation)
+                ktablename = s3_get_foreign_key(field)[0]
+                if ktablename:
+                    tablenames.add(ktablename)
+        versions = cls.versions
+        tables = ",".join("%s:%s" % (tn, versions.get(tn, 0))
+                          for tn in sorted(tablenames))
+
+        # Canonical serialization of the parameters
+        serialize = lambda items: ",".join(str(item) for item in items) \
+                                  if isinstance(items, (list, tuple)) \
+                                  else str(items)
+        params = []
+        for name in sorted(attr):
+            params.append("%s=%s" % (name, serialize(attr[name])))
+
+        # The permitted realms of the current user
+        auth = current.auth
+        user = auth.user
+        realms = user.realms if user else None
+
+        key = "%r|%s|%s|%s|%s|%s|%s" % (rfilter,
+                                        serialize([rfield.colname
+                                                   for rfield in rfields]),
+                                        "|".join(params),
+                                        json.dumps(realms, sort_keys=True),
+                                        auth.override,
+                                        current.T.accepted_language,
+                                        tables,
+                                        )
+        return hashlib.md5(s3_unicode(key).encode("utf-8")).hexdigest()
+
+    # -------------------------------------------------------------------------
+    @classmethod
+    def get(cls, key, resource, rfields):
+        """
+            Look up a cached result
+
+            @param key: the cache key
+            @param resource: the S3Resource
+            @param rfields: the resolved fields to extract
+
+            @return: S3ResourceData, or None if not cached
+        """
+
+        ttl = current.deployment_settings.get_base_data_cache_ttl()
+
+        with cls.lock:
+            entry = cls.entries.pop(key, None)
+            if entry is not None and \
+               (not ttl or entry[0] + ttl > time.time()):
+                # Re-insert as most recently used
+                cls.entries[key] = entry
+                cls.hits += 1
+            else:
+                entry = None
+                cls.misses += 1
+
+        if entry is None:
+            return None
+
+        # Construct a new S3ResourceData instance from the entry
+        data = object.__new__(S3ResourceData)
+        data.resource = resource
+        data.table = resource.table
+        data.aqueries = {}
+        data.rfields = rfields
+        for name, value in entry[1].items():
+            setattr(data, name, value)
+        data.rows = [Storage(row) for row in data.rows]
+        return data
+
+    # -------------------------------------------------------------------------
+    @classmethod
+    def store(cls, key, data):
+        """
+            Store a result in the cache
+
+            @param key: the cache key
+            @param data: the S3ResourceData
+        """
+
+        size = current.deployment_settings.get_base_data_cache_size()
+        if not size:
+            return
+
+        values = {"numrows": data.numrows,
+                  "ids": list(data.ids) if data.ids is not None else None,
+                  "rows": [Storage(row) for row in data.rows],
+                  "approximate": data.approximate,
+                  "cursor": data.cursor,
+                  }
+
+        with cls.lock:
+            entries = cls.entries
+            entries.pop(key, None)
+            entries[key] = (time.time(), values)
+            # Remove the least recently used entries
+            while len(entries) > size:
+                entries.popitem(last=False)
+
+    # -------------------------------------------------------------------------
+    @classmethod
+    def invalidate(cls, tablename):
+        """
+            Invalidate all cached results involving a table, to be called
+            whenever records in the table are written or deleted
+
+            @param tablename: the table name (or Table)
+        """
+
+        tablename = original_tablename(tablename) \
+                    if isinstance(tablename, Table) else str(tablename)
+
+        with cls.lock:
+            versions = cls.versions
+            versions[tablename] = versions.get(tablename, 0) + 1
+
+    # -------------------------------------------------------------------------
+    @classmethod
+    def clear(cls):
+        """
+            Remove all entries from the cache, reset the counters
+        """
+
+        with cls.lock:
+            cls.entries.clear()
+            cls.hits = cls.misses = 0
+
+    # -------------------------------------------------------------------------
+    @classmethod
+    def stats(cls):
+        """
+            Get cache statistics
+
+            @return: dict {"size": number of entries,
+                           "hits": number of cache hits,
+                           "misses": number of cache misses,
+                           }
+        """
+
+        return {"size": len(cls.entries),
+                "hits": cls.hits,
+                "misses": cls.misses,
+                }
+
 # END =========================================================================
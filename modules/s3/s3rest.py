@@ -883,6 +883,16 @@ class S3Request(object):
         if r.representation in ("gpx", "osm"):
             maxbounds = True
 
+        # Server-side clustering (GeoJSON)
+        if "cluster" in get_vars:
+            cluster = {"zoom": get_vars["cluster"],
+                       "distance": get_vars.get("cluster_distance"),
+                       "threshold": get_vars.get("cluster_threshold"),
+                       "markers": get_vars.get("markers"),
+                       }
+        else:
+            cluster = None
+
         # Components of the master resource (tablenames)
         if "mcomponents" in get_vars:
             mcomponents = get_vars["mcomponents"]
@@ -977,6 +987,7 @@ class S3Request(object):
                                      stylesheet = stylesheet,
                                      as_json = as_json,
                                      maxbounds = maxbounds,
+                                     cluster = cluster,
                                      target = target,
                                      **args)
         # Transformation error?
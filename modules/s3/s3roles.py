@@ -665,6 +665,9 @@ class S3RoleManager(S3Method):
                         # Add the rule
                         table.insert(**data)
 
+            # Invalidate compiled ACLs
+            current.auth.permission.clear_acl_store()
+
     # -------------------------------------------------------------------------
     @staticmethod
     def copy_role(r, **attr):
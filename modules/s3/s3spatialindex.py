@@ -0,0 +1,292 @@
+# -*- coding: utf-8 -*-
+
+""" S3 Spatial Index
+
+    @copyright: 2020 (c) Sahana Software Foundation
+    @license: MIT
+
+    @requires: U{B{I{gluon}} <http://web2py.com>}
+
+    Permission is hereby granted, free of charge, to any person
+    obtaining a copy of this software and associated documentation
+    files (the "Software"), to deal in the Software without
+    restriction, including without limitation the rights to use,
+    copy, modify, merge, publish, distribute, sublicense, and/or sell
+    copies of the Software, and to permit persons to whom the
+    Software is furnished to do so, subject to the following
+    conditions:
+
+    The above copyright notice and this permission notice shall be
+    included in all copies or substantial portions of the Software.
+
+    THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+    EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES
+    OF MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+    NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT
+    HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY,
+    WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+    FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR
+    OTHER DEALINGS IN THE SOFTWARE.
+"""
+
+__all__ = ("S3SpatialIndex",
+           )
+
+import sys
+
+from gluon import current
+
+TABLENAME = "gis_location"
+RTREE_TABLENAME = "gis_location_rtree"
+
+# Index backends
+SQLITE_RTREE = "sqlite_rtree"
+
+# =============================================================================
+class S3SpatialIndex(object):
+    """
+        Spatial index (R-tree) over the bounds of gis_location, used for
+        bounding box queries if the database has no spatial extensions:
+
+            - SQLite: R*Tree virtual table, stored in the database and
+                      updated by triggers on every write to gis_location
+
+        For other databases (or if the backend is unavailable), bounding
+        box queries use the bounds columns of gis_location directly.
+
+        The index is set up by a scheduler task (gis_spatial_index_setup),
+        which is scheduled when the index is first needed; until then,
+        bounding box queries use the bounds columns.
+
+        @note: the index contains locations with valid bounds only,
+               so queries against it never match locations without
+               bounds (the same as with bounds columns) - callers which
+               need to include point locations without bounds must add
+               them to the query (e.g. OR lat_min == None)
+        @note: R*Tree stores the bounds as 32-bit floats (rounded
+               outwards), so results at the edges of the bounding box
+               are approximate, i.e. may include locations which are
+               just outside of it (by less than the float32 precision)
+    """
+
+    # Process-wide backend detection
+    _backend = None
+    _detected = False
+    _scheduled = False
+
+    # -------------------------------------------------------------------------
+    @classmethod
+    def backend(cls):
+        """
+            Detect the spatial index backend for the current database,
+            schedules the index setup if necessary; the backend is
+            remembered per process once the index exists
+
+            @return: the backend name, or None if not available
+        """
+
+        if not cls._detected:
+
+            backend = None
+            detected = True
+
+            settings = current.deployment_settings
+            if settings.get_gis_spatial_index() and \
+               not settings.get_gis_spatialdb():
+                db = current.db
+                if db._dbname == "sqlite":
+                    if cls._exists_sqlite(db):
+                        backend = SQLITE_RTREE
+                    else:
+                        # Check again with the next query
+                        detected = False
+                        if not cls._scheduled:
+                            # The scheduler skips duplicates of a queued task
+                            current.s3task.schedule_task("gis_spatial_index_setup")
+                            cls._scheduled = True
+
+            cls._backend = backend
+            cls._detected = detected
+
+        return cls._backend
+
+    # -------------------------------------------------------------------------
+    @classmethod
+    def setup(cls):
+        """
+            Set up the spatial index for the current database - to be run
+            in a scheduler task or from the CLI (and committed right away),
+            not in interactive requests
+
+            @return: the backend name, or None if not available
+        """
+
+        backend = None
+
+        settings = current.deployment_settings
+        if settings.get_gis_spatial_index() and \
+           not settings.get_gis_spatialdb():
+            db = current.db
+            try:
+                if db._dbname == "sqlite":
+                    backend = cls._setup_sqlite(db)
+            except Exception:
+                current.log.error("Spatial index setup failed",
+                                  sys.exc_info()[1])
+                backend = None
+
+        # Detect the backend again with the next query
+        cls.reset()
+
+        return backend
+
+    # -------------------------------------------------------------------------
+    @staticmethod
+    def _exists_sqlite(db):
+        """
+            Check whether the R*Tree virtual table exists in SQLite
+
+            @param db: the database
+            @return: True|False
+        """
+
+        rows = db.executesql("SELECT name FROM sqlite_master "
+                             "WHERE type='table' AND name='%s';" % RTREE_TABLENAME)
+        return bool(rows)
+
+    # -------------------------------------------------------------------------
+    @classmethod
+    def _setup_sqlite(cls, db):
+        """
+            Set up the spatial index in SQLite, i.e. an R*Tree virtual
+            table updated by triggers
+
+            @param db: the database
+            @return: the backend name, or None if R*Tree is not available
+        """
+
+        # Make sure the table exists
+        current.s3db.table(TABLENAME)
+
+        if cls._exists_sqlite(db):
+            return SQLITE_RTREE
+
+        executesql = db.executesql
+
+        options = {"t": TABLENAME,
+                   "r": RTREE_TABLENAME,
+                   # R*Tree rejects entries with min > max
+                   "valid": "%(p)s.lon_min <= %(p)s.lon_max AND "
+                            "%(p)s.lat_min <= %(p)s.lat_max",
+                   }
+        try:
+            executesql("CREATE VIRTUAL TABLE %(r)s USING rtree"
+                       "(id, lon_min, lon_max, lat_min, lat_max);" % options)
+        except Exception:
+            # R*Tree module not available
+            return None
+
+        # Triggers to update the index
+        valid = options["valid"]
+        options["new"] = valid % {"p": "new"}
+        executesql("CREATE TRIGGER IF NOT EXISTS %(r)s_ai "
+                   "AFTER INSERT ON %(t)s WHEN %(new)s BEGIN "
+                   "INSERT OR REPLACE INTO %(r)s "
+                   "VALUES (new.id, new.lon_min, new.lon_max, "
+                   "new.lat_min, new.lat_max); END;" % options)
+        executesql("CREATE TRIGGER IF NOT EXISTS %(r)s_au "
+                   "AFTER UPDATE OF lon_min, lon_max, lat_min, lat_max "
+                   "ON %(t)s BEGIN "
+                   "DELETE FROM %(r)s WHERE id=old.id; "
+                   "INSERT INTO %(r)s SELECT new.id, new.lon_min, "
+                   "new.lon_max, new.lat_min, new.lat_max WHERE %(new)s; "
+                   "END;" % options)
+        executesql("CREATE TRIGGER IF NOT EXISTS %(r)s_ad "
+                   "AFTER DELETE ON %(t)s BEGIN "
+                   "DELETE FROM %(r)s WHERE id=old.id; END;" % options)
+
+        # Index existing locations
+        executesql("INSERT INTO %(r)s SELECT id, lon_min, lon_max, "
+                   "lat_min, lat_max FROM %(t)s WHERE %(valid)s;" %
+                   dict(options, valid=valid % {"p": TABLENAME}))
+
+        return SQLITE_RTREE
+
+    # -------------------------------------------------------------------------
+    @classmethod
+    def available(cls):
+        """
+            Check whether the spatial index can be used
+
+            @return: True|False
+        """
+
+        return bool(cls.backend())
+
+    # -------------------------------------------------------------------------
+    @classmethod
+    def query(cls, lon_min, lat_min, lon_max, lat_max):
+        """
+            Construct a query for all locations with bounds intersecting
+            a bounding box
+
+            @param lon_min: the minimum longitude of the bounding box
+            @param lat_min: the minimum latitude of the bounding box
+            @param lon_max: the maximum longitude of the bounding box
+            @param lat_max: the maximum latitude of the bounding box
+
+            @return: a Query, or None if the index is not available
+
+            @note: the query never matches locations without bounds, and
+                   is approximate at the edges of the bounding box (see
+                   class docstring)
+        """
+
+        if not cls.backend():
+            return None
+
+        subselect = "SELECT %(r)s.id FROM %(r)s WHERE " \
+                    "%(r)s.lon_min<=%(lon_max)r AND " \
+                    "%(r)s.lon_max>=%(lon_min)r AND " \
+                    "%(r)s.lat_min<=%(lat_max)r AND " \
+                    "%(r)s.lat_max>=%(lat_min)r;" % \
+                    {"r": RTREE_TABLENAME,
+                     "lon_min": float(lon_min),
+                     "lat_min": float(lat_min),
+                     "lon_max": float(lon_max),
+                     "lat_max": float(lat_max),
+                     }
+
+        table = current.s3db.table(TABLENAME)
+        return table._id.belongs(subselect)
+
+    # -------------------------------------------------------------------------
+    @classmethod
+    def rebuild(cls):
+        """
+            Rebuild the index for all locations (e.g. after restoring
+            the gis_location table from a backup)
+        """
+
+        backend = cls.backend()
+        if backend == SQLITE_RTREE:
+            executesql = current.db.executesql
+            executesql("DELETE FROM %s;" % RTREE_TABLENAME)
+            executesql("INSERT INTO %(r)s SELECT id, lon_min, lon_max, "
+                       "lat_min, lat_max FROM %(t)s WHERE "
+                       "%(t)s.lon_min <= %(t)s.lon_max AND "
+                       "%(t)s.lat_min <= %(t)s.lat_max;" %
+                       {"r": RTREE_TABLENAME, "t": TABLENAME})
+
+    # -------------------------------------------------------------------------
+    @classmethod
+    def reset(cls):
+        """
+            Reset the backend detection (e.g. after database migration)
+        """
+
+        cls._backend = None
+        cls._detected = False
+        cls._scheduled = False
+
+# END =========================================================================
@@ -0,0 +1,639 @@
+# -*- coding: utf-8 -*-
+
+""" S3 Text Search Index
+
+    @copyright: 2020 (c) Sahana Software Foundation
+    @license: MIT
+
+    @requires: U{B{I{gluon}} <http://web2py.com>}
+
+    Permission is hereby granted, free of charge, to any person
+    obtaining a copy of this software and associated documentation
+    files (the "Software"), to deal in the Software without
+    restriction, including without limitation the rights to use,
+    copy, modify, merge, publish, distribute, sublicense, and/or sell
+    copies of the Software, and to permit persons to whom the
+    Software is furnished to do so, subject to the following
+    conditions:
+
+    The above copyright notice and this permission notice shall be
+    included in all copies or substantial portions of the Software.
+
+    THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+    EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES
+    OF MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+    NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT
+    HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY,
+    WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+    FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR
+    OTHER DEALINGS IN THE SOFTWARE.
+"""
+
+__all__ = ("S3TextSearch",
+           )
+
+import re
+import sys
+import time
+
+from gluon import current
+
+from s3compat import basestring
+from .s3utils import s3_unicode
+
+TABLENAME = "s3_text_search"
+FTS_TABLENAME = "s3_text_search_fts"
+
+# Search backends
+PG_TRIGRAM = "pg_trgm"
+PG_TSVECTOR = "pg_tsvector"
+SQLITE_TRIGRAM = "fts5_trigram"
+SQLITE_FTS = "fts5"
+
+# Interval to re-check for the index setup if not available (seconds)
+DETECT_INTERVAL = 300
+
+# Timeout for the index build task (seconds)
+BUILD_TIMEOUT = 3600
+
+# =============================================================================
+class S3TextSearch(object):
+    """
+        Indexed text search for resources, used by the datatable quick
+        search instead of LIKE-matching each text column.
+
+        The text of the configured fields of each record is stored as
+        a (lower-case) document in s3_text_search, which is indexed
+        with a backend-specific text search index:
+
+            - PostgreSQL: trigram index (pg_trgm) if the extension is
+                          installed, otherwise a tsvector index
+            - SQLite:     FTS5 virtual table (trigram tokenizer where
+                          available)
+
+        For other databases (or if the backend is unavailable), the
+        datatable quick search falls back to LIKE.
+
+        Activation per table:
+
+            s3db.configure(tablename,
+                           # Names of the fields to index (or True for
+                           # all string/text fields of the table)
+                           text_search = ["name", "acronym"],
+                           )
+
+        The index is set up and populated by a scheduler task (see
+        rebuild), which is scheduled when the index for a table is first
+        needed - until then, the quick search falls back to LIKE. The
+        index can also be built from the CLI:
+
+            python web2py.py -S eden -M -R applications/eden/static/scripts/tools/text_search_rebuild.py -A tablename
+
+        The index is updated by the CRUD/import/delete methods; records
+        written directly with the DAL can be re-indexed with rebuild().
+
+        @note: the index covers all configured fields, so the quick
+               search would also match configured fields that are not
+               shown as columns in the datatable
+    """
+
+    # Process-wide backend detection
+    _backend = None
+    _detected = None
+
+    # Tables with known-populated index (per process)
+    _ready = set()
+
+    # Tables for which the index build has been scheduled (per process)
+    _scheduled = set()
+
+    # -------------------------------------------------------------------------
+    @staticmethod
+    def supported():
+        """
+            Check whether the text search index is enabled and supported
+            for the current database
+
+            @return: True|False
+        """
+
+        return current.deployment_settings.get_database_text_search() and \
+               current.db._dbname in ("postgres", "sqlite")
+
+    # -------------------------------------------------------------------------
+    @classmethod
+    def backend(cls):
+        """
+            Detect the text search backend for the current database; this
+            is done once per process (re-checked after DETECT_INTERVAL if
+            the index has not been set up yet)
+
+            @return: the backend name, or None if not available
+        """
+
+        now = time.time()
+        detected = cls._detected
+        if detected is None or \
+           cls._backend is None and now - detected > DETECT_INTERVAL:
+
+            backend = None
+            if cls.supported():
+                db = current.db
+                try:
+                    if db._dbname == "postgres":
+                        backend = cls._detect_postgres(db)
+                    else:
+                        backend = cls._detect_sqlite(db)
+                except Exception:
+                    current.log.error("Text search backend detection failed",
+                                      sys.exc_info()[1])
+                    backend = None
+
+            cls._backend = backend
+            cls._detected = now
+
+        return cls._backend
+
+    # -------------------------------------------------------------------------
+    @staticmethod
+    def _detect_postgres(db):
+        """
+            Detect the text search index in PostgreSQL
+
+            @param db: the database
+            @return: the backend name, or None if not set up
+        """
+
+        rows = db.executesql("SELECT indexname FROM pg_indexes "
+                             "WHERE tablename='%(t)s' AND indexname IN "
+                             "('%(t)s_trgm_idx', '%(t)s_tsv_idx');" %
+                             {"t": TABLENAME})
+        indexes = set(row[0] for row in rows)
+        if "%s_trgm_idx" % TABLENAME in indexes:
+            return PG_TRIGRAM
+        elif indexes:
+            return PG_TSVECTOR
+        return None
+
+    # -------------------------------------------------------------------------
+    @staticmethod
+    def _detect_sqlite(db):
+        """
+            Detect the text search index in SQLite
+
+            @param db: the database
+            @return: the backend name, or None if not set up
+        """
+
+        rows = db.executesql("SELECT sql FROM sqlite_master "
+                             "WHERE type='table' AND name='%s';" % FTS_TABLENAME)
+        if rows:
+            sql = rows[0][0] or ""
+            return SQLITE_TRIGRAM if "trigram" in sql else SQLITE_FTS
+        return None
+
+    # -------------------------------------------------------------------------
+    @classmethod
+    def setup(cls):
+        """
+            Set up the text search indexes (DDL), called by rebuild, i.e.
+            in the index build task rather than in interactive requests
+
+            @return: the backend name, or None if not available
+        """
+
+        backend = None
+        if cls.supported():
+            db = current.db
+            try:
+                if db._dbname == "postgres":
+                    backend = cls._setup_postgres(db)
+                else:
+                    backend = cls._setup_sqlite(db)
+            except Exception:
+                current.log.error("Text search index setup failed",
+                                  sys.exc_info()[1])
+                backend = None
+
+        cls._backend = backend
+        cls._detected = time.time()
+
+        return backend
+
+    # -------------------------------------------------------------------------
+    @staticmethod
+    def _setup_postgres(db):
+        """
+            Set up the text search index in PostgreSQL
+
+            @param db: the database
+            @return: the backend name
+        """
+
+        # Make sure the table exists
+        current.s3db.table(TABLENAME)
+
+        executesql = db.executesql
+
+        # Composite index for index maintenance
+        executesql("CREATE INDEX IF NOT EXISTS %(t)s_record_idx "
+                   "ON %(t)s (tablename, record_id);" % {"t": TABLENAME})
+
+        # Check whether pg_trgm is installed (not trying to create the
+        # extension here, since failure would abort the transaction)
+        rows = executesql("SELECT 1 FROM pg_extension "
+                          "WHERE extname='pg_trgm';")
+        if rows:
+            executesql("CREATE INDEX IF NOT EXISTS %(t)s_trgm_idx "
+                       "ON %(t)s USING gin (document gin_trgm_ops);" %
+                       {"t": TABLENAME})
+            backend = PG_TRIGRAM
+        else:
+            executesql("CREATE INDEX IF NOT EXISTS %(t)s_tsv_idx "
+                       "ON %(t)s USING gin "
+                       "(to_tsvector('simple', document));" %
+                       {"t": TABLENAME})
+            backend = PG_TSVECTOR
+
+        return backend
+
+    # -------------------------------------------------------------------------
+    @staticmethod
+    def _setup_sqlite(db):
+        """
+            Set up the text search index in SQLite, i.e. an FTS5 virtual
+            table as external-content index for s3_text_search, updated
+            by triggers
+
+            @param db: the database
+            @return: the backend name, or None if FTS5 is not available
+        """
+
+        # Make sure the table exists
+        current.s3db.table(TABLENAME)
+
+        executesql = db.executesql
+
+        # Composite index for index maintenance
+        executesql("CREATE INDEX IF NOT EXISTS %(t)s_record_idx "
+                   "ON %(t)s (tablename, record_id);" % {"t": TABLENAME})
+
+        backend = S3TextSearch._detect_sqlite(db)
+        if backend:
+            return backend
+
+        create = "CREATE VIRTUAL TABLE %(f)s USING fts5(document, " \
+                 "content='%(t)s', content_rowid='id'%(tokenize)s);"
+        options = {"t": TABLENAME, "f": FTS_TABLENAME}
+        try:
+            # Trigram tokenizer (SQLite>=3.34) for substring matches
+            options["tokenize"] = ", tokenize='trigram'"
+            executesql(create % options)
+            backend = SQLITE_TRIGRAM
+        except Exception:
+            try:
+                options["tokenize"] = ""
+                executesql(create % options)
+                backend = SQLITE_FTS
+            except Exception:
+                # FTS5 not available
+                return None
+
+        # Triggers to update the FTS index
+        executesql("CREATE TRIGGER IF NOT EXISTS %(t)s_ai "
+                   "AFTER INSERT ON %(t)s BEGIN "
+                   "INSERT INTO %(f)s(rowid, document) "
+                   "VALUES (new.id, new.document); END;" % options)
+        executesql("CREATE TRIGGER IF NOT EXISTS %(t)s_ad "
+                   "AFTER DELETE ON %(t)s BEGIN "
+                   "INSERT INTO %(f)s(%(f)s, rowid, document) "
+                   "VALUES ('delete', old.id, old.document); END;" % options)
+        executesql("CREATE TRIGGER IF NOT EXISTS %(t)s_au "
+                   "AFTER UPDATE ON %(t)s BEGIN "
+                   "INSERT INTO %(f)s(%(f)s, rowid, document) "
+                   "VALUES ('delete', old.id, old.document); "
+                   "INSERT INTO %(f)s(rowid, document) "
+                   "VALUES (new.id, new.document); END;" % options)
+
+        # Index existing documents
+        executesql("INSERT INTO %(f)s(%(f)s) VALUES ('rebuild');" % options)
+
+        return backend
+
+    # -------------------------------------------------------------------------
+    @staticmethod
+    def search_fields(tablename):
+        """
+            Get the names of the indexed fields of a table
+
+            @param tablename: the table name
+            @return: list of field names, or None if the table has no
+                     text search index configured
+        """
+
+        s3db = current.s3db
+
+        setting = s3db.get_config(tablename, "text_search")
+        if not setting:
+            return None
+
+        table = s3db.table(tablename)
+        if table is None:
+            return None
+
+        if setting is True:
+            setting = [fn for fn in table.fields
+                          if str(table[fn].type) in ("string", "text") and
+                             table[fn].readable]
+        elif isinstance(setting, basestring):
+            setting = [setting]
+
+        fields = [fn for fn in setting if fn in table.fields]
+        return fields if fields else None
+
+    # -------------------------------------------------------------------------
+    @classmethod
+    def available(cls, tablename):
+        """
+            Check whether the text search index can be used for a table,
+            schedules the index build for the table if necessary
+
+            @param tablename: the table name
+            @return: True|False
+        """
+
+        if not cls.supported() or not cls.search_fields(tablename):
+            return False
+
+        if tablename in cls._ready:
+            return True
+
+        ready = False
+        if cls.backend():
+            # Look up the marker for the completed index build
+            itable = current.s3db.table(TABLENAME)
+            query = (itable.tablename == tablename) & \
+                    (itable.record_id == 0)
+            row = current.db(query).select(itable.id,
+                                           limitby = (0, 1),
+                                           ).first()
+            ready = bool(row)
+
+        if ready:
+            cls._ready.add(tablename)
+        else:
+            cls.schedule(tablename)
+
+        return ready
+
+    # -------------------------------------------------------------------------
+    @classmethod
+    def schedule(cls, tablename):
+        """
+            Schedule the index build for a table (once per process, the
+            scheduler skips duplicates of already queued build tasks)
+
+            @param tablename: the table name
+        """
+
+        if tablename in cls._scheduled:
+            return
+        cls._scheduled.add(tablename)
+
+        current.s3task.schedule_task("s3_text_search_rebuild",
+                                     vars = {"tablename": tablename,
+                                             "fields": cls.search_fields(tablename),
+                                             },
+                                     timeout = BUILD_TIMEOUT,
+                                     )
+
+    # -------------------------------------------------------------------------
+    @classmethod
+    def query(cls, table, word):
+        """
+            Construct a query for records in table which contain word
+            in any of their indexed fields
+
+            @param table: the Table
+            @param word: the search term (lower-case string)
+
+            @return: a Query, or None if the backend is not available
+        """
+
+        backend = cls.backend()
+        if not backend:
+            return None
+
+        db = current.db
+        itable = current.s3db.table(TABLENAME)
+
+        tablename = str(table)
+        word = s3_unicode(word).lower()
+
+        if backend == PG_TRIGRAM or \
+           backend == SQLITE_TRIGRAM and len(word) < 3:
+            # Trigram index supports LIKE (for short terms, the
+            # FTS5 trigram tokenizer returns no matches, so use LIKE
+            # here too)
+            query = (itable.tablename == tablename) & \
+                    (itable.document.like("%%%s%%" % word,
+                                          case_sensitive = True,
+                                          ))
+            subselect = db(query)._select(itable.record_id)
+
+        elif backend == PG_TSVECTOR:
+            # Prefix-match all lexemes in the term
+            terms = [t for t in re.split(r"\W+", word, flags=re.UNICODE) if t]
+            if not terms:
+                return None
+            tsquery = " & ".join("%s:*" % t for t in terms)
+            subselect = "SELECT %(t)s.record_id FROM %(t)s " \
+                        "WHERE %(t)s.tablename=%(tn)s AND " \
+                        "to_tsvector('simple', %(t)s.document) @@ " \
+                        "to_tsquery('simple', %(q)s);" % \
+                        {"t": TABLENAME,
+                         "tn": cls._quote(tablename),
+                         "q": cls._quote(tsquery),
+                         }
+
+        else:
+            # FTS5 MATCH (phrase, prefix-match unless trigram)
+            expr = '"%s"' % word.replace('"', '""')
+            if backend == SQLITE_FTS:
+                expr = "%s*" % expr
+            subselect = "SELECT %(t)s.record_id FROM %(t)s " \
+                        "WHERE %(t)s.tablename=%(tn)s AND " \
+                        "%(t)s.id IN (SELECT rowid FROM %(f)s " \
+                        "WHERE %(f)s MATCH %(q)s);" % \
+                        {"t": TABLENAME,
+                         "f": FTS_TABLENAME,
+                         "tn": cls._quote(tablename),
+                         "q": cls._quote(expr),
+                         }
+
+        return table._id.belongs(subselect)
+
+    # -------------------------------------------------------------------------
+    @staticmethod
+    def _quote(value):
+        """
+            Quote a string for use in SQL
+
+            @param value: the string
+        """
+
+        return "'%s'" % s3_unicode(value).replace("'", "''")
+
+    # -------------------------------------------------------------------------
+    @classmethod
+    def update(cls, tablename, record_ids):
+        """
+            Update the index for records
+
+            @param tablename: the table name
+            @param record_ids: record ID or list of record IDs
+        """
+
+        fields = cls.search_fields(tablename)
+        if not fields or not cls.supported():
+            return
+
+        if not isinstance(record_ids, (list, tuple, set)):
+            record_ids = [record_ids]
+        record_ids = [record_id for record_id in record_ids if record_id]
+        if not record_ids:
+            return
+
+        db = current.db
+        s3db = current.s3db
+
+        table = s3db.table(tablename)
+        itable = s3db.table(TABLENAME)
+
+        # Remove the current documents
+        db((itable.tablename == tablename) & \
+           (itable.record_id.belongs(record_ids))).delete()
+
+        # Insert the new documents
+        query = table._id.belongs(record_ids)
+        if "deleted" in table.fields:
+            query &= (table.deleted == False)
+        rows = db(query).select(table._id, *[table[fn] for fn in fields])
+        cls._insert(tablename, table, fields, rows)
+
+    # -------------------------------------------------------------------------
+    @classmethod
+    def delete(cls, tablename, record_ids):
+        """
+            Remove records from the index
+
+            @param tablename: the table name
+            @param record_ids: record ID or list of record IDs
+        """
+
+        if not cls.search_fields(tablename) or not cls.supported():
+            return
+
+        if not isinstance(record_ids, (list, tuple, set)):
+            record_ids = [record_ids]
+
+        itable = current.s3db.table(TABLENAME)
+        query = (itable.tablename == tablename) & \
+                (itable.record_id.belongs(record_ids))
+        current.db(query).delete()
+
+    # -------------------------------------------------------------------------
+    @classmethod
+    def rebuild(cls, tablename, fields=None, chunksize=1000):
+        """
+            Set up the index if necessary, and rebuild it for all records
+            in a table - to be run in a scheduler task or from the CLI
+            (see static/scripts/tools/text_search_rebuild.py), not in
+            interactive requests
+
+            @param tablename: the table name
+            @param fields: the names of the fields to index, defaults
+                           to the configured fields of the table
+            @param chunksize: number of records to process at a time
+        """
+
+        if not fields:
+            fields = cls.search_fields(tablename)
+        if not fields or not cls.supported():
+            return
+
+        if not cls.setup():
+            return
+
+        db = current.db
+        s3db = current.s3db
+
+        table = s3db.table(tablename)
+        itable = s3db.table(TABLENAME)
+
+        db(itable.tablename == tablename).delete()
+
+        query = (table._id > 0)
+        if "deleted" in table.fields:
+            query &= (table.deleted == False)
+
+        fields_ = [table._id] + [table[fn] for fn in fields]
+        last_id = 0
+        while True:
+            rows = db(query & (table._id > last_id)).select(
+                                        orderby = table._id,
+                                        limitby = (0, chunksize),
+                                        *fields_)
+            if not rows:
+                break
+            cls._insert(tablename, table, fields, rows)
+            last_id = rows.last()[table._id]
+
+        # Mark the index build as completed
+        itable.insert(tablename = tablename,
+                      record_id = 0,
+                      document = "",
+                      )
+
+        cls._ready.add(tablename)
+
+    # -------------------------------------------------------------------------
+    @staticmethod
+    def _insert(tablename, table, fields, rows):
+        """
+            Insert the index documents for rows
+
+            @param tablename: the table name
+            @param table: the Table
+            @param fields: the indexed field names
+            @param rows: the Rows
+        """
+
+        if not rows:
+            return
+
+        pkey = table._id.name
+        documents = []
+        for row in rows:
+            text = [s3_unicode(row[fn]) for fn in fields
+                                        if row[fn] not in (None, "")]
+            documents.append({"tablename": tablename,
+                              "record_id": row[pkey],
+                              "document": "\n".join(text).lower(),
+                              })
+
+        current.s3db.table(TABLENAME).bulk_insert(documents)
+
+    # -------------------------------------------------------------------------
+    @classmethod
+    def reset(cls):
+        """
+            Reset the backend detection (e.g. after database migration)
+        """
+
+        cls._backend = None
+        cls._detected = None
+        cls._ready = set()
+        cls._scheduled = set()
+
+# END =========================================================================
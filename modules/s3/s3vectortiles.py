@@ -0,0 +1,708 @@
+# -*- coding: utf-8 -*-
+
+""" S3 Vector Tiles
+
+    @copyright: 2020 (c) Sahana Software Foundation
+    @license: MIT
+
+    @requires: U{B{I{gluon}} <http://web2py.com>}
+    @requires: U{B{I{shapely}} <https://pypi.org/project/Shapely>}
+
+    Permission is hereby granted, free of charge, to any person
+    obtaining a copy of this software and associated documentation
+    files (the "Software"), to deal in the Software without
+    restriction, including without limitation the rights to use,
+    copy, modify, merge, publish, distribute, sublicense, and/or sell
+    copies of the Software, and to permit persons to whom the
+    Software is furnished to do so, subject to the following
+    conditions:
+
+    The above copyright notice and this permission notice shall be
+    included in all copies or substantial portions of the Software.
+
+    THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+    EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES
+    OF MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+    NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT
+    HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY,
+    WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+    FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR
+    OTHER DEALINGS IN THE SOFTWARE.
+"""
+
+__all__ = ("S3TileCache",
+           "S3VectorTiles",
+           )
+
+import hashlib
+import json
+import math
+import os
+import shutil
+import uuid
+
+from gluon import current, HTTP
+from gluon.languages import lazyT
+
+from s3dal import Table, original_tablename
+from .s3gis import GIS
+from .s3rest import S3Method
+from .s3utils import s3_str, s3_unicode
+
+SEPARATORS = (",", ":")
+
+# Half the circumference of the earth in EPSG:900913 (web mercator)
+MERCATOR_MAX = 20037508.342789244
+
+# Maximum latitude in web mercator
+MERCATOR_MAX_LAT = 85.0511287798066
+
+# Maximum zoom level
+MAX_ZOOM = 22
+
+# =============================================================================
+class S3TileCache(object):
+    """
+        On-disk cache for vector tiles (see S3VectorTiles), shared between
+        all worker processes:
+
+            <folder>/cache/tiles/<tablename>/VERSION
+            <folder>/cache/tiles/<tablename>/<version>/<key>/<z>/<x>/<y>.<format>
+
+        The table version is bumped after records in the table have been
+        written or deleted and the transaction committed (see invalidate),
+        so outdated tiles are never returned; they are removed from disk
+        with the next invalidation.
+
+        Changes to gis_location invalidate the cached tiles of all tables
+        with features at these locations.
+    """
+
+    # -------------------------------------------------------------------------
+    @staticmethod
+    def path(*parts):
+        """
+            Get a path inside the tile cache
+
+            @param parts: the path elements below the cache folder
+        """
+
+        return os.path.join(current.request.folder, "cache", "tiles", *parts)
+
+    # -------------------------------------------------------------------------
+    @classmethod
+    def version(cls, tablename):
+        """
+            Get the current version of the cached tiles for a table
+
+            @param tablename: the table name
+
+            @return: the version number
+        """
+
+        try:
+            with open(cls.path(tablename, "VERSION"), "r") as f:
+                version = int(f.read().strip() or 0)
+        except (IOError, OSError, ValueError):
+            version = 0
+        return version
+
+    # -------------------------------------------------------------------------
+    @staticmethod
+    def key(resource, *params):
+        """
+            Construct the cache key for tiles of a resource
+
+            @param resource: the S3Resource
+            @param params: the parameters for the tiles (layer, fields etc.)
+
+            @return: the cache key (string), or None if the tiles can not
+                     be cached
+        """
+
+        rfilter = resource.rfilter
+        if rfilter is None or rfilter.get_extra_filters():
+            # Extra filters are callables => can't serialize them
+            return None
+
+        # The permitted realms of the current user
+        auth = current.auth
+        user = auth.user
+        realms = user.realms if user else None
+
+        key = "%r|%s|%s|%s|%s" % (rfilter,
+                                  "|".join(s3_str(param) for param in params),
+                                  json.dumps(realms, sort_keys=True),
+                                  auth.override,
+                                  current.T.accepted_language,
+                                  )
+        return hashlib.md5(s3_unicode(key).encode("utf-8")).hexdigest()
+
+    # -------------------------------------------------------------------------
+    @classmethod
+    def get(cls, tablename, version, key, z, x, y, fmt):
+        """
+            Look up a cached tile
+
+            @param tablename: the table name
+            @param version: the table version
+            @param key: the cache key
+            @param z: the zoom level
+            @param x: the tile column
+            @param y: the tile row
+            @param fmt: the tile format
+
+            @return: the tile contents (bytes), or None if not cached
+        """
+
+        path = cls.path(tablename,
+                        str(version),
+                        key,
+                        str(z),
+                        str(x),
+                        "%s.%s" % (y, fmt),
+                        )
+        try:
+            with open(path, "rb") as f:
+                tile = f.read()
+        except (IOError, OSError):
+            tile = None
+        return tile
+
+    # -------------------------------------------------------------------------
+    @classmethod
+    def store(cls, tablename, version, key, z, x, y, fmt, tile):
+        """
+            Store a tile in the cache
+
+            @param tablename: the table name
+            @param version: the table version the tile has been
+                            produced for
+            @param key: the cache key
+            @param z: the zoom level
+            @param x: the tile column
+            @param y: the tile row
+            @param fmt: the tile format
+            @param tile: the tile contents (bytes)
+        """
+
+        folder = cls.path(tablename,
+                          str(version),
+                          key,
+                          str(z),
+                          str(x),
+                          )
+        path = os.path.join(folder, "%s.%s" % (y, fmt))
+
+        # Write to a temporary file first, so that concurrent
+        # requests never read an incomplete tile
+        tmp = "%s.%s" % (path, uuid.uuid4().hex)
+        try:
+            if not os.path.isdir(folder):
+                os.makedirs(folder)
+            with open(tmp, "wb") as f:
+                f.write(tile)
+            os.rename(tmp, path)
+        except (IOError, OSError):
+            # Folder not writable, or tile stored by another process
+            try:
+                os.remove(tmp)
+            except OSError:
+                pass
+
+    # -------------------------------------------------------------------------
+    @classmethod
+    def invalidate(cls, tablename, record_ids=None):
+        """
+            Invalidate all cached tiles of a table, to be called after
+            records in the table have been written or deleted (see
+            S3Model.invalidate_caches)
+
+            @param tablename: the table name (or Table)
+            @param record_ids: the IDs of the written records, to limit
+                               the invalidation for gis_location to the
+                               tables referencing these locations
+        """
+
+        tablename = original_tablename(tablename) \
+                    if isinstance(tablename, Table) else str(tablename)
+
+        if tablename == "gis_location":
+            try:
+                tablenames = os.listdir(cls.path())
+            except OSError:
+                tablenames = []
+            if record_ids and tablenames:
+                tablenames = cls.referencing(tablenames, record_ids)
+        elif os.path.isdir(cls.path(tablename)):
+            tablenames = [tablename]
+        else:
+            # No cached tiles for this table
+            tablenames = []
+
+        for tablename in tablenames:
+
+            version = cls.version(tablename) + 1
+            try:
+                with open(cls.path(tablename, "VERSION"), "w") as f:
+                    f.write(str(version))
+            except (IOError, OSError):
+                current.log.error("Could not invalidate tile cache for %s" % tablename)
+                continue
+
+            # Remove the outdated tiles
+            folder = cls.path(tablename)
+            for name in os.listdir(folder):
+                if name.isdigit() and int(name) != version:
+                    shutil.rmtree(os.path.join(folder, name), ignore_errors=True)
+
+    # -------------------------------------------------------------------------
+    @staticmethod
+    def referencing(tablenames, location_ids):
+        """
+            Find the tables with cached tiles which contain features at
+            any of the given locations
+
+            @param tablenames: the names of the tables with cached tiles
+            @param location_ids: the gis_location record IDs
+
+            @return: list of table names
+        """
+
+        db = current.db
+        s3db = current.s3db
+
+        location_ids = list(location_ids)
+
+        sites = None
+        result = []
+        for tablename in tablenames:
+            if tablename == "gis_location":
+                result.append(tablename)
+                continue
+            table = s3db.table(tablename)
+            if table is None:
+                continue
+            if "location_id" in table.fields:
+                query = table.location_id.belongs(location_ids)
+            elif "site_id" in table.fields:
+                if sites is None:
+                    stable = s3db.org_site
+                    sites = db(stable.location_id.belongs(location_ids))._select(stable.site_id)
+                query = table.site_id.belongs(sites)
+            else:
+                continue
+            if db(query).select(table._id, limitby=(0, 1)).first():
+                result.append(tablename)
+        return result
+
+    # -------------------------------------------------------------------------
+    @classmethod
+    def clear(cls):
+        """
+            Remove all tiles from the cache
+        """
+
+        shutil.rmtree(cls.path(), ignore_errors=True)
+
+# =============================================================================
+class S3VectorTiles(S3Method):
+    """
+        Tiled export of the features of a resource, as used by Feature
+        Layers to load only the features inside the visible map area:
+
+            /<controller>/<function>/tiles.geojson?layer=<layer_id>&z={z}&x={x}&y={y}
+            /<controller>/<function>/tiles.mvt?layer=<layer_id>&z={z}&x={x}&y={y}
+
+        Tiles use the XYZ scheme in web mercator (EPSG:900913), feature
+        geometries are simplified for the zoom level (using the precomputed
+        simplified geometries where available).
+
+        Tiles can be cached on disk (see S3TileCache), if enabled with
+        settings.gis.vector_tile_cache = True
+    """
+
+    FORMATS = {"geojson": "application/json",
+               "mvt": "application/vnd.mapbox-vector-tile",
+               }
+
+    # -------------------------------------------------------------------------
+    def apply_method(self, r, **attr):
+        """
+            Entry point for REST API
+
+            @param r: the S3Request
+            @param attr: controller options for this request
+        """
+
+        if r.http != "GET":
+            r.error(405, current.ERROR.BAD_METHOD)
+
+        fmt = r.representation
+        if fmt not in self.FORMATS:
+            r.error(415, current.ERROR.BAD_FORMAT)
+
+        get_vars = r.get_vars
+        try:
+            z = int(get_vars["z"])
+            x = int(get_vars["x"])
+            y = int(get_vars["y"])
+        except (KeyError, TypeError, ValueError):
+            r.error(400, current.ERROR.BAD_REQUEST)
+        size = 2 ** z if 0 <= z <= MAX_ZOOM else 0
+        if not (0 <= x < size and 0 <= y < size):
+            r.error(400, current.ERROR.BAD_REQUEST)
+
+        resource = self.resource
+        tablename = resource.tablename
+
+        layer = self.layer(get_vars.get("layer"))
+        attr_fields = self.attr_fields(layer)
+        points = layer.points if layer else False
+
+        # Look up the tile cache
+        cache = None
+        if current.deployment_settings.get_gis_vector_tile_cache():
+            key = S3TileCache.key(resource,
+                                  layer.layer_id if layer else None,
+                                  ",".join(attr_fields),
+                                  points,
+                                  )
+            if key:
+                cache = S3TileCache
+        if cache:
+            # Version before extraction, so that the tile is never
+            # stored as current if the data change in the meantime
+            version = cache.version(tablename)
+            tile = cache.get(tablename, version, key, z, x, y, fmt)
+        else:
+            tile = None
+
+        if tile is None:
+            features = self.features(r, z, x, y, attr_fields, points)
+            if fmt == "mvt":
+                tile = self.encode_mvt(r, features, z, x, y)
+            else:
+                tile = self.encode_geojson(features)
+            if cache:
+                cache.store(tablename, version, key, z, x, y, fmt, tile)
+
+        current.response.headers["Content-Type"] = self.FORMATS[fmt]
+        return tile
+
+    # -------------------------------------------------------------------------
+    @staticmethod
+    def layer(layer_id):
+        """
+            Look up the Feature Layer
+
+            @param layer_id: the layer ID (from URL)
+
+            @return: the gis_layer_feature Row, or None
+        """
+
+        if not layer_id:
+            return None
+        try:
+            layer_id = int(layer_id)
+        except (TypeError, ValueError):
+            return None
+
+        ftable = current.s3db.gis_layer_feature
+        query = (ftable.layer_id == layer_id) & \
+                (ftable.deleted == False)
+        return current.db(query).select(ftable.layer_id,
+                                        ftable.attr_fields,
+                                        ftable.popup_fields,
+                                        ftable.points,
+                                        limitby = (0, 1),
+                                        ).first()
+
+    # -------------------------------------------------------------------------
+    def attr_fields(self, layer):
+        """
+            Get the attribute fields for the features, same as
+            GIS.get_location_data
+
+            @param layer: the gis_layer_feature Row
+
+            @return: list of field selectors
+        """
+
+        get_vars = self.request.get_vars
+
+        attr_fields = get_vars.get("attr")
+        attr_fields = attr_fields.split(",") if attr_fields else []
+        popup_fields = get_vars.get("popup")
+        popup_fields = popup_fields.split(",") if popup_fields else []
+
+        if layer:
+            if not popup_fields:
+                popup_fields = layer.popup_fields or []
+            if not attr_fields:
+                attr_fields = layer.attr_fields or []
+        elif not popup_fields:
+            popup_fields = ["name"]
+
+        fields = []
+        for selector in popup_fields + attr_fields:
+            if selector not in fields:
+                fields.append(selector)
+        return fields
+
+    # -------------------------------------------------------------------------
+    @staticmethod
+    def tile_bounds(z, x, y):
+        """
+            Get the bounds of a tile
+
+            @param z: the zoom level
+            @param x: the tile column
+            @param y: the tile row
+
+            @return: tuple (lon_min, lat_min, lon_max, lat_max)
+        """
+
+        size = 2.0 ** z
+
+        def lat(row):
+            return math.degrees(math.atan(math.sinh(math.pi * (1 - 2 * row / size))))
+
+        return (x / size * 360.0 - 180.0,
+                lat(y + 1),
+                (x + 1) / size * 360.0 - 180.0,
+                lat(y),
+                )
+
+    # -------------------------------------------------------------------------
+    def features(self, r, z, x, y, attr_fields, points=False):
+        """
+            Extract the features inside a tile
+
+            @param r: the S3Request
+            @param z: the zoom level
+            @param x: the tile column
+            @param y: the tile row
+            @param attr_fields: the attribute fields (selectors)
+            @param points: use the lat/lon of the features rather than
+                           their shapes
+
+            @return: list of tuples (record_id, geometry, attributes),
+                     with the geometry as GeoJSON
+        """
+
+        db = current.db
+        s3db = current.s3db
+        settings = current.deployment_settings
+
+        resource = self.resource
+        table = resource.table
+
+        # Locations inside the tile
+        gtable = s3db.gis_location
+        query = GIS.query_features_by_bbox(*self.tile_bounds(z, x, y))
+        if "location_id" in table.fields:
+            prefix = "location_id$"
+            locations = db(query & (gtable.deleted == False))._select(gtable.id)
+            resource.add_filter(table.location_id.belongs(locations))
+        elif "site_id" in table.fields:
+            prefix = "site_id$location_id$"
+            stable = s3db.org_site
+            locations = db(query & (gtable.deleted == False))._select(gtable.id)
+            sites = db(stable.location_id.belongs(locations))._select(stable.site_id)
+            resource.add_filter(table.site_id.belongs(sites))
+        elif resource.tablename == "gis_location":
+            prefix = ""
+            resource.add_filter(query)
+        else:
+            # Can't display this resource on the Map
+            r.error(400, current.ERROR.BAD_RESOURCE)
+
+        geometry = ["%sid" % prefix, "%slat" % prefix, "%slon" % prefix]
+
+        # Extract the records
+        max_features = settings.get_gis_max_features()
+        fields = ["id"]
+        for selector in geometry + attr_fields:
+            if selector not in fields:
+                fields.append(selector)
+        data = resource.select(fields,
+                               limit = max_features + 1,
+                               represent = True,
+                               raw_data = True,
+                               show_links = False,
+                               )
+        rows = data.rows
+        if len(rows) > max_features:
+            message = "Too Many Records"
+            status = 509
+            raise HTTP(status,
+                       body = current.xml.json_message(success = False,
+                                                       statuscode = status,
+                                                       message = message,
+                                                       ),
+                       web2py_error = message,
+                       )
+
+        rfields = dict((rfield.selector, rfield) for rfield in data.rfields)
+        colname = lambda selector: rfields[selector].colname
+
+        pkey = colname("id")
+        location_id, lat, lon = [colname(selector) for selector in geometry]
+
+        # Simplified shapes (precomputed where available)
+        if points:
+            shapes = {}
+        else:
+            tolerance, precision = self.resolution(z)
+            shapes = GIS.get_simplified_geojson([row["_row"][location_id] for row in rows],
+                                                tolerance = tolerance,
+                                                precision = precision,
+                                                )
+
+        # Attributes, same as GIS.get_location_data
+        attr_cols = []
+        for selector in attr_fields:
+            rfield = rfields.get(selector)
+            if rfield is None:
+                continue
+            field = rfield.field
+            ftype = field.type if field else None
+            attr_cols.append((rfield.colname, rfield.fname, ftype))
+
+        NONE = current.messages["NONE"]
+
+        features = []
+        append = features.append
+        for row in rows:
+            raw = row["_row"]
+
+            shape = shapes.get(raw[location_id])
+            if not shape:
+                if raw[lat] is None or raw[lon] is None:
+                    continue
+                shape = '{"type":"Point","coordinates":[%r,%r]}' % (raw[lon], raw[lat])
+
+            attributes = {}
+            for col, fname, ftype in attr_cols:
+                represent = row[col]
+                if represent is None or represent in (NONE, ""):
+                    # Skip empty fields
+                    continue
+                if ftype == "integer" and not isinstance(represent, lazyT) or \
+                   ftype in ("double", "float"):
+                    # Attributes should be numbers not strings
+                    represent = raw[col]
+                else:
+                    represent = s3_str(represent)
+                attributes[fname] = represent
+
+            append((raw[pkey], shape, attributes))
+
+        return features
+
+    # -------------------------------------------------------------------------
+    @staticmethod
+    def resolution(z):
+        """
+            Get the tolerance and precision to simplify feature geometries
+            for a zoom level, i.e. to a resolution of about one pixel
+
+            @param z: the zoom level
+
+            @return: tuple (tolerance, precision)
+        """
+
+        # Degrees per pixel
+        tolerance = 360.0 / (256 * 2 ** z)
+
+        precision = int(math.ceil(-math.log10(tolerance))) + 1
+        precision = max(1, min(precision, current.deployment_settings.get_gis_precision()))
+
+        return tolerance, precision
+
+    # -------------------------------------------------------------------------
+    @staticmethod
+    def encode_geojson(features):
+        """
+            Encode features as GeoJSON tile
+
+            @param features: the features, as returned from features()
+
+            @return: the tile contents (bytes)
+        """
+
+        items = []
+        append = items.append
+        for record_id, geometry, attributes in features:
+            append('{"type":"Feature","id":%s,"geometry":%s,"properties":%s}' % \
+                   (record_id,
+                    geometry,
+                    json.dumps(attributes, separators=SEPARATORS),
+                    ))
+
+        output = '{"type":"FeatureCollection","features":[%s]}' % ",".join(items)
+        return s3_unicode(output).encode("utf-8")
+
+    # -------------------------------------------------------------------------
+    def encode_mvt(self, r, features, z, x, y):
+        """
+            Encode features as Mapbox Vector Tile
+
+            @param r: the S3Request
+            @param features: the features, as returned from features()
+            @param z: the zoom level
+            @param x: the tile column
+            @param y: the tile row
+
+            @return: the tile contents (bytes)
+        """
+
+        try:
+            import mapbox_vector_tile
+        except ImportError:
+            current.log.error("Mapbox Vector Tiles require mapbox_vector_tile")
+            r.error(501, current.ERROR.NOT_IMPLEMENTED)
+
+        from shapely.geometry import shape
+        from shapely.ops import transform
+
+        def project(lon, lat):
+            lat = max(-MERCATOR_MAX_LAT, min(lat, MERCATOR_MAX_LAT))
+            return (lon * MERCATOR_MAX / 180.0,
+                    math.log(math.tan((90.0 + lat) * math.pi / 360.0)) * \
+                    MERCATOR_MAX / math.pi,
+                    )
+
+        def mercator(lon, lat, z=None):
+            # Called with either single coordinates or sequences
+            if isinstance(lon, (int, float)):
+                return project(lon, lat)
+            xy = [project(*point) for point in zip(lon, lat)]
+            return tuple(p[0] for p in xy), tuple(p[1] for p in xy)
+
+        items = []
+        append = items.append
+        for record_id, geometry, attributes in features:
+            geometry = shape(json.loads(geometry))
+            append({"id": record_id,
+                    "geometry": transform(mercator, geometry),
+                    "properties": attributes,
+                    })
+
+        lon_min, lat_min, lon_max, lat_max = self.tile_bounds(z, x, y)
+        bounds = project(lon_min, lat_min) + project(lon_max, lat_max)
+
+        layers = [{"name": self.resource.tablename,
+                   "features": items,
+                   }]
+        try:
+            tile = mapbox_vector_tile.encode(layers,
+                                             default_options = {"quantize_bounds": bounds},
+                                             )
+        except TypeError:
+            # mapbox_vector_tile < 2.0
+            tile = mapbox_vector_tile.encode(layers, quantize_bounds=bounds)
+        return tile
+
+# END =========================================================================
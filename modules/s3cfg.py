@@ -1009,6 +1009,19 @@ class S3Config(Storage):
             False = owned by any authenticated user
         """
         return self.security.get("strict_ownership", True)
+    def get_security_acl_cache_size(self):
+        """
+            Maximum number of compiled ACL sets to keep in the process-wide
+            ACL store (shared across requests), 0 to disable
+        """
+        return self.security.get("acl_cache_size", 1000)
+    def get_security_realm_set_threshold(self):
+        """
+            Number of permitted realms above which accessible queries use
+            a sub-select from a stored realm set rather than an IN-list
+            of realm entities, 0 to disable
+        """
+        return self.security.get("realm_set_threshold", 500)
     def get_security_map(self):
         return self.security.get("map", False)
 
@@ -1079,6 +1092,84 @@ class S3Config(Storage):
       """
         return self.base.get("bigtable", False)
 
+    def get_base_keyset_pagination(self):
+        """
+            Use keyset pagination (seek method) for sequential page
+            requests in data tables and data lists, where the orderby
+            allows it (constant effort per page instead of OFFSET)
+        """
+        return self.base.get("keyset_pagination", True)
+
+    def get_base_count_estimate_threshold(self):
+        """
+            Minimum number of records for which the "estimate" count
+            strategy uses the query planner's estimate (smaller results
+            are counted exactly)
+        """
+        return self.base.get("count_estimate_threshold", 10000)
+
+    def get_base_count_cache_ttl(self):
+        """
+            Time (in seconds) to cache record counts with the "cached"
+            count strategy
+        """
+        return self.base.get("count_cache_ttl", 60)
+
+    def get_base_export_chunksize(self):
+        """
+            Maximum number of records to extract at a time when
+            streaming large result sets (e.g. in CSV/JSON/XLS exports)
+        """
+        return self.base.get("export_chunksize", 1000)
+
+    def get_base_data_cache_size(self):
+        """
+            Maximum number of results to keep in the cross-request cache
+            for resource data extractions (used only for tables which
+            are configured with data_cache=True), 0 to disable
+        """
+        return self.base.get("data_cache_size", 200)
+
+    def get_base_data_cache_ttl(self):
+        """
+            Maximum time (in seconds) to keep cached resource data, limits
+            the delay until changes made by other worker processes become
+            visible (0 = no limit)
+        """
+        return self.base.get("data_cache_ttl", 300)
+
+    def get_base_hierarchy_store(self):
+        """
+            Store hierarchies (S3Hierarchy) in the database after building
+            them, so that subsequent requests need not rebuild them
+            - requires that all writes to hierarchical tables go through
+              the framework (forms, imports, s3db.onaccept, deletes),
+              since only these update the stored hierarchies
+        """
+        return self.base.get("hierarchy_store", False)
+
+    def get_base_represent_cache(self):
+        """
+            Lookup tables for which S3Represent shall use a process-wide
+            cache shared across requests (S3RepresentCache), a list of
+            table names, or True for all tables
+        """
+        return self.base.get("represent_cache", False)
+
+    def get_base_represent_cache_size(self):
+        """
+            Maximum number of records in the S3Represent cache
+        """
+        return self.base.get("represent_cache_size", 10000)
+
+    def get_base_represent_cache_ttl(self):
+        """
+            Maximum age (in seconds) of S3Represent cache entries, to
+            limit the time changes made in other worker processes (or
+            changes in related records) remain invisible
+        """
+        return self.base.get("represent_cache_ttl", 300)
+
     def get_base_cdn(self):
         """
             Should we use CDNs (Content Distribution Networks) to serve some common CSS/JS?
@@ -1271,6 +1362,14 @@ class S3Config(Storage):
             airegex = False
         return airegex
 
+    def get_database_text_search(self):
+        """
+            Use the text search index (S3TextSearch) for the datatable
+            quick search in tables configured with "text_search"
+            (PostgreSQL and SQLite only, other databases use LIKE)
+        """
+        return self.database.get("text_search", True)
+
     # -------------------------------------------------------------------------
     # Finance settings
     def get_fin_currency_writable(self):
@@ -1412,6 +1511,7 @@ class S3Config(Storage):
             Supported options:
                 "nominatim" (default)
                 "google"
+                "gazetteer" (offline, using the names of gis_location)
         """
         return self.gis.get("geocode_service", "nominatim")
 
@@ -1503,6 +1603,16 @@ class S3Config(Storage):
         setting = self.gis.get("location_filter_bigtable_lookups")
         return setting if setting is not None else self.get_base_bigtable()
 
+    def get_gis_location_filter_facets(self):
+        """
+            Location filter to use precomputed options (location facets)
+            if the resource is unfiltered and fully accessible
+            - can be overridden by filter widget option (facets)
+            - requires that all writes to the filtered tables go through
+              the framework (forms, imports, s3db.onaccept, deletes)
+        """
+        return self.gis.get("location_filter_facets", False)
+
     def get_gis_location_represent_address_only(self):
         """
             Never use LatLon for Location Represents
@@ -1687,6 +1797,24 @@ class S3Config(Storage):
         """
         return self.gis.get("simplify_tolerance", 0.01)
 
+    def get_gis_simplify_tolerances(self):
+        """
+            Tolerances at which to precompute simplified geometries for
+            (non-point) locations, which the GeoJSON exports use instead
+            of simplifying polygons at request time
+            - the exports use the coarsest precomputed geometry which is
+              at least as detailed as the requested tolerance
+            - set to [] to disable
+        """
+        return self.gis.get("simplify_tolerances", (0.01,
+                                                    0.005,
+                                                    0.0025,
+                                                    0.00125,
+                                                    0.000625,
+                                                    0.0003125,
+                                                    0.00015625,
+                                                    ))
+
     def get_gis_precision(self):
         """
             Number of Decimal places to put in output
@@ -1705,6 +1833,25 @@ class S3Config(Storage):
         else:
             return self.gis.get("spatialdb", False)
 
+    def get_gis_spatial_index(self):
+        """
+            Use the embedded spatial index (S3SpatialIndex) for bounding
+            box queries if the database has no spatial extensions
+            (SQLite only, other databases use the bounds columns)
+        """
+        return self.gis.get("spatial_index", True)
+
+    def get_gis_vector_tile_cache(self):
+        """
+            Cache the tiles of the vector tile endpoint (S3VectorTiles)
+            on disk
+            - requires that all writes to the mapped tables and to their
+              locations go through the framework (forms, imports,
+              s3db.onaccept, deletes), since only these invalidate the
+              cached tiles
+        """
+        return self.gis.get("vector_tile_cache", False)
+
     def get_gis_widget_catalogue_layers(self):
         """
             Should Map Widgets display Catalogue Layers?
@@ -2088,6 +2235,19 @@ class S3Config(Storage):
 
         return self.ui.get("datatables_dom", "fril<'dataTable_table't>pi")
 
+    def get_ui_datatables_count_strategy(self):
+        """
+            Strategy to count the total number of records in data tables:
+                "exact" = count all matching records
+                "estimate" = use the query planner's estimate for large
+                             numbers (PostgreSQL only), show "about N"
+                             and fetch the exact number asynchronously
+                "cached" = exact count, cached for a short time
+            - can be overridden per resource with the count_strategy setting
+        """
+
+        return self.ui.get("datatables_count_strategy", "exact")
+
     def get_ui_datatables_initComplete(self):
         """
             Callback for dataTables
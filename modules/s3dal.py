@@ -70,7 +70,9 @@ class S3DAL(object):
             # PyDAL <= 16.03
             self.INVERT = adapter.INVERT
             self.COMMA = adapter.COMMA
+            self.AND = adapter.AND
             self.OR = adapter.OR
+            self.EQ = adapter.EQ
             self.CONTAINS = adapter.CONTAINS
             self.AGGREGATE = adapter.AGGREGATE
 
@@ -78,7 +80,9 @@ class S3DAL(object):
             # current PyDAL
             self.INVERT = dialect.invert
             self.COMMA = dialect.comma
+            self.AND = dialect._and
             self.OR = dialect._or
+            self.EQ = dialect.eq
             self.CONTAINS = dialect.contains
             self.AGGREGATE = dialect.aggregate
 
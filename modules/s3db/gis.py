@@ -72,6 +72,9 @@ class S3LocationModel(S3Model):
 
     names = ("gis_location",
              #"gis_location_error",
+             "gis_location_simplified",
+             "gis_gazetteer",
+             "gis_location_facet",
              "gis_location_id",
              "gis_country_id",
              "gis_country_requires",
@@ -369,6 +372,7 @@ class S3LocationModel(S3Model):
                        list_fields = list_fields,
                        list_orderby = "gis_location.name",
                        onaccept = self.gis_location_onaccept,
+                       ondelete = self.gis_location_ondelete,
                        onvalidation = self.gis_location_onvalidation,
                        )
 
@@ -426,6 +430,51 @@ class S3LocationModel(S3Model):
                         # s3_comments(),
                         # *s3_meta_fields())
 
+        # ---------------------------------------------------------------------
+        # Simplified Geometries
+        # - precomputed for (non-point) locations at the tolerances in
+        #   settings.gis.simplify_tolerances, so that the GeoJSON exports
+        #   do not need to simplify polygons at request time
+        # - maintained by GIS.update_simplified_geometries
+        #
+        tablename = "gis_location_simplified"
+        self.define_table(tablename,
+                          location_id(empty = False,
+                                      ondelete = "CASCADE",
+                                      ),
+                          Field("tolerance", "double"),
+                          Field("geojson", "text"),
+                          *S3MetaFields.timestamps())
+
+        # ---------------------------------------------------------------------
+        # Gazetteer
+        # - normalized names (incl. local and alternate names) of locations,
+        #   the name index of the offline geocoder
+        # - maintained by S3Gazetteer
+        #
+        tablename = "gis_gazetteer"
+        self.define_table(tablename,
+                          location_id(empty = False,
+                                      ondelete = "CASCADE",
+                                      ),
+                          Field("name", length=255),
+                          Field("prefix", length=8),
+                          )
+
+        # ---------------------------------------------------------------------
+        # Location Facets
+        # - the Lx locations in use by location references in other tables,
+        #   for the options of S3LocationFilter
+        # - maintained by S3LocationCache
+        #
+        tablename = "gis_location_facet"
+        self.define_table(tablename,
+                          Field("tablename", length=128),
+                          Field("fieldname", length=128),
+                          location_id(ondelete = "CASCADE"),
+                          Field("version", length=64),
+                          )
+
         # Pass names back to global scope (s3.*)
         return {"gis_location_id": location_id,
                 "gis_country_id": country_id,
@@ -474,6 +523,52 @@ class S3LocationModel(S3Model):
                                      args = [feature],
                                      )
 
+        # Update the simplified geometries
+        if "wkt" in form.vars and \
+           current.deployment_settings.get_gis_simplify_tolerances():
+            wkt = form_vars_get("wkt")
+            if wkt and wkt[:5] != "POINT":
+                current.s3task.run_async("gis_update_simplified_geometries",
+                                         args = [location_id],
+                                         )
+            elif form.record:
+                # Remove outdated simplified geometries
+                current.gis.update_simplified_geometries([location_id])
+
+        # Update the Gazetteer
+        S3Gazetteer.update(location_id)
+
+        # Invalidate the cached location options (after commit)
+        record = form.record
+        if form_vars_get("level") or record and record.level:
+            after_commit = current.s3db.after_commit
+            after_commit(S3LocationCache.invalidate_hierarchy, location_id)
+            if record and record.path:
+                # Location may have moved to another L0
+                after_commit(S3LocationCache.expire,
+                             record.path.split("/", 1)[0],
+                             )
+
+    # -------------------------------------------------------------------------
+    @staticmethod
+    def gis_location_ondelete(row):
+        """
+            On Delete for GIS Locations
+        """
+
+        # Invalidate the cached location options (after commit)
+        # - the row only contains the keys, so look up the level
+        #   (the record is archived rather than removed)
+        location_id = row.get("id")
+        table = current.s3db.gis_location
+        record = current.db(table.id == location_id).select(table.level,
+                                                            limitby = (0, 1),
+                                                            ).first()
+        if record and record.level:
+            current.s3db.after_commit(S3LocationCache.invalidate_hierarchy,
+                                      location_id,
+                                      )
+
     # -------------------------------------------------------------------------
     @staticmethod
     def gis_location_onvalidation(form):
@@ -1263,6 +1358,8 @@ class S3LocationNameModel(S3Model):
                                                        "language",
                                                        ),
                                             ),
+                  onaccept = self.gis_location_name_onaccept,
+                  ondelete = self.gis_location_name_ondelete,
                   )
 
         # ---------------------------------------------------------------------
@@ -1291,11 +1388,52 @@ class S3LocationNameModel(S3Model):
                                                        "name_alt",
                                                        ),
                                             ),
+                  onaccept = self.gis_location_name_onaccept,
+                  ondelete = self.gis_location_name_ondelete,
                   )
 
         # Pass names back to global scope (s3.*)
         return {}
 
+    # -------------------------------------------------------------------------
+    @staticmethod
+    def gis_location_name_onaccept(form):
+        """
+            On Accept for Local/Alternate Names:
+                - update the Gazetteer for the location
+                - expire the cached location options for its L0
+
+            @param form: the Form
+        """
+
+        location_id = form.vars.get("location_id")
+        if not location_id and form.record:
+            location_id = form.record.location_id
+
+        if location_id:
+            S3Gazetteer.update(location_id)
+            l0 = S3LocationCache.l0(location_id)
+            if l0:
+                current.s3db.after_commit(S3LocationCache.expire, l0)
+
+    # -------------------------------------------------------------------------
+    @staticmethod
+    def gis_location_name_ondelete(row):
+        """
+            On Delete for Local/Alternate Names:
+                - update the Gazetteer for the location
+                - expire the cached location options for its L0
+
+            @param row: the deleted Row
+        """
+
+        location_id = row.get("location_id")
+        if location_id:
+            S3Gazetteer.update(location_id)
+            l0 = S3LocationCache.l0(location_id)
+            if l0:
+                current.s3db.after_commit(S3LocationCache.expire, l0)
+
 # =============================================================================
 class S3LocationTagModel(S3Model):
     """
@@ -1514,6 +1652,8 @@ class S3LocationHierarchyModel(S3Model):
 
         self.configure(tablename,
                        deduplicate = S3Duplicate(primary=("location_id",)),
+                       onaccept = self.gis_hierarchy_onaccept,
+                       ondelete = self.gis_hierarchy_ondelete,
                        onvalidation = self.gis_hierarchy_onvalidation,
                        )
 
@@ -1585,6 +1725,31 @@ class S3LocationHierarchyModel(S3Model):
                             )
                         )
 
+    # -------------------------------------------------------------------------
+    @staticmethod
+    def gis_hierarchy_onaccept(form):
+        """
+            On Accept for Location Hierarchies:
+                - expire the cached hierarchy labels for the L0
+        """
+
+        location_id = form.vars.get("location_id")
+        if not location_id and form.record:
+            location_id = form.record.location_id
+
+        # None => default hierarchy (all L0s)
+        current.s3db.after_commit(S3LocationCache.expire, location_id)
+
+    # -------------------------------------------------------------------------
+    @staticmethod
+    def gis_hierarchy_ondelete(row):
+        """
+            On Delete for Location Hierarchies:
+                - expire the cached hierarchy labels for the L0
+        """
+
+        current.s3db.after_commit(S3LocationCache.expire, row.get("location_id"))
+
     # -------------------------------------------------------------------------
     @staticmethod
     def gis_hierarchy_onvalidation(form):
@@ -105,7 +105,10 @@ __all__ = (# PR Base Entities
            "pr_ancestors",
            "pr_descendants",
            "pr_rebuild_path",
+           "pr_clear_paths",
            "pr_role_rebuild_path",
+           "pr_update_closure",
+           "pr_rebuild_closure",
 
            # Helper for ImageLibrary
            "pr_image_modify",
@@ -138,6 +141,9 @@ from s3layouts import S3PopupLink
 OU = 1 # role type which indicates hierarchy, see role_types
 OTHER_ROLE = 9
 
+# Whether the affiliation closure has been checked (per process)
+CLOSURE_CHECKED = False
+
 # Compact JSON encoding
 SEPARATORS = (",", ":")
 
@@ -147,6 +153,7 @@ class PRPersonEntityModel(S3Model):
 
     names = ("pr_pentity",
              "pr_affiliation",
+             "pr_affiliation_closure",
              "pr_person_user",
              "pr_role",
              "pr_role_types",
@@ -405,6 +412,7 @@ class PRPersonEntityModel(S3Model):
 
         # Resource configuration
         configure(tablename,
+                  onaccept = self.pr_role_onaccept,
                   onvalidation = self.pr_role_onvalidation,
                   )
 
@@ -458,6 +466,20 @@ class PRPersonEntityModel(S3Model):
                   ondelete = self.pr_affiliation_ondelete,
                   )
 
+        # ---------------------------------------------------------------------
+        # Affiliation Closure
+        # - all direct and indirect ancestor/descendant relationships
+        #   between person entities, per role type
+        # - maintained by pr_update_closure, not to be edited manually
+        #
+        tablename = "pr_affiliation_closure"
+        define_table(tablename,
+                     Field("ancestor_pe", "integer"),
+                     Field("descendant_pe", "integer"),
+                     Field("depth", "integer"),
+                     Field("role_type", "integer"),
+                     )
+
         # ---------------------------------------------------------------------
         # Pass names back to global scope (s3.*)
         #
@@ -654,6 +676,27 @@ class PRPersonEntityModel(S3Model):
                 current.s3db.pr_role_rebuild_path(role_id, clear=True)
         return
 
+    # -------------------------------------------------------------------------
+    @staticmethod
+    def pr_role_onaccept(form):
+        """
+            Update the affiliation closure for the affiliates of the role
+            (in case the role type has changed)
+
+            @param form: the CRUD form
+        """
+
+        role_id = form.vars.id
+        if not role_id:
+            return
+
+        atable = current.s3db.pr_affiliation
+        query = (atable.role_id == role_id) & \
+                (atable.deleted != True)
+        rows = current.db(query).select(atable.pe_id)
+        if rows:
+            pr_update_closure([row.pe_id for row in rows])
+
     # -------------------------------------------------------------------------
     @staticmethod
     def pr_pentity_onaccept(form):
@@ -7929,23 +7972,25 @@ class pr_AssignMethod(S3Method):
                 rows = dict((row.id, row) for row in rows)
                 onaccept = component.get_config("create_onaccept",
                                                 component.get_config("onaccept", None))
-                for person_id in selected:
-                    try:
-                        pr_id = int(person_id.strip())
-                    except ValueError:
-                        continue
-                    if pr_id not in rows:
-                        link = Storage(person_id = person_id)
-                        link[fkey] = record_id
-                        _id = table.insert(**link)
-                        if onaccept:
-                            link["id"] = _id
-                            form = Storage(vars = link)
-                            if not isinstance(onaccept, list):
-                                onaccept = [onaccept]
-                            for callback in onaccept:
-                                callback(form)
-                        added += 1
+                # Update affiliations and realms once for all assignments
+                with S3DeferredUpdates():
+                    for person_id in selected:
+                        try:
+                            pr_id = int(person_id.strip())
+                        except ValueError:
+                            continue
+                        if pr_id not in rows:
+                            link = Storage(person_id = person_id)
+                            link[fkey] = record_id
+                            _id = table.insert(**link)
+                            if onaccept:
+                                link["id"] = _id
+                                form = Storage(vars = link)
+                                if not isinstance(onaccept, list):
+                                    onaccept = [onaccept]
+                                for callback in onaccept:
+                                    callback(form)
+                            added += 1
                 if self.postprocess is not None:
                     # Run postprocess async as it may take some time to run
                     current.s3task.run_async("settings_task",
@@ -8780,6 +8825,11 @@ def pr_update_affiliations(table, record):
     else:
         rtype = table
 
+    # Deferred (bulk operation)?
+    deferred = S3DeferredUpdates.context()
+    if deferred and deferred.add_affiliations(rtype, record):
+        return
+
     if rtype == "hrm_human_resource":
 
         # Get the HR record
@@ -9200,13 +9250,22 @@ def pr_define_role(pe_id,
     else:
         duplicate = None
     if duplicate:
-        if duplicate.role_type != role_type:
+        type_changed = duplicate.role_type != role_type
+        if type_changed:
             # Clear paths if this changes the role type
             if str(role_type) != str(OU):
                 data["path"] = None
             s3db.pr_role_rebuild_path(duplicate.id, clear=True)
         duplicate.update_record(**data)
         record_id = duplicate.id
+        if type_changed:
+            # Update the closure for the affiliates of this role
+            atable = s3db.pr_affiliation
+            query = (atable.role_id == record_id) & \
+                    (atable.deleted != True)
+            rows = current.db(query).select(atable.pe_id)
+            if rows:
+                pr_update_closure([row.pe_id for row in rows])
     else:
         record_id = rtable.insert(**data)
     return record_id
@@ -9430,40 +9489,25 @@ def pr_get_path(pe_id):
 def pr_get_ancestors(pe_id):
     """
         Find all ancestor entities of a person entity in the OU hierarchy
-        (performs a path lookup where paths are available, otherwise rebuilds
-        paths).
+        (performs a lookup in the affiliation closure).
 
         @param pe_id: the person entity ID
 
-        @return: a list of PE-IDs
+        @return: a list of PE-IDs (as strings, nearest ancestors first)
     """
 
-    s3db = current.s3db
-    atable = s3db.pr_affiliation
-    rtable = s3db.pr_role
-    query = (atable.deleted != True) & \
-            (atable.role_id == rtable.id) & \
-            (atable.pe_id == pe_id) & \
-            (rtable.deleted != True) & \
-            (rtable.role_type == OU)
+    if not pe_id:
+        return []
 
-    roles = current.db(query).select(rtable.id,
-                                     rtable.pe_id,
-                                     rtable.path,
-                                     rtable.role_type)
-    paths = []
-    append = paths.append
-    for role in roles:
-        path = S3MultiPath([role.pe_id])
-        if role.path is None:
-            ppath = pr_role_rebuild_path(role)
-        else:
-            ppath = S3MultiPath(role.path)
-        path.extend(role.pe_id, ppath, cut=pe_id)
-        append(path)
-    ancestors = S3MultiPath.all_nodes(paths)
+    pr_closure_available()
 
-    return ancestors
+    ctable = current.s3db.pr_affiliation_closure
+    query = (ctable.descendant_pe == pe_id) & \
+            (ctable.role_type == OU)
+    rows = current.db(query).select(ctable.ancestor_pe,
+                                    orderby = ctable.depth,
+                                    )
+    return [str(row.ancestor_pe) for row in rows]
 
 # =============================================================================
 def pr_instance_type(pe_id):
@@ -9556,122 +9600,83 @@ def pr_realm_users(realm, roles=None, role_types=OU):
 def pr_ancestors(entities):
     """
         Find all ancestor entities of the given entities in the
-        OU hierarchy.
+        OU hierarchy (performs a lookup in the affiliation closure).
 
-        @param entities:
+        @param entities: list of PE-IDs
 
-        @return: Storage of lists of PE-IDs
+        @return: Storage of lists of PE-IDs (as strings)
     """
 
     if not entities:
         return Storage()
 
-    s3db = current.s3db
-    atable = s3db.pr_affiliation
-    rtable = s3db.pr_role
-    query = (atable.deleted != True) & \
-            (atable.role_id == rtable.id) & \
-            (atable.pe_id.belongs(entities)) & \
-            (rtable.deleted != True) & \
-            (rtable.role_type == OU)
-    rows = current.db(query).select(rtable.id,
-                                    rtable.pe_id,
-                                    rtable.path,
-                                    rtable.role_type,
-                                    atable.pe_id)
+    pr_closure_available()
+
+    ctable = current.s3db.pr_affiliation_closure
+    query = (ctable.descendant_pe.belongs(entities)) & \
+            (ctable.role_type == OU)
+    rows = current.db(query).select(ctable.ancestor_pe,
+                                    ctable.descendant_pe,
+                                    orderby = ctable.depth,
+                                    )
+
     ancestors = Storage([(pe_id, []) for pe_id in entities])
-    r = rtable._tablename
-    a = atable._tablename
     for row in rows:
-        pe_id = row[a].pe_id
-        paths = ancestors[pe_id]
-        role = row[r]
-        path = S3MultiPath([role.pe_id])
-        if role.path is None:
-            ppath = pr_role_rebuild_path(role)
-        else:
-            ppath = S3MultiPath(role.path)
-        path.extend(role.pe_id, ppath, cut=pe_id)
-        paths.append(path)
-    for pe_id in ancestors:
-        ancestors[pe_id] = S3MultiPath.all_nodes(ancestors[pe_id])
+        pe_id = row.descendant_pe
+        if pe_id not in ancestors:
+            # Entities given as strings
+            pe_id = str(pe_id)
+            if pe_id not in ancestors:
+                continue
+        ancestors[pe_id].append(str(row.ancestor_pe))
     return ancestors
 
 # =============================================================================
 def pr_descendants(pe_ids, skip=None, root=True):
     """
         Find descendant entities of a person entity in the OU hierarchy
-        (performs a real search, not a path lookup), grouped by root PE
+        (performs a lookup in the affiliation closure), grouped by root PE
 
         @param pe_ids: set/list of pe_ids
-        @param skip: list of person entity IDs to skip during
-                     descending (internal)
-        @param root: this is the top-node (internal)
+        @param skip: list of person entity IDs to skip (legacy, ignored
+                     except for the root nodes)
+        @param root: legacy, ignored
 
-        @return: a dict of lists of descendant PEs per root PE
+        @return: a dict of lists of descendant PEs (except persons)
+                 per root PE
     """
 
     if skip is None:
         skip = set()
 
-    # We still need to support Py 2.6
-    #pe_ids = {i for i in pe_ids if i not in skip}
     pe_ids = set(i for i in pe_ids if i not in skip)
     if not pe_ids:
         return {}
 
+    pr_closure_available()
+
     s3db = current.s3db
     etable = s3db.pr_pentity
-    rtable = s3db.pr_role
-    atable = s3db.pr_affiliation
-
-    q = (rtable.pe_id.belongs(pe_ids)) \
-        if len(pe_ids) > 1 else (rtable.pe_id == list(pe_ids)[0])
-
-    query = (q & (rtable.role_type == OU) & (rtable.deleted != True)) & \
-            ((atable.role_id == rtable.id) & (atable.deleted != True)) & \
-            (etable.pe_id == atable.pe_id)
-
-    rows = current.db(query).select(rtable.pe_id,
-                                    atable.pe_id,
-                                    etable.instance_type)
-    r = rtable._tablename
-    e = etable._tablename
-    a = atable._tablename
-
-    nodes = set()
-    ogetattr = object.__getattribute__
+    ctable = s3db.pr_affiliation_closure
+
+    query = (ctable.ancestor_pe.belongs(pe_ids)) & \
+            (ctable.role_type == OU) & \
+            (etable.pe_id == ctable.descendant_pe) & \
+            (etable.instance_type != "pr_person")
+    rows = current.db(query).select(ctable.ancestor_pe,
+                                    ctable.descendant_pe,
+                                    orderby = ctable.depth,
+                                    )
+    c = ctable._tablename
 
     result = {}
-
-    skip.update(pe_ids)
     for row in rows:
-
-        parent = ogetattr(ogetattr(row, r), "pe_id")
-        child = ogetattr(ogetattr(row, a), "pe_id")
-        instance_type = ogetattr(ogetattr(row, e), "instance_type")
-        if instance_type != "pr_person":
-            if parent not in result:
-                result[parent] = []
-            result[parent].append(child)
-        if child not in skip:
-            nodes.add(child)
-
-    if nodes:
-        descendants = pr_descendants(nodes, skip=skip, root=False)
-        for child, nodes in descendants.items():
-            for parent, children in result.items():
-                if child in children:
-                    for node in nodes:
-                        if node not in children:
-                            children.append(node)
-    if root:
-        for child, nodes in result.items():
-            for parent, children in result.items():
-                if child in children:
-                    for node in nodes:
-                        if node not in children and node != parent:
-                            children.append(node)
+        row = row[c]
+        parent = row.ancestor_pe
+        if parent not in result:
+            result[parent] = [row.descendant_pe]
+        else:
+            result[parent].append(row.descendant_pe)
 
     return result
 
@@ -9679,13 +9684,12 @@ def pr_descendants(pe_ids, skip=None, root=True):
 def pr_get_descendants(pe_ids, entity_types=None, skip=None, ids=True):
     """
         Find descendant entities of a person entity in the OU hierarchy
-        (performs a real search, not a path lookup).
+        (performs a lookup in the affiliation closure).
 
         @param pe_ids: person entity ID or list of IDs
         @param entity_types: optional filter to a specific entity_type
-        @param ids: whether to return a list of ids or nodes (internal)
-        @param skip: list of person entity IDs to skip during
-                     descending (internal)
+        @param skip: legacy, ignored
+        @param ids: whether to return a list of ids or nodes (legacy)
 
         @return: a list of PE-IDs
     """
@@ -9696,61 +9700,40 @@ def pr_get_descendants(pe_ids, entity_types=None, skip=None, ids=True):
         pe_ids = set(pe_ids) \
                  if isinstance(pe_ids, (list, tuple)) else {pe_ids}
 
+    pr_closure_available()
+
     db = current.db
     s3db = current.s3db
     etable = s3db.pr_pentity
-    rtable = db.pr_role
-    atable = db.pr_affiliation
-
-    if skip is None:
-        skip = set()
-    skip.update(pe_ids)
+    ctable = s3db.pr_affiliation_closure
 
     if len(pe_ids) > 1:
-        q = (rtable.pe_id.belongs(pe_ids))
+        q = (ctable.ancestor_pe.belongs(pe_ids))
     else:
-        q = (rtable.pe_id == list(pe_ids)[0])
-
-    query = ((rtable.deleted != True) & q & (rtable.role_type == OU)) & \
-            ((atable.deleted != True) & (atable.role_id == rtable.id))
+        q = (ctable.ancestor_pe == list(pe_ids)[0])
+    query = q & (ctable.role_type == OU)
 
     if entity_types is not None:
-        query &= (etable.pe_id == atable.pe_id)
-        rows = db(query).select(etable.pe_id, etable.instance_type)
-        # We still need to support Py 2.6
-        #result = {(r.pe_id, r.instance_type) for r in rows}
+        if type(entity_types) is not set:
+            if not isinstance(entity_types, (tuple, list)):
+                entity_types = {entity_types}
+            else:
+                entity_types = set(entity_types)
+        query &= (etable.pe_id == ctable.descendant_pe)
+        rows = db(query).select(etable.pe_id,
+                                etable.instance_type,
+                                distinct = True,
+                                )
         result = set((r.pe_id, r.instance_type) for r in rows)
-        # We still need to support Py 2.6
-        #node_ids = {i for i, t in result if i not in skip}
-        node_ids = set(i for i, t in result if i not in skip)
-    else:
-        rows = db(query).select(atable.pe_id)
-        # We still need to support Py 2.6
-        #result = {r.pe_id for r in rows}
-        result = set(r.pe_id for r in rows)
-        # We still need to support Py 2.6
-        #node_ids = {i for i in result if i not in skip}
-        node_ids = set(i for i in result if i not in skip)
-    # Recurse
-    if node_ids:
-        descendants = pr_get_descendants(node_ids,
-                                         skip=skip,
-                                         entity_types=entity_types,
-                                         ids=False)
-        result.update(descendants)
-
-    if ids:
-        if entity_types is not None:
-            if type(entity_types) is not set:
-                if not isinstance(entity_types, (tuple, list)):
-                    entity_types = {entity_types}
-                else:
-                    entity_types = set(entity_types)
+        if ids:
             return [n[0] for n in result if n[1] in entity_types]
-        else:
-            return list(result)
     else:
-        return result
+        rows = db(query).select(ctable.descendant_pe, distinct=True)
+        result = set(r.descendant_pe for r in rows)
+        if ids:
+            return list(result)
+
+    return result
 
 # =============================================================================
 # Internal Path Tools
@@ -9767,6 +9750,12 @@ def pr_rebuild_path(pe_id, clear=False):
     if isinstance(pe_id, Row):
         pe_id = pe_id.pe_id
 
+    if clear:
+        # Deferred (bulk operation)?
+        deferred = S3DeferredUpdates.context()
+        if deferred and deferred.add_path(pe_id):
+            return
+
     rtable = current.s3db.pr_role
     query = (rtable.pe_id == pe_id) & \
             (rtable.role_type == OU) & \
@@ -9781,6 +9770,41 @@ def pr_rebuild_path(pe_id, clear=False):
         if role.path is None:
             pr_role_rebuild_path(role, clear=clear)
 
+    if clear:
+        # Affiliations have changed => update the closure
+        pr_update_closure([pe_id])
+
+# =============================================================================
+def pr_clear_paths(pe_ids):
+    """
+        Update the affiliation closure for multiple person entities, and
+        clear the OU paths of all roles of these entities and their
+        descendants (triggers lazy rebuild); set-based alternative to
+        pr_rebuild_path with clear=True, e.g. after bulk imports
+
+        @param pe_ids: the person entity IDs
+    """
+
+    pe_ids = set(pe_id for pe_id in pe_ids if pe_id)
+    if not pe_ids:
+        return
+
+    db = current.db
+    s3db = current.s3db
+
+    pr_update_closure(pe_ids)
+
+    # All descendants are affected, too
+    ctable = s3db.pr_affiliation_closure
+    query = (ctable.ancestor_pe.belongs(pe_ids))
+    rows = db(query).select(ctable.descendant_pe, distinct=True)
+    affected = pe_ids | set(row.descendant_pe for row in rows)
+
+    rtable = s3db.pr_role
+    query = (rtable.pe_id.belongs(affected)) & \
+            (rtable.deleted != True)
+    db(query).update(path=None)
+
 # =============================================================================
 def pr_role_rebuild_path(role_id, skip=None, clear=False):
     """
@@ -9849,6 +9873,157 @@ def pr_role_rebuild_path(role_id, skip=None, clear=False):
 
     return path
 
+# =============================================================================
+# Affiliation Closure
+# =============================================================================
+#
+def pr_update_closure(pe_ids):
+    """
+        Update the affiliation closure (=all direct and indirect ancestors
+        per role type) for person entities and all their descendants,
+        to be called whenever affiliations of these entities have changed
+
+        @param pe_ids: list of person entity IDs
+    """
+
+    pe_ids = set(pe_id for pe_id in pe_ids if pe_id)
+    if not pe_ids:
+        return
+
+    # Make sure the closure is complete before updating it
+    pr_closure_available()
+
+    db = current.db
+    s3db = current.s3db
+
+    ctable = s3db.pr_affiliation_closure
+    rtable = s3db.pr_role
+    atable = s3db.pr_affiliation
+
+    # All current descendants are affected, too
+    query = (ctable.ancestor_pe.belongs(pe_ids))
+    rows = db(query).select(ctable.descendant_pe, distinct=True)
+    affected = pe_ids | set(row.descendant_pe for row in rows)
+
+    # Get all affiliations of the affected entities
+    query = (atable.pe_id.belongs(affected)) & \
+            (atable.deleted != True) & \
+            (rtable.id == atable.role_id) & \
+            (rtable.deleted != True)
+    rows = db(query).select(rtable.pe_id,
+                            rtable.role_type,
+                            atable.pe_id,
+                            )
+    r = rtable._tablename
+    a = atable._tablename
+    edges = set()
+    for row in rows:
+        edges.add((row[r].pe_id, row[a].pe_id, row[r].role_type))
+
+    # Get the closure of all non-affected parents (which is unchanged)
+    parents = set(parent for parent, child, role_type in edges
+                  if parent not in affected)
+    closure = {}
+    if parents:
+        query = (ctable.descendant_pe.belongs(parents))
+        rows = db(query).select(ctable.ancestor_pe,
+                                ctable.descendant_pe,
+                                ctable.depth,
+                                ctable.role_type,
+                                )
+        for row in rows:
+            key = (row.descendant_pe, row.role_type)
+            if key not in closure:
+                closure[key] = {}
+            closure[key][row.ancestor_pe] = row.depth
+
+    # Compute the ancestors of the affected entities, with the minimum
+    # distance for each ancestor (repeats until stable, so that the order
+    # of the edges doesn't matter and loops are tolerated)
+    ancestors = {}
+    changed = True
+    while changed:
+        changed = False
+        for parent, child, role_type in edges:
+            key = (child, role_type)
+            if key not in ancestors:
+                ancestors[key] = {}
+            target = ancestors[key]
+            if parent in affected:
+                source = ancestors.get((parent, role_type), {})
+            else:
+                source = closure.get((parent, role_type), {})
+            candidates = [(parent, 0)] + list(source.items())
+            for ancestor, depth in candidates:
+                depth += 1
+                if ancestor == child:
+                    continue
+                if ancestor not in target or target[ancestor] > depth:
+                    target[ancestor] = depth
+                    changed = True
+
+    # Replace the closure of the affected entities
+    db(ctable.descendant_pe.belongs(affected)).delete()
+    items = []
+    for (descendant, role_type), nodes in ancestors.items():
+        for ancestor, depth in nodes.items():
+            items.append({"ancestor_pe": ancestor,
+                          "descendant_pe": descendant,
+                          "depth": depth,
+                          "role_type": role_type,
+                          })
+    if items:
+        ctable.bulk_insert(items)
+
+# =============================================================================
+def pr_rebuild_closure():
+    """
+        Rebuild the entire affiliation closure, e.g. after a migration
+        or a bulk import which has bypassed the onaccept-routines
+    """
+
+    db = current.db
+    s3db = current.s3db
+
+    ctable = s3db.pr_affiliation_closure
+    atable = s3db.pr_affiliation
+
+    db(ctable.id > 0).delete()
+
+    query = (atable.deleted != True) & \
+            (atable.pe_id != None)
+    rows = db(query).select(atable.pe_id, distinct=True)
+    pr_update_closure([row.pe_id for row in rows])
+
+# =============================================================================
+def pr_closure_available():
+    """
+        Check whether the affiliation closure is populated, and rebuild
+        it if not (e.g. after upgrading an existing database); the check
+        is performed only once per process
+
+        @return: True
+    """
+
+    global CLOSURE_CHECKED
+    if CLOSURE_CHECKED:
+        return True
+    CLOSURE_CHECKED = True
+
+    db = current.db
+    s3db = current.s3db
+
+    ctable = s3db.pr_affiliation_closure
+    atable = s3db.pr_affiliation
+
+    if not db(ctable.id > 0).select(ctable.id, limitby=(0, 1)).first():
+        query = (atable.deleted != True) & \
+                (atable.pe_id != None)
+        if db(query).select(atable.id, limitby=(0, 1)).first():
+            pr_rebuild_closure()
+
+    return True
+
 # -----------------------------------------------------------------------------
 def pr_image_modify(image_file,
                     image_name,
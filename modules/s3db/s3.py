@@ -28,6 +28,7 @@
 """
 
 __all__ = ("S3HierarchyModel",
+           "S3TextSearchModel",
            "S3DashboardModel",
            "S3DynamicTablesModel",
            "s3_table_rheader",
@@ -58,6 +59,11 @@ class S3HierarchyModel(S3Model):
                                 default = False,
                                 ),
                           Field("hierarchy", "json"),
+                          # Incremented with every update (to detect
+                          # concurrent changes)
+                          Field("version", "integer",
+                                default = 0,
+                                ),
                           *S3MetaFields.timestamps())
 
         # ---------------------------------------------------------------------
@@ -71,6 +77,36 @@ class S3HierarchyModel(S3Model):
 
         return {}
 
+# =============================================================================
+class S3TextSearchModel(S3Model):
+    """ Model for the text search index (see S3TextSearch) """
+
+    names = ("s3_text_search",
+             )
+
+    def model(self):
+
+        # ---------------------------------------------------------------------
+        # Text Search Index
+        #
+        tablename = "s3_text_search"
+        self.define_table(tablename,
+                          Field("tablename", length=64),
+                          Field("record_id", "integer"),
+                          Field("document", "text"),
+                          )
+
+        # ---------------------------------------------------------------------
+        # Return global names to s3.*
+        #
+        return {}
+
+    # -------------------------------------------------------------------------
+    def defaults(self):
+        """ Safe defaults if module is disabled """
+
+        return {}
+
 # =============================================================================
 class S3DashboardModel(S3Model):
     """ Model for stored dashboard configurations """
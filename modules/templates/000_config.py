@@ -43,6 +43,8 @@ settings.base.template = "default"
 #settings.database.password = "password"
 # Uncomment to use a different pool size
 #settings.database.pool_size = 30
+# Uncomment to disable the text search index (S3TextSearch)
+#settings.database.text_search = False
 # Do we have a spatial DB available? (currently supports PostGIS. Spatialite to come.)
 #settings.gis.spatialdb = True
 
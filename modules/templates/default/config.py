@@ -29,6 +29,16 @@ def config(settings):
 
     # Uncomment this to prefer scalability-optimized strategies globally
     #settings.base.bigtable = True
+    # Uncomment this to disable keyset pagination in data tables and data lists
+    #settings.base.keyset_pagination = False
+    # Number of records to extract at a time in exports (default 1000)
+    #settings.base.export_chunksize = 500
+    # Maximum number of cached results for tables configured with data_cache=True
+    #settings.base.data_cache_size = 500
+    # Cache representations of these lookup tables across requests
+    #settings.base.represent_cache = ("org_organisation", "gis_location", "pr_person")
+    # Uncomment to store hierarchies rather than rebuilding them in every request
+    #settings.base.hierarchy_store = True
 
     # Theme (folder to use for views/layout.html)
     #settings.base.theme = "default"
@@ -359,6 +369,8 @@ def config(settings):
     #settings.gis.countries = ("US",)
     # Uncomment to pass Addresses imported from CSV to a Geocoder to try and automate Lat/Lon
     #settings.gis.geocode_imported_addresses = "google"
+    # Uncomment to geocode offline, using the names of the locations in the database
+    #settings.gis.geocode_service = "gazetteer"
     # Hide the Map-based selection tool in the Location Selector
     #settings.gis.map_selector = False
     # Show LatLon boxes in the Location Selector
@@ -419,6 +431,8 @@ def config(settings):
     settings.gis.legend = "float"
     # Uncomment to use scalability-optimized options lookups in location filters
     #settings.gis.location_filter_bigtable_lookups = True
+    # Uncomment to use precomputed options for unfiltered Location Filters
+    #settings.gis.location_filter_facets = True
     # Uncomment to prevent showing LatLon in Location Represents
     #settings.gis.location_represent_address_only = True
     # Mouse Position: 'normal', 'mgrs' or None
@@ -445,8 +459,14 @@ def config(settings):
     #settings.gis.scaleline = False
     # Uncomment to hide the GeoNames search box
     #settings.gis.search_geonames = False
+    # Uncomment to not use the embedded spatial index (SQLite R*Tree) for bounding box queries
+    #settings.gis.spatial_index = False
+    # Uncomment to cache vector tiles (tiles.geojson/tiles.mvt) on disk
+    #settings.gis.vector_tile_cache = True
     # Uncomment to modify the Simplify Tolerance
     #settings.gis.simplify_tolerance = 0.001
+    # Uncomment to modify the Tolerances at which simplified geometries are precomputed (empty list to disable)
+    #settings.gis.simplify_tolerances = (0.01, 0.001, 0.0001)
     # Uncomment this for highly-zoomed maps showing buildings
     #settings.gis.precision = 5
     # Uncomment to Hide the Toolbar from the main Map
@@ -496,6 +516,10 @@ def config(settings):
     # False = owned by any authenticated user
     #settings.security.strict_ownership = False
 
+    # Filter by a stored realm set (sub-select) rather than an IN-list
+    # when a user has access to more than this number of realms (0 to disable)
+    #settings.security.realm_set_threshold = 200
+
     # Audit
     # - can be a callable for custom hooks (return True to also perform normal logging, or False otherwise)
     # NB Auditing (especially Reads) slows system down & consumes diskspace
@@ -551,6 +575,8 @@ def config(settings):
     #settings.ui.datatables_initComplete = '''$('.dataTables_paginate').after($('.dt-export-options'))'''
     # Uncomment for dataTables to use a different paging style:
     #settings.ui.datatables_pagingType = "bootstrap"
+    # Uncomment to show estimated record counts in dataTables for large tables (PostgreSQL only)
+    #settings.ui.datatables_count_strategy = "estimate"
     # Uncomment to restrict the export formats available
     #settings.ui.export_formats = ("kml", "pdf", "rss", "xls", "xml")
     # Uncomment to change the label/class of FilterForm clear buttons
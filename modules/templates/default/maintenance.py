@@ -28,6 +28,9 @@ class Daily():
         table = s3db.sync_log
         db(table.timestmp < month_past).delete()
 
+        # Cleanup unused realm sets
+        current.auth.permission.cleanup_realm_sets()
+
         # Cleanup Sessions
         osjoin = os.path.join
         osstat = os.stat
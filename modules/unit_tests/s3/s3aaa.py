@@ -1398,6 +1398,58 @@ class ACLManagementTests(unittest.TestCase):
             auth.s3_delete_role("TESTGROUP")
             db.rollback()
 
+    # -------------------------------------------------------------------------
+    def testACLStore(self):
+        """ Test the process-wide store of compiled ACLs """
+
+        db = current.db
+        auth = current.auth
+
+        assertEqual = self.assertEqual
+        assertTrue = self.assertTrue
+
+        from s3.s3aaa import S3Permission
+
+        current.deployment_settings.security.policy = 5
+        auth.permission = S3Permission(auth)
+        acl = auth.permission
+
+        role = auth.s3_create_role("Test Group", None,
+                                   dict(c="org", f="office", uacl=acl.ALL, oacl=acl.ALL),
+                                   dict(t="org_office", uacl=acl.READ, oacl=acl.READ),
+                                   uid="TESTGROUP")
+        try:
+            realms = {role: None}
+            acls = acl.applicable_acls(acl.READ, realms, {},
+                                       c="org",
+                                       f="office",
+                                       t="org_office",
+                                       )
+            assertEqual(acls, {"ANY": (acl.READ, acl.READ)})
+
+            # Compiled ACLs are stored across requests
+            assertTrue(len(S3Permission.acl_store) > 0)
+            acl = auth.permission = S3Permission(auth)
+            acls = acl.applicable_acls(acl.READ, realms, {},
+                                       c="org",
+                                       f="office",
+                                       t="org_office",
+                                       )
+            assertEqual(acls, {"ANY": (acl.READ, acl.READ)})
+
+            # Updating the ACL invalidates the store
+            acl.update_acl(role, t="org_office", uacl=acl.ALL, oacl=acl.ALL)
+            assertEqual(len(S3Permission.acl_store), 0)
+            acls = acl.applicable_acls(acl.UPDATE, realms, {},
+                                       c="org",
+                                       f="office",
+                                       t="org_office",
+                                       )
+            assertEqual(acls, {"ANY": (acl.ALL, acl.ALL)})
+        finally:
+            auth.s3_delete_role("TESTGROUP")
+            db.rollback()
+
 # =============================================================================
 class HasPermissionTests(unittest.TestCase):
     """ Test permission check method """
@@ -2758,6 +2810,102 @@ class AccessibleQueryTests(unittest.TestCase):
                                    role="TestOrgUnit")
         auth.s3_withdraw_role(user, self.reader, for_pe=self.org[2])
 
+    # -------------------------------------------------------------------------
+    def testPermittedRecordIDs(self):
+        """ Test bulk permission check for multiple records """
+
+        auth = current.auth
+
+        current.deployment_settings.security.policy = 6
+        auth.permission = S3Permission(auth)
+
+        permitted_record_ids = auth.s3_permitted_record_ids
+        c = "org"
+        f = "permission_test"
+        table = current.s3db.org_permission_test
+
+        assertEqual = self.assertEqual
+
+        record_ids = [self.record1, self.record2, self.record3]
+
+        # Check anonymous
+        auth.s3_impersonate(None)
+        permitted = permitted_record_ids("read", table, record_ids, c=c, f=f)
+        assertEqual(permitted, set())
+
+        # Assign TESTEDITOR for org[0]
+        auth.s3_impersonate("normaluser@example.com")
+        auth.s3_assign_role(auth.user.id, self.editor, for_pe=self.org[0])
+
+        # Only record1 is in the realm of org[0]
+        permitted = permitted_record_ids("update", table, record_ids, c=c, f=f)
+        assertEqual(permitted, {self.record1})
+
+        # Accepts record IDs as strings, ignores invalid IDs
+        permitted = permitted_record_ids("update",
+                                         "org_permission_test",
+                                         [str(self.record1), "x", None],
+                                         c = c,
+                                         f = f,
+                                         )
+        assertEqual(permitted, {self.record1})
+
+        # Override permits all records
+        auth.override = True
+        permitted = permitted_record_ids("delete", table, record_ids, c=c, f=f)
+        assertEqual(permitted, set(record_ids))
+        auth.override = False
+
+        auth.s3_withdraw_role(auth.user.id, self.editor, for_pe=[])
+
+    # -------------------------------------------------------------------------
+    def testRealmSet(self):
+        """ Test accessible query with stored realm set """
+
+        db = current.db
+        auth = current.auth
+        settings = current.deployment_settings
+
+        current.deployment_settings.security.policy = 6
+        auth.permission = S3Permission(auth)
+
+        accessible_query = auth.s3_accessible_query
+        c = "org"
+        f = "permission_test"
+        table = current.s3db.org_permission_test
+
+        assertEqual = self.assertEqual
+        assertTrue = self.assertTrue
+
+        threshold = settings.get_security_realm_set_threshold()
+        settings.security.realm_set_threshold = 1
+        try:
+            auth.s3_impersonate("normaluser@example.com")
+            auth.s3_assign_role(auth.user.id, self.editor, for_pe=self.org[0])
+            auth.s3_assign_role(auth.user.id, self.editor, for_pe=self.org[1])
+
+            # Query should use a sub-select from the realm set
+            query = accessible_query("update", table, c=c, f=f)
+            assertTrue("s3_realm_set" in str(query))
+
+            # ...and still select the records of both realms
+            rows = db(query).select(table.id)
+            record_ids = set(row.id for row in rows)
+            assertEqual(record_ids, {self.record1, self.record2})
+
+            # Realm set is stored only once
+            rtable = db.s3_realm_set
+            realm_set = (rtable.pe_id.belongs(self.org[:2]))
+            count = db(realm_set).count()
+            auth.permission.clear_cache()
+            auth.permission.realm_sets = {}
+            accessible_query("update", table, c=c, f=f)
+            assertEqual(db(realm_set).count(), count)
+
+            auth.s3_withdraw_role(auth.user.id, self.editor, for_pe=[])
+        finally:
+            settings.security.realm_set_threshold = threshold
+
     ## -------------------------------------------------------------------------
     #def testPerformance(self):
         #""" Test accessible query performance """
@@ -9,6 +9,7 @@ import unittest
 from gluon.languages import lazyT
 
 from s3.s3fields import *
+from s3.s3model import S3Model
 from s3compat import basestring
 
 from unit_tests import run_suite
@@ -298,6 +299,63 @@ class S3RepresentTests(unittest.TestCase):
         # All that should have taken exactly 2 queries!
         self.assertEqual(r.queries, 2)
 
+    # -------------------------------------------------------------------------
+    def testSharedCache(self):
+        """ Test the shared representation cache """
+
+        settings = current.deployment_settings
+        setting = settings.base.get("represent_cache")
+        settings.base.represent_cache = ["org_organisation"]
+
+        S3RepresentCache.clear()
+        try:
+            # First lookup from the database
+            r = S3Represent(lookup="org_organisation")
+            result = r.bulk([self.id1, self.id2], show_link=False)
+            self.assertEqual(result[self.id1], self.name1)
+            self.assertEqual(result[self.id2], self.name2)
+            self.assertEqual(r.queries, 1)
+
+            # Another instance with the same signature uses the cache
+            r = S3Represent(lookup="org_organisation")
+            result = r.bulk([self.id1, self.id2], show_link=False)
+            self.assertEqual(result[self.id1], self.name1)
+            self.assertEqual(result[self.id2], self.name2)
+            self.assertEqual(r.queries, 0)
+
+            # Different fields => different signature
+            r = S3Represent(lookup="org_organisation", fields=["name", "id"])
+            r.bulk([self.id1], show_link=False)
+            self.assertEqual(r.queries, 1)
+
+            # Closures and bound methods => no shared cache
+            def labels(prefix):
+                return lambda row: "%s %s" % (prefix, row.name)
+            r = S3Represent(lookup="org_organisation", labels=labels("A"))
+            self.assertEqual(S3RepresentCache.signature(r), None)
+            r = S3Represent(lookup="org_organisation", labels=self.label)
+            self.assertEqual(S3RepresentCache.signature(r), None)
+
+            # Invalidated when the record is updated
+            otable = current.s3db.org_organisation
+            current.db(otable.id == self.id1).update(name="Renamed Organisation")
+            S3Model.onaccept(otable, Storage(id=self.id1), method="update")
+
+            r = S3Represent(lookup="org_organisation")
+            result = r.bulk([self.id1, self.id2], show_link=False)
+            self.assertEqual(result[self.id1], "Renamed Organisation")
+            self.assertEqual(result[self.id2], self.name2)
+            self.assertEqual(r.queries, 1)
+        finally:
+            settings.base.represent_cache = setting
+            S3RepresentCache.clear()
+
+    # -------------------------------------------------------------------------
+    def label(self, row):
+        """ Representation function as bound method (see testSharedCache) """
+
+        return row.name
+
     # -------------------------------------------------------------------------
     def tearDown(self):
 
@@ -6,6 +6,7 @@
 import unittest
 
 from gluon import *
+from s3 import FS, S3LocationCache, S3ResourceField
 from s3.s3filter import *
 
 from unit_tests import run_suite
@@ -128,11 +129,108 @@ class S3FilterWidgetTests(unittest.TestCase):
         self.assertTrue("2" in values)
         self.assertTrue("3" in values)
 
+# =============================================================================
+class S3LocationFilterTests(unittest.TestCase):
+    """ Tests for S3LocationFilter options lookup """
+
+    # -------------------------------------------------------------------------
+    def setUp(self):
+
+        current.auth.override = True
+
+        s3db = current.s3db
+        ltable = s3db.gis_location
+
+        l0 = ltable.insert(name = "Testfacetland",
+                           level = "L0",
+                           L0 = "Testfacetland",
+                           )
+        l1 = ltable.insert(name = "Testfacet Province",
+                           level = "L1",
+                           parent = l0,
+                           L0 = "Testfacetland",
+                           L1 = "Testfacet Province",
+                           )
+        point = ltable.insert(name = "Testfacet Office",
+                              parent = l1,
+                              L0 = "Testfacetland",
+                              L1 = "Testfacet Province",
+                              )
+        ltable[l0].update_record(path = "%s" % l0)
+        ltable[l1].update_record(path = "%s/%s" % (l0, l1))
+        ltable[point].update_record(path = "%s/%s/%s" % (l0, l1, point))
+        self.l0 = l0
+
+        organisation_id = s3db.org_organisation.insert(name = "Testfacet Org")
+        self.organisation_id = organisation_id
+        s3db.org_office.insert(name = "Testfacet Office",
+                               organisation_id = organisation_id,
+                               location_id = point,
+                               )
+
+    # -------------------------------------------------------------------------
+    def tearDown(self):
+
+        current.auth.override = False
+        current.db.rollback()
+
+    # -------------------------------------------------------------------------
+    def testFacetOptions(self):
+        """ Test options lookup from the location facet """
+
+        s3db = current.s3db
+
+        widget = S3LocationFilter("location_id",
+                                  levels = ["L0", "L1"],
+                                  facets = True,
+                                  )
+
+        resource = s3db.resource("org_office")
+        rfield = S3ResourceField(resource, "location_id")
+        self.assertTrue(widget._unfiltered(resource, rfield))
+
+        levels = widget._options(resource, inject_hierarchy=False)[1]
+        self.assertTrue("Testfacetland" in levels["L0"]["options"])
+        self.assertTrue("Testfacet Province" in levels["L1"]["options"])
+
+        # Facet follows changes in the table
+        ltable = s3db.gis_location
+        l1 = ltable.insert(name = "Testfacet Other",
+                           level = "L1",
+                           parent = self.l0,
+                           L0 = "Testfacetland",
+                           L1 = "Testfacet Other",
+                           )
+        s3db.org_office.insert(name = "Testfacet Other Office",
+                               organisation_id = self.organisation_id,
+                               location_id = l1,
+                               )
+        S3LocationCache.invalidate("org_office")
+
+        resource = s3db.resource("org_office")
+        levels = widget._options(resource, inject_hierarchy=False)[1]
+        self.assertTrue("Testfacet Other" in levels["L1"]["options"])
+
+    # -------------------------------------------------------------------------
+    def testFiltered(self):
+        """ Test that filtered resources do not use the location facet """
+
+        resource = current.s3db.resource("org_office",
+                                         filter = FS("name") == "Testfacet Office",
+                                         )
+        rfield = S3ResourceField(resource, "location_id")
+        self.assertFalse(S3LocationFilter._unfiltered(resource, rfield))
+
+        resource = current.s3db.resource("org_office")
+        rfield = S3ResourceField(resource, "site_id$location_id")
+        self.assertFalse(S3LocationFilter._unfiltered(resource, rfield))
+
 # =============================================================================
 if __name__ == "__main__":
 
     run_suite(
         S3FilterWidgetTests,
+        S3LocationFilterTests,
     )
 
 # END ========================================================================
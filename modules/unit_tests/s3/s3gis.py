@@ -5,6 +5,8 @@
 # To run this script use:
 # python web2py.py -S eden -M -R applications/eden/modules/unit_tests/s3/s3gis.py
 
+import json
+import os
 import unittest
 import datetime
 from gluon import *
@@ -353,6 +355,75 @@ class S3LocationTreeTests(unittest.TestCase):
         # We should have seen all the expected parents.
         self.assertEqual(len(expected_parents), 0)
 
+    # -------------------------------------------------------------------------
+    def testULT5_rebuild_location_tree(self):
+        """ Test the bulk update of the location tree for a country """
+
+        table = self.table
+        db = current.db
+        gis = current.gis
+
+        # Insert a country
+        L0_lat = 10.0
+        L0_lon = -10.0
+        L0_id = table.insert(level = "L0",
+                             name = "s3gis.testULT5.L0",
+                             lat = L0_lat,
+                             lon = L0_lon,
+                             )
+        # Insert an L1 with its own Lat/Lon
+        L1_id = table.insert(level = "L1",
+                             name = "s3gis.testULT5.L1",
+                             parent = L0_id,
+                             lat = 12.0,
+                             lon = -12.0,
+                             )
+        # And an L3 below that, skipping over L2
+        L3_id = table.insert(level = "L3",
+                             name = "s3gis.testULT5.L3",
+                             parent = L1_id,
+                             )
+        # And a specific location at the end
+        specific_id = table.insert(name = "s3gis.testULT5.specific",
+                                   parent = L3_id,
+                                   )
+
+        updated = gis.rebuild_location_tree(L0=L0_id)
+        self.assertEqual(updated, 4)
+
+        L1_record = db(table.id == L1_id).select(*self.fields,
+                                                 limitby=(0, 1)
+                                                 ).first()
+        self.assertEqual(L1_record.inherited, False)
+        self.assertEqual(L1_record.path, "%s/%s" % (L0_id, L1_id))
+        self.assertEqual(L1_record.lat, 12.0)
+
+        L3_record = db(table.id == L3_id).select(*self.fields,
+                                                 limitby=(0, 1)
+                                                 ).first()
+        self.assertEqual(L3_record.inherited, True)
+        self.assertEqual(L3_record.path, "%s/%s/%s" % (L0_id, L1_id, L3_id))
+        self.assertEqual(L3_record.lat, 12.0)
+        self.assertEqual(L3_record.lon, -12.0)
+
+        specific_record = db(table.id == specific_id).select(table.path,
+                                                             table.L0,
+                                                             table.L1,
+                                                             table.L2,
+                                                             table.L3,
+                                                             limitby=(0, 1)
+                                                             ).first()
+        self.assertEqual(specific_record.path,
+                         "%s/%s/%s/%s" % (L0_id, L1_id, L3_id, specific_id))
+        self.assertEqual(specific_record.L0, "s3gis.testULT5.L0")
+        self.assertEqual(specific_record.L1, "s3gis.testULT5.L1")
+        self.assertEqual(specific_record.L2, None)
+        self.assertEqual(specific_record.L3, "s3gis.testULT5.L3")
+
+        # Nothing to do on second run
+        updated = gis.rebuild_location_tree(L0=L0_id)
+        self.assertEqual(updated, 0)
+
     # -------------------------------------------------------------------------
     def _testL0(self, with_level):
         """ Test updating a Country with Polygon """
@@ -773,6 +844,499 @@ class S3LocationTreeTests(unittest.TestCase):
         current.auth.override = False
         current.db.rollback()
 
+# =============================================================================
+class S3BBoxQueryTests(unittest.TestCase):
+    """ Tests for bounding box queries (with or without spatial index) """
+
+    # -------------------------------------------------------------------------
+    def setUp(self):
+
+        current.auth.override = True
+
+    # -------------------------------------------------------------------------
+    def tearDown(self):
+
+        current.auth.override = False
+        current.db.rollback()
+
+    # -------------------------------------------------------------------------
+    def testBBoxQuery(self):
+        """ Test query_features_by_bbox """
+
+        db = current.db
+        gis = current.gis
+        table = current.s3db.gis_location
+
+        inside = table.insert(name = "s3gis.testBBox.inside",
+                              lat = 10.5,
+                              lon = 20.5,
+                              lat_min = 10.5,
+                              lat_max = 10.5,
+                              lon_min = 20.5,
+                              lon_max = 20.5,
+                              )
+        overlap = table.insert(name = "s3gis.testBBox.overlap",
+                               lat = 10,
+                               lon = 20,
+                               lat_min = 9,
+                               lat_max = 11,
+                               lon_min = 19,
+                               lon_max = 21,
+                               )
+        outside = table.insert(name = "s3gis.testBBox.outside",
+                               lat = -10.5,
+                               lon = -20.5,
+                               lat_min = -10.5,
+                               lat_max = -10.5,
+                               lon_min = -20.5,
+                               lon_max = -20.5,
+                               )
+        # Point without bounds
+        point = table.insert(name = "s3gis.testBBox.point",
+                             lat = 11.5,
+                             lon = 21.5,
+                             )
+        table.insert(name = "s3gis.testBBox.pointoutside",
+                     lat = -11.5,
+                     lon = -21.5,
+                     )
+
+        query = gis.query_features_by_bbox(20, 10, 22, 12) & \
+                (table.name.like("s3gis.testBBox.%"))
+        rows = db(query).select(table.id)
+        found = set(row.id for row in rows)
+        self.assertEqual(found, {inside, overlap, point})
+
+        # Index follows updates
+        db(table.id == outside).update(lat = 11,
+                                       lon = 21,
+                                       lat_min = 11,
+                                       lat_max = 11,
+                                       lon_min = 21,
+                                       lon_max = 21,
+                                       )
+        rows = db(query).select(table.id)
+        found = set(row.id for row in rows)
+        self.assertEqual(found, {inside, overlap, point, outside})
+
+# =============================================================================
+class S3SimplifiedGeometryTests(unittest.TestCase):
+    """ Tests for precomputed simplified geometries """
+
+    # -------------------------------------------------------------------------
+    def setUp(self):
+
+        current.auth.override = True
+
+    # -------------------------------------------------------------------------
+    def tearDown(self):
+
+        current.auth.override = False
+        current.db.rollback()
+
+    # -------------------------------------------------------------------------
+    def testSimplifiedGeometries(self):
+        """ Test precomputing and lookup of simplified geometries """
+
+        db = current.db
+        s3db = current.s3db
+        gis = current.gis
+
+        tolerances = current.deployment_settings.get_gis_simplify_tolerances()
+        if not tolerances:
+            self.skipTest("no simplify_tolerances configured")
+
+        table = s3db.gis_location
+        polygon_id = table.insert(name = "s3gis.testSimplified.polygon",
+                                  wkt = "POLYGON ((10 10, 10.001 15, 10 20, 20 20, 20 10, 10 10))",
+                                  )
+        point_id = table.insert(name = "s3gis.testSimplified.point",
+                                wkt = "POINT (15 15)",
+                                )
+
+        updated = gis.update_simplified_geometries([polygon_id, point_id])
+        self.assertEqual(updated, 1)
+
+        stable = s3db.gis_location_simplified
+        rows = db(stable.location_id.belongs((polygon_id, point_id))).select(stable.location_id,
+                                                                             stable.tolerance,
+                                                                             stable.geojson,
+                                                                             )
+        self.assertEqual(len(rows), len(tolerances))
+        self.assertTrue(all(row.location_id == polygon_id for row in rows))
+
+        # Lookup picks the precomputed polygon for the tolerance,
+        # and simplifies the point on the fly
+        tolerance = max(tolerances)
+        precomputed = dict((row.tolerance, row.geojson) for row in rows)
+        geojsons = gis.get_simplified_geojson([polygon_id, point_id],
+                                              tolerance = tolerance * 2,
+                                              )
+        self.assertEqual(geojsons[polygon_id], precomputed[tolerance])
+        self.assertTrue("Point" in geojsons[point_id])
+
+        # Updating a polygon into a point removes the simplified polygons
+        db(table.id == polygon_id).update(wkt = "POINT (15 15)")
+        gis.update_simplified_geometries([polygon_id])
+        self.assertEqual(db(stable.location_id == polygon_id).count(), 0)
+
+# =============================================================================
+class S3VectorTilesTests(unittest.TestCase):
+    """ Tests for vector tiles and the tile cache """
+
+    TABLENAME = "test_vector_tiles"
+
+    # -------------------------------------------------------------------------
+    def tearDown(self):
+
+        import shutil
+        shutil.rmtree(S3TileCache.path(self.TABLENAME), ignore_errors=True)
+
+    # -------------------------------------------------------------------------
+    def testTileBounds(self):
+        """ Test the bounds of tiles """
+
+        assertAlmostEqual = self.assertAlmostEqual
+
+        lon_min, lat_min, lon_max, lat_max = S3VectorTiles.tile_bounds(0, 0, 0)
+        assertAlmostEqual(lon_min, -180.0)
+        assertAlmostEqual(lon_max, 180.0)
+        assertAlmostEqual(lat_min, -85.0511287798066)
+        assertAlmostEqual(lat_max, 85.0511287798066)
+
+        # North-east quarter at zoom level 1
+        lon_min, lat_min, lon_max, lat_max = S3VectorTiles.tile_bounds(1, 1, 0)
+        assertAlmostEqual(lon_min, 0.0)
+        assertAlmostEqual(lon_max, 180.0)
+        assertAlmostEqual(lat_min, 0.0)
+        assertAlmostEqual(lat_max, 85.0511287798066)
+
+    # -------------------------------------------------------------------------
+    def testTileCache(self):
+        """ Test storing, lookup and invalidation of cached tiles """
+
+        tablename = self.TABLENAME
+        cache = S3TileCache
+
+        version = cache.version(tablename)
+        self.assertEqual(version, 0)
+        self.assertEqual(cache.get(tablename, version, "key", 3, 4, 5, "geojson"), None)
+
+        tile = b'{"type":"FeatureCollection","features":[]}'
+        cache.store(tablename, version, "key", 3, 4, 5, "geojson", tile)
+        self.assertEqual(cache.get(tablename, version, "key", 3, 4, 5, "geojson"), tile)
+        self.assertEqual(cache.get(tablename, version, "key", 3, 4, 6, "geojson"), None)
+
+        # Write to the table invalidates the tile
+        cache.invalidate(tablename)
+        version = cache.version(tablename)
+        self.assertEqual(version, 1)
+        self.assertEqual(cache.get(tablename, version, "key", 3, 4, 5, "geojson"), None)
+
+        # Write to gis_location invalidates the tiles of all tables
+        cache.store(tablename, version, "key", 3, 4, 5, "geojson", tile)
+        cache.invalidate("gis_location")
+        self.assertEqual(cache.version(tablename), 2)
+
+        # Write to a location without features of the table doesn't
+        cache.invalidate("gis_location", [0])
+        self.assertEqual(cache.version(tablename), 2)
+
+# =============================================================================
+class S3GeoJSONTests(unittest.TestCase):
+    """ Tests for the native GeoJSON encoder """
+
+    TABLENAME = "org_office"
+
+    # -------------------------------------------------------------------------
+    def setUp(self):
+
+        current.auth.override = True
+
+        permission = current.auth.permission
+        self.format = permission.format
+        permission.format = "geojson"
+
+        xml = current.xml
+        self.show_ids = xml.show_ids
+        xml.show_ids = True
+
+        s3db = current.s3db
+        organisation_id = s3db.org_organisation.insert(name = "s3gis.testGeoJSON")
+        table = s3db.org_office
+        self.ids = [table.insert(name = "s3gis.testGeoJSON.%s" % i,
+                                 organisation_id = organisation_id,
+                                 )
+                    for i in range(3)]
+
+    # -------------------------------------------------------------------------
+    def tearDown(self):
+
+        current.auth.permission.format = self.format
+        current.xml.show_ids = self.show_ids
+
+        current.auth.override = False
+        current.db.rollback()
+
+    # -------------------------------------------------------------------------
+    def export(self, record_ids, location_data, native=True):
+        """
+            Export records as GeoJSON
+
+            @param record_ids: the record IDs
+            @param location_data: the location data
+            @param native: use the native encoder rather than the stylesheet
+        """
+
+        stylesheet = os.path.join(current.request.folder,
+                                  "static", "formats", "geojson", "export.xsl")
+
+        resource = current.s3db.resource(self.TABLENAME, id=record_ids)
+        if native:
+            return resource.export_xml(mcomponents = None,
+                                       stylesheet = stylesheet,
+                                       as_json = True,
+                                       location_data = location_data,
+                                       )
+        else:
+            tree = resource.export_xml(mcomponents = None,
+                                       stylesheet = stylesheet,
+                                       as_tree = True,
+                                       location_data = location_data,
+                                       )
+            return current.xml.tree2json(tree)
+
+    # -------------------------------------------------------------------------
+    def assertSameOutput(self, record_ids, location_data):
+        """
+            Assert that native encoder and stylesheet produce the same output
+
+            @param record_ids: the record IDs
+            @param location_data: the location data
+        """
+
+        native = self.export(record_ids, location_data)
+        xslt = self.export(record_ids, location_data, native=False)
+        self.assertEqual(json.loads(native), json.loads(xslt))
+
+    # -------------------------------------------------------------------------
+    def testGeometries(self):
+        """ Test export of features with geometries """
+
+        tablename = self.TABLENAME
+        ids = self.ids
+
+        polygon = '{"type":"Polygon","coordinates":[[[10,10],[10,20],[20,20],[10,10]]]}'
+        point = '{"type":"Point","coordinates":[15,15]}'
+        location_data = {"geojsons": {tablename: {ids[0]: [polygon],
+                                                  ids[1]: [polygon, point],
+                                                  },
+                                      },
+                         "attributes": {tablename: {ids[0]: {"name": "Office",
+                                                             "staff": 5,
+                                                             "ratio": 2.5,
+                                                             },
+                                                    },
+                                        },
+                         "markers": {tablename: {"image": "marker.png",
+                                                 "height": 20,
+                                                 "width": 10,
+                                                 },
+                                     },
+                         "styles": {tablename: {ids[1]: '{"fill":"ff0000"}'}},
+                         }
+
+        # Collection
+        self.assertSameOutput(ids, location_data)
+        # Single feature
+        self.assertSameOutput(ids[:1], location_data)
+
+        output = json.loads(self.export(ids[:1], location_data))
+        self.assertEqual(output["type"], "Feature")
+        properties = output["properties"]
+        self.assertEqual(properties["id"], ids[0])
+        self.assertEqual(properties["staff"], 5)
+        self.assertEqual(properties["ratio"], 2.5)
+        self.assertEqual(properties["name"], "Office")
+
+    # -------------------------------------------------------------------------
+    def testPoints(self):
+        """ Test export of features with lat/lon """
+
+        tablename = self.TABLENAME
+        ids = self.ids
+
+        location_data = {"latlons": {tablename: {ids[0]: (10.5, 20.25),
+                                                 ids[2]: (-1, 1),
+                                                 },
+                                     },
+                         "attributes": {tablename: {ids[2]: {"name": "Office"},
+                                                    },
+                                        },
+                         }
+
+        self.assertSameOutput(ids, location_data)
+        self.assertSameOutput(ids[:1], location_data)
+
+    # -------------------------------------------------------------------------
+    def testClusters(self):
+        """ Test server-side grid clustering """
+
+        db = current.db
+        s3db = current.s3db
+        ids = self.ids
+
+        gtable = s3db.gis_location
+        table = s3db.org_office
+        for record_id, (lat, lon) in zip(ids, ((10.0, 20.0),
+                                               (10.0001, 20.0001),
+                                               (-30.0, 40.0),
+                                               )):
+            location_id = gtable.insert(name = "s3gis.testGeoJSON",
+                                        lat = lat,
+                                        lon = lon,
+                                        )
+            db(table.id == record_id).update(location_id=location_id)
+
+        codec = S3Codec.get_codec("geojson")
+        resource = s3db.resource(self.TABLENAME, id=ids)
+
+        clusters, record_ids = codec.clusters(resource, 5, 20, 2)
+        self.assertEqual(len(clusters), 1)
+        cluster = clusters[0]
+        self.assertEqual(cluster["count"], 2)
+        self.assertEqual(cluster["id"], min(ids[:2]))
+        self.assertEqual(cluster["bbox"], [20.0, 10.0, 20.0001, 10.0001])
+        self.assertEqual(record_ids, [ids[2]])
+
+        # Drill-down: no clusters at high zoom levels
+        clusters, record_ids = codec.clusters(resource, 20, 20, 2)
+        self.assertEqual(clusters, [])
+        self.assertEqual(set(record_ids), set(ids))
+
+        # Clustering options
+        self.assertEqual(codec.cluster_options(None), None)
+        self.assertEqual(codec.cluster_options({"zoom": "x"}), None)
+        options = codec.cluster_options({"zoom": "5",
+                                         "distance": "10",
+                                         "threshold": "3",
+                                         })
+        self.assertEqual(options, (5, 10.0, 3, False))
+
+# =============================================================================
+class S3GazetteerTests(unittest.TestCase):
+    """ Tests for the offline gazetteer """
+
+    # -------------------------------------------------------------------------
+    def setUp(self):
+
+        current.auth.override = True
+
+        settings = current.deployment_settings
+        self.geocode_service = settings.gis.get("geocode_service")
+        settings.gis.geocode_service = "gazetteer"
+
+        # Do not rebuild the index for the whole database
+        self.ready = S3Gazetteer._ready
+        S3Gazetteer._ready = True
+
+        s3db = current.s3db
+        table = s3db.gis_location
+        self.province_id = table.insert(name = "Testgaz Province",
+                                        level = "L1",
+                                        lat = 10,
+                                        lon = 20,
+                                        )
+        self.town_id = table.insert(name = "Testgazville",
+                                    level = "L3",
+                                    parent = self.province_id,
+                                    lat = 10.5,
+                                    lon = 20.5,
+                                    )
+        s3db.gis_location_name_alt.insert(location_id = self.town_id,
+                                          name_alt = "Gazbürg",
+                                          )
+        S3Gazetteer.update([self.province_id, self.town_id])
+
+    # -------------------------------------------------------------------------
+    def tearDown(self):
+
+        settings = current.deployment_settings
+        if self.geocode_service is None:
+            settings.gis.pop("geocode_service", None)
+        else:
+            settings.gis.geocode_service = self.geocode_service
+
+        S3Gazetteer._ready = self.ready
+        S3Gazetteer.clear_cache()
+
+        current.auth.override = False
+        current.db.rollback()
+
+    # -------------------------------------------------------------------------
+    def testNormalize(self):
+        """ Test name normalization """
+
+        normalize = S3Gazetteer.normalize
+
+        self.assertEqual(normalize(" Saint-Étienne "), "saint etienne")
+        self.assertEqual(normalize("N'Djamena"), "n djamena")
+        self.assertEqual(normalize(None), "")
+
+    # -------------------------------------------------------------------------
+    def testGeocode(self):
+        """ Test forward geocoding """
+
+        geocode = S3Gazetteer.geocode
+        town_id = self.town_id
+        province_id = self.province_id
+
+        # Most specific part of the address
+        result = geocode("1 Main Street, Testgazville, Testgaz Province")
+        self.assertEqual(result["location_id"], town_id)
+        self.assertEqual(result["lat"], 10.5)
+        self.assertEqual(result["lon"], 20.5)
+
+        # Alternate names, without diacritics
+        result = geocode("Gazburg", Lx_ids=[province_id])
+        self.assertEqual(result["location_id"], town_id)
+
+        # Fuzzy match
+        result = geocode("Testgazvile")
+        self.assertEqual(result["location_id"], town_id)
+
+        # Match for the Lx only
+        result = geocode("Testgaz Province", Lx_ids=[province_id])
+        self.assertEqual(result, "We can only geocode to the Lx")
+
+        # Outside of the Lx
+        result = geocode("Testgazville", Lx_ids=[town_id + 1000000])
+        self.assertEqual(result, "No results found")
+
+        result = geocode("Nowhere Testgaz")
+        self.assertEqual(result, "No results found")
+
+    # -------------------------------------------------------------------------
+    def testGeocodeBatch(self):
+        """ Test batch geocoding and result caching """
+
+        results = S3Gazetteer.geocode_batch([("Testgazville", None, None),
+                                             ("Nowhere Testgaz", None, None),
+                                             ("Testgaz Province", None, None),
+                                             ])
+        self.assertEqual(results[0]["location_id"], self.town_id)
+        self.assertEqual(results[1], "No results found")
+        self.assertEqual(results[2]["location_id"], self.province_id)
+
+        # Results are cached until the index is updated
+        current.db(current.s3db.gis_location.id == self.town_id).update(lat = 11)
+        result = S3Gazetteer.geocode("Testgazville")
+        self.assertEqual(result["lat"], 10.5)
+
+        S3Gazetteer.update(self.town_id)
+        result = S3Gazetteer.geocode("Testgazville")
+        self.assertEqual(result["lat"], 11)
+
 # =============================================================================
 class S3NoGisConfigTests(unittest.TestCase):
     """
@@ -815,6 +1379,11 @@ if __name__ == "__main__":
 
     run_suite(
         S3LocationTreeTests,
+        S3BBoxQueryTests,
+        S3SimplifiedGeometryTests,
+        S3VectorTilesTests,
+        S3GeoJSONTests,
+        S3GazetteerTests,
         S3NoGisConfigTests,
         )
 
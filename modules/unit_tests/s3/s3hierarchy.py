@@ -122,6 +122,7 @@ class S3HierarchyTests(unittest.TestCase):
         db = current.db
         db.test_hierarchy_reference.drop()
         db.test_hierarchy.drop(mode="cascade")
+        db(db.s3_hierarchy.tablename == "test_hierarchy").delete()
         current.db.commit()
 
     # -------------------------------------------------------------------------
@@ -573,6 +574,118 @@ class S3HierarchyTests(unittest.TestCase):
         nodes = h.findall(root, category="Cat 4")
         assertEqual(nodes, set())
 
+    # -------------------------------------------------------------------------
+    def testIndex(self):
+        """ Test the pre-order hierarchy index """
+
+        from s3.s3hierarchy import S3HierarchyIndex
+
+        uids = self.uids
+
+        assertEqual = self.assertEqual
+
+        h = S3Hierarchy("test_hierarchy")
+        index = h.index
+
+        # All descendants are within the interval of the node
+        pos = index.pos
+        root = uids["HIERARCHY1"]
+        i = pos[root]
+        descendants = set(index.ids[i+1:index.right[i]+1])
+        assertEqual(descendants, h.findall(root))
+
+        # Children and levels
+        children = set(index.ids[j] for j in index.children(i))
+        assertEqual(children, h.children(root))
+        assertEqual(index.levels[i], 0)
+        assertEqual(index.levels[pos[uids["HIERARCHY1-2-1"]]], 2)
+
+        # Serialization
+        restored = S3HierarchyIndex.from_dict(index.as_dict())
+        assertEqual(restored.ids, index.ids)
+        assertEqual(restored.right, index.right)
+        assertEqual(restored.parents, index.parents)
+
+    # -------------------------------------------------------------------------
+    def testIncrementalUpdate(self):
+        """ Test incremental updates of the stored hierarchy """
+
+        db = current.db
+        s3db = current.s3db
+
+        uids = self.uids
+
+        assertEqual = self.assertEqual
+        assertTrue = self.assertTrue
+        assertFalse = self.assertFalse
+
+        # Rebuild and store the hierarchy
+        settings = current.deployment_settings
+        hierarchy_store = settings.base.get("hierarchy_store")
+        settings.base.hierarchy_store = True
+        try:
+            S3Hierarchy.dirty("test_hierarchy")
+            h = S3Hierarchy("test_hierarchy")
+        finally:
+            settings.base.hierarchy_store = hierarchy_store
+        assertTrue(uids["HIERARCHY1"] in h.roots)
+
+        htable = s3db.s3_hierarchy
+        query = (htable.tablename == "test_hierarchy")
+        row = db(query).select(htable.dirty,
+                               htable.version,
+                               limitby = (0, 1),
+                               ).first()
+        assertFalse(row.dirty)
+        version = row.version
+
+        table = db.test_hierarchy
+        parent_id = uids["HIERARCHY2-1"]
+        record_id = None
+        try:
+            # Add a node
+            record_id = table.insert(name = "Type 2-1-3",
+                                     category = "Cat 2",
+                                     parent = parent_id,
+                                     )
+            S3Hierarchy.update_nodes("test_hierarchy", record_id)
+
+            # Verify that the stored hierarchy has been updated
+            row = db(query).select(htable.dirty,
+                                   htable.version,
+                                   htable.hierarchy,
+                                   limitby = (0, 1),
+                                   ).first()
+            assertFalse(row.dirty)
+            assertEqual(row.version, version + 1)
+            assertTrue(record_id in row.hierarchy["ids"])
+
+            h = S3Hierarchy("test_hierarchy")
+            assertEqual(h.parent(record_id), parent_id)
+            assertEqual(h.category(record_id), "Cat 2")
+
+            # Move the node
+            new_parent_id = uids["HIERARCHY1-1"]
+            db(table.id == record_id).update(parent=new_parent_id)
+            S3Hierarchy.update_nodes("test_hierarchy", record_id)
+
+            h = S3Hierarchy("test_hierarchy")
+            assertEqual(h.parent(record_id), new_parent_id)
+            assertFalse(record_id in h.children(parent_id))
+            assertTrue(record_id in h.findall(uids["HIERARCHY1"]))
+
+            # Remove the node
+            db(table.id == record_id).update(deleted=True)
+            S3Hierarchy.delete_nodes("test_hierarchy", record_id)
+
+            h = S3Hierarchy("test_hierarchy")
+            assertEqual(h.category(record_id), None)
+            assertFalse(record_id in h.children(new_parent_id))
+
+        finally:
+            if record_id:
+                db(table.id == record_id).delete()
+
     # -------------------------------------------------------------------------
     def testExportNode(self):
         """ Test export of nodes """
@@ -1252,6 +1365,7 @@ class S3TypeOfTests(unittest.TestCase):
         db.typeof_hierarchy.drop(mode="cascade")
         db.typeof_hierarchy_reference.drop()
         db.typeof_nonhierarchy.drop()
+        db(db.s3_hierarchy.tablename == "typeof_hierarchy").delete()
 
     # -------------------------------------------------------------------------
     def setUp(self):
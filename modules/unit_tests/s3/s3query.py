@@ -245,6 +245,47 @@ class FieldSelectorResolutionTests(unittest.TestCase):
 
         assertTrue(distinct)
 
+    # -------------------------------------------------------------------------
+    def testSelectorResolutionCache(self):
+        """ Test caching of resolved selectors """
+
+        s3db = current.s3db
+
+        assertEqual = self.assertEqual
+        assertNotEqual = self.assertNotEqual
+        assertIn = self.assertIn
+        assertNotIn = self.assertNotIn
+
+        from s3.s3query import S3FieldPath
+
+        s3db.clear_selector_cache()
+        cache = current.model["selectors"]
+
+        resource = s3db.resource("test_master")
+        key = S3FieldPath._cache_key(resource, "child.name")
+
+        rfield = resource.resolve_selector("child.name")
+        assertIn(key, current.model["selectors"])
+
+        # Second resolution from cache gives the same result
+        cached = resource.resolve_selector("child.name")
+        assertEqual(cached.colname, rfield.colname)
+        assertEqual([str(j) for j in cached.left["test_master"]],
+                    [str(j) for j in rfield.left["test_master"]])
+
+        # ...but with separate joins dicts
+        cached.left["test"] = []
+        assertNotIn("test", rfield.left)
+
+        # Resources with different component exposure have different keys
+        other = s3db.resource("test_master", components=["parent"])
+        assertNotEqual(S3FieldPath._cache_key(other, "child.name"), key)
+
+        # Changes of the component graph invalidate the cache
+        s3db.add_components("test_master")
+        assertNotIn(key, current.model["selectors"])
+        assertIn(key, cache)
+
 # =============================================================================
 class FieldCategoryFlagsTests(unittest.TestCase):
     """ Test S3ResourceField type category properties """
@@ -2498,6 +2539,45 @@ class JoinResolutionTests(unittest.TestCase):
         assertEqual(str(left[0]), str(ltable_join))
         assertEqual(str(left[1]), str(ptable_join))
 
+    # -------------------------------------------------------------------------
+    @unittest.skipIf(not current.deployment_settings.has_module("project"), "project module disabled")
+    def testPrune(self):
+        """ Test pruning of left joins which are not required """
+
+        s3db = current.s3db
+
+        assertEqual = self.assertEqual
+        assertTrue = self.assertTrue
+        assertFalse = self.assertFalse
+
+        ptable = s3db.project_project
+        ltable = s3db.project_task_project
+        ttable = s3db.project_task
+
+        ptable_join = ptable.on(ltable.project_id == ptable.id)
+        ltable_join = ltable.on(ltable.task_id == ttable.id)
+        left = [ltable_join, ptable_join]
+
+        # N:1 join, but not 1:N join
+        assertTrue(S3Joins.unique_join(ptable_join))
+        assertFalse(S3Joins.unique_join(ltable_join))
+
+        # Query only referencing the master table
+        query = (ttable.deleted == False)
+        assertEqual(S3Joins.prune(left, [query]), [])
+        # - without distinct, the 1:N join must be retained
+        pruned = S3Joins.prune(left, [query], distinct=False)
+        assertEqual([str(j) for j in pruned], [str(ltable_join)])
+
+        # Query referencing the project table requires both joins
+        query = (ptable.name == "Test")
+        pruned = S3Joins.prune(left, [query])
+        assertEqual([str(j) for j in pruned], [str(ltable_join), str(ptable_join)])
+
+        # Orderby referencing the link table
+        pruned = S3Joins.prune(left, [None, "project_task_project.id desc"])
+        assertEqual([str(j) for j in pruned], [str(ltable_join)])
+
 # =============================================================================
 class URLQueryParserTests(unittest.TestCase):
     """ URL Query Parser Tests """
@@ -15,7 +15,7 @@ from gluon import *
 from gluon.storage import Storage
 
 from s3 import *
-from s3dal import Row
+from s3dal import Row, Rows
 
 from unit_tests import run_suite
 
@@ -299,6 +299,48 @@ class ResourceDataTableFilterTests(unittest.TestCase):
                                              get_vars)[1]
         self.assertEqual(orderby, "hrm_competency_rating.priority desc")
 
+    # -------------------------------------------------------------------------
+    def testDataTableFilterTextSearch(self):
+        """ Test quick search with text search index """
+
+        if not S3TextSearch.supported():
+            self.skipTest("text search index not supported")
+
+        db = current.db
+        s3db = current.s3db
+
+        s3db.configure("org_organisation", text_search=["name", "acronym"])
+        try:
+            S3TextSearch.rebuild("org_organisation")
+            if not S3TextSearch.available("org_organisation"):
+                self.skipTest("text search index not available")
+
+            table = s3db.org_organisation
+            org_id = table.insert(name = "TextSearchTestOrganisation",
+                                  acronym = "TSTORG",
+                                  )
+            S3TextSearch.update("org_organisation", org_id)
+
+            resource = s3db.resource("org_organisation")
+            get_vars = Storage({"sSearch": "textsearchtest",
+                                "iColumns": "2",
+                                })
+            searchq, orderby, left = resource.datatable_filter(["id", "name"],
+                                                                get_vars)
+            self.assertNotEqual(searchq, None)
+
+            rows = db(searchq).select(table.id)
+            self.assertEqual([row.id for row in rows], [org_id])
+
+            # Removed from index
+            S3TextSearch.delete("org_organisation", org_id)
+            rows = db(searchq).select(table.id)
+            self.assertEqual(len(rows), 0)
+        finally:
+            s3db.clear_config("org_organisation", "text_search")
+            db.rollback()
+            S3TextSearch.reset()
+
 # =============================================================================
 class ResourceExportTests(unittest.TestCase):
     """ Test XML export of resources """
@@ -1841,6 +1883,37 @@ class ResourceGetTests(unittest.TestCase):
         assertEqual(record.uuid, "GETTESTOFFICE")
         assertEqual(record.name, "GetTestOffice")
 
+    # -------------------------------------------------------------------------
+    def testLoadComponents(self):
+        """ load_components() filters components by the master keys """
+
+        assertEqual = self.assertEqual
+        assertNotEqual = self.assertNotEqual
+
+        resource = current.s3db.resource("org_organisation",
+                                         uid="GETTESTORG",
+                                         components=["office"],
+                                         )
+        loaded = resource.load_components()
+        assertEqual(list(loaded.keys()), ["office"])
+
+        component = resource.components["office"]
+        assertEqual(component.rfilter.master_keys, [self.org_id])
+        rows = loaded["office"]
+        assertEqual(len(rows), 1)
+        assertEqual(rows[0].uuid, "GETTESTOFFICE")
+
+        # Records are distributed to the master records
+        records = resource.get(self.org_id, "office")
+        assertEqual([r.uuid for r in records], ["GETTESTOFFICE"])
+        assertNotEqual(component._masterindex, None)
+
+        # Clearing the master restores the master query filter
+        resource.clear()
+        assertEqual(component._masterindex, None)
+        assertEqual(component.rfilter.master_keys, None)
+        assertEqual(component.count(), 1)
+
     # -------------------------------------------------------------------------
     @classmethod
     def tearDownClass(cls):
@@ -2515,6 +2588,267 @@ class ResourceSelectTests(unittest.TestCase):
         # - returns all matching record ids, however
         assertEqual(len(data.ids), numitems)
 
+    # -------------------------------------------------------------------------
+    def testCountStrategies(self):
+        """ Test count strategies """
+
+        s3db = current.s3db
+
+        assertEqual = self.assertEqual
+        assertFalse = self.assertFalse
+
+        numitems = len([item for item in self.test_data if item[1] == "A"])
+
+        resource = s3db.resource("select_master", filter=FS("status") == "A")
+        rfilter = resource.rfilter
+
+        # Exact count
+        assertEqual(rfilter.count(strategy="exact"), numitems)
+        assertFalse(rfilter.approximate)
+
+        # Cached count gives the exact number
+        assertEqual(rfilter.count(strategy="cached"), numitems)
+        assertFalse(rfilter.approximate)
+
+        # Estimates are not used for small numbers
+        assertEqual(rfilter.count(strategy="estimate"), numitems)
+        assertFalse(rfilter.approximate)
+
+        # Count strategy in select
+        data = resource.select(["name"], limit=1, count="estimate")
+        assertEqual(data.numrows, numitems)
+        assertFalse(data.approximate)
+
+    # -------------------------------------------------------------------------
+    def testSelectKeyset(self):
+        """ Test keyset pagination (seek method) """
+
+        s3db = current.s3db
+
+        assertEqual = self.assertEqual
+        assertNotEqual = self.assertNotEqual
+
+        numitems = len(self.test_data)
+
+        # Define resource
+        resource = s3db.resource("select_master")
+        table = resource.table
+
+        # Reference: all record IDs in descending order
+        expected = [row.id for row in current.db(table.id > 0).select(
+                                                    table.id,
+                                                    orderby = ~table.id,
+                                                    )]
+        assertEqual(len(expected), numitems)
+
+        # Page through the resource with the cursor
+        limit = 3
+        seek = True
+        ids = []
+        while True:
+            data = resource.select(["id", "name"],
+                                   limit = limit,
+                                   orderby = ~table.id,
+                                   count = True,
+                                   seek = seek,
+                                   )
+            # - counts all matching records
+            assertEqual(data.numrows, numitems)
+            page = [row["select_master.id"] for row in data.rows]
+            if not page:
+                break
+            # - page in the right order
+            assertEqual(page, data.ids)
+            ids.extend(page)
+            seek = data.cursor
+            assertNotEqual(seek, None)
+        assertEqual(ids, expected)
+
+        # Start a page sequence at an offset
+        data = resource.select(["id", "name"],
+                               start = 4,
+                               limit = limit,
+                               orderby = ~table.id,
+                               seek = True,
+                               )
+        assertEqual(data.ids, expected[4:4+limit])
+        assertEqual(data.cursor, [expected[4+limit-1]])
+
+        # Nullable orderby field => falls back to OFFSET, no cursor
+        data = resource.select(["id", "name"],
+                               start = 2,
+                               limit = limit,
+                               orderby = "select_master.name",
+                               seek = True,
+                               )
+        assertEqual(len(data.rows), limit)
+        assertEqual(data.cursor, None)
+
+    # -------------------------------------------------------------------------
+    def testIterSelect(self):
+        """ Test chunk-wise extraction with iterselect """
+
+        s3db = current.s3db
+
+        assertEqual = self.assertEqual
+
+        numitems = len(self.test_data)
+
+        # Define resource
+        resource = s3db.resource("select_master")
+        table = resource.table
+
+        # Reference: all record IDs in descending order
+        expected = [row.id for row in current.db(table.id > 0).select(
+                                                    table.id,
+                                                    orderby = ~table.id,
+                                                    )]
+
+        # Chunks with keyset pagination
+        data = resource.iterselect(["id", "name"],
+                                   chunksize = 3,
+                                   orderby = ~table.id,
+                                   count = True,
+                                   )
+        assertEqual(len(data), numitems)
+        chunks = list(data.chunks())
+        assertEqual(len(chunks), (numitems + 2) // 3)
+        assertEqual([row["select_master.id"] for row in data], expected)
+
+        # Chunks by record IDs (nullable orderby field)
+        data = resource.iterselect(["id", "name"],
+                                   chunksize = 3,
+                                   orderby = "select_master.name",
+                                   )
+        ids = [row["select_master.id"] for row in data]
+        assertEqual(len(ids), numitems)
+        assertEqual(set(ids), set(expected))
+
+        # Chunks by record IDs as Rows
+        data = resource.iterselect(["id", "name"],
+                                   chunksize = 3,
+                                   orderby = "select_master.name",
+                                   as_rows = True,
+                                   )
+        chunks = list(data.chunks())
+        for chunk in chunks:
+            self.assertTrue(isinstance(chunk, Rows))
+        ids = [row["select_master.id"] for chunk in chunks for row in chunk]
+        assertEqual(len(ids), numitems)
+        assertEqual(set(ids), set(expected))
+
+        # Chunks as Rows
+        data = resource.iterselect(["id", "name"],
+                                   chunksize = 3,
+                                   orderby = ~table.id,
+                                   as_rows = True,
+                                   )
+        ids = [row["select_master.id"] for row in data]
+        assertEqual(ids, expected)
+
+    # -------------------------------------------------------------------------
+    def testDataCache(self):
+        """ Test the cross-request result cache """
+
+        s3db = current.s3db
+
+        assertEqual = self.assertEqual
+        assertNotEqual = self.assertNotEqual
+
+        from s3.s3resource import S3ResourceDataCache as cache
+
+        s3db.configure("select_master", data_cache=True)
+        try:
+            cache.clear()
+
+            resource = s3db.resource("select_master")
+            data = resource.select(["id", "name"], limit=None, count=True)
+            stats = cache.stats()
+            assertEqual(stats["misses"], 1)
+            assertEqual(stats["hits"], 0)
+            assertEqual(stats["size"], 1)
+
+            # Same extraction => cache hit
+            resource = s3db.resource("select_master")
+            cached = resource.select(["id", "name"], limit=None, count=True)
+            assertEqual(cache.stats()["hits"], 1)
+            assertEqual(cached.numrows, data.numrows)
+            assertEqual(cached.rows, data.rows)
+
+            # Cached rows are copies
+            cached.rows[0]["select_master.name"] = "Modified"
+            assertNotEqual(data.rows[0]["select_master.name"], "Modified")
+
+            # Different filter => cache miss
+            resource = s3db.resource("select_master",
+                                     filter = FS("name") != None,
+                                     )
+            resource.select(["id", "name"], limit=None, count=True)
+            assertEqual(cache.stats()["misses"], 2)
+
+            # Write to the table => cache miss
+            cache.invalidate("select_master")
+            resource = s3db.resource("select_master")
+            resource.select(["id", "name"], limit=None, count=True)
+            stats = cache.stats()
+            assertEqual(stats["misses"], 3)
+            assertEqual(stats["hits"], 1)
+
+            # Default fields
+            resource = s3db.resource("select_master")
+            data = resource.select(None, limit=None)
+            assertEqual(len(data.rows), len(self.test_data))
+        finally:
+            s3db.clear_config("select_master", "data_cache")
+            cache.clear()
+
+    # -------------------------------------------------------------------------
+    def testBatchRepresent(self):
+        """ Test batched foreign key representation across columns """
+
+        db = current.db
+        s3db = current.s3db
+
+        assertEqual = self.assertEqual
+
+        otable = s3db.org_organisation
+        org1 = otable.insert(name="Batch Represent Organisation 1")
+        org2 = otable.insert(name="Batch Represent Organisation 2")
+
+        represent1 = S3Represent(lookup="org_organisation")
+        represent2 = S3Represent(lookup="org_organisation")
+
+        s3db.define_table("select_batch",
+                          Field("org1", "reference org_organisation",
+                                represent = represent1,
+                                ),
+                          Field("org2", "reference org_organisation",
+                                represent = represent2,
+                                ),
+                          *s3_meta_fields())
+        try:
+            table = s3db.select_batch
+            table.insert(org1=org1, org2=org2)
+            table.insert(org1=org2, org2=org1)
+
+            resource = s3db.resource("select_batch")
+            data = resource.select(["org1", "org2"],
+                                   orderby = table.id,
+                                   represent = True,
+                                   )
+            rows = data.rows
+            assertEqual(rows[0]["select_batch.org1"], "Batch Represent Organisation 1")
+            assertEqual(rows[0]["select_batch.org2"], "Batch Represent Organisation 2")
+            assertEqual(rows[1]["select_batch.org1"], "Batch Represent Organisation 2")
+            assertEqual(rows[1]["select_batch.org2"], "Batch Represent Organisation 1")
+
+            # Both columns were looked up together in advance
+            assertEqual(represent1.queries, 0)
+            assertEqual(represent2.queries, 0)
+        finally:
+            db.select_batch.drop()
+            db.rollback()
+
 # =============================================================================
 class ResourceLazyVirtualFieldsSupportTests(unittest.TestCase):
     """ Test support for lazy virtual fields """
@@ -11,7 +11,7 @@ import datetime
 from gluon import *
 from gluon.storage import Storage
 
-from s3 import s3_phone_represent, s3_fullname
+from s3 import S3DeferredUpdates, s3_phone_represent, s3_fullname
 
 from lxml import etree
 
@@ -142,6 +142,88 @@ class PRTests(unittest.TestCase):
         users = s3db.pr_realm_users(None)
         self.assertTrue(all([u in users for u in all_users]))
 
+    # -------------------------------------------------------------------------
+    def testAffiliationClosure(self):
+        """ Test ancestor/descendant lookups from the affiliation closure """
+
+        s3db = current.s3db
+
+        assertEqual = self.assertEqual
+
+        auth = current.auth
+        auth.s3_impersonate("normaluser@example.com")
+        user_pe_id = auth.s3_user_pe_id(auth.user.id)
+        auth.s3_impersonate(None)
+
+        org1 = self.org1
+        org2 = self.org2
+
+        # org2 is branch of org1, user is staff of org2
+        s3db.pr_add_affiliation(org1, org2, role="Branches")
+        s3db.pr_add_affiliation(org2, user_pe_id, role="Staff")
+
+        ctable = s3db.pr_affiliation_closure
+        query = (ctable.ancestor_pe == org1) & \
+                (ctable.descendant_pe == user_pe_id)
+        row = current.db(query).select(ctable.depth,
+                                       limitby = (0, 1),
+                                       ).first()
+        assertEqual(row.depth, 2)
+
+        ancestors = s3db.pr_get_ancestors(user_pe_id)
+        assertEqual(ancestors, [str(org2), str(org1)])
+
+        ancestors = s3db.pr_ancestors([user_pe_id, org2])
+        assertEqual(ancestors[org2], [str(org1)])
+
+        descendants = s3db.pr_get_descendants(org1)
+        assertEqual(set(descendants), {org2, user_pe_id})
+
+        descendants = s3db.pr_get_descendants(org1,
+                                              entity_types="org_organisation",
+                                              )
+        assertEqual(descendants, [org2])
+
+        # Persons are excluded
+        descendants = s3db.pr_descendants([org1])
+        assertEqual(descendants, {org1: [org2]})
+
+        # Removing the branch affiliation updates the closure
+        s3db.pr_remove_affiliation(org1, org2, role="Branches")
+        ancestors = s3db.pr_get_ancestors(user_pe_id)
+        assertEqual(ancestors, [str(org2)])
+        descendants = s3db.pr_get_descendants(org1)
+        assertEqual(descendants, [])
+
+    # -------------------------------------------------------------------------
+    def testDeferredUpdates(self):
+        """ Test deferred affiliation updates """
+
+        s3db = current.s3db
+
+        assertEqual = self.assertEqual
+
+        org1 = self.org1
+        org2 = self.org2
+
+        with S3DeferredUpdates() as deferred:
+
+            s3db.pr_add_affiliation(org1, org2, role="Branches")
+
+            # Closure update is deferred
+            self.assertTrue(org2 in deferred.paths)
+            ancestors = s3db.pr_get_ancestors(org2)
+            assertEqual(ancestors, [])
+
+            # Nested context is merged into the outer context
+            with S3DeferredUpdates() as nested:
+                self.assertFalse(nested.active)
+
+        # Closure has been updated at the end of the context
+        ancestors = s3db.pr_get_ancestors(org2)
+        assertEqual(ancestors, [str(org1)])
+        self.assertEqual(S3DeferredUpdates.context(), None)
+
     # -------------------------------------------------------------------------
     def tearDown(self):
 
@@ -398,6 +398,7 @@
                 //'headerCallback': this._headerCallback(),
                 'rowCallback': this._rowCallback(),
                 'drawCallback': this._drawCallback(),
+                'infoCallback': this._infoCallback(),
 
                 // Custom initComplete
                 // - can e.g. be used to reposition elements like export_formats
@@ -425,6 +426,9 @@
             var tableConfig = $.parseJSON(config.val());
             this.tableConfig = tableConfig;
 
+            // Permitted record IDs per method (for row actions with permit)
+            this._updatePermitted(tableConfig.permitted);
+
             // Apply actions fallback
             if (!tableConfig.rowActions.length) {
                 tableConfig.rowActionsJSON = false;
@@ -515,12 +519,58 @@
                 cacheCombined.store(cacheLower, cacheLastJson.data, availableRecords);
             }
 
+            var self = this;
+
+            /**
+             * Request the exact numbers of records from the server, if the
+             * last response contained only estimates (recordsApprox), and
+             * redraw the table (from cache) when they arrive
+             *
+             * @param {Array} data - the data to send with the count request
+             *                       (search and sorting parameters)
+             */
+            var countRequest = null;
+            var exactCount = function(data) {
+
+                var lastJson = cacheLastJson;
+                if (!lastJson || !lastJson.recordsApprox || countRequest === lastJson) {
+                    return;
+                }
+                countRequest = lastJson;
+
+                var countData = (data || []).filter(function(item) {
+                    return ['draw', 'limit', 'start'].indexOf(item.name) == -1;
+                });
+                countData.push({'name': 'count', 'value': 'exact'});
+
+                $.ajaxS3({
+                    'type': conf.method,
+                    'url': self.ajaxUrl,
+                    'data': countData,
+                    'dataType': 'json',
+                    'cache': false,
+                    'success': function(counts) {
+                        if (cacheLastJson !== lastJson) {
+                            // Outdated (table has been reloaded meanwhile)
+                            return;
+                        }
+                        cacheLastJson.recordsTotal = counts.recordsTotal;
+                        cacheLastJson.recordsFiltered = counts.recordsFiltered;
+                        delete cacheLastJson.recordsApprox;
+                        self.recordsApprox = false;
+                        cacheCombined.store(cacheLower, [], counts.recordsFiltered);
+
+                        // Redraw from cache to update info and pagination
+                        $(self.element).DataTable().draw(false);
+                    }
+                });
+            };
+
             /**
              * Pipelining function for DataTables. To be used for the `ajax` option
              * of DataTables, original version from:
              * - http://datatables.net/examples/server_side/pipeline.html
              */
-            var self = this;
             return function(request, drawCallback, settings) {
 
                 if (this.hasOwnProperty('nTable')) {
@@ -570,6 +620,11 @@
 
                 // Make the totalRecords visible to other functions
                 self.totalRecords = totalRecords;
+                self.recordsApprox = cacheLastJson && cacheLastJson.recordsApprox || false;
+                if (self.recordsApprox) {
+                    // Initial cache with estimated numbers
+                    exactCount();
+                }
 
                 if (requestLength == -1) {
                     // Showing all records
@@ -732,6 +787,15 @@
                             // Keep the server response as basis for subsequent cache responses
                             cacheLastJson = $.extend(true, {}, json);
 
+                            // Update the permitted record IDs
+                            self._updatePermitted(json.permitted);
+
+                            // Get the exact numbers if the response has estimates
+                            self.recordsApprox = json.recordsApprox || false;
+                            if (self.recordsApprox) {
+                                exactCount(sendData);
+                            }
+
                             // Update cacheUpper with the actual number of records returned
                             cacheUpper = requestStart + json.data.length;
 
@@ -859,6 +923,36 @@
             };
         },
 
+        /**
+         * Get the info callback function, to indicate estimated numbers
+         * of records in the table info
+         */
+        _infoCallback: function() {
+
+            var self = this;
+
+            /**
+             * Callback function to render the table info
+             *
+             * @param {object} oSettings - the dataTable table info object
+             * @param {integer} start - the index of the first record shown
+             * @param {integer} end - the index of the last record shown
+             * @param {integer} max - the total number of records
+             * @param {integer} total - the number of records after filtering
+             * @param {string} pre - the info string as rendered by dataTables
+             */
+            return function(oSettings, start, end, max, total, pre) {
+
+                if (!self.recordsApprox || !total || !i18n.infoApprox) {
+                    return pre;
+                }
+                var formatNumber = oSettings.fnFormatNumber;
+                return i18n.infoApprox.replace('_START_', formatNumber.call(oSettings.oInstance, start))
+                                      .replace('_END_', formatNumber.call(oSettings.oInstance, end))
+                                      .replace('_TOTAL_', formatNumber.call(oSettings.oInstance, total));
+            };
+        },
+
         /**
          * Get the draw callback function
          */
@@ -965,6 +1059,34 @@
             };
         },
 
+        /**
+         * Set the permitted record IDs reported by the server for a page
+         * (for row actions with permit), replacing those of previous pages
+         *
+         * @param {object} permitted - the permitted record IDs per method,
+         *                             format {method: [recordID, ...]}
+         */
+        _updatePermitted: function(permitted) {
+
+            if (!permitted) {
+                this.permitted = null;
+                return;
+            }
+            var recordIDs,
+                method,
+                ids;
+            this.permitted = {};
+            for (method in permitted) {
+                if (permitted.hasOwnProperty(method)) {
+                    ids = this.permitted[method] = {};
+                    recordIDs = permitted[method];
+                    for (var i = 0, len = recordIDs.length; i < len; i++) {
+                        ids[recordIDs[i]] = true;
+                    }
+                }
+            }
+        },
+
         // --------------------------------------------------------------------
         // CELL CONTENTS HELPERS
 
@@ -975,6 +1097,10 @@
          * @param {object} action - the action configuration:
          * @property {Array} action.restrict - Render the button only for these record IDs
          * @property {Array} action.exclude - Do not render the action button for these record IDs
+         * @property {string} action.permit - Render the button only for records for which this
+         *                                    method is permitted (if the server has reported
+         *                                    permitted record IDs for this method, otherwise
+         *                                    falls back to action.restrict)
          * @property {string} action._class - the CSS class to use for the button
          * @property {string} action.label - the label for the button
          * @property {string} action.icon - the CSS class for the icon to be placed on the button
@@ -992,10 +1118,19 @@
 
             var button = '';
 
-            // Check if action is restricted to a subset of records
-            var restrict = action.restrict;
-            if (restrict && restrict.constructor === Array && restrict.indexOf(recordId) == -1) {
-                return button;
+            // Check if action requires a record-level permission
+            var permit = action.permit,
+                permitted = this.permitted;
+            if (permit && permitted && permitted.hasOwnProperty(permit)) {
+                if (!permitted[permit].hasOwnProperty(recordId)) {
+                    return button;
+                }
+            } else {
+                // Check if action is restricted to a subset of records
+                var restrict = action.restrict;
+                if (restrict && restrict.constructor === Array && restrict.indexOf(recordId) == -1) {
+                    return button;
+                }
             }
             var exclude = action.exclude;
             if (exclude && exclude.constructor === Array && exclude.indexOf(recordId) != -1) {
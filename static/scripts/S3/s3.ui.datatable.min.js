@@ -226,36 +226,111 @@ g){var l=c.cells(g,":hidden").eq(0).map(function(g){var l=e(c.column(g.column).h
 function(){return this});K.register("responsive.recalc()",function(){this.iterator("table",function(c){c._responsive&&(c._responsive._resizeAuto(),c._responsive._resize())})});K.register("responsive.index()",function(c){c=e(c);return{column:c.data("dtr-index"),row:c.parent().data("dtr-index")}});v.version="1.0.2";e.fn.dataTable.Responsive=v;e.fn.DataTable.Responsive=v;e(t).on("init.dt.dtr",function(c,g,l){if(e(g.nTable).hasClass("responsive")||e(g.nTable).hasClass("dt-responsive")||g.oInit.responsive||
 m.defaults.responsive)c=g.oInit.responsive,!1!==c&&new v(g,e.isPlainObject(c)?c:{})});return v};"function"===typeof define&&define.amd?define(["jquery","datatables"],m):"object"===typeof exports?m(require("jquery"),require("datatables")):jQuery&&!jQuery.fn.dataTable.Responsive&&m(jQuery,jQuery.fn.dataTable)})(window,document);
 jQuery.fn.dataTableExt.oSort["formatted-num-asc"]=function(k,t){k=k.match(/\d/)?k.replace(/[^\d\-\.]/g,""):0;t=t.match(/\d/)?t.replace(/[^\d\-\.]/g,""):0;return parseFloat(k)-parseFloat(t)};jQuery.fn.dataTableExt.oSort["formatted-num-desc"]=function(k,t){k=k.match(/\d/)?k.replace(/[^\d\-\.]/g,""):0;t=t.match(/\d/)?t.replace(/[^\d\-\.]/g,""):0;return parseFloat(t)-parseFloat(k)};
-(function(k,t){function m(){this.data=[];this.slices=[];this.availableRecords=-1}var e=0,v=function(c,g){for(var e=0,k=g.length;e<k;e++)if(c==g[e])return e;return-1},z=function(c,g,e){c=c.split("?");g&&(c[0]+="."+g);e&&(1<c.length?c[1]+="&"+e:c.push(e));return c.join("?")},K=function(c,g){var e=function(c){return-1!=c.indexOf(".")||"("==c[0]},k=function(c,g){return c&&c.split("&").filter(function(c){c=c.split("=");return 1<c.length&&g(decodeURIComponent(c[0]))})||[]};c=c.split("?");g=g.split("?");
-var m=k(c[1],function(c){return!e(c)&&"w"!=c[0]});c[1]=m.concat(k(g[1],e)).join("&");return c.join("?")};m.prototype.store=function(c,g,e){e!==t&&(this.availableRecords=e);if(e=g.length){var l=this.data,k=this.slices;g.forEach(function(e,g){l[c+g]=e});k.push([c,c+e]);k.sort(function(c,e){var g=c[0]-e[0];return 0!==g?g:c[1]-e[1]});if(1<k.length){var m=[];g=k.reduce(function(c,e){return c[1]<e[0]||c[0]>e[1]?(m.push(c),e):[Math.min(c[0],e[0]),Math.max(c[1],e[1])]});m.push(g);this.slices=m}}};m.prototype.retrieve=
-function(c,e){var g=this.availableRecords;if(0>g)return null;0>c&&(c=0);if(c>=g)return[];e=c+e;e>g&&(e=g);g=this.slices;for(var k,m=g.length,x=0;x<m;x++)if(k=g[x],c>=k[0]&&e<=k[1])return this.data.slice(c,e);return null};m.prototype.clear=function(){this.cache=[];this.slices=[];this.availableRecords=-1};k.widget("s3.dataTableS3",{options:{destroy:!1,deselectedIndicator:!1},_create:function(){this.id=e;e+=1;this.eventNamespace=".dataTableS3"},_init:function(){var c=k(this.element).attr("id");this.tableID=
-c;this.selector="#"+c;this.refresh()},_destroy:function(){k.Widget.prototype.destroy.call(this)},refresh:function(){var c=k(this.element),e=this.options;this._unbindEvents();var l=this._parseConfig();if(l!==t){var r=!0,m=!0,x=null;"true"==l.pagination?(this.ajaxUrl=l.ajaxUrl,x=this._pipeline({cache:this._initCache()})):m=r=!1;this._renderBulkActions();c.dataTable({ajax:x,autoWidth:!1,columns:this.columnConfigs,deferRender:!0,destroy:e.destroy,dom:l.dom,lengthMenu:l.lengthMenu,order:l.order,orderFixed:l.group,
-ordering:!0,pageLength:l.pageLength,pagingType:l.pagingType,processing:m,searchDelay:450,searching:"true"==l.searching,serverSide:r,search:{smart:r},language:{aria:{sortAscending:": "+i18n.sortAscending,sortDescending:": "+i18n.sortDescending},paginate:{first:i18n.first,last:i18n.last,next:i18n.next,previous:i18n.previous},emptyTable:i18n.emptyTable,info:i18n.info,infoEmpty:i18n.infoEmpty,infoFiltered:i18n.infoFiltered,infoThousands:i18n.infoThousands,lengthMenu:i18n.lengthMenu,loadingRecords:i18n.loadingRecords+
-"...",processing:i18n.processing+"...",search:i18n.search+":",zeroRecords:i18n.zeroRecords},rowCallback:this._rowCallback(),drawCallback:this._drawCallback(),initComplete:S3.dataTables.initComplete});this._bindEvents()}},_parseConfig:function(){var c=k(this.element),e=k(this.selector+"_configurations");if(e.length){this.tableConfig=e=k.parseJSON(e.val());e.rowActions.length?e.rowActionsJSON=!0:(e.rowActionsJSON=!1,e.rowActions=S3.dataTables.Actions?S3.dataTables.Actions:[]);var l=[];c=k("thead tr",
-c).children().length;for(var r=0;r<c;r++)l[r]=null;0<e.rowActions.length&&(l[e.actionCol]={sTitle:" ",bSortable:!1});e.bulkActions&&(l[e.bulkCol]={sTitle:'<div class="bulk-select-options"><input class="bulk-select-all" type="checkbox">'+i18n.selectAll+"</input></div>",bSortable:!1});if(e.colWidths){var m;c=e.colWidths;for(m in c)null!=l[m]?l[m].sWidth=c[m]:l[m]={sWidth:c[m]}}this.columnConfigs=l;return e}},_pipeline:function(c){var e=k.extend({cache:{},pages:2,data:null,method:"GET"},c);c=e.cache;
-var l=c.cacheLastRequest||null,r=c.cacheLastJson||null,w=c.cacheLower;w===t&&(w=-1);var x=new m;r&&-1!=w&&x.store(w,r.data,r.recordsFiltered||r.recordsTotal);var u=this;return function(c,g,m){if(this.hasOwnProperty("nTable")){if(c=m.sAjaxSource)u.ajaxUrl=c,m.sAjaxSource=null;l=r=null;w=-1;x.clear();g({})}else{var v=!1,C=c.start,I=c.start,z=c.length,D=c.recordsTotal,E=D;r&&(r.recordsTotal!==t&&(D=r.recordsTotal),E=r.recordsFiltered!==t?r.recordsFiltered:D);u.totalRecords=D;-1==z&&(C=0,E!==t?z=E:v=
-!0);if(!v)if(D=C+z,m.clearCache)x.clear(),m.clearCache=!1,v=!0;else if(!l||JSON.stringify(c.order)===JSON.stringify(l.order)&&JSON.stringify(c.columns)===JSON.stringify(l.columns)&&JSON.stringify(c.search)===JSON.stringify(l.search)){var P=x.retrieve(C,D-C);null===P&&(v=!0)}else x.clear(),v=!0;l=k.extend(!0,{},c);if(v){C<w&&(C-=z*(e.pages-1),0>C&&(C=0));w=C;c.start=C;c.length=z*e.pages;k.isFunction(e.data)?(P=e.data(c))&&k.extend(c,P):k.isPlainObject(e.data)&&k.extend(c,e.data);P=[{name:"draw",value:c.draw},
-{name:"limit",value:-1==z?"none":c.length}];0!=C&&P.push({name:"start",value:C});c.search&&c.search.value&&(P.push({name:"sSearch",value:c.search.value}),P.push({name:"iColumns",value:c.columns.length}));if(v=c.order.length){P.push({name:"iSortingCols",value:v});E=u.columnConfigs;var K;for(D=0;D<E.length;D++)(K=E[D])&&!K.bSortable&&P.push({name:"bSortable_"+D,value:"false"});for(D=0;D<v;D++)E=c.order[D],P.push({name:"iSortCol_"+D,value:E.column}),P.push({name:"sSortDir_"+D,value:E.dir})}c=k.ajaxS3;
-k.searchS3!==t&&(c=k.searchS3);m.jqXHR=c({type:e.method,url:u.ajaxUrl,data:P,dataType:"json",cache:!1,success:function(c){var e=u.totalRecords;c.recordsFiltered!==t&&(e=c.recordsFiltered);x.store(C,c.data,e);r=k.extend(!0,{},c);C!=I&&c.data.splice(0,I-C);-1!=z&&c.data.splice(z,c.data.length);g(c)}})}else m=k.extend(!0,{},r,{draw:c.draw}),m.data=P,g(m)}}},_initCache:function(){var c=k(this.selector+"_dataTable_cache");return this.pipelineCache=c=0<c.length?JSON.parse(c.val()):{}},_headerCallback:function(){},
-_rowCallback:function(){var c=this;return function(e,l){var g=c.tableConfig,m=g.actionCol,x=/>(.*)</i.exec(l[m]);x=null===x?l[m]:x[1];var u=g.rowActions;if(u.length||g.bulkActions){for(var t=[],I=0;I<u.length;I++)t.push(c._renderActionButton(x,u[I]));k("td:eq("+m+")",e).addClass("actions").html(t.join(""))}g.bulkActions&&c._bulkSelect(e,v(x,c.selectedRows));g=g.rowStyles;if(g.length){m=k(e);for(var D in g)-1!=v(x,g[D])&&m.addClass(D)}c._truncateCellContents(e,l);return e}},_drawCallback:function(){var c=
-this;return function(e){var g=k(c.element),m=c.selector,w=g.closest(".dt-wrapper"),x=c.ajaxUrl;x&&w.find("a.permalink").each(function(){var c=k(this);c.attr("href",K(c.attr("href"),x))});var u=e.fnRecordsDisplay();1<Math.ceil(u/e._iDisplayLength)?k(m+"_paginate").show():k(m+"_paginate").hide();0===u?w.find(".dt-export-options").hide():w.find(".dt-export-options").show();k(m+" .s3_modal").length&&S3.addModals();m=g.closest(".dt-contents");m.length&&(0<u?m.find(".empty").hide().siblings(".dt-wrapper").show():
-m.find(".empty").show().siblings(".dt-wrapper").hide());var t=c.tableConfig;if(t.group.length){var v=[];t.group.forEach(function(g,k){c._renderGroups(e,g[0],t.groupTitles[k]||[],t.groupTotals[k]||{},v,k+1);v.push(g[0])});if(t.shrinkGroupedRows){var D,z;k("tbody tr",g).each(function(){var c=k(this);c.hasClass("group")?(D=c.data("level"),z=c.data("group")):D&&z&&!c.hasClass("spacer")&&c.addClass("xgroup_"+D+"_"+z).addClass("collapsable")});k(".collapsable").hide()}}c.doubleScroll()}},_renderActionButton:function(c,
-e){var g="",k=e.restrict;if(k&&k.constructor===Array&&-1==k.indexOf(c)||(k=e.exclude)&&k.constructor===Array&&-1!=k.indexOf(c))return g;g=e._class;k=e.label;!this.tableConfig.rowActionsJSON&&this.tableConfig.utf8&&(k=S3.Utf8.decode(e.label));var m=e._title||k;e.icon?k='<i class="'+e.icon+'" alt="'+k+'"> </i>':e.img&&(k='<img src="'+e.icon+'" alt="'+k+'"></img>');var x=e._disabled?' disabled="disabled"':"";var u=/%5Bid%5D/g;e._onclick?(c=e._onclick.replace(u,c),g='<a class="'+g+'" onclick="'+c+x+'">'+
-k+"</a>"):e.url?(u=e.url.replace(u,c),(e=e._target||"")&&(e=' target="'+e+'"'),g='<a db_id="'+c+'" class="'+g+'" href="'+u+'" title="'+m+'"'+e+x+">"+k+"</a>"):((e=e._ajaxurl||"")&&(e=' data-url="'+e+'"'),g='<a db_id="'+c+'" class="'+g+'" title="'+m+'"'+e+x+">"+k+"</a>");return g},ajaxAction:function(c){var e=k(this.element);return function(g){g.stopPropagation();g.preventDefault();if(!c||confirm(c)){var l=k(this);g=l.attr("db_id");l=l.data("url");var m={},x=e.closest(".dt-wrapper").find('input[name="_formkey"]').first().val();
-x!==t&&(m._formkey=x);l&&g&&k.ajaxS3({url:l.replace(/%5Bid%5D/g,g),type:"POST",dataType:"json",data:m,success:function(){e.dataTable().fnReloadAjax()}})}}},_truncateCellContents:function(c,e){var g=this.tableConfig,m=g.textMaxLength,w=g.textShrinkLength;g=g.group.map(function(c){return c[0]});for(var x=0,u=0;u<e.length;u++)if(-1==k.inArray(u,g)){var t=e[u];if(t.length>m&&!t.match(/<.*>/)){var v='<div class="dt-truncate"><span class="ui-icon ui-icon-zoomin" style="float:right"></span>'+t.substr(0,
-w)+"&hellip;</div>";t='<div  style="display:none" class="dt-truncate"><span class="ui-icon ui-icon-zoomout" style="float:right"></span>'+t+"</div>";k("td:eq("+x+")",c).html(v+t)}x++}},doubleScroll:function(){var c=k(this.element);if(c.hasClass("doublescroll")&&!c.hasClass("responsive"))try{c.closest(".dataTable_table").doubleScroll({contentElement:c,resetOnWindowResize:!0})}catch(g){console.log("dataTableS3: doubleScroll not available")}},_renderBulkActions:function(){var c=this.tableConfig.bulkActions;
-if(c){var e=k('<div class="dataTable-action">');c.forEach(function(c){var g;if(c.constructor===Array){var l=c[0];var m=c[1];2<c.length&&(g=c[2])}else l=m=c;c=k('<input type="submit" class="selected-action">').attr({id:m+"-selected-action",name:m,value:l}).appendTo(e);g&&c.addClass(g)});this.bulkActionControls=e;c=JSON.parse(k(this.selector+"_dataTable_bulkSelection").val());null===c&&(c=[]);this.selectedRows=c;k(this.selector+"_dataTable_bulkSelectAll").val()?this.selectionMode="Exclusive":this.selectionMode=
-"Inclusive"}},_bulkSelect:function(c,e){var g=k(this.element),m=this.tableConfig,w=this.selectedRows.length,t=this.totalRecords,u=k(".bulk-select-options",g),v=k(".bulk-select-all",g),z=k(".bulk-deselected",g),D=k(".bulk-total-available",g),M=k(".bulk-total-selected",g),N=D.length&&D.length;"Inclusive"==this.selectionMode?(N?(M.text(w),D.text(t)):z.remove(),z=m.bulkSingle,-1==e?(k(c).removeClass("row_selected"),k(".bulkcheckbox",c).prop("checked",!1)):(z&&k(c).closest("table").find("tr").removeClass("row_selected").find(".bulkcheckbox").prop("checked",
-!1),k(c).addClass("row_selected"),k(".bulkcheckbox",c).prop("checked",!0)),z||w!=t||(v.prop("checked",!0),this.selectionMode="Exclusive",this.selectedRows=[])):(N?(M.text(parseInt(D.text(),10)-w),D.text(t)):w&&w!=t?(!z.length&&this.options.deselectedIndicator&&(z=k('<span class="bulk-deselected">').appendTo(u)),z.html("[-"+w+"]")):z.remove(),-1==e?(k(c).addClass("row_selected"),k(".bulkcheckbox",c).prop("checked",!0)):(k(c).removeClass("row_selected"),k(".bulkcheckbox",c).prop("checked",!1)),w==t&&
-(v.prop("checked",!1),this.selectionMode="Inclusive",this.selectedRows=[]));m.bulkActions&&(k(this.selector+"_dataTable_bulkMode").val(this.selectionMode),k(this.selector+"_dataTable_bulkSelection").val(this.selectedRows.join(",")),this.bulkActionControls.insertBefore(u),c=this.selectedRows.length,"Exclusive"==this.selectionMode&&(c=t-c),k(".selected-action",g).prop("disabled",0==c),k(".pair-action",g).prop("disabled",2!=c))},_bulkSelectRow:function(){var c=this;return function(){var e=k(this),l=
-e.data("dbid"),m=c.selectedRows,w=v(l,m);-1==w?(c.tableConfig.bulkSingle?c.selectedRows=[l]:m.push(l),w=0):(m.splice(w,1),w=-1);c._bulkSelect(e.closest("tr"),w)}},_bulkSelectAll:function(){var c=k(this.element),e=this;return function(){e.selectedRows=[];k(this).prop("checked")?e.selectionMode="Exclusive":e.selectionMode="Inclusive";c.dataTable().api().draw(!1)}},_renderGroups:function(c,e,l,m,w,x){var g=c.aoColumns.length,r=k(this.element);r=k("tbody tr",r);for(var v,z,M,N=1,K=0,J=0,W="",E=0;E<r.length;E++)if(v=
-k(r[E]),!v.hasClass("spacer"))if(z=c.aoData[c.aiDisplay[K]]._aData,v.hasClass("group")){M=t;var P=v.data("group");W=w.map(function(c){return this[c]},z).join("_")}else{z=z[e];if(z!==M){for(;l.length>J&&z!=l[J][0];)M=l[J][1],this._insertGroupHeader(v,M,x,N,P,g,m,W),J++,N++;l.length>J?(M=l[J][1],J++):M=z;this._insertGroupHeader(v,M,x,N,P,g,m,W,!0);N++;M=z}K+=1;this.tableConfig.shrinkGroupedRows&&v.hide()}for(v=r[r.length-1];l.length>J;)M=l[J][1],this._insertGroupHeader(v,M,x,N,P,g,m,W,!1,!0),J++,N++},
-_insertGroupHeader:function(c,e,l,m,w,t,u,v,z,D){var g=this.tableConfig;m=k('<tr class="group">').data({level:""+l,group:""+m}).addClass("level_"+l);var r=g.shrinkGroupedRows;if(w){var x=""+(l-1);m.addClass("xgroup_"+x+"_"+w).data({parentLevel:x,parentGroup:w});r&&m.addClass("collapsable")}w=k("<td>").attr("colspan",t).appendTo(m);for(x=1;x<l;x++)k('<span class="group-indent">').appendTo(w);1<l&&(k('<span class="ui-icon ui-icon-triangle-1-e group-closed">').appendTo(w),k('<span class="ui-icon ui-icon-triangle-1-s group-opened">').hide().appendTo(w));
-x="";null!=u[e]?x=" ("+u[e]+")":(v+=e,null!=u[v]&&(x=" ("+u[v]+")"));w.append(e+x);r&&z&&(e=g.groupIcon,e=e.length>=l?e[l-1]:"icon",u=k('<span class="group-expand">').appendTo(w),z=k('<span class="group-collapse">').hide().appendTo(w),"text"==e?(u.text("\u2192"),z.text("\u2193")):"icon"==e&&(u.addClass("ui-icon ui-icon-arrowthick-1-e"),z.addClass("ui-icon ui-icon-arrowthick-1-s")));D?m.insertAfter(c):m.insertBefore(c);g.groupSpacing&&(c=m.prevAll("tr.group").first(),c.length&&c.data("level")==l&&
-(c=c.data("group"),t=k("<td>").attr("colspan",t),t=k('<tr class="spacer">').append(t),r&&t.addClass("collapsable"),t.addClass("xgroup_"+l+"_"+c).insertBefore(m)))},_toggleGroup:function(c,e){switch(this.tableConfig.shrinkGroupedRows){case "individual":e?this._expandGroup(c):this._collapseGroup(c);break;case "accordion":if(e){this._expandGroup(c);e=".level_"+c.data("level");var g=c.data("parentGroup");g&&(e+=".xgroup_"+c.data("parentLevel")+"_"+g);var m=this;c.siblings("tr.group"+e).each(function(){m._collapseGroup(k(this))})}else this._collapseGroup(c)}},
-_expandGroup:function(c){var e=c.data("level"),l=c.data("group");c.siblings("tr.xgroup_"+e+"_"+l).show();k(".group-expand, .group-closed",c).hide();k(".group-collapse, .group-opened",c).show()},_collapseGroup:function(c){var e=c.data("level"),l=c.data("group"),m=this;c.siblings("tr.xgroup_"+e+"_"+l).each(function(){var c=k(this);c.hasClass("group")&&m._collapseGroup(c);c.hide()});k(".group-expand, .group-closed",c).show();k(".group-collapse, .group-opened",c).hide()},_exportFormat:function(){var c=
-k(this.element),e=this;return function(){var g=c.dataTable().fnSettings(),m=k(this).data("url"),w=k(this).data("extension");if(g){var v="id="+e.tableid,u=g.oPreviousSearch.sSearch,C=g.aaSorting,I=g.aaSortingFixed;g=g.aoColumns;u&&(v+="&sSearch="+u+"&iColumns="+g.length);null!==I&&(C=I.concat(C));g.forEach(function(c,e){c.bSortable||(v+="&bSortable_"+e+"=false")});v+="&iSortingCols="+C.length;C.forEach(function(c,e){v+="&iSortCol_"+e+"="+C[e][0]+"&sSortDir_"+e+"="+C[e][1]});m=z(m,w,v)}else m=z(m,w);
-k.searchDownloadS3!==t?k.searchDownloadS3(m,"_blank"):window.open(m)}},_initExportFormats:function(){var c=this._parseConfig();if(c!==t&&(c=c.ajaxUrl)&&S3.search!==t){var e=document.createElement("a");e.href=c;if(e.search){var l=e.search.slice(1).split("&").map(function(c){return c.split("=")}).filter(function(c){return-1!=c[0].indexOf(".")});k(this.element).closest(".dt-wrapper").find(".dt-export").each(function(){var c=k(this),e=c.data("url");e&&c.data("url",S3.search.filterURL(e,l))})}}},_bindEvents:function(){var c=
-k(this.element),e=this.eventNamespace,l=this;c.on("click"+e,".dt-truncate .ui-icon-zoomin, .dt-truncate .ui-icon-zoomout",function(){k(this).parent().toggle().siblings(".dt-truncate").toggle();return!1});this._initExportFormats();c.closest(".dt-wrapper").find(".dt-export").on("click"+e,this._exportFormat());c.on("click"+e,".dt-ajax-delete",this.ajaxAction(i18n.delete_confirmation));c.on("click"+e,".group-collapse, .group-expand",function(){var c=k(this),e=c.closest("tr.group"),g=!0;c.hasClass("group-collapse")&&
-(g=!1);l._toggleGroup(e,g)});if(this.tableConfig.bulkActions){if(this.tableConfig.bulkSingle)k(".bulk-select-options",c).hide();else c.on("click"+e,".bulk-select-all",this._bulkSelectAll());c.on("click"+e,".bulkcheckbox",this._bulkSelectRow())}return!0},_unbindEvents:function(){var c=k(this.element),e=this.eventNamespace;c.off(e);c.closest(".dt-wrapper").find(".dt-export").off(e);return!0}});k.fn.dataTable.Api.register("clearPipeline()",function(){return this.iterator("table",function(c){c.clearCache=
-!0})});k.fn.dataTableExt.oApi.fnReloadAjax=function(c,e){"undefined"!=e&&null!=e&&(c.sAjaxSource=e);this.oApi._fnProcessingDisplay(c,!0);var g=this;c.ajax({},function(){g.oApi._fnClearTable(c);g.fnDraw()},c)};k(document).ready(function(){if(S3.dataTables){var c=S3.dataTables.id;c&&c.forEach(function(c){k("#"+c).dataTableS3({destroy:!1})})}})})(jQuery);
+(function($,undefined){"use strict";var dataTableS3ID=0;var inList=function(item,arr){for(var i=0,len=arr.length;i<len;i++){if(item==arr[i]){return i;}}
+return-1;};var appendUrlQuery=function(url,extension,query){var parts=url.split('?');if(extension){parts[0]+='.'+extension;}
+if(query){if(parts.length>1){parts[1]+='&'+query;}else{parts.push(query);}}
+return parts.join('?');};var updateUrlQuery=function(target,source){var urlFilters=function(k){return k.indexOf('.')!=-1||k[0]=='(';};var otherParams=function(k){return!urlFilters(k)&&k[0]!='w';};var extractFrom=function(query,f){return query&&query.split('&').filter(function(item){var q=item.split('=');return q.length>1&&f(decodeURIComponent(q[0]));})||[];};var tparts=target.split('?'),sparts=source.split('?'),urlVars=extractFrom(tparts[1],otherParams);tparts[1]=urlVars.concat(extractFrom(sparts[1],urlFilters)).join('&');return tparts.join('?');};function DDTCache(){this.data=[];this.slices=[];this.availableRecords=-1;}
+DDTCache.prototype.store=function(startIndex,data,availableRecords){if(availableRecords!==undefined){this.availableRecords=availableRecords;}
+var dataLength=data.length;if(dataLength){var cache=this.data,slices=this.slices;data.forEach(function(record,index){cache[startIndex+index]=record;});slices.push([startIndex,startIndex+dataLength]);slices.sort(function(x,y){var diff=x[0]-y[0];if(diff!==0){return diff;}else{return x[1]-y[1];}});if(slices.length>1){var newSlices=[];var merged=slices.reduce(function(x,y){if(x[1]<y[0]||x[0]>y[1]){newSlices.push(x);return y;}else{return[Math.min(x[0],y[0]),Math.max(x[1],y[1])];}});newSlices.push(merged);this.slices=newSlices;}}};DDTCache.prototype.retrieve=function(pageStart,pageLength){var availableRecords=this.availableRecords;if(availableRecords<0){return null;}
+if(pageStart<0){pageStart=0;}
+if(pageStart>=availableRecords){return[];}
+var pageEnd=pageStart+pageLength;if(pageEnd>availableRecords){pageEnd=availableRecords;}
+var slices=this.slices,slice,numSlices=slices.length;for(var i=0;i<numSlices;i++){slice=slices[i];if(pageStart>=slice[0]&&pageEnd<=slice[1]){return this.data.slice(pageStart,pageEnd);}}
+return null;};DDTCache.prototype.clear=function(){this.cache=[];this.slices=[];this.availableRecords=-1;};$.widget('s3.dataTableS3',{options:{destroy:false,deselectedIndicator:false},_create:function(){this.id=dataTableS3ID;dataTableS3ID+=1;this.eventNamespace='.dataTableS3';},_init:function(){var el=$(this.element),tableID=el.attr('id');this.tableID=tableID;this.selector='#'+tableID;this.refresh();},_destroy:function(){$.Widget.prototype.destroy.call(this);},refresh:function(){var el=$(this.element),opts=this.options;this._unbindEvents();var tableConfig=this._parseConfig();if(tableConfig===undefined){return;}
+var serverSide=true,processing=true,fnAjax=null;if(tableConfig.pagination=='true'){this.ajaxUrl=tableConfig.ajaxUrl;fnAjax=this._pipeline({cache:this._initCache()});}else{serverSide=false;processing=false;}
+this._renderBulkActions();el.dataTable({'ajax':fnAjax,'autoWidth':false,'columns':this.columnConfigs,'deferRender':true,'destroy':opts.destroy,'dom':tableConfig.dom,'lengthMenu':tableConfig.lengthMenu,'order':tableConfig.order,'orderFixed':tableConfig.group,'ordering':true,'pageLength':tableConfig.pageLength,'pagingType':tableConfig.pagingType,'processing':processing,'searchDelay':450,'searching':tableConfig.searching=='true','serverSide':serverSide,'search':{'smart':serverSide},'language':{'aria':{'sortAscending':': '+i18n.sortAscending,'sortDescending':': '+i18n.sortDescending},'paginate':{'first':i18n.first,'last':i18n.last,'next':i18n.next,'previous':i18n.previous},'emptyTable':i18n.emptyTable,'info':i18n.info,'infoEmpty':i18n.infoEmpty,'infoFiltered':i18n.infoFiltered,'infoThousands':i18n.infoThousands,'lengthMenu':i18n.lengthMenu,'loadingRecords':i18n.loadingRecords+'...','processing':i18n.processing+'...','search':i18n.search+':','zeroRecords':i18n.zeroRecords},'rowCallback':this._rowCallback(),'drawCallback':this._drawCallback(),'infoCallback':this._infoCallback(),'initComplete':S3.dataTables.initComplete});this._bindEvents();},_parseConfig:function(){var el=$(this.element),config=$(this.selector+'_configurations');if(!config.length){return;}
+var tableConfig=$.parseJSON(config.val());this.tableConfig=tableConfig;this._updatePermitted(tableConfig.permitted);if(!tableConfig.rowActions.length){tableConfig.rowActionsJSON=false;if(S3.dataTables.Actions){tableConfig.rowActions=S3.dataTables.Actions;}else{tableConfig.rowActions=[];}}else{tableConfig.rowActionsJSON=true;}
+var columnConfig=[],numCols=$('thead tr',el).children().length;for(var i=0;i<numCols;i++){columnConfig[i]=null;}
+if(tableConfig.rowActions.length>0){columnConfig[tableConfig.actionCol]={'sTitle':' ','bSortable':false};}
+if(tableConfig.bulkActions){columnConfig[tableConfig.bulkCol]={'sTitle':'<div class="bulk-select-options"><input class="bulk-select-all" type="checkbox">'+i18n.selectAll+'</input></div>','bSortable':false};}
+if(tableConfig.colWidths){var col,_colWidths=tableConfig.colWidths;for(col in _colWidths){if(columnConfig[col]!=null){columnConfig[col].sWidth=_colWidths[col];}else{columnConfig[col]={'sWidth':_colWidths[col]};}}}
+this.columnConfigs=columnConfig;return tableConfig;},_pipeline:function(opts){var conf=$.extend({cache:{},pages:2,data:null,method:'GET'},opts);var cache=conf.cache,cacheLastRequest=cache.cacheLastRequest||null,cacheLastJson=cache.cacheLastJson||null,cacheUpper=cache.cacheUpper||null,cacheLower=cache.cacheLower;if(cacheLower===undefined){cacheLower=-1;}
+var cacheCombined=new DDTCache();if(cacheLastJson&&cacheLower!=-1){var availableRecords=cacheLastJson.recordsFiltered||cacheLastJson.recordsTotal;cacheCombined.store(cacheLower,cacheLastJson.data,availableRecords);}
+var self=this;var countRequest=null;var exactCount=function(data){var lastJson=cacheLastJson;if(!lastJson||!lastJson.recordsApprox||countRequest===lastJson){return;}
+countRequest=lastJson;var countData=(data||[]).filter(function(item){return['draw','limit','start'].indexOf(item.name)==-1;});countData.push({'name':'count','value':'exact'});$.ajaxS3({'type':conf.method,'url':self.ajaxUrl,'data':countData,'dataType':'json','cache':false,'success':function(counts){if(cacheLastJson!==lastJson){return;}
+cacheLastJson.recordsTotal=counts.recordsTotal;cacheLastJson.recordsFiltered=counts.recordsFiltered;delete cacheLastJson.recordsApprox;self.recordsApprox=false;cacheCombined.store(cacheLower,[],counts.recordsFiltered);$(self.element).DataTable().draw(false);}});};return function(request,drawCallback,settings){if(this.hasOwnProperty('nTable')){var sAjaxSource=settings.sAjaxSource;if(sAjaxSource){self.ajaxUrl=sAjaxSource;settings.sAjaxSource=null;}
+cacheLastJson=null;cacheLastRequest=null;cacheLower=-1;cacheUpper=null;cacheCombined.clear();drawCallback({});return;}
+var ajax=false,requestStart=request.start,drawStart=request.start,requestLength=request.length,cached;var totalRecords=request.recordsTotal,availableRecords=totalRecords;if(cacheLastJson){if(cacheLastJson.recordsTotal!==undefined){totalRecords=cacheLastJson.recordsTotal;}
+if(cacheLastJson.recordsFiltered!==undefined){availableRecords=cacheLastJson.recordsFiltered;}else{availableRecords=totalRecords;}}
+self.totalRecords=totalRecords;self.recordsApprox=cacheLastJson&&cacheLastJson.recordsApprox||false;if(self.recordsApprox){exactCount();}
+if(requestLength==-1){requestStart=0;if(availableRecords!==undefined){requestLength=availableRecords;}else{ajax=true;}}
+if(!ajax){var requestEnd=requestStart+requestLength;if(settings.clearCache){cacheCombined.clear();settings.clearCache=false;ajax=true;}else if(cacheLastRequest&&(JSON.stringify(request.order)!==JSON.stringify(cacheLastRequest.order)||JSON.stringify(request.columns)!==JSON.stringify(cacheLastRequest.columns)||JSON.stringify(request.search)!==JSON.stringify(cacheLastRequest.search))){cacheCombined.clear();ajax=true;}else{cached=cacheCombined.retrieve(requestStart,requestEnd-requestStart);if(cached===null){ajax=true;}}}
+cacheLastRequest=$.extend(true,{},request);if(ajax){if(requestStart<cacheLower){requestStart=requestStart-(requestLength*(conf.pages-1));if(requestStart<0){requestStart=0;}}
+cacheLower=requestStart;if(request.length!=-1){cacheUpper=requestStart+(requestLength*conf.pages);}else{cacheUpper=requestLength;}
+request.start=requestStart;request.length=requestLength*conf.pages;if($.isFunction(conf.data)){var d=conf.data(request);if(d){$.extend(request,d);}}
+else if($.isPlainObject(conf.data)){$.extend(request,conf.data);}
+var limit;if(requestLength==-1){limit='none';}else{limit=request.length;}
+var sendData=[{'name':'draw','value':request.draw},{'name':'limit','value':limit}];if(requestStart!=0){sendData.push({'name':'start','value':requestStart});}
+if(request.search&&request.search.value){sendData.push({'name':'sSearch','value':request.search.value});sendData.push({'name':'iColumns','value':request.columns.length});}
+var order_len=request.order.length;if(order_len){sendData.push({'name':'iSortingCols','value':order_len});var columnConfigs=self.columnConfigs,columnConfig,ordering,i;for(i=0;i<columnConfigs.length;i++){columnConfig=columnConfigs[i];if(columnConfig&&!columnConfig.bSortable){sendData.push({'name':'bSortable_'+i,'value':'false'});}}
+for(i=0;i<order_len;i++){ordering=request.order[i];sendData.push({'name':'iSortCol_'+i,'value':ordering.column});sendData.push({'name':'sSortDir_'+i,'value':ordering.dir});}}
+var ajaxMethod=$.ajaxS3;if($.searchS3!==undefined){ajaxMethod=$.searchS3;}
+settings.jqXHR=ajaxMethod({'type':conf.method,'url':self.ajaxUrl,'data':sendData,'dataType':'json','cache':false,'success':function(json){var cacheEnd=self.totalRecords;if(json.recordsFiltered!==undefined){cacheEnd=json.recordsFiltered;}
+cacheCombined.store(requestStart,json.data,cacheEnd);cacheLastJson=$.extend(true,{},json);self._updatePermitted(json.permitted);self.recordsApprox=json.recordsApprox||false;if(self.recordsApprox){exactCount(sendData);}
+cacheUpper=requestStart+json.data.length;if(requestStart!=drawStart){json.data.splice(0,drawStart-requestStart);}
+if(requestLength!=-1){json.data.splice(requestLength,json.data.length);}
+drawCallback(json);}});}else{var json=$.extend(true,{},cacheLastJson,{draw:request.draw});json.data=cached;drawCallback(json);}};},_initCache:function(){var initial=$(this.selector+'_dataTable_cache'),cache;if(initial.length>0){cache=JSON.parse(initial.val());}else{cache={};}
+this.pipelineCache=cache;return cache;},_headerCallback:function(){},_rowCallback:function(){var self=this;return function(nRow,aData){var tableConfig=self.tableConfig,actionCol=tableConfig.actionCol;var result=/>(.*)</i.exec(aData[actionCol]),recordId;if(result===null){recordId=aData[actionCol];}else{recordId=result[1];}
+var rowActions=tableConfig.rowActions;if(rowActions.length||tableConfig.bulkActions){var buttons=[];for(var i=0;i<rowActions.length;i++){buttons.push(self._renderActionButton(recordId,rowActions[i]));}
+$('td:eq('+actionCol+')',nRow).addClass('actions').html(buttons.join(''));}
+if(tableConfig.bulkActions){self._bulkSelect(nRow,inList(recordId,self.selectedRows));}
+var styles=tableConfig.rowStyles;if(styles.length){var row=$(nRow);for(var style in styles){if(inList(recordId,styles[style])!=-1){row.addClass(style);}}}
+self._truncateCellContents(nRow,aData);return nRow;};},_infoCallback:function(){var self=this;return function(oSettings,start,end,max,total,pre){if(!self.recordsApprox||!total||!i18n.infoApprox){return pre;}
+var formatNumber=oSettings.fnFormatNumber;return i18n.infoApprox.replace('_START_',formatNumber.call(oSettings.oInstance,start)).replace('_END_',formatNumber.call(oSettings.oInstance,end)).replace('_TOTAL_',formatNumber.call(oSettings.oInstance,total));};},_drawCallback:function(){var self=this;return function(oSettings){var el=$(self.element),selector=self.selector,wrapper=el.closest('.dt-wrapper');var ajaxSource=self.ajaxUrl;if(ajaxSource){wrapper.find('a.permalink').each(function(){var $this=$(this);$this.attr('href',updateUrlQuery($this.attr('href'),ajaxSource));});}
+var numrows=oSettings.fnRecordsDisplay();if(Math.ceil(numrows/oSettings._iDisplayLength)>1){$(selector+'_paginate').show();}else{$(selector+'_paginate').hide();}
+if(numrows===0){wrapper.find('.dt-export-options').hide();}else{wrapper.find('.dt-export-options').show();}
+if($(selector+' .s3_modal').length){S3.addModals();}
+var container=el.closest('.dt-contents');if(container.length){if(numrows>0){container.find('.empty').hide().siblings('.dt-wrapper').show();}else{container.find('.empty').show().siblings('.dt-wrapper').hide();}}
+var tableConfig=self.tableConfig,groups=tableConfig.group;if(groups.length){var prefixID=[];tableConfig.group.forEach(function(group,i){var groupTotals=tableConfig.groupTotals[i]||{},groupTitles=tableConfig.groupTitles[i]||[];self._renderGroups(oSettings,group[0],groupTitles,groupTotals,prefixID,i+1);prefixID.push(group[0]);});if(tableConfig.shrinkGroupedRows){var levelID,groupID;$('tbody tr',el).each(function(){var row=$(this);if(row.hasClass('group')){levelID=row.data('level');groupID=row.data('group');}else if(levelID&&groupID&&!row.hasClass('spacer')){row.addClass('xgroup_'+levelID+'_'+groupID).addClass('collapsable');}});$('.collapsable').hide();}}
+self.doubleScroll();};},_updatePermitted:function(permitted){if(!permitted){this.permitted=null;return;}
+var recordIDs,method,ids;this.permitted={};for(method in permitted){if(permitted.hasOwnProperty(method)){ids=this.permitted[method]={};recordIDs=permitted[method];for(var i=0,len=recordIDs.length;i<len;i++){ids[recordIDs[i]]=true;}}}},_renderActionButton:function(recordId,action){var button='';var permit=action.permit,permitted=this.permitted;if(permit&&permitted&&permitted.hasOwnProperty(permit)){if(!permitted[permit].hasOwnProperty(recordId)){return button;}}else{var restrict=action.restrict;if(restrict&&restrict.constructor===Array&&restrict.indexOf(recordId)==-1){return button;}}
+var exclude=action.exclude;if(exclude&&exclude.constructor===Array&&exclude.indexOf(recordId)!=-1){return button;}
+var c=action._class;var label=action.label;if(!this.tableConfig.rowActionsJSON&&this.tableConfig.utf8){label=S3.Utf8.decode(action.label);}
+var title=action._title||label;if(action.icon){label='<i class="'+action.icon+'" alt="'+label+'"> </i>';}else if(action.img){label='<img src="'+action.icon+'" alt="'+label+'"></img>';}
+var disabled;if(action._disabled){disabled=' disabled="disabled"';}else{disabled='';}
+var re=/%5Bid%5D/g;if(action._onclick){var oc=action._onclick.replace(re,recordId);button='<a class="'+c+'" onclick="'+oc+disabled+'">'+label+'</a>';}else if(action.url){var url=action.url.replace(re,recordId),target=action._target||'';if(target){target=' target="'+target+'"';}
+button='<a db_id="'+recordId+'" class="'+c+'" href="'+url+'" title="'+title+'"'+target+disabled+'>'+label+'</a>';}else{var ajaxURL=action._ajaxurl||'';if(ajaxURL){ajaxURL=' data-url="'+ajaxURL+'"';}
+button='<a db_id="'+recordId+'" class="'+c+'" title="'+title+'"'+ajaxURL+disabled+'>'+label+'</a>';}
+return button;},ajaxAction:function(confirmation){var el=$(this.element);return function(event){event.stopPropagation();event.preventDefault();if(!confirmation||confirm(confirmation)){var $this=$(this),recordID=$this.attr('db_id'),ajaxURL=$this.data('url'),data={},formKey=el.closest('.dt-wrapper').find('input[name="_formkey"]').first().val();if(formKey!==undefined){data._formkey=formKey;}
+if(ajaxURL&&recordID){$.ajaxS3({'url':ajaxURL.replace(/%5Bid%5D/g,recordID),'type':'POST','dataType':'json','data':data,'success':function(){el.dataTable().fnReloadAjax();}});}}};},_truncateCellContents:function(row,data){var tableConfig=this.tableConfig,maxLength=tableConfig.textMaxLength,shrinkLength=tableConfig.textShrinkLength,groups=tableConfig.group.map(function(group){return group[0];}),colIdx=0;for(var i=0;i<data.length;i++){if($.inArray(i,groups)!=-1){continue;}
+var str=data[i];if(str.length>maxLength&&!str.match(/<.*>/)){var disp='<div class="dt-truncate"><span class="ui-icon ui-icon-zoomin" style="float:right"></span>'+str.substr(0,shrinkLength)+"&hellip;</div>",full='<div  style="display:none" class="dt-truncate"><span class="ui-icon ui-icon-zoomout" style="float:right"></span>'+str+"</div>";$('td:eq('+colIdx+')',row).html(disp+full);}
+colIdx++;}},doubleScroll:function(){var el=$(this.element);if(el.hasClass('doublescroll')&&!el.hasClass('responsive')){try{el.closest('.dataTable_table').doubleScroll({contentElement:el,resetOnWindowResize:true});}catch(e){console.log('dataTableS3: doubleScroll not available');}}},_renderBulkActions:function(){var tableConfig=this.tableConfig,bulkActions=tableConfig.bulkActions;if(bulkActions){var bulkActionControls=$('<div class="dataTable-action">');bulkActions.forEach(function(bulkAction){var name,value,cls;if(bulkAction.constructor===Array){value=bulkAction[0];name=bulkAction[1];if(bulkAction.length>2){cls=bulkAction[2];}}else{name=bulkAction;value=bulkAction;}
+var bulkActionSubmit=$('<input type="submit" class="selected-action">').attr({id:name+'-selected-action',name:name,value:value}).appendTo(bulkActionControls);if(cls){bulkActionSubmit.addClass(cls);}});this.bulkActionControls=bulkActionControls;var selected=JSON.parse($(this.selector+'_dataTable_bulkSelection').val());if(selected===null){selected=[];}
+this.selectedRows=selected;if($(this.selector+'_dataTable_bulkSelectAll').val()){this.selectionMode='Exclusive';}else{this.selectionMode='Inclusive';}}},_bulkSelect:function(row,index){var el=$(this.element),tableConfig=this.tableConfig,numSelected=this.selectedRows.length,totalRecords=this.totalRecords;var bulkSelectOptions=$('.bulk-select-options',el),selectAll=$('.bulk-select-all',el),deselected=$('.bulk-deselected',el),totalAvailable=$('.bulk-total-available',el),totalSelected=$('.bulk-total-selected',el),selectedIndicator=totalAvailable.length&&totalAvailable.length;if(this.selectionMode=='Inclusive'){if(selectedIndicator){totalSelected.text(numSelected);totalAvailable.text(totalRecords);}else{deselected.remove();}
+var bulkSingle=tableConfig.bulkSingle;if(index==-1){$(row).removeClass('row_selected');$('.bulkcheckbox',row).prop('checked',false);}else{if(bulkSingle){$(row).closest('table').find('tr').removeClass('row_selected').find('.bulkcheckbox').prop('checked',false);}
+$(row).addClass('row_selected');$('.bulkcheckbox',row).prop('checked',true);}
+if(!bulkSingle&&(numSelected==totalRecords)){selectAll.prop('checked',true);this.selectionMode='Exclusive';this.selectedRows=[];}}else{if(selectedIndicator){totalSelected.text(parseInt(totalAvailable.text(),10)-numSelected);totalAvailable.text(totalRecords);}else{if(!numSelected||numSelected==totalRecords){deselected.remove();}else{if(!deselected.length&&this.options.deselectedIndicator){deselected=$('<span class="bulk-deselected">').appendTo(bulkSelectOptions);}
+deselected.html('[-'+numSelected+']');}}
+if(index==-1){$(row).addClass('row_selected');$('.bulkcheckbox',row).prop('checked',true);}else{$(row).removeClass('row_selected');$('.bulkcheckbox',row).prop('checked',false);}
+if(numSelected==totalRecords){selectAll.prop('checked',false);this.selectionMode='Inclusive';this.selectedRows=[];}}
+if(tableConfig.bulkActions){$(this.selector+'_dataTable_bulkMode').val(this.selectionMode);$(this.selector+'_dataTable_bulkSelection').val(this.selectedRows.join(','));this.bulkActionControls.insertBefore(bulkSelectOptions);var numActive=this.selectedRows.length;if(this.selectionMode=='Exclusive'){numActive=totalRecords-numActive;}
+$('.selected-action',el).prop('disabled',numActive==0);$('.pair-action',el).prop('disabled',numActive!=2);}},_bulkSelectRow:function(){var self=this;return function(){var $this=$(this),id=$this.data('dbid'),rows=self.selectedRows;var posn=inList(id,rows);if(posn==-1){if(self.tableConfig.bulkSingle){self.selectedRows=[id];}else{rows.push(id);}
+posn=0;}else{rows.splice(posn,1);posn=-1;}
+self._bulkSelect($this.closest('tr'),posn);};},_bulkSelectAll:function(){var el=$(this.element),self=this;return function(){self.selectedRows=[];if($(this).prop('checked')){self.selectionMode='Exclusive';}else{self.selectionMode='Inclusive';}
+el.dataTable().api().draw(false);};},_renderGroups:function(oSettings,groupColumn,groupTitles,groupTotals,prefixID,level){var iColspan=oSettings.aoColumns.length,parentGroup,el=$(this.element),tableRows=$('tbody tr',el),row,rowData,value,prevValue,title,group=1,dataCnt=0,groupTitleCnt=0,groupPrefix='';for(var i=0;i<tableRows.length;i++){row=$(tableRows[i]);if(row.hasClass('spacer')){continue;}
+rowData=oSettings.aoData[oSettings.aiDisplay[dataCnt]]._aData;if(row.hasClass('group')){prevValue=undefined;parentGroup=row.data('group');groupPrefix=prefixID.map(function(idx){return this[idx];},rowData).join('_');continue;}
+value=rowData[groupColumn];if(value!==prevValue){while(groupTitles.length>groupTitleCnt&&value!=groupTitles[groupTitleCnt][0]){title=groupTitles[groupTitleCnt][1];this._insertGroupHeader(row,title,level,group,parentGroup,iColspan,groupTotals,groupPrefix);groupTitleCnt++;group++;}
+if(groupTitles.length>groupTitleCnt){title=groupTitles[groupTitleCnt][1];groupTitleCnt++;}else{title=value;}
+this._insertGroupHeader(row,title,level,group,parentGroup,iColspan,groupTotals,groupPrefix,true);group++;prevValue=value;}
+dataCnt+=1;if(this.tableConfig.shrinkGroupedRows){row.hide();}}
+row=tableRows[tableRows.length-1];while(groupTitles.length>groupTitleCnt){title=groupTitles[groupTitleCnt][1];this._insertGroupHeader(row,title,level,group,parentGroup,iColspan,groupTotals,groupPrefix,false,true);groupTitleCnt++;group++;}},_insertGroupHeader:function(row,groupTitle,level,group,parentGroup,iColspan,groupTotals,groupPrefix,addIcons,append){var tableConfig=this.tableConfig;var nGroup=$('<tr class="group">').data({level:''+level,group:''+group}).addClass('level_'+level);var collapsable=tableConfig.shrinkGroupedRows;if(parentGroup){var parentLevel=''+(level-1);nGroup.addClass('xgroup_'+parentLevel+'_'+parentGroup).data({parentLevel:parentLevel,parentGroup:parentGroup});if(collapsable){nGroup.addClass('collapsable');}}
+var nCell=$('<td>').attr('colspan',iColspan).appendTo(nGroup);for(var lvl=1;lvl<level;lvl++){$('<span class="group-indent">').appendTo(nCell);}
+if(level>1){$('<span class="ui-icon ui-icon-triangle-1-e group-closed">').appendTo(nCell);$('<span class="ui-icon ui-icon-triangle-1-s group-opened">').hide().appendTo(nCell);}
+var groupCount='';if(groupTotals[groupTitle]!=null){groupCount=' ('+groupTotals[groupTitle]+')';}else{var index=groupPrefix+groupTitle;if(groupTotals[index]!=null){groupCount=' ('+groupTotals[index]+')';}}
+nCell.append(groupTitle+groupCount);if(collapsable&&addIcons){var expandIcons=tableConfig.groupIcon,expandIconType;if(expandIcons.length>=level){expandIconType=expandIcons[level-1];}else{expandIconType='icon';}
+var expandIcon=$('<span class="group-expand">').appendTo(nCell),collapseIcon=$('<span class="group-collapse">').hide().appendTo(nCell);if(expandIconType=='text'){expandIcon.text('→');collapseIcon.text('↓');}else if(expandIconType=='icon'){expandIcon.addClass('ui-icon ui-icon-arrowthick-1-e');collapseIcon.addClass('ui-icon ui-icon-arrowthick-1-s');}}
+if(append){nGroup.insertAfter(row);}else{nGroup.insertBefore(row);}
+if(tableConfig.groupSpacing){var prevHeader=nGroup.prevAll('tr.group').first();if(prevHeader.length){var prevLevel=prevHeader.data('level');if(prevLevel==level){var prevGroup=prevHeader.data('group'),emptyCell=$('<td>').attr('colspan',iColspan),spacerRow=$('<tr class="spacer">').append(emptyCell);if(collapsable){spacerRow.addClass('collapsable');}
+spacerRow.addClass('xgroup_'+level+'_'+prevGroup).insertBefore(nGroup);}}}},_toggleGroup:function(row,visibility){switch(this.tableConfig.shrinkGroupedRows){case'individual':if(visibility){this._expandGroup(row);}else{this._collapseGroup(row);}
+break;case'accordion':if(visibility){this._expandGroup(row);var level=row.data('level'),siblingClass='.level_'+level,parentGroup=row.data('parentGroup');if(parentGroup){siblingClass+='.xgroup_'+row.data('parentLevel')+'_'+parentGroup;}
+var self=this;row.siblings('tr.group'+siblingClass).each(function(){self._collapseGroup($(this));});}else{this._collapseGroup(row);}
+break;default:break;}},_expandGroup:function(row){var level=row.data('level'),group=row.data('group');row.siblings('tr.xgroup_'+level+'_'+group).show();$('.group-expand, .group-closed',row).hide();$('.group-collapse, .group-opened',row).show();},_collapseGroup:function(row){var level=row.data('level'),group=row.data('group'),self=this;row.siblings('tr.xgroup_'+level+'_'+group).each(function(){var $this=$(this);if($this.hasClass('group')){self._collapseGroup($this);}
+$this.hide();});$('.group-expand, .group-closed',row).show();$('.group-collapse, .group-opened',row).hide();},_exportFormat:function(){var el=$(this.element),self=this;return function(){var oSetting=el.dataTable().fnSettings(),url=$(this).data('url'),extension=$(this).data('extension');if(oSetting){var args='id='+self.tableid,sSearch=oSetting.oPreviousSearch.sSearch,aaSort=oSetting.aaSorting,aaSortFixed=oSetting.aaSortingFixed,aoColumns=oSetting.aoColumns;if(sSearch){args+='&sSearch='+sSearch+'&iColumns='+aoColumns.length;}
+if(aaSortFixed!==null){aaSort=aaSortFixed.concat(aaSort);}
+aoColumns.forEach(function(column,i){if(!column.bSortable){args+='&bSortable_'+i+'=false';}});args+='&iSortingCols='+aaSort.length;aaSort.forEach(function(sorting,i){args+='&iSortCol_'+i+'='+aaSort[i][0]+'&sSortDir_'+i+'='+aaSort[i][1];});url=appendUrlQuery(url,extension,args);}else{url=appendUrlQuery(url,extension);}
+if($.searchDownloadS3!==undefined){$.searchDownloadS3(url,'_blank');}else{window.open(url);}};},_initExportFormats:function(){var tableConfig=this._parseConfig();if(tableConfig===undefined){return;}
+var ajaxURL=tableConfig.ajaxUrl;if(ajaxURL&&S3.search!==undefined){var link=document.createElement('a');link.href=ajaxURL;if(link.search){var items=link.search.slice(1).split('&'),queries=items.map(function(item){return item.split('=');}).filter(function(item){return item[0].indexOf('.')!=-1;});$(this.element).closest('.dt-wrapper').find('.dt-export').each(function(){var $this=$(this);var url=$this.data('url');if(url){$this.data('url',S3.search.filterURL(url,queries));}});}}},_bindEvents:function(){var el=$(this.element),ns=this.eventNamespace,self=this;el.on('click'+ns,'.dt-truncate .ui-icon-zoomin, .dt-truncate .ui-icon-zoomout',function(){$(this).parent().toggle().siblings('.dt-truncate').toggle();return false;});this._initExportFormats();el.closest('.dt-wrapper').find('.dt-export').on('click'+ns,this._exportFormat());el.on('click'+ns,'.dt-ajax-delete',this.ajaxAction(i18n.delete_confirmation));el.on('click'+ns,'.group-collapse, .group-expand',function(){var $this=$(this),trow=$this.closest('tr.group'),visibility=true;if($this.hasClass('group-collapse')){visibility=false;}
+self._toggleGroup(trow,visibility);});if(this.tableConfig.bulkActions){if(this.tableConfig.bulkSingle){$('.bulk-select-options',el).hide();}else{el.on('click'+ns,'.bulk-select-all',this._bulkSelectAll());}
+el.on('click'+ns,'.bulkcheckbox',this._bulkSelectRow());}
+return true;},_unbindEvents:function(){var el=$(this.element),ns=this.eventNamespace;el.off(ns);el.closest('.dt-wrapper').find('.dt-export').off(ns);return true;}});$.fn.dataTable.Api.register('clearPipeline()',function(){return this.iterator('table',function(settings){settings.clearCache=true;});});$.fn.dataTableExt.oApi.fnReloadAjax=function(oSettings,sNewSource){if(sNewSource!='undefined'&&sNewSource!=null){oSettings.sAjaxSource=sNewSource;}
+this.oApi._fnProcessingDisplay(oSettings,true);var self=this;oSettings.ajax({},function(){self.oApi._fnClearTable(oSettings);self.fnDraw();},oSettings);};$(document).ready(function(){if(S3.dataTables){var dataTableIds=S3.dataTables.id;if(dataTableIds){dataTableIds.forEach(function(tableId){$('#'+tableId).dataTableS3({destroy:false});});}}});})(jQuery);
@@ -0,0 +1,11 @@
+#!/usr/bin/python
+
+# This is a script to build (or rebuild) the name index of the offline
+# gazetteer (S3Gazetteer), e.g. after importing locations with the DAL
+
+# Needs to be run in the web2py environment
+# python web2py.py -S eden -M -R applications/eden/static/scripts/tools/gis_gazetteer_rebuild.py
+
+s3base.S3Gazetteer.rebuild()
+db.commit()
+print("Gazetteer index rebuilt")
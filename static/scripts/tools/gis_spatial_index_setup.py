@@ -0,0 +1,11 @@
+#!/usr/bin/python
+
+# This is a script to set up the spatial index (S3SpatialIndex) for
+# bounding box queries, e.g. if there is no scheduler worker running
+
+# Needs to be run in the web2py environment
+# python web2py.py -S eden -M -R applications/eden/static/scripts/tools/gis_spatial_index_setup.py
+
+backend = s3base.S3SpatialIndex.setup()
+db.commit()
+print("Spatial index: %s" % (backend or "not available"))
@@ -5,6 +5,29 @@
 # Needs to be run in the web2py environment
 # python web2py.py -S eden -M -R applications/eden/static/scripts/tools/gis_update_location_tree.py
 
-s3db.gis_location
-gis.update_location_tree()
-db.commit()
+# To update only the locations of certain countries, pass their L0 location IDs:
+# python web2py.py -S eden -M -R applications/eden/static/scripts/tools/gis_update_location_tree.py -A 1 2
+#
+# Independent countries can be updated in parallel processes (one process
+# per group of L0 IDs), to list the L0 location IDs:
+# python web2py.py -S eden -M -R applications/eden/static/scripts/tools/gis_update_location_tree.py -A L0
+# NB Specific locations without parent are only updated when run without L0 IDs
+
+import sys
+
+args = sys.argv[1:]
+
+table = s3db.gis_location
+if args == ["L0"]:
+    # List the L0 location IDs
+    query = (table.level == "L0") & (table.deleted == False)
+    for row in db(query).select(table.id, orderby=table.id):
+        print(row.id)
+elif args:
+    L0 = [int(arg) for arg in args]
+    updated = gis.rebuild_location_tree(L0=L0)
+    s3db.commit()
+    print("%s locations updated" % updated)
+else:
+    gis.update_location_tree()
+    s3db.commit()
@@ -0,0 +1,20 @@
+#!/usr/bin/python
+
+# This is a script to precompute the simplified geometries of all
+# (non-point) Locations in the Database, e.g. after importing boundaries
+# or after changing settings.gis.simplify_tolerances
+
+# Needs to be run in the web2py environment
+# python web2py.py -S eden -M -R applications/eden/static/scripts/tools/gis_update_simplified_geometries.py
+
+# To update only certain locations, pass their IDs:
+# python web2py.py -S eden -M -R applications/eden/static/scripts/tools/gis_update_simplified_geometries.py -A 1 2
+
+import sys
+
+args = sys.argv[1:]
+
+location_ids = [int(arg) for arg in args] if args else None
+updated = gis.update_simplified_geometries(location_ids)
+db.commit()
+print("%s locations updated" % updated)
@@ -18,6 +18,6 @@ countries = ["AF", "AU", "BD", "BN", "CK", "CN", "FJ",
              ]
 
 gis.import_admin_areas(countries=countries)
-db.commit()
+s3db.commit()
 
 sys.stderr.write("Total Time: %s\n" % (time.mktime(time.localtime()) - secs))
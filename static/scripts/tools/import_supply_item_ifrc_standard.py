@@ -53,7 +53,7 @@ resource.import_xml(File,
                     stylesheet=stylesheet)
 File.close()
 
-db.commit()
+s3db.commit()
 
 auth.override = False
 
@@ -0,0 +1,19 @@
+#!/usr/bin/python
+
+# This is a script to set up and (re-)build the text search index
+# (S3TextSearch) for tables configured with text_search, e.g. after
+# enabling the index or after writing records directly with the DAL
+
+# Needs to be run in the web2py environment
+# python web2py.py -S eden -M -R applications/eden/static/scripts/tools/text_search_rebuild.py -A org_organisation
+
+import sys
+
+args = sys.argv[1:]
+
+if not args:
+    print("Usage: text_search_rebuild.py tablename [tablename ...]")
+for tablename in args:
+    s3base.S3TextSearch.rebuild(tablename)
+    db.commit()
+    print("Text search index rebuilt for %s" % tablename)